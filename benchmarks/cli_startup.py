@@ -0,0 +1,150 @@
+"""
+Benchmark webhook2lambda2sqs CLI startup: the import time of the runner
+module (via ``python -X importtime``), and which heavy third-party modules are
+imported by actions that shouldn't need them.
+
+Exits non-zero if any action imports one of ``HEAVY_MODULES``, or if the
+fastest runner import takes longer than ``--max-ms`` milliseconds, so it can
+be used as a regression check.
+
+Usage: python benchmarks/cli_startup.py [--runs N] [--max-ms MS]
+
+The latest version of this package is available at:
+<http://github.com/jantman/webhook2lambda2sqs>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of webhook2lambda2sqs, also known as webhook2lambda2sqs.
+
+    webhook2lambda2sqs is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    webhook2lambda2sqs is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with webhook2lambda2sqs.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/webhook2lambda2sqs> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import argparse
+import subprocess
+import sys
+
+#: top-level packages that are slow to import, and that must only be
+#: imported by the actions that use them
+HEAVY_MODULES = ['boto3', 'botocore', 'requests', 'urllib3']
+
+#: command line arguments for actions that should not import any of
+#: ``HEAVY_MODULES``
+LIGHT_ACTIONS = [
+    ['--help'],
+    ['generate', '--help'],
+    ['example-config'],
+]
+
+#: run the CLI with ``sys.argv[1:]`` as its arguments, then write the names of
+#: all imported modules to STDERR
+RUN_ACTION = """
+import sys
+from webhook2lambda2sqs.runner import main
+args = sys.argv[1:]
+sys.argv = ['webhook2lambda2sqs'] + args
+try:
+    main()
+except SystemExit:
+    pass
+sys.stderr.write(' '.join(sorted(sys.modules.keys())))
+"""
+
+
+def runner_import_usec():
+    """
+    Import the runner module in a new interpreter with ``-X importtime``, and
+    return the cumulative import time of ``webhook2lambda2sqs.runner`` in
+    microseconds.
+
+    :rtype: int
+    """
+    p = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c',
+         'import webhook2lambda2sqs.runner'],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    _, err = p.communicate()
+    for line in err.decode('utf-8').splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = [x.strip() for x in line.split('|')]
+        if len(parts) == 3 and parts[2] == 'webhook2lambda2sqs.runner':
+            return int(parts[1])
+    raise Exception('Unable to find webhook2lambda2sqs.runner import time in '
+                    'output: %s' % err)
+
+
+def heavy_imports(action_args):
+    """
+    Run the CLI with the given arguments in a new interpreter, and return the
+    sorted list of ``HEAVY_MODULES`` that it imported.
+
+    :param action_args: command line arguments
+    :type action_args: list
+    :rtype: list
+    """
+    p = subprocess.Popen(
+        [sys.executable, '-c', RUN_ACTION] + action_args,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    _, err = p.communicate()
+    # the module list is the last line; --help and example-config also
+    # write to STDERR
+    mods = err.decode('utf-8').splitlines()[-1].split()
+    return sorted(set(
+        m.split('.')[0] for m in mods if m.split('.')[0] in HEAVY_MODULES
+    ))
+
+
+def main(runs=5, max_ms=None):
+    failed = False
+    times = sorted(runner_import_usec() for _ in range(runs))
+    print('import webhook2lambda2sqs.runner: min %.1f ms, median %.1f ms '
+          '(%d runs)' % (
+              times[0] / 1000.0, times[len(times) // 2] / 1000.0, runs))
+    if max_ms is not None and times[0] > max_ms * 1000:
+        print('FAIL: runner import took longer than %s ms' % max_ms)
+        failed = True
+    for action_args in LIGHT_ACTIONS:
+        heavy = heavy_imports(action_args)
+        print('%-20s heavy imports: %s' % (
+            ' '.join(action_args), ', '.join(heavy) or 'none'))
+        if len(heavy) > 0:
+            failed = True
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description='Benchmark CLI startup')
+    p.add_argument('--runs', type=int, default=5,
+                   help='number of runner imports to time (default: 5)')
+    p.add_argument('--max-ms', type=float, default=None,
+                   help='fail if the fastest runner import takes longer '
+                   'than this many milliseconds')
+    args = p.parse_args()
+    main(runs=args.runs, max_ms=args.max_ms)
@@ -0,0 +1,112 @@
+"""
+Benchmark the JSON serialization done by the generated Lambda function, with
+the stdlib json module and (if installed) orjson, with and without key sorting.
+
+Usage: python benchmarks/json_serializers.py [iterations]
+
+The latest version of this package is available at:
+<http://github.com/jantman/webhook2lambda2sqs>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of webhook2lambda2sqs, also known as webhook2lambda2sqs.
+
+    webhook2lambda2sqs is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    webhook2lambda2sqs is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with webhook2lambda2sqs.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/webhook2lambda2sqs> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import sys
+import timeit
+
+from webhook2lambda2sqs import lambda_func
+
+
+def make_payload(num_items):
+    """
+    Return a message envelope shaped like the one the Lambda function
+    enqueues, with a POST body of ``num_items`` items.
+    """
+    return {
+        'context': {
+            'aws_request_id': 'a3d3dc44-c3d4-11e6-a5ff-c7c7d5c2e4a8',
+            'function_name': 'webhook2lambda2sqs',
+            'invoked_function_arn': 'arn:aws:lambda:us-east-1:123456789012:'
+                                    'function:webhook2lambda2sqs',
+            'memory_limit_in_mb': 128
+        },
+        'data': {
+            'items': [
+                {
+                    'id': x,
+                    'name': 'item %d' % x,
+                    'tags': ['foo', 'bar', 'baz'],
+                    'price': x * 1.25,
+                    'active': x % 2 == 0
+                } for x in range(num_items)
+            ]
+        },
+        'event': {
+            'context': {
+                'http-method': 'POST',
+                'request-id': 'a3d3dc44-c3d4-11e6-a5ff-c7c7d5c2e4a8',
+                'resource-path': '/myendpoint',
+                'source-ip': '192.0.2.1',
+                'user-agent': 'benchmark'
+            },
+            'params': {'header': {}, 'path': {}, 'querystring': {}}
+        }
+    }
+
+
+def main(iterations=1000):
+    serializers = [('json', None)]
+    if lambda_func.orjson is not None:
+        serializers.append(('orjson', lambda_func.orjson))
+    else:
+        print('orjson is not installed; only benchmarking stdlib json')
+    orig = (lambda_func.orjson, lambda_func.json_sort_keys)
+    try:
+        for num_items in [1, 100, 1000]:
+            payload = make_payload(num_items)
+            for name, mod in serializers:
+                lambda_func.orjson = mod
+                for sort_keys in [True, False]:
+                    lambda_func.json_sort_keys = sort_keys
+                    secs = timeit.timeit(
+                        lambda: lambda_func.json_dumps(payload),
+                        number=iterations
+                    )
+                    print('%5d items %-7s sort_keys=%-5s %10.2f usec/call' % (
+                        num_items, name, sort_keys,
+                        (secs / iterations) * 1000000
+                    ))
+    finally:
+        lambda_func.orjson, lambda_func.json_sort_keys = orig
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:2]])
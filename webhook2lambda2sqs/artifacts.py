@@ -0,0 +1,111 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/webhook2lambda2sqs>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of webhook2lambda2sqs, also known as webhook2lambda2sqs.
+
+    webhook2lambda2sqs is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    webhook2lambda2sqs is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with webhook2lambda2sqs.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/webhook2lambda2sqs> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import logging
+
+from webhook2lambda2sqs.config import Config
+from webhook2lambda2sqs.func_generator import LambdaFuncGenerator
+from webhook2lambda2sqs.tf_generator import TerraformGenerator
+from webhook2lambda2sqs.tf_templates import endpoints_module
+
+logger = logging.getLogger(__name__)
+
+
+def generate_artifacts(conf, account_id=None, aws_region=None, region=None,
+                       tf_ver=(0, 9, 0)):
+    """
+    Generate the Lambda function and Terraform configuration for a
+    configuration dict entirely in memory, for tools that generate many
+    stacks in one process. This is the equivalent of the ``generate`` action,
+    except that nothing is read from or written to disk and no AWS API calls
+    are made.
+
+    The AWS account ID and region must therefore be known up front, from the
+    arguments, the ``aws_account_id`` and ``aws_region`` configuration
+    options, or the ``AWS_DEFAULT_REGION`` or ``AWS_REGION`` environment
+    variables. The ``lambda_vendor_dir`` configuration option (and so
+    ``lambda_layer``) is not supported, as it reads packages from disk.
+
+    :param conf: configuration, as would be read from the configuration file
+    :type conf: dict
+    :param account_id: AWS account ID to generate for (overriding the
+      ``aws_account_id`` configuration option), or None
+    :type account_id: str
+    :param aws_region: AWS region to generate for (overriding the
+      ``aws_region`` configuration option), or None
+    :type aws_region: str
+    :param region: the region to generate the stack for, if the ``regions``
+      configuration option is set; ignored otherwise.
+    :type region: str
+    :param tf_ver: target terraform version
+    :type tf_ver: tuple
+    :return: dict with keys ``func_src`` (str; the function source),
+      ``func_zip`` (bytes; the function deployment package), ``tf_config``
+      (dict; the Terraform configuration), ``tf_json`` (str; the Terraform
+      configuration as written to ``webhook2lambda2sqs.tf.json``) and
+      ``endpoints_module`` (str; the endpoints module source if the
+      ``terraform_module`` configuration option is true, otherwise None)
+    :rtype: dict
+    :raises: :py:exc:`~.InvalidConfigError` if the configuration is invalid
+    """
+    config = Config.from_dict(conf)
+    if config.get('lambda_vendor_dir') is not None:
+        raise Exception('ERROR: lambda_vendor_dir is not supported when '
+                        'generating in memory')
+    regions = config.get('regions')
+    if regions is None:
+        region = None
+    elif region not in regions:
+        raise Exception('ERROR: region must be one of the configured '
+                        'regions: %s' % ', '.join(regions))
+    func_src = LambdaFuncGenerator(config).generate()
+    tfgen = TerraformGenerator(
+        config, tf_ver=tf_ver, region=region, account_id=account_id,
+        aws_region=aws_region, offline=True
+    )
+    tf_json = tfgen._get_config(func_src)
+    res = {
+        'func_src': func_src,
+        'func_zip': tfgen._zip_bytes(func_src),
+        'tf_config': tfgen.tf_conf,
+        'tf_json': tf_json,
+        'endpoints_module': None
+    }
+    if config.get('terraform_module'):
+        res['endpoints_module'] = endpoints_module
+    logger.debug('Generated artifacts for %s in memory', config.func_name)
+    return res
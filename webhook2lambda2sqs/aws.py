@@ -36,15 +36,84 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 import logging
-from boto3 import client
 from datetime import datetime
 import json
 from pprint import pformat
+import threading
 
-from webhook2lambda2sqs.utils import pretty_json
+from webhook2lambda2sqs.utils import pretty_json, cache_get, cache_set
 
 logger = logging.getLogger(__name__)
 
+#: botocore configuration options for all of the AWS API clients we create:
+#: retry throttling and transient errors more than the default, allow as many
+#: concurrent connections as the ``multi`` action and multiple regions may
+#: use, and don't hang forever on a stuck connection. boto3 and botocore are
+#: only imported when the first client or session is created, so that
+#: actions which never talk to AWS don't pay for importing them.
+BOTO_CONFIG = {
+    'retries': {'max_attempts': 10},
+    'max_pool_connections': 50,
+    'connect_timeout': 10,
+    'read_timeout': 60
+}
+
+#: Seconds to cache the ID of the ReST API with a given name; see
+#: :py:meth:`~.AWSInfo.get_api_id`
+API_ID_CACHE_TTL = 3600
+
+#: the shared boto3 Session; see :py:func:`~.get_session`
+_session = None
+
+#: memoized clients, keyed by (service name, region); see
+#: :py:func:`~.get_client`
+_clients = {}
+
+#: guards ``_session`` and ``_clients``; boto3 Sessions aren't thread-safe,
+#: but the clients they create are
+_clients_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Return the boto3 Session shared by all of the AWS clients in this process,
+    creating it on first use. Credentials and configuration are resolved once
+    per session.
+
+    :rtype: :py:class:`boto3.session.Session`
+    """
+    global _session
+    with _clients_lock:
+        if _session is None:
+            from boto3.session import Session
+            logger.debug('Creating boto3 Session')
+            _session = Session()
+        return _session
+
+
+def get_client(svc, region=None):
+    """
+    Return a boto3 client for the given service and region from the shared
+    session (see :py:func:`~.get_session`), configured with
+    :py:const:`~.BOTO_CONFIG`. Clients are memoized per service and region,
+    so repeated calls return the same client.
+
+    :param svc: service name
+    :type svc: str
+    :param region: region name, or None for the default region
+    :type region: str
+    :return: boto3 client
+    """
+    key = (svc, region)
+    session = get_session()
+    with _clients_lock:
+        if key not in _clients:
+            from botocore.config import Config
+            logger.debug('Creating %s client for region %s', svc, region)
+            _clients[key] = session.client(svc, region_name=region,
+                                           config=Config(**BOTO_CONFIG))
+        return _clients[key]
+
 
 class AWSInfo(object):
 
@@ -55,11 +124,35 @@ class AWSInfo(object):
         'loggingLevel': '/%s/logging/loglevel',
         'dataTraceEnabled': '/%s/logging/dataTrace',
         'throttlingBurstLimit': '/%s/throttling/burstLimit',
-        'throttlingRateLimit': '/%s/throttling/rateLimit'
+        'throttlingRateLimit': '/%s/throttling/rateLimit',
+        'cachingEnabled': '/%s/caching/enabled',
+        'cacheTtlInSeconds': '/%s/caching/ttlInSeconds'
     }
 
-    def __init__(self, config):
+    def __init__(self, config, region=None):
+        """
+        :param config: program configuration
+        :type config: :py:class:`~.Config`
+        :param region: AWS region to connect to; None for the ``aws_region``
+          configuration option if set, else the default region
+        :type region: str
+        """
         self.config = config
+        if region is None:
+            region = config.get('aws_region')
+        self.region = region
+        self._api_id = None
+
+    def _client(self, svc):
+        """
+        Return the (shared) boto3 client for the given service, in
+        ``self.region`` if set; see :py:func:`~.get_client`.
+
+        :param svc: service name
+        :type svc: str
+        :return: boto3 client
+        """
+        return get_client(svc, self.region)
 
     def show_cloudwatch_logs(self, count=10, grp_name=None):
         """
@@ -72,7 +165,7 @@ class AWSInfo(object):
             grp_name = '/aws/lambda/%s' % self.config.func_name
         logger.debug('Log Group Name: %s', grp_name)
         logger.debug('Connecting to AWS Logs API')
-        conn = client('logs')
+        conn = self._client('logs')
         logger.debug('Getting log streams')
         streams = conn.describe_log_streams(
             logGroupName=grp_name,
@@ -256,7 +349,7 @@ class AWSInfo(object):
         :type delete: bool
         """
         logger.debug('Connecting to SQS API')
-        conn = client('sqs')
+        conn = self._client('sqs')
         if name is not None:
             queues = [name]
         else:
@@ -267,8 +360,44 @@ class AWSInfo(object):
             except Exception:
                 logger.error("Error showing queue '%s'", q_name, exc_info=1)
 
+    def update_function_code(self, zip_path):
+        """
+        Upload the function zip file at ``zip_path`` as the Lambda function's
+        code and then publish a new version of it.
+
+        :param zip_path: path to the function zip file
+        :type zip_path: str
+        :return: published function version
+        :rtype: str
+        """
+        with open(zip_path, 'rb') as fh:
+            zip_bytes = fh.read()
+        conn = self._client('lambda')
+        logger.info('Updating code for function %s from %s',
+                    self.config.func_name, zip_path)
+        res = conn.update_function_code(
+            FunctionName=self.config.func_name, ZipFile=zip_bytes
+        )
+        logger.debug('update_function_code response: %s', res)
+        try:
+            waiter = conn.get_waiter('function_updated')
+        except ValueError:
+            # older botocore without the waiter; updates were synchronous
+            waiter = None
+        if waiter is not None:
+            logger.debug('Waiting for function update to complete')
+            waiter.wait(FunctionName=self.config.func_name)
+        ver = conn.publish_version(
+            FunctionName=self.config.func_name,
+            CodeSha256=res['CodeSha256']
+        )
+        logger.warning('Updated function %s code (CodeSha256 %s); published '
+                       'version %s', self.config.func_name, res['CodeSha256'],
+                       ver['Version'])
+        return ver['Version']
+
     def get_api_base_url(self):
-        conn = client('apigateway')
+        conn = self._client('apigateway')
         api_id = self.get_api_id()
         return 'https://%s.execute-api.%s.amazonaws.com/%s/' % (
                 api_id, conn._client_config.region_name, self.config.stage_name
@@ -276,26 +405,78 @@ class AWSInfo(object):
 
     def get_api_id(self):
         """
-        Return the API ID.
+        Return the ID of the ReST API named for our function. The ID is
+        remembered for the life of this object, and cached on disk (per
+        region and name) for :py:const:`~.API_ID_CACHE_TTL` seconds; a cached
+        ID is only used after checking that the API still exists with the
+        same name. Otherwise, all pages of ReST APIs are listed.
 
         :return: API ID
         :rtype: str
         """
+        if self._api_id is not None:
+            return self._api_id
         logger.debug('Connecting to AWS apigateway API')
-        conn = client('apigateway')
-        apis = conn.get_rest_apis()
-        api_id = None
-        for api in apis['items']:
-            if api['name'] == self.config.func_name:
-                api_id = api['id']
-                logger.debug('Found API id: %s', api_id)
-                break
+        conn = self._client('apigateway')
+        name = self.config.func_name
+        key = '%s|%s' % (conn._client_config.region_name, name)
+        api_id = cache_get('api_id', key, API_ID_CACHE_TTL)
+        if api_id is not None and not self._check_api_id(conn, api_id, name):
+            api_id = None
         if api_id is None:
-            raise Exception('Unable to find ReST API named %s' %
-                            self.config.func_name)
+            api_id = self._find_api_id(conn, name)
+            cache_set('api_id', key, api_id)
+        self._api_id = api_id
         return api_id
 
-    def set_method_settings(self):
+    def _check_api_id(self, conn, api_id, name):
+        """
+        Return whether the ReST API with ID ``api_id`` exists and is named
+        ``name``.
+
+        :param conn: APIGateway API connection
+        :type conn: :py:class:`botocore:APIGateway.Client`
+        :param api_id: ReST API ID
+        :type api_id: str
+        :param name: expected ReST API name
+        :type name: str
+        :rtype: bool
+        """
+        from botocore.exceptions import ClientError
+        try:
+            api = conn.get_rest_api(restApiId=api_id)
+        except ClientError:
+            logger.debug('Unable to get cached ReST API %s', api_id,
+                         exc_info=1)
+            return False
+        if api['name'] != name:
+            logger.debug('Cached ReST API %s is now named %s', api_id,
+                         api['name'])
+            return False
+        logger.debug('Using cached API id: %s', api_id)
+        return True
+
+    def _find_api_id(self, conn, name):
+        """
+        Find the ID of the ReST API named ``name`` by listing all of the ReST
+        APIs in the account, 500 (the maximum) per page.
+
+        :param conn: APIGateway API connection
+        :type conn: :py:class:`botocore:APIGateway.Client`
+        :param name: ReST API name
+        :type name: str
+        :return: API ID
+        :rtype: str
+        """
+        paginator = conn.get_paginator('get_rest_apis')
+        for page in paginator.paginate(PaginationConfig={'PageSize': 500}):
+            for api in page['items']:
+                if api['name'] == name:
+                    logger.debug('Found API id: %s', api['id'])
+                    return api['id']
+        raise Exception('Unable to find ReST API named %s' % name)
+
+    def set_method_settings(self, api_id=None):
         """
         Set the Method settings <https://docs.aws.amazon.com/apigateway/api-\
 reference/resource/stage/#methodSettings> on our Deployment Stage.
@@ -303,48 +484,90 @@ reference/resource/stage/#methodSettings> on our Deployment Stage.
 jantman/webhook2lambda2sqs/issues/7> and <https://github.com/hashicorp\
 /terraform/issues/6612>.
 
-        Calls :py:meth:`~._add_method_setting` for each setting that is not
-        currently correct.
+        The stage-wide (``*/*``) settings come from
+        ``api_gateway_method_settings``, and each endpoint's ``method_settings``
+        are set on that endpoint's method. Every setting that is not currently
+        correct is updated in a single call to
+        :py:meth:`~._update_method_settings`.
+
+        :param api_id: ReST API ID, if known (i.e. from Terraform outputs);
+          if None, it's found with :py:meth:`~.get_api_id`
+        :type api_id: str
         """
-        settings = self.config.get('api_gateway_method_settings')
-        if settings is None:
+        wanted = self._method_settings()
+        if len(wanted) == 0:
             logger.debug('api_gateway_method_settings not set in config')
             return
         logger.info('Setting API Gateway Stage methodSettings')
-        api_id = self.get_api_id()
+        if api_id is None:
+            api_id = self.get_api_id()
         stage_name = self.config.stage_name
         logger.debug('Connecting to AWS apigateway API')
-        conn = client('apigateway')
+        conn = self._client('apigateway')
         logger.debug('Getting Stage configuration: api_id=%s stage_name=%s',
                      api_id, stage_name)
         stage = conn.get_stage(restApiId=api_id, stageName=stage_name)
         logger.debug("Got stage config: \n%s", pformat(stage))
-        # hack for stages that have had no method settings applied yet
-        if '*/*' not in stage['methodSettings']:
-            stage['methodSettings']['*/*'] = {}
-        curr_settings = stage['methodSettings']['*/*']
-        for k, v in sorted(settings.items()):
-            if k in curr_settings and curr_settings[k] == v:
-                logger.debug('methodSetting "%s" is correct (%s)', k, v)
+        changes = []
+        for setting_key in sorted(wanted.keys()):
+            # stages and methods that have had no method settings applied yet
+            # have no entry at all
+            curr_settings = stage['methodSettings'].get(setting_key, {})
+            for k, v in sorted(wanted[setting_key].items()):
+                if v is None:
+                    # null means "don't set this option"
+                    continue
+                if k in curr_settings and curr_settings[k] == v:
+                    logger.debug('methodSetting "%s" for %s is correct (%s)',
+                                 k, setting_key, v)
+                    continue
+                if k not in curr_settings:
+                    logger.debug('Adding new methodSetting "%s" for %s value '
+                                 '%s', k, setting_key, v)
+                else:
+                    logger.debug('Updating methodSetting "%s" for %s from %s '
+                                 'to %s', k, setting_key, curr_settings[k], v)
+                changes.append((setting_key, k, v))
+        if len(changes) == 0:
+            logger.info('All methodSettings are correct')
+            return
+        if (not stage.get('cacheClusterEnabled', False) and
+                any(k == 'cachingEnabled' and v for _, k, v in changes)):
+            logger.warning('methodSettings enable caching, but stage %s has '
+                           'no cache cluster enabled', stage_name)
+        self._update_method_settings(conn, api_id, stage_name, changes)
+
+    def _method_settings(self):
+        """
+        Return the method settings wanted on the stage, as a dict of
+        methodSettings key (``*/*`` for the stage-wide settings, or the
+        escaped resource path and HTTP method, i.e. ``~1foo/POST``, for an
+        endpoint) to a dict of setting name to value.
+
+        :return: wanted method settings
+        :rtype: dict
+        """
+        res = {}
+        settings = self.config.get('api_gateway_method_settings')
+        if settings is not None:
+            res['*/*'] = settings
+        endpoints = self.config.get('endpoints')
+        for ep, ep_conf in sorted(endpoints.items()):
+            if 'method_settings' not in ep_conf:
                 continue
-            # else update the value; note that the API doesn't actually follow
-            # https://tools.ietf.org/html/rfc6902#section-4 and doesn't seem
-            # to actually accept 'add' for these.
-            op = 'replace'
-            if k not in curr_settings:
-                logger.debug('Adding new methodSetting "%s" value %s', k, v)
-            else:
-                logger.debug('Updating methodSetting "%s" from %s to %s',
-                             k, curr_settings[k], v)
-            self._add_method_setting(conn, api_id, stage_name,
-                                     self._method_setting_paths[k] % '*/*',
-                                     k, v, op)
-
-    def _add_method_setting(self, conn, api_id, stage_name, path, key, value,
-                            op):
-        """
-        Update a single method setting on the specified stage. This uses the
-        'add' operation to PATCH the resource.
+            res['~1%s/%s' % (ep, ep_conf['method'].upper())] = ep_conf[
+                'method_settings']
+        return res
+
+    def _update_method_settings(self, conn, api_id, stage_name, changes):
+        """
+        Update method settings on the specified stage, using one PATCH
+        (``update_stage``) call with an operation for each setting, and check
+        the stage returned by it for the new values.
+
+        Note that the API doesn't actually follow
+        https://tools.ietf.org/html/rfc6902#section-4 and doesn't seem to
+        accept 'add' for these; every operation is a 'replace'.
 
         :param conn: APIGateway API connection
         :type conn: :py:class:`botocore:APIGateway.Client`
@@ -352,32 +575,32 @@ jantman/webhook2lambda2sqs/issues/7> and <https://github.com/hashicorp\
         :type api_id: str
         :param stage_name: stage name
         :type stage_name: str
-        :param path: path to patch (see https://docs.aws.amazon.com/apigateway/\
-api-reference/resource/stage/#methodSettings)
-        :type path: str
-        :param key: the dictionary key this should update
-        :type key: str
-        :param value: new value to set
-        :param op: PATCH operation to perform, 'add' or 'replace'
-        :type op: str
-        """
-        logger.debug('update_stage PATCH %s on %s; value=%s',
-                     op, path, str(value))
+        :param changes: list of (methodSettings key, setting name, new value)
+          3-tuples to set
+        :type changes: :std:term:`list`
+        """
+        ops = []
+        for setting_key, key, value in changes:
+            ops.append({
+                'op': 'replace',
+                'path': self._method_setting_paths[key] % setting_key,
+                'value': str(value)
+            })
+        logger.debug('update_stage PATCH with %d operations: %s',
+                     len(ops), ops)
         res = conn.update_stage(
             restApiId=api_id,
             stageName=stage_name,
-            patchOperations=[
-                {
-                    'op': op,
-                    'path': path,
-                    'value': str(value)
-                }
-            ]
+            patchOperations=ops
         )
-        if res['methodSettings']['*/*'][key] != value:
-            logger.error('methodSettings PATCH expected to update %s to %s,'
-                         'but instead found value as %s', key, value,
-                         res['methodSettings']['*/*'][key])
-        else:
-            logger.info('Successfully updated methodSetting %s to %s',
-                        key, value)
+        failed = 0
+        for setting_key, key, value in changes:
+            actual = res['methodSettings'].get(setting_key, {}).get(key)
+            if actual != value:
+                failed += 1
+                logger.error('methodSettings PATCH expected to update %s for '
+                             '%s to %s, but instead found value as %s', key,
+                             setting_key, value, actual)
+        if failed == 0:
+            logger.info('Successfully updated %d methodSettings',
+                        len(changes))
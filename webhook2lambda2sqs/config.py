@@ -37,6 +37,7 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import logging
 import os
+from copy import deepcopy
 from textwrap import dedent
 
 from webhook2lambda2sqs.utils import pretty_json, read_json_file
@@ -58,14 +59,37 @@ class Config(object):
 
     _allowed_methods = ['POST', 'GET']
 
+    _allowed_integrations = ['lambda', 'direct']
+
+    _allowed_api_types = ['rest', 'http']
+
+    _allowed_api_layouts = ['endpoints', 'proxy']
+
+    _allowed_api_definitions = ['resources', 'openapi']
+
+    _required_endpoint_keys = ['method', 'queues']
+
+    _optional_endpoint_keys = [
+        'integration', 'sns_fanout', 'sns_filter_policies', 'async',
+        'method_settings'
+    ]
+
     _example = {
         'api_gateway_method_settings': {
             'metricsEnabled': False,
             'loggingLevel': 'OFF',
             'dataTraceEnabled': False,
             'throttlingBurstLimit': None,
-            'throttlingRateLimit': None
+            'throttlingRateLimit': None,
+            'cachingEnabled': False,
+            'cacheTtlInSeconds': None
         },
+        'api_definition': 'resources',
+        'api_layout': 'endpoints',
+        'api_type': 'rest',
+        'aws_account_id': None,
+        'aws_region': None,
+        'custom_domain': None,
         'deployment_stage_name': 'something',
         'endpoints': {
             'some_resource_path': {
@@ -77,14 +101,27 @@ class Config(object):
                 'queues': ['queueName2', 'queueName3']
             }
         },
+        'json_sort_keys': True,
+        'lambda_botocore_services': None,
+        'lambda_layer': False,
+        'lambda_precompile': False,
+        'lambda_runtime': 'python2.7',
+        'lambda_vendor_dir': None,
         'logging_level': 'INFO',
         'name_suffix': 'something',
+        'queue_region': None,
+        'regions': None,
+        'sns_fanout_queue_policies': False,
         'terraform_remote_state': {
             'backend': 'backend_name',
             'config': {
                 'option_name': 'option_value'
             }
-        }
+        },
+        'terraform_module': False,
+        'terraform_plugin_cache_dir': None,
+        'terraform_timeout': None,
+        'terraform_transcript': None
     }
 
     _example_docs = """
@@ -115,6 +152,59 @@ class Config(object):
         rate limit (requests per second). See:
         %s
         Omit to not set this option.
+      - 'cachingEnabled' - (boolean, default False) whether responses are
+        cached. This only has an effect if a cache cluster is enabled on the
+        stage, which is not managed by this program.
+      - 'cacheTtlInSeconds' - (integer, default None) time to live of cached
+        responses. Omit to not set this option.
+
+      Settings for individual endpoints can be overridden with the endpoint's
+      'method_settings'. All of the settings for a stage are applied with a
+      single API call.
+
+    api_definition - (optional) how the ReST API is defined in the generated
+      Terraform; either "resources" (the default) to generate separate
+      API Gateway resource, method, integration, response and model
+      resources, or "openapi" to render the whole API (paths, methods,
+      integrations with their mapping templates, and response models) into a
+      single OpenAPI document set as the "body" of the API Gateway ReST API.
+      With "openapi", Terraform only manages a handful of resources no matter
+      how many endpoints there are, which makes plan and apply much faster
+      for large configurations. Not supported with an "http" api_type.
+
+    api_layout - (optional) how endpoints are laid out in the API; either
+      "endpoints" (the default) to create API Gateway resources, methods and
+      integrations (or HTTP API routes) for each endpoint, or "proxy" to
+      create a single greedy "{proxy+}" resource (or route) for all methods,
+      with the function looking up the endpoint and checking the method
+      itself. With "proxy", the number of Terraform resources doesn't grow
+      with the number of endpoints, which keeps plan and apply fast and
+      avoids API Gateway resource limits with many endpoints; requests for
+      unknown endpoints or with the wrong method get an error response from
+      the function instead of from API Gateway. Not supported with "direct"
+      integration or async endpoints.
+
+    api_type - (optional) type of API Gateway API to create; either "rest"
+      (the default) for a ReST API, or "http" for an HTTP API (API Gateway v2)
+      using a Lambda proxy integration with payload format version 2.0. HTTP
+      APIs are cheaper and have lower latency, but require Terraform >= 0.12
+      and do not support the "direct" endpoint integration. When using an HTTP
+      API, only the 'metricsEnabled', 'throttlingBurstLimit' and
+      'throttlingRateLimit' api_gateway_method_settings are used, and they are
+      set on the stage by Terraform.
+
+    aws_account_id - (optional) ID of the AWS account to deploy to. If set
+      (or given with the --account-id command line option), generating
+      doesn't query AWS for the account ID. Otherwise it's found with the STS
+      GetCallerIdentity operation and cached (per AWS profile and the access
+      key of the credentials in use, wherever they come from) in
+      ~/.webhook2lambda2sqs/aws_cache.json for a day.
+
+    aws_region - (optional) AWS region to deploy to; also set as the
+      Terraform AWS provider region. If set (or given with the --region
+      command line option), the region isn't taken from the environment or
+      AWS configuration. Together with aws_account_id, this lets generate run
+      without any AWS API calls or credentials. Not used with 'regions'.
 
     deployment_stage_name - (optional) String used as the name for the API
       Gateway Deployment Stage, which will be the beginning component of the
@@ -122,11 +212,79 @@ class Config(object):
       (i.e. https://<api id>.execute-api.us-east-1.amazonaws.com/STAGE_NAME/).
       Defaults to "webhook2lambda2sqs".
 
+    custom_domain - (optional) dict describing a custom domain name to serve
+      the (ReST) API at, with a Route 53 latency-based alias record for each
+      region pointing at that region's regional API Gateway domain name, so
+      that senders reach the closest region. Keys:
+      - 'domain_name' - the custom domain name, i.e. "hooks.example.com"
+      - 'route53_zone_id' - ID of the Route 53 hosted zone for domain_name
+      - 'certificate_arns' - dict of AWS region name to the ARN of an ACM
+        certificate for domain_name in that region; must have an entry for
+        every region deployed to.
+
     endpoints - dict describing each webhook endpoint to setup in API Gateway.
       - key is the API Gateway resource name (final component of the URL)
       - value is a dict with the following keys:
         - 'method' - HTTP method for API Gateway resource
         - 'queues' - list of SQS queue names to push request content to
+        - 'integration' - (optional) how API Gateway enqueues the request;
+          either "lambda" (the default) to invoke the Lambda function, or
+          "direct" to send the message straight to SQS via an API Gateway
+          AWS service integration, with no Lambda invocation. "direct"
+          endpoints must have exactly one queue.
+        - 'sns_fanout' - (optional, boolean, default False) if true, create an
+          SNS topic for this endpoint with each of its queues subscribed (with
+          raw message delivery); the function publishes each message once to
+          the topic instead of sending it to each queue. The queues' policies
+          must allow the topic to send to them; see
+          sns_fanout_queue_policies.
+        - 'sns_filter_policies' - (optional) only valid with 'sns_fanout';
+          dict of queue name to SNS subscription filter policy (applied to
+          the message body) for that queue's subscription.
+        - 'async' - (optional, boolean, default False) if true, API Gateway
+          invokes the function asynchronously and responds with HTTP 202
+          immediately, without waiting for the messages to be enqueued. Events
+          that still fail after Lambda's retries are sent to an SQS queue
+          named "<function name>-failures", which is created for this purpose.
+          Not supported with "direct" integration or an "http" api_type.
+        - 'method_settings' - (optional) dict of API Gateway Method settings
+          for this endpoint only, overriding api_gateway_method_settings
+          (i.e. a higher throttlingBurstLimit for a busy endpoint); the same
+          keys are supported. Not supported with a "proxy" api_layout. For an
+          "http" api_type, these are set as route settings by Terraform.
+
+    json_sort_keys - (optional, boolean, default True) whether or not the
+      function sorts keys when serializing queue messages to JSON. Set to false
+      if consumers don't need stable, byte-identical message bodies, to save
+      some time serializing large payloads.
+
+    lambda_botocore_services - (optional) list of AWS service names (i.e.
+      ["sqs", "sns"]). If set, boto3 and botocore data files (service models)
+      for any other services are left out of the vendored packages, which
+      shrinks the package considerably when boto3 is vendored.
+
+    lambda_layer - (optional, boolean, default False) if true, put the contents
+      of lambda_vendor_dir in a separate Lambda layer
+      (webhook2lambda2sqs_layer.zip) instead of the function zip file, so that
+      function-only changes upload a much smaller package.
+
+    lambda_precompile - (optional, boolean, default False) if true, include
+      bytecode (.pyc) for the function and vendored packages in the
+      deployment packages, so Lambda doesn't compile them on every cold
+      start. webhook2lambda2sqs must be run under the same Python version as
+      lambda_runtime (3.7 or later).
+
+    lambda_runtime - (optional) the Lambda runtime identifier for the
+      function. Defaults to "python2.7".
+
+    lambda_vendor_dir - (optional) path to a directory whose contents will be
+      added to the top level of the Lambda function zip file, i.e. packages
+      installed with
+      'pip install --target DIR --platform manylinux2014_x86_64
+      --only-binary=:all: --python-version 3.X orjson' (matching
+      lambda_runtime). If the orjson package is present in the function
+      package, it will be used instead of the much slower stdlib json module.
+      Note that orjson output is more compact than the json module's.
 
     logging_level - the Python logging level (constant name) to set for the
       lambda function. Defaults to INFO. Currently the function only logs at
@@ -135,6 +293,45 @@ class Config(object):
     name_suffix - (optional) by default, all AWS resources will be named
       "webhook2lambda2sqs"; specify a suffix to add to that name here.
 
+    queue_region - (optional) AWS region that the SQS queues are in. By
+      default, each region's function and "direct" integrations send to the
+      queues of the same names in their own region; set this to send from
+      every region to the queues in one region instead. Not supported with
+      'sns_fanout' endpoints when deploying to more than one region.
+
+    regions - (optional) list of AWS region names to deploy to, active-active.
+      A separate stack is generated for each region in a subdirectory of the
+      working directory named for the region (i.e. ./us-east-1/), and
+      generate, plan, apply, genapply and destroy run for all regions in
+      parallel. IAM role names get a "-<region>" suffix. If
+      terraform_remote_state is used, its config must have a 'key' or 'path',
+      which is prefixed with "<region>/" for each region. If omitted, the
+      region is taken from the environment / AWS configuration as usual.
+
+    sns_fanout_queue_policies - (optional, boolean, default False) if true,
+      manage the SQS queue policy of every queue subscribed to an
+      'sns_fanout' topic, allowing the topics to send to it. WARNING: this
+      REPLACES any existing policy on those queues, and destroy DELETES their
+      policies, even though the queues themselves aren't managed by this
+      program. If false, you must add a statement allowing the
+      "sns.amazonaws.com" service principal sqs:SendMessage with an
+      "aws:SourceArn" of the topic ARN to each queue's policy yourself.
+
+    terraform_module - (optional) boolean, default false. If true, generate
+      the per-endpoint API Gateway resources with a reusable Terraform module
+      (written to webhook2lambda2sqs_endpoints/main.tf) using for_each over a
+      map of endpoints, instead of spelling out every endpoint's resources in
+      webhook2lambda2sqs.tf.json. Adding an endpoint then only adds one map
+      entry, and Terraform builds its graph much faster for configurations
+      with many endpoints. Requires Terraform >= 0.13; not supported with an
+      "http" api_type, "openapi" api_definition or "proxy" api_layout.
+
+    terraform_plugin_cache_dir - (optional) directory to use as a shared
+      Terraform provider plugin cache (TF_PLUGIN_CACHE_DIR) for Terraform
+      0.10+. Defaults to the TF_PLUGIN_CACHE_DIR environment variable if set,
+      else ~/.terraform.d/plugin-cache; set to false to disable. 'terraform
+      init' is only re-run when the backend configuration or providers change.
+
     terraform_remote_state - (optional) dict of Terraform remote state options.
       If specified, will call 'terraform remote config' before every terraform
       command to setup remote state storage. See:
@@ -143,6 +340,13 @@ class Config(object):
       Dict keys:
       - 'backend' - name of the terraform remote state backend to configure
       - 'config' - dict of backend configuration option name/value pairs
+
+    terraform_timeout - (optional) if set, the number of seconds after which
+      any single terraform command is terminated and considered failed.
+
+    terraform_transcript - (optional) if set, path to a file that the complete
+      output of every terraform command will be appended to. Only the last
+      16MiB of output from each command is kept in memory.
     """ % (
         '<https://docs.aws.amazon.com/apigateway/api-reference/resource/'
         'stage/#methodSettings>',
@@ -163,6 +367,25 @@ class Config(object):
         self._config = self._load_config(path)
         self._validate_config()
 
+    @classmethod
+    def from_dict(cls, conf):
+        """
+        Return a Config for a configuration dict (i.e. the parsed content of
+        a configuration file) without reading anything from disk. The dict
+        is copied, so later changes to it don't affect the Config.
+
+        :param conf: configuration
+        :type conf: dict
+        :return: validated configuration
+        :rtype: :py:class:`~.Config`
+        :raises: :py:exc:`~.InvalidConfigError`
+        """
+        config = cls.__new__(cls)
+        config.path = None
+        config._config = deepcopy(conf)
+        config._validate_config()
+        return config
+
     def _validate_config(self):
         """
         Validate configuration file.
@@ -182,62 +405,143 @@ class Config(object):
             raise InvalidConfigError('configuration must have '
                                      'at least one endpoint')
         for ep in self._config['endpoints']:
-            if sorted(
-                    self._config['endpoints'][ep].keys()
-            ) != ['method', 'queues']:
-                raise InvalidConfigError('Endpoint %s configuration keys must '
-                                         'be "method" and "queues".' % ep)
-            meth = self._config['endpoints'][ep]['method']
-            if meth not in self._allowed_methods:
-                raise InvalidConfigError('Endpoint %s method %s not allowed '
-                                         '(allowed methods: %s'
-                                         ')' % (ep, meth,
-                                                self._allowed_methods))
+            self._validate_endpoint(ep, self._config['endpoints'][ep])
+        api_type = self._config.get('api_type', 'rest')
+        if api_type not in self._allowed_api_types:
+            raise InvalidConfigError('api_type must be one of %s' %
+                                     self._allowed_api_types)
+        if api_type == 'http':
+            for ep in self._config['endpoints']:
+                if self._config['endpoints'][ep].get(
+                        'integration', 'lambda') == 'direct':
+                    raise InvalidConfigError('Endpoint %s "direct" integration '
+                                             'is not supported with an "http" '
+                                             'api_type' % ep)
+                if self._config['endpoints'][ep].get('async', False):
+                    raise InvalidConfigError('Endpoint %s async is not '
+                                             'supported with an "http" '
+                                             'api_type' % ep)
+        api_layout = self._config.get('api_layout', 'endpoints')
+        if api_layout not in self._allowed_api_layouts:
+            raise InvalidConfigError('api_layout must be one of %s' %
+                                     self._allowed_api_layouts)
+        if api_layout == 'proxy':
+            for ep in self._config['endpoints']:
+                if self._config['endpoints'][ep].get(
+                        'integration', 'lambda') == 'direct':
+                    raise InvalidConfigError('Endpoint %s "direct" integration '
+                                             'is not supported with a "proxy" '
+                                             'api_layout' % ep)
+                if self._config['endpoints'][ep].get('async', False):
+                    raise InvalidConfigError('Endpoint %s async is not '
+                                             'supported with a "proxy" '
+                                             'api_layout' % ep)
+                if 'method_settings' in self._config['endpoints'][ep]:
+                    raise InvalidConfigError('Endpoint %s method_settings are '
+                                             'not supported with a "proxy" '
+                                             'api_layout' % ep)
+        api_definition = self._config.get('api_definition', 'resources')
+        if api_definition not in self._allowed_api_definitions:
+            raise InvalidConfigError('api_definition must be one of %s' %
+                                     self._allowed_api_definitions)
+        if api_definition == 'openapi' and api_type == 'http':
+            raise InvalidConfigError('api_definition "openapi" is not '
+                                     'supported with an "http" api_type')
+        if self._config.get('json_sort_keys', True) not in [True, False]:
+            raise InvalidConfigError('json_sort_keys must be omitted or a '
+                                     'boolean')
+        for k in ['lambda_layer', 'lambda_precompile', 'terraform_module',
+                  'sns_fanout_queue_policies']:
+            if self._config.get(k, False) not in [True, False]:
+                raise InvalidConfigError('%s must be omitted or a boolean' % k)
+        if self._config.get('terraform_module', False) and (
+                api_type != 'rest' or api_definition != 'resources' or
+                api_layout != 'endpoints'):
+            raise InvalidConfigError('terraform_module is only supported with '
+                                     'a "rest" api_type, "resources" '
+                                     'api_definition and "endpoints" '
+                                     'api_layout')
+        if (self._config.get('lambda_layer', False) and
+                self._config.get('lambda_vendor_dir') is None):
+            raise InvalidConfigError('lambda_layer requires lambda_vendor_dir')
+        svcs = self._config.get('lambda_botocore_services')
+        if svcs is not None and not isinstance(svcs, type([])):
+            raise InvalidConfigError('lambda_botocore_services must be omitted '
+                                     'or a list')
+        pcd = self._config.get('terraform_plugin_cache_dir')
+        if pcd is True or (pcd not in [None, False] and
+                           not isinstance(pcd, (type(''), type(u'')))):
+            raise InvalidConfigError('terraform_plugin_cache_dir must be '
+                                     'omitted, a string or false')
+        tf_timeout = self._config.get('terraform_timeout')
+        if tf_timeout is not None and (
+                isinstance(tf_timeout, bool) or
+                not isinstance(tf_timeout, (int, float)) or tf_timeout <= 0):
+            raise InvalidConfigError('terraform_timeout must be omitted or a '
+                                     'positive number of seconds')
         levels = ['CRITICAL', 'ERROR', 'WARNING', 'INFO', 'DEBUG', 'NOTSET']
         if ('logging_level' in self._config and
                 self._config['logging_level'] not in levels):
             raise InvalidConfigError('logging_level must be one of %s' % levels)
+        self._validate_regions(api_type)
+        acct = self._config.get('aws_account_id')
+        if acct is not None and (
+                not isinstance(acct, (type(''), type(u''))) or
+                len(acct) != 12 or not acct.isdigit()):
+            raise InvalidConfigError('aws_account_id must be omitted or a '
+                                     '12-digit string')
+        aws_region = self._config.get('aws_region')
+        if aws_region is not None and not isinstance(
+                aws_region, (type(''), type(u''))):
+            raise InvalidConfigError('aws_region must be omitted or a region '
+                                     'name')
+        if aws_region is not None and self._config.get('regions') is not None:
+            raise InvalidConfigError('aws_region cannot be used with regions')
+        if 'api_gateway_method_settings' in self._config:
+            self._validate_method_settings(
+                self._config['api_gateway_method_settings'],
+                'api_gateway_method_settings'
+            )
+
+    def _validate_method_settings(self, ms, desc):
         """
-        'api_gateway_method_settings': {
-            'throttlingBurstLimit': None,
-            'throttlingRateLimit': None
-        },
+        Validate a dict of API Gateway Method settings; either the
+        ``api_gateway_method_settings`` or an endpoint's ``method_settings``.
+
+        :param ms: method settings
+        :type ms: dict
+        :param desc: description of the settings for error messages
+        :type desc: str
+        :raises: InvalidConfigError
         """
-        if 'api_gateway_method_settings' not in self._config:
-            return
-        ms = self._config['api_gateway_method_settings']
+        if not isinstance(ms, type({})):
+            raise InvalidConfigError('%s must be a dict' % desc)
         bad_keys = []
         for k in ms.keys():
             if k not in self._example['api_gateway_method_settings'].keys():
                 bad_keys.append(k)
         if len(bad_keys) > 0:
             raise InvalidConfigError(
-                'Invalid keys in "api_gateway_method_settings": %s' % bad_keys)
-        if 'metricsEnabled' in ms and ms['metricsEnabled'] not in [True, False]:
-            raise InvalidConfigError(
-                'api_gateway_method_settings metricsEnabled key must be omitted'
-                ' or a boolean')
+                'Invalid keys in "%s": %s' % (desc, bad_keys))
+        for k in ['metricsEnabled', 'dataTraceEnabled', 'cachingEnabled']:
+            if k in ms and ms[k] not in [True, False]:
+                raise InvalidConfigError(
+                    '%s %s key must be omitted or a boolean' % (desc, k))
         if ('loggingLevel' in ms and
                 ms['loggingLevel'] not in ['OFF', 'INFO', 'ERROR']):
             raise InvalidConfigError(
-                'api_gateway_method_settings loggingLevel must be omitted or '
-                'one of "OFF", "INFO" or "ERROR"'
+                '%s loggingLevel must be omitted or one of "OFF", "INFO" or '
+                '"ERROR"' % desc
             )
-        if ('metricsEnabled' in ms and
-                ms['dataTraceEnabled'] not in [True, False]):
-            raise InvalidConfigError(
-                'api_gateway_method_settings dataTraceEnabled key must be '
-                'omitted or a boolean')
-        if ('throttlingBurstLimit' in ms and
-                ms['throttlingBurstLimit'] is not None):
-            try:
-                assert ms['throttlingBurstLimit'] == int(
-                    ms['throttlingBurstLimit'])
-            except (AssertionError, ValueError, TypeError):
-                raise InvalidConfigError(
-                    'api_gateway_method_settings throttlingBurstLimit key must '
-                    'be omitted, null or an integer'
-                )
+        for k in ['throttlingBurstLimit', 'cacheTtlInSeconds']:
+            if k in ms and ms[k] is not None:
+                try:
+                    assert ms[k] == int(ms[k])
+                except (AssertionError, ValueError, TypeError):
+                    raise InvalidConfigError(
+                        '%s %s key must be omitted, null or an integer' % (
+                            desc, k)
+                    )
         if ('throttlingRateLimit' in ms and
                 ms['throttlingRateLimit'] is not None):
             try:
@@ -245,10 +549,131 @@ class Config(object):
                     ms['throttlingRateLimit'])
             except (AssertionError, ValueError, TypeError):
                 raise InvalidConfigError(
-                    'api_gateway_method_settings throttlingRateLimit key must '
-                    'be omitted, null or a Number (float/double)'
+                    '%s throttlingRateLimit key must be omitted, null or a '
+                    'Number (float/double)' % desc
                 )
 
+    def _validate_regions(self, api_type):
+        """
+        Validate the ``regions``, ``queue_region`` and ``custom_domain``
+        configuration.
+
+        :param api_type: the configured api_type
+        :type api_type: str
+        :raises: InvalidConfigError
+        """
+        str_types = (type(''), type(u''))
+        regions = self._config.get('regions')
+        if regions is not None:
+            if (not isinstance(regions, type([])) or len(regions) < 1 or
+                    not all(isinstance(r, str_types) for r in regions) or
+                    len(set(regions)) != len(regions)):
+                raise InvalidConfigError('regions must be omitted or a list '
+                                         'of unique region names')
+            rmt = self._config.get('terraform_remote_state')
+            if rmt is not None and 'key' not in rmt.get(
+                    'config', {}) and 'path' not in rmt.get('config', {}):
+                raise InvalidConfigError('terraform_remote_state config must '
+                                         'have a "key" or "path" to deploy '
+                                         'to multiple regions')
+        qr = self._config.get('queue_region')
+        if qr is not None:
+            if not isinstance(qr, str_types):
+                raise InvalidConfigError('queue_region must be omitted or a '
+                                         'region name')
+            if regions is not None and len(regions) > 1:
+                for ep in self._config['endpoints']:
+                    if self._config['endpoints'][ep].get('sns_fanout', False):
+                        raise InvalidConfigError(
+                            'Endpoint %s sns_fanout is not supported with '
+                            'queue_region and multiple regions' % ep)
+        cd = self._config.get('custom_domain')
+        if cd is None:
+            return
+        if api_type != 'rest':
+            raise InvalidConfigError('custom_domain is only supported with a '
+                                     '"rest" api_type')
+        if (not isinstance(cd, type({})) or
+                sorted(cd.keys()) != ['certificate_arns', 'domain_name',
+                                      'route53_zone_id'] or
+                not isinstance(cd['certificate_arns'], type({}))):
+            raise InvalidConfigError('custom_domain must be a dict with '
+                                     'domain_name, route53_zone_id and '
+                                     'certificate_arns keys')
+        for r in (regions or []):
+            if r not in cd['certificate_arns']:
+                raise InvalidConfigError('custom_domain certificate_arns has '
+                                         'no certificate for region %s' % r)
+
+    def _validate_endpoint(self, ep, ep_conf):
+        """
+        Validate the configuration of a single endpoint.
+
+        :param ep: endpoint name
+        :type ep: str
+        :param ep_conf: endpoint configuration
+        :type ep_conf: dict
+        :raises: InvalidConfigError
+        """
+        for k in self._required_endpoint_keys:
+            if k not in ep_conf:
+                raise InvalidConfigError('Endpoint %s configuration must '
+                                         'include "method" and "queues" '
+                                         'keys.' % ep)
+        bad_keys = []
+        for k in ep_conf.keys():
+            if (k not in self._required_endpoint_keys and
+                    k not in self._optional_endpoint_keys):
+                bad_keys.append(k)
+        if len(bad_keys) > 0:
+            raise InvalidConfigError('Endpoint %s has invalid configuration '
+                                     'keys: %s' % (ep, sorted(bad_keys)))
+        meth = ep_conf['method']
+        if meth not in self._allowed_methods:
+            raise InvalidConfigError('Endpoint %s method %s not allowed '
+                                     '(allowed methods: %s'
+                                     ')' % (ep, meth,
+                                            self._allowed_methods))
+        integration = ep_conf.get('integration', 'lambda')
+        if integration not in self._allowed_integrations:
+            raise InvalidConfigError('Endpoint %s integration %s not allowed '
+                                     '(allowed integrations: %s'
+                                     ')' % (ep, integration,
+                                            self._allowed_integrations))
+        if integration == 'direct' and len(ep_conf['queues']) != 1:
+            raise InvalidConfigError('Endpoint %s uses "direct" integration '
+                                     'and must have exactly one queue' % ep)
+        is_async = ep_conf.get('async', False)
+        if is_async not in [True, False]:
+            raise InvalidConfigError('Endpoint %s async must be omitted or a '
+                                     'boolean' % ep)
+        if is_async and integration == 'direct':
+            raise InvalidConfigError('Endpoint %s cannot use async with '
+                                     '"direct" integration' % ep)
+        fanout = ep_conf.get('sns_fanout', False)
+        if fanout not in [True, False]:
+            raise InvalidConfigError('Endpoint %s sns_fanout must be omitted '
+                                     'or a boolean' % ep)
+        if fanout and integration == 'direct':
+            raise InvalidConfigError('Endpoint %s cannot use sns_fanout with '
+                                     '"direct" integration' % ep)
+        if 'method_settings' in ep_conf:
+            self._validate_method_settings(ep_conf['method_settings'],
+                                           'Endpoint %s method_settings' % ep)
+        if 'sns_filter_policies' not in ep_conf:
+            return
+        if not fanout:
+            raise InvalidConfigError('Endpoint %s sns_filter_policies requires '
+                                     'sns_fanout' % ep)
+        bad_queues = []
+        for qname in ep_conf['sns_filter_policies']:
+            if qname not in ep_conf['queues']:
+                bad_queues.append(qname)
+        if len(bad_queues) > 0:
+            raise InvalidConfigError('Endpoint %s sns_filter_policies has '
+                                     'policies for queues not in its "queues" '
+                                     'list: %s' % (ep, sorted(bad_queues)))
+
     def get(self, key):
         """
         Get the value of the specified configuration key. Return None if the
@@ -287,6 +712,93 @@ class Config(object):
             name += self.get('name_suffix')
         return name
 
+    @property
+    def endpoint_method_settings(self):
+        """
+        Return a dict of endpoint name to its ``method_settings``, for the
+        endpoints that have them.
+
+        :return: endpoint method settings
+        :rtype: dict
+        """
+        res = {}
+        for ep, ep_conf in self._config['endpoints'].items():
+            if 'method_settings' in ep_conf:
+                res[ep] = ep_conf['method_settings']
+        return res
+
+    @property
+    def queue_region(self):
+        """
+        Return the region the SQS queues are in, or None for the region of
+        each stack.
+
+        :return: region name or None
+        :rtype: str
+        """
+        return self.get('queue_region')
+
+    def region_remote_state(self, region):
+        """
+        Return the ``terraform_remote_state`` configuration for the stack in
+        the given region; the same as the configured value, but with
+        the 'key' or 'path' backend configuration option prefixed with
+        ``<region>/`` so each region has its own state.
+
+        :param region: region name
+        :type region: str
+        :return: terraform_remote_state configuration, or None if not set
+        :rtype: dict
+        """
+        rmt = self.get('terraform_remote_state')
+        if rmt is None:
+            return None
+        conf = dict(rmt['config'])
+        for k in ['key', 'path']:
+            if k in conf:
+                conf[k] = '%s/%s' % (region, conf[k])
+                break
+        return {'backend': rmt['backend'], 'config': conf}
+
+    @property
+    def api_definition(self):
+        """
+        Return how the ReST API is defined, "resources" or "openapi".
+
+        :return: API definition mode
+        :rtype: str
+        """
+        api_definition = self.get('api_definition')
+        if api_definition is None:
+            api_definition = 'resources'
+        return api_definition
+
+    @property
+    def api_layout(self):
+        """
+        Return the API layout, "endpoints" or "proxy".
+
+        :return: API layout
+        :rtype: str
+        """
+        api_layout = self.get('api_layout')
+        if api_layout is None:
+            api_layout = 'endpoints'
+        return api_layout
+
+    @property
+    def api_type(self):
+        """
+        Return the type of API Gateway API to create, "rest" or "http".
+
+        :return: API type
+        :rtype: str
+        """
+        api_type = self.get('api_type')
+        if api_type is None:
+            api_type = 'rest'
+        return api_type
+
     @property
     def stage_name(self):
         """
@@ -314,6 +826,32 @@ class Config(object):
             level = 'INFO'
         return level
 
+    @property
+    def json_sort_keys(self):
+        """
+        Return whether or not the lambda function should sort keys when
+        serializing queue messages.
+
+        :rtype: bool
+        """
+        sort_keys = self.get('json_sort_keys')
+        if sort_keys is None:
+            sort_keys = True
+        return sort_keys
+
+    @property
+    def lambda_runtime(self):
+        """
+        Return the Lambda runtime to use for the function.
+
+        :return: Lambda runtime identifier
+        :rtype: str
+        """
+        runtime = self.get('lambda_runtime')
+        if runtime is None:
+            runtime = 'python2.7'
+        return runtime
+
     @staticmethod
     def example_config():
         """
@@ -36,9 +36,8 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 import logging
-from inspect import getsourcelines
+import pkgutil
 from pprint import pformat
-from webhook2lambda2sqs import lambda_func
 from webhook2lambda2sqs.version import VERSION, PROJECT_URL
 
 logger = logging.getLogger(__name__)
@@ -58,17 +57,21 @@ class LambdaFuncGenerator(object):
     def _get_source(self):
         """
         Get the lambda function source template. Strip the leading docstring.
-        Note that it's a real module in this project so we can test it.
+        Note that it's a real module in this project so we can test it; its
+        source is read as package data rather than imported, so that we don't
+        import boto3 just to generate it.
 
         :return: function source code, with leading docstring stripped.
         :rtype: str
         """
         logger.debug('Getting module source for webhook2lambda2sqs.lambda_func')
-        orig = getsourcelines(lambda_func)
+        orig = pkgutil.get_data(
+            'webhook2lambda2sqs', 'lambda_func.py'
+        ).decode('utf-8')
         src = ''
         in_docstr = False
         have_docstr = False
-        for line in orig[0]:
+        for line in orig.splitlines(True):
             if line.strip() == '"""' and not in_docstr and not have_docstr:
                 in_docstr = True
                 continue
@@ -125,5 +128,12 @@ class LambdaFuncGenerator(object):
         ).replace(
             'logger.setLevel(logging.INFO)',
             'logger.setLevel(logging.%s)' % self.config.logging_level
+        ).replace(
+            'json_sort_keys = True',
+            'json_sort_keys = %s' % self.config.json_sort_keys
+        ).replace(
+            'queue_region = None',
+            'queue_region = %s' % repr(self.config.queue_region).replace(
+                "u'", "'")
         )
         return s
@@ -107,3 +107,80 @@ response_model_mapping = {
         """
     }
 }
+
+async_response_model_mapping = {
+    'error': response_model_mapping['error'],
+    'success': {
+        'application/json': """
+{
+  "status" : "accepted",
+  "message" : "request accepted for asynchronous processing",
+  "SQSMessageIds": [],
+  "request_id": "$context.requestId"
+}
+        """
+    }
+}
+
+# Request data mappings for the "direct" (API Gateway to SQS) integration;
+# these mirror what lambda_func.msg_body_for_event() puts in the "data" key.
+direct_data_mapping = {
+    'GET': """{
+#foreach($paramName in $input.params().querystring.keySet())
+    "$paramName" : "$util.escapeJavaScript($input.params().querystring.get($paramName))"
+    #if($foreach.hasNext),#end
+#end
+}""",
+    'POST': "$input.json('$')"
+}
+
+
+def _direct_request_template(data_mapping):
+    """
+    Return the "direct" integration request template for the given data
+    mapping; this renders the same envelope as
+    :py:func:`webhook2lambda2sqs.lambda_func.msg_body_for_event` (with an empty
+    "context", as there is no Lambda context) and URL-encodes it as the
+    SQS SendMessage MessageBody.
+    """
+    return "#define($msgBody)\n{\n" \
+           "\"context\" : {},\n" \
+           "\"data\" : " + data_mapping + ",\n" \
+           "\"event\" :\n" + request_model_mapping['application/json'] + \
+           "\n}\n#end\n" \
+           "Action=SendMessage&MessageBody=$util.urlEncode(\"$msgBody\")"
+
+
+direct_request_model_mapping = {
+    'GET': {
+        'application/json': _direct_request_template(direct_data_mapping['GET'])
+    },
+    'POST': {
+        'application/json': _direct_request_template(
+            direct_data_mapping['POST'])
+    }
+}
+
+direct_response_model_mapping = {
+    'error': {
+        'application/json': """
+#set($inputRoot = $input.path('$'))
+{
+  "status" : "error",
+  "message" : "$inputRoot.Error.Code: $inputRoot.Error.Message",
+  "request_id": "$context.requestId"
+}
+        """
+    },
+    'success': {
+        'application/json': """
+#set($inputRoot = $input.path('$'))
+{
+  "status" : "success",
+  "message" : "enqueued 1 messages",
+  "SQSMessageIds": ["$inputRoot.SendMessageResponse.SendMessageResult.MessageId"],
+  "request_id": "$context.requestId"
+}
+        """
+    }
+}
@@ -9,6 +9,15 @@ This file should not be modified directly.
 import logging
 import boto3
 import json
+import base64
+import time
+
+# use orjson, if it was vendored into the deployment package, as it's much
+# faster than the stdlib json module for large payloads
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -30,6 +39,17 @@ requests_log.propagate = True
 
 endpoints = {}
 
+# whether or not to sort keys in enqueued JSON messages
+json_sort_keys = True
+
+# region of the SQS queues, or None for the function's own region
+queue_region = None
+
+# for asynchronous endpoints, number of times to retry enqueueing in just the
+# queues that failed, before failing the invocation (which Lambda retries for
+# all queues)
+ASYNC_ENQUEUE_RETRIES = 2
+
 
 def webhook2lambda2sqs_handler(event, context):
     """
@@ -45,6 +65,8 @@ def webhook2lambda2sqs_handler(event, context):
     :rtype: str
     :raises: Exception
     """
+    if is_http_api_event(event):
+        return http_api_handler(event, context)
     # be sure we log full information about any error; if handle_event()
     # raises an exception, log a bunch of information at error level and then
     # re-raise the Exception
@@ -56,6 +78,11 @@ def webhook2lambda2sqs_handler(event, context):
                      event, vars(context), exc_info=1)
         raise ex
     logger.debug('handle_event() result: %s', res)
+    # nobody sees the response of an asynchronous invocation; fail if any
+    # enqueue failed, so Lambda retries the event and then sends it to the
+    # on-failure destination
+    if res.get('status', None) == 'partial' and endpoint_is_async(event):
+        raise Exception('Failed enqueueing some messages: %s' % res['message'])
     # if all enqueues failed, this should be an error
     if len(res['SQSMessageIds']) < 1:
         raise Exception('Failed enqueueing all messages')
@@ -63,9 +90,137 @@ def webhook2lambda2sqs_handler(event, context):
     return res
 
 
+def is_http_api_event(event):
+    """
+    Return whether or not the event is from an API Gateway HTTP API (v2) Lambda
+    proxy integration using payload format version 2.0.
+
+    :param event: Lambda event that triggered the handler
+    :type event: dict
+    :rtype: bool
+    """
+    return event.get('version', None) == '2.0' and 'routeKey' in event
+
+
+def http_api_handler(event, context):
+    """
+    Handler for HTTP API (payload format 2.0) events. Converts the event to
+    the same format as the ReST API request mapping template via
+    :py:func:`~.event_from_http_api`, handles it with :py:func:`~.handle_event`
+    and returns a proxy integration response with the same status codes and
+    JSON body as the ReST API integration responses.
+
+    :param event: Lambda event that triggered the handler
+    :type event: dict
+    :param context: Lambda function context - see
+      http://docs.aws.amazon.com/lambda/latest/dg/python-context-object.html
+    :return: Lambda proxy integration response
+    :rtype: dict
+    """
+    request_id = event.get('requestContext', {}).get('requestId', None)
+    rest_event = event_from_http_api(event)
+    try:
+        res = handle_event(rest_event, context)
+        if len(res['SQSMessageIds']) < 1:
+            raise Exception('Failed enqueueing all messages')
+    except Exception as ex:
+        logger.error('Error handling event; event=%s context=%s',
+                     event, vars(context), exc_info=1)
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({
+                'status': 'error',
+                'message': '%s: %s' % (ex.__class__.__name__, ex),
+                'request_id': request_id
+            })
+        }
+    logger.debug('handle_event() result: %s', res)
+    res['request_id'] = request_id
+    return {
+        'statusCode': 202,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps(res)
+    }
+
+
+def event_from_http_api(event):
+    """
+    Convert an HTTP API (payload format 2.0) event to the event format
+    generated by the ReST API request mapping template, so that the enqueued
+    message is the same regardless of API type.
+
+    :param event: HTTP API Lambda event
+    :type event: dict
+    :return: event in ReST API mapping template format
+    :rtype: dict
+    """
+    req_ctx = event.get('requestContext', {})
+    http = req_ctx.get('http', {})
+    body = event.get('body', None)
+    if body is not None and event.get('isBase64Encoded', False):
+        body = base64.b64decode(body).decode('utf-8')
+    try:
+        body_json = json.loads(body) if body else {}
+    except ValueError:
+        body_json = body
+    return {
+        'body-json': body_json,
+        'params': {
+            'header': event.get('headers', None) or {},
+            'path': event.get('pathParameters', None) or {},
+            'querystring': event.get('queryStringParameters', None) or {}
+        },
+        'stage-variables': event.get('stageVariables', None) or {},
+        'context': {
+            'account-id': req_ctx.get('accountId', ''),
+            'api-id': req_ctx.get('apiId', ''),
+            'http-method': http.get('method', ''),
+            'stage': req_ctx.get('stage', ''),
+            'source-ip': http.get('sourceIp', ''),
+            'user-agent': http.get('userAgent', ''),
+            'request-id': req_ctx.get('requestId', ''),
+            # routeKey is like "POST /endpoint_name"
+            'resource-path': event['routeKey'].split(' ', 1)[-1]
+        }
+    }
+
+
+def is_proxy_event(event):
+    """
+    Return whether or not the event was received on the greedy ``{proxy+}``
+    resource (or route) used by the "proxy" api_layout.
+
+    :param event: Lambda event that triggered the handler
+    :type event: dict
+    :rtype: bool
+    """
+    return event['context']['resource-path'] == '/{proxy+}'
+
+
+def endpoint_name(event):
+    """
+    Return the name of the endpoint that an event was received on. With the
+    "proxy" api_layout, requests for all endpoints are received on a single
+    ``{proxy+}`` resource, and the endpoint name is its ``proxy`` path
+    parameter.
+
+    :param event: Lambda event that triggered the handler
+    :type event: dict
+    :return: endpoint name
+    :rtype: str
+    """
+    if is_proxy_event(event):
+        return event.get('params', {}).get('path', {}).get(
+            'proxy', '').strip('/')
+    return event['context']['resource-path'].lstrip('/')
+
+
 def queues_for_endpoint(event):
     """
-    Return the list of queues to publish to for a given endpoint.
+    Return the list of queues to publish to for a given endpoint. For events
+    received on the ``{proxy+}`` resource, also check that the request used
+    the endpoint's configured method.
 
     :param event: Lambda event that triggered the handler
     :type event: dict
@@ -75,11 +230,52 @@ def queues_for_endpoint(event):
     """
     global endpoints  # endpoint config that's templated in by generator
     # get endpoint config
+    ep_name = endpoint_name(event)
     try:
-        ep_name = event['context']['resource-path'].lstrip('/')
-        return endpoints[ep_name]['queues']
+        ep_conf = endpoints[ep_name]
     except:
         raise Exception('Endpoint not in configuration: /%s' % ep_name)
+    method = event['context'].get('http-method', None)
+    if is_proxy_event(event) and method != ep_conf['method']:
+        raise Exception('Method %s not allowed for endpoint /%s' % (
+            method, ep_name))
+    return ep_conf['queues']
+
+
+def endpoint_is_async(event):
+    """
+    Return whether or not the endpoint for an event is invoked asynchronously.
+
+    :param event: Lambda event that triggered the handler
+    :type event: dict
+    :rtype: bool
+    """
+    global endpoints  # endpoint config that's templated in by generator
+    return endpoints.get(endpoint_name(event), {}).get('async', False)
+
+
+def sns_topic_for_endpoint(event, context):
+    """
+    Return the ARN of the SNS fan-out topic for a given endpoint, or None if
+    the endpoint doesn't use SNS fan-out. The topic is created in the same
+    account and region as the function, and named
+    ``<function name>-<endpoint name>``.
+
+    :param event: Lambda event that triggered the handler
+    :type event: dict
+    :param context: Lambda function context - see
+      http://docs.aws.amazon.com/lambda/latest/dg/python-context-object.html
+    :return: SNS topic ARN, or None
+    :rtype: str
+    """
+    global endpoints  # endpoint config that's templated in by generator
+    ep_name = endpoint_name(event)
+    if not endpoints.get(ep_name, {}).get('sns_fanout', False):
+        return None
+    arn_parts = context.invoked_function_arn.split(':')
+    return 'arn:aws:sns:%s:%s:%s-%s' % (
+        arn_parts[3], arn_parts[4], context.function_name, ep_name
+    )
 
 
 def msg_body_for_event(event, context):
@@ -105,7 +301,7 @@ def msg_body_for_event(event, context):
         'event': serializable_dict(event),
         'context': serializable_dict(vars(context))
     }
-    msg = json.dumps(msg_dict, sort_keys=True)
+    msg = json_dumps(msg_dict)
     logger.debug('Message to enqueue: %s', msg)
     return msg
 
@@ -125,22 +321,32 @@ def handle_event(event, context):
     queues = queues_for_endpoint(event)
     # store some state
     msg_ids = []
-    failed = 0
     # get the message to enqueue
     msg = msg_body_for_event(event, context)
+    topic_arn = sns_topic_for_endpoint(event, context)
+    if topic_arn is not None:
+        return handle_sns_fanout(topic_arn, queues, msg)
     # connect to SQS API
-    conn = boto3.client('sqs')
-    for queue_name in queues:
-        try:
-            msg_ids.append(try_enqueue(conn, queue_name, msg))
-        except Exception:
-            failed += 1
-            logger.error('Failed enqueueing message in %s:', queue_name,
-                         exc_info=1)
+    if queue_region is None:
+        conn = boto3.client('sqs')
+    else:
+        conn = boto3.client('sqs', region_name=queue_region)
+    failed = enqueue_all(conn, queues, msg, msg_ids)
+    if len(failed) > 0 and endpoint_is_async(event):
+        # the invocation fails if any queue failed, and Lambda then retries
+        # the whole event, duplicating the message in the queues that
+        # succeeded; first retry only the queues that failed
+        for attempt in range(ASYNC_ENQUEUE_RETRIES):
+            time.sleep(0.2 * (2 ** attempt))
+            logger.warning('Retrying enqueueing message in %d failed '
+                           'queue(s): %s', len(failed), failed)
+            failed = enqueue_all(conn, failed, msg, msg_ids)
+            if len(failed) == 0:
+                break
     fail_str = ''
     status = 'success'
-    if failed > 0:
-        fail_str = '; %d failed' % failed
+    if len(failed) > 0:
+        fail_str = '; %d failed' % len(failed)
         status = 'partial'
     return {
         'status': status,
@@ -149,6 +355,69 @@ def handle_event(event, context):
     }
 
 
+def enqueue_all(conn, queues, msg, msg_ids):
+    """
+    Try to enqueue a message in each of a list of queues, appending the IDs
+    of the enqueued messages to ``msg_ids``.
+
+    :param conn: SQS API connection
+    :type conn: :py:class:`botocore:SQS.Client`
+    :param queues: names of queues to put message in
+    :type queues: :std:term:`list`
+    :param msg: JSON-serialized message body
+    :type msg: str
+    :param msg_ids: list to append enqueued message IDs to
+    :type msg_ids: :std:term:`list`
+    :return: names of the queues that enqueueing failed for
+    :rtype: :std:term:`list`
+    """
+    failed = []
+    for queue_name in queues:
+        try:
+            msg_ids.append(try_enqueue(conn, queue_name, msg))
+        except Exception:
+            failed.append(queue_name)
+            logger.error('Failed enqueueing message in %s:', queue_name,
+                         exc_info=1)
+    return failed
+
+
+def handle_sns_fanout(topic_arn, queues, msg):
+    """
+    Publish the message once to an endpoint's SNS fan-out topic, which
+    delivers it to all of the endpoint's queues.
+
+    :param topic_arn: ARN of the SNS topic to publish to
+    :type topic_arn: str
+    :param queues: list of queues subscribed to the topic
+    :type queues: :std:term:`list`
+    :param msg: JSON-serialized message body
+    :type msg: str
+    :return: JSON-serialized success response
+    :rtype: str
+    """
+    conn = boto3.client('sns')
+    try:
+        logger.debug('Publishing message to SNS topic: %s', topic_arn)
+        resp = conn.publish(TopicArn=topic_arn, Message=msg)
+    except Exception:
+        logger.error('Failed publishing message to %s:', topic_arn,
+                     exc_info=1)
+        return {
+            'status': 'error',
+            'message': 'failed publishing message to SNS for %d queues' % (
+                len(queues)),
+            'SQSMessageIds': []
+        }
+    logger.debug('Published message to %s with ID %s', topic_arn,
+                 resp['MessageId'])
+    return {
+        'status': 'success',
+        'message': 'published message to SNS for %d queues' % len(queues),
+        'SQSMessageIds': [resp['MessageId']]
+    }
+
+
 def try_enqueue(conn, queue_name, msg):
     """
     Try to enqueue a message. If it succeeds, return the message ID.
@@ -175,6 +444,27 @@ def try_enqueue(conn, queue_name, msg):
     return resp['MessageId']
 
 
+def json_dumps(obj):
+    """
+    Serialize ``obj`` to a JSON string, using orjson if it's available and
+    falling back to the stdlib json module otherwise, or if orjson can't
+    serialize something that json can (i.e. integers over 64 bits). Keys are
+    sorted if ``json_sort_keys`` is True.
+
+    :param obj: object to serialize
+    :return: JSON-serialized object
+    :rtype: str
+    """
+    if orjson is not None:
+        opts = orjson.OPT_SORT_KEYS if json_sort_keys else 0
+        try:
+            return orjson.dumps(obj, option=opts).decode('utf-8')
+        except TypeError:
+            # orjson.JSONEncodeError is a TypeError
+            pass
+    return json.dumps(obj, sort_keys=json_sort_keys)
+
+
 def serializable_dict(d):
     """
     Return a dict like d, but with any un-json-serializable elements removed.
@@ -185,6 +475,8 @@ def serializable_dict(d):
             newd[k] = serializable_dict(d[k])
             continue
         try:
+            # the stdlib json module, so that what's kept doesn't depend on
+            # whether orjson is vendored; see json_dumps()
             json.dumps({'k': d[k]})
             newd[k] = d[k]
         except:
@@ -37,12 +37,13 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ################################################################################
 """
 
+import os
 import sys
 import argparse
 import logging
+import time
 from platform import node
 from datetime import datetime
-import requests
 from pprint import pformat
 
 from webhook2lambda2sqs.version import PROJECT_URL, VERSION
@@ -99,12 +100,17 @@ def parse_args(argv):
     p.add_argument('-T', '--tf-version', dest='tf_ver', action='store',
                    type=str, default='0.9.0',
                    help='terraform version to generate configurations for')
+    p.add_argument('-w', '--workdir', dest='workdir', action='store',
+                   type=str, default='.',
+                   help='directory to write generated files to and run '
+                        'terraform in (default: ./); for the "multi" action, '
+                        'the directory to create per-config directories in')
     subparsers = p.add_subparsers(title='Action (Subcommand)', dest='action',
                                   metavar='ACTION', description='Action to '
                                   'perform; each action may take further '
                                   'parameters. Use ACTION -h for subcommand-'
                                   'specific options and arguments.')
-    subparsers.add_parser(
+    genparser = subparsers.add_parser(
         'generate', help='generate lambda function and terraform configs in ./'
     )
     tf_parsers = [
@@ -115,6 +121,16 @@ def parse_args(argv):
         ('destroy',
          'run terraform destroy to completely destroy infrastructure')
     ]
+    tf_parsers.append(
+        ('deploy-code', 'generate function and terraform configs in ./; if '
+                        'only the function code changed since the last '
+                        'deploy, upload it directly, otherwise run terraform '
+                        'apply')
+    )
+    tf_parsers.append(
+        ('multi', 'generate, plan or genapply several configurations '
+                  'concurrently, each in its own directory')
+    )
     tf_p_objs = {}
     for cname, chelp in tf_parsers:
         tf_p_objs[cname] = subparsers.add_parser(cname, help=chelp)
@@ -126,6 +142,59 @@ def parse_args(argv):
                                       action='store_false', default=True,
                                       help='DO NOT stream Terraform output to '
                                            'STDOUT (combined) in realtime')
+        tf_p_objs[cname].add_argument('--parallelism', dest='parallelism',
+                                      action='store', type=int, default=None,
+                                      help='limit the number of concurrent '
+                                           'Terraform operations')
+        tf_p_objs[cname].add_argument('--no-refresh', dest='refresh',
+                                      action='store_false', default=True,
+                                      help='DO NOT refresh Terraform state '
+                                           'before planning/applying')
+        tf_p_objs[cname].add_argument('--refresh-max-age',
+                                      dest='refresh_max_age', action='store',
+                                      type=int, default=None,
+                                      help='do not refresh Terraform state if '
+                                           'the local state file was written '
+                                           'less than this many seconds ago')
+        tf_p_objs[cname].set_defaults(plan_out=None, plan_file=None)
+    tf_p_objs['plan'].add_argument('-o', '--out', dest='plan_out',
+                                   action='store', type=str, default=None,
+                                   help='save the plan to this file, for use '
+                                        'with "apply --plan"')
+    tf_p_objs['apply'].add_argument('--plan', dest='plan_file', action='store',
+                                    type=str, default=None,
+                                    help='apply exactly the plan saved to this '
+                                         'file by "plan --out"')
+    multiparser = tf_p_objs['multi']
+    multiparser.add_argument('-j', '--jobs', dest='jobs', action='store',
+                             type=int, default=4,
+                             help='maximum number of configurations to '
+                                  'process concurrently (default 4)')
+    multiparser.add_argument('multi_action', metavar='MULTI_ACTION',
+                             choices=['generate', 'plan', 'genapply'],
+                             help='action to perform for each configuration: '
+                                  'generate, plan (generate then plan) or '
+                                  'genapply')
+    multiparser.add_argument('configs', metavar='CONFIG', nargs='+',
+                             help='configuration file(s); each is processed '
+                                  'in WORKDIR/<config file name without '
+                                  'extension>/')
+    for gp in [genparser, tf_p_objs['genapply'], tf_p_objs['deploy-code'],
+               multiparser]:
+        gp.add_argument('-r', '--package-report', dest='package_report',
+                        action='store_true', default=False,
+                        help='report the size of the Lambda deployment '
+                             'package(s) and time to import the function')
+        gp.add_argument('--account-id', dest='account_id', action='store',
+                        type=str, default=None,
+                        help='AWS account ID to generate for, instead of '
+                             'the aws_account_id config option or looking it '
+                             'up with STS')
+        gp.add_argument('--region', dest='aws_region', action='store',
+                        type=str, default=None,
+                        help='AWS region to generate for, instead of the '
+                             'aws_region config option or the environment / '
+                             'AWS config')
     apilogparser = subparsers.add_parser('apilogs', help='show last 10 '
                                          'CloudWatch Logs entries for the '
                                          'API Gateway')
@@ -199,6 +268,25 @@ def set_log_level_format(level, format):
     logger.setLevel(level)
 
 
+def _stack_location(config, args):
+    """
+    Return the working directory and region of the stack to get information
+    about for the logs, apilogs, queuepeek and test actions; if the
+    configuration has ``regions``, this is the stack for the first region.
+
+    :param config: configuration
+    :type config: :py:class:`~.Config`
+    :param args: command line arguments
+    :type args: :py:class:`argparse.Namespace`
+    :return: 2-tuple of (working directory, region name or None)
+    :rtype: tuple
+    """
+    regions = config.get('regions')
+    if regions is None:
+        return args.workdir, None
+    return os.path.join(args.workdir, regions[0]), regions[0]
+
+
 def get_base_url(config, args):
     """
     Get the API base url. Try Terraform state first, then
@@ -211,16 +299,18 @@ def get_base_url(config, args):
     :return: API base URL
     :rtype: str
     """
+    workdir, region = _stack_location(config, args)
     try:
         logger.debug('Trying to get Terraform base_url output')
-        runner = TerraformRunner(config, args.tf_path)
+        runner = TerraformRunner(config, args.tf_path, workdir=workdir,
+                                 region=region)
         outputs = runner._get_outputs()
         base_url = outputs['base_url']
         logger.debug("Terraform base_url output: '%s'", base_url)
     except Exception:
         logger.info('Unable to find API base_url from Terraform state; '
                     'querying AWS.', exc_info=1)
-        aws = AWSInfo(config)
+        aws = AWSInfo(config, region=region)
         base_url = aws.get_api_base_url()
         logger.debug("AWS api_base_url: '%s'", base_url)
     if not base_url.endswith('/'):
@@ -239,16 +329,18 @@ def get_api_id(config, args):
     :return: API Gateway ID
     :rtype: str
     """
+    workdir, region = _stack_location(config, args)
     try:
         logger.debug('Trying to get Terraform rest_api_id output')
-        runner = TerraformRunner(config, args.tf_path)
+        runner = TerraformRunner(config, args.tf_path, workdir=workdir,
+                                 region=region)
         outputs = runner._get_outputs()
         depl_id = outputs['rest_api_id']
         logger.debug("Terraform rest_api_id output: '%s'", depl_id)
     except Exception:
         logger.info('Unable to find API rest_api_id from Terraform state;'
                     ' querying AWS.', exc_info=1)
-        aws = AWSInfo(config)
+        aws = AWSInfo(config, region=region)
         depl_id = aws.get_api_id()
         logger.debug("AWS API ID: '%s'", depl_id)
     return depl_id
@@ -263,6 +355,7 @@ def run_test(config, args):
     :param args: command line arguments
     :type args: :py:class:`argparse.Namespace`
     """
+    import requests
     base_url = get_base_url(config, args)
     logger.debug('API base url: %s', base_url)
     endpoints = config.get('endpoints')
@@ -316,17 +409,21 @@ def main(args=None):
     elif args.verbose == 1:
         set_log_info()
 
+    if args.action == 'multi':
+        run_multi(args)
+        return
+
     # get our config
     config = Config(args.config)
 
     if args.action == 'logs':
-        aws = AWSInfo(config)
+        aws = AWSInfo(config, region=_stack_location(config, args)[1])
         aws.show_cloudwatch_logs(count=args.log_count)
         return
 
     if args.action == 'apilogs':
         api_id = get_api_id(config, args)
-        aws = AWSInfo(config)
+        aws = AWSInfo(config, region=_stack_location(config, args)[1])
         aws.show_cloudwatch_logs(
             count=args.log_count,
             grp_name='API-Gateway-Execution-Logs_%s/%s' % (
@@ -336,7 +433,7 @@ def main(args=None):
         return
 
     if args.action == 'queuepeek':
-        aws = AWSInfo(config)
+        aws = AWSInfo(config, region=_stack_location(config, args)[1])
         aws.show_queue(name=args.queue_name, delete=args.queue_delete,
                        count=args.msg_count)
         return
@@ -345,37 +442,291 @@ def main(args=None):
         run_test(config, args)
         return
 
-    if args.action in ['apply', 'genapply', 'plan', 'destroy']:
-        runner = TerraformRunner(config, args.tf_path)
+    run_config(config, args, args.action, args.workdir)
+
+
+def run_config(config, args, action, workdir, generate=False):
+    """
+    Run a generate or Terraform action for one configuration. If the
+    configuration has ``regions``, run it for the stack of every region
+    concurrently, each in a subdirectory of ``workdir`` named for the region;
+    print a summary of the results and exit non-zero if any failed.
+
+    :param config: configuration
+    :type config: :py:class:`~.Config`
+    :param args: command line arguments
+    :type args: :py:class:`argparse.Namespace`
+    :param action: action to run; one of the generate or Terraform actions
+    :type action: str
+    :param workdir: directory to write generated files to and run terraform in
+    :type workdir: str
+    :param generate: whether to generate the function and configuration
+      before a ``plan``
+    :type generate: bool
+    """
+    regions = config.get('regions')
+    if regions is None:
+        run_stack(config, args, action, workdir, generate=generate)
+        return
+    workdirs = [os.path.join(workdir, r) for r in regions]
+    logger.warning('Running %s for %d regions', action, len(regions))
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(len(regions))
+    try:
+        results = pool.map(
+            lambda x: _run_region_one(config, args, action, x[1], x[0],
+                                      generate),
+            zip(regions, workdirs)
+        )
+    finally:
+        pool.close()
+        pool.join()
+    if _print_results(action, regions, workdirs, results) > 0:
+        raise SystemExit(1)
+
+
+def _run_region_one(config, args, action, workdir, region, generate):
+    """
+    Run an action for the stack of one region; see :py:func:`~.run_config`.
+
+    :param config: configuration
+    :type config: :py:class:`~.Config`
+    :param args: command line arguments
+    :type args: :py:class:`argparse.Namespace`
+    :param action: action to run
+    :type action: str
+    :param workdir: directory to generate into and run terraform in
+    :type workdir: str
+    :param region: region name
+    :type region: str
+    :param generate: whether to generate before a ``plan``
+    :type generate: bool
+    :return: 2-tuple of (error message or None on success, duration in
+      seconds)
+    :rtype: tuple
+    """
+    start = time.time()
+    try:
+        run_stack(config, args, action, workdir, generate=generate,
+                  region=region)
+    except (Exception, SystemExit) as ex:
+        logger.error('%s (%s) failed: %s', region, workdir, ex, exc_info=1)
+        return str(ex) or ex.__class__.__name__, time.time() - start
+    return None, time.time() - start
+
+
+def _print_results(action, names, workdirs, results):
+    """
+    Print a summary of the results of running ``action`` concurrently for
+    several configurations or regions.
+
+    :param action: the action that was run
+    :type action: str
+    :param names: configuration paths or region names
+    :type names: :std:term:`list`
+    :param workdirs: working directory for each of ``names``
+    :type workdirs: :std:term:`list`
+    :param results: (error message or None, duration) 2-tuple for each of
+      ``names``
+    :type results: :std:term:`list`
+    :return: number of failures
+    :rtype: int
+    """
+    print("\n\n" + '=> %s results:' % action)
+    failed = 0
+    for name, workdir, (err, duration) in zip(names, workdirs, results):
+        if err is None:
+            print('OK      %s (%s) %.1fs' % (name, workdir, duration))
+            continue
+        failed += 1
+        print('FAILED  %s (%s) %.1fs: %s' % (name, workdir, duration, err))
+    print('%d succeeded, %d failed' % (len(names) - failed, failed))
+    return failed
+
+
+def _region_plan_path(path, region):
+    """
+    Return the path of the saved plan file to use for one region's stack,
+    given the ``plan --out`` or ``apply --plan`` path from the command line.
+    When deploying to multiple regions, each region gets its own plan file,
+    named with a ``.<region>`` suffix, so that concurrent plans don't
+    overwrite each other and each region applies its own plan.
+
+    :param path: plan file path from the command line, or None
+    :type path: str
+    :param region: region of the stack, or None if not deploying to multiple
+      regions
+    :type region: str
+    :return: plan file path for the stack, or None
+    :rtype: str
+    """
+    if path is None or region is None:
+        return path
+    path = '%s.%s' % (path, region)
+    logger.info('Using plan file for region %s: %s', region, path)
+    return path
+
+
+def _rest_api_id_output(runner):
+    """
+    Return the ``rest_api_id`` Terraform output, or None if it can't be
+    found.
+
+    :param runner: Terraform runner for the stack
+    :type runner: :py:class:`~.TerraformRunner`
+    :return: API Gateway ReST API ID, or None
+    :rtype: str
+    """
+    try:
+        return runner._get_outputs()['rest_api_id']
+    except Exception:
+        logger.debug('Unable to get rest_api_id Terraform output',
+                     exc_info=1)
+        return None
+
+
+def run_stack(config, args, action, workdir, generate=False, region=None):
+    """
+    Run a generate or Terraform action for one stack.
+
+    :param config: configuration
+    :type config: :py:class:`~.Config`
+    :param args: command line arguments
+    :type args: :py:class:`argparse.Namespace`
+    :param action: action to run; one of the generate or Terraform actions
+    :type action: str
+    :param workdir: directory to write generated files to and run terraform in
+    :type workdir: str
+    :param generate: whether to generate the function and configuration
+      before a ``plan``
+    :type generate: bool
+    :param region: region of the stack, when deploying to multiple regions
+    :type region: str
+    """
+    if action in ['apply', 'genapply', 'plan', 'destroy', 'deploy-code']:
+        if not os.path.isdir(workdir):
+            # TerraformRunner runs terraform in the working directory, before
+            # the configuration is generated into it
+            logger.debug('Creating working directory: %s', workdir)
+            os.makedirs(workdir)
+        runner = TerraformRunner(config, args.tf_path, workdir=workdir,
+                                 region=region)
         tf_ver = runner.tf_version
+        if config.api_type == 'http' and tf_ver < (0, 12, 0):
+            # the aws_apigatewayv2_* resources need an AWS provider that
+            # only supports terraform 0.12 and later
+            raise Exception('ERROR: an "http" api_type requires terraform '
+                            '>= 0.12.0, but found terraform %s' %
+                            '.'.join([str(x) for x in tf_ver]))
     else:
         tf_ver = tuple(
             [int(x) for x in args.tf_ver.split('.')]
         )
 
     # if generate or genapply, generate the configs
-    if args.action == 'generate' or args.action == 'genapply':
+    if generate or action in ['generate', 'genapply', 'deploy-code']:
         func_gen = LambdaFuncGenerator(config)
         func_src = func_gen.generate()
         # @TODO: also write func_source to disk
-        tf_gen = TerraformGenerator(config, tf_ver=tf_ver)
-        tf_gen.generate(func_src)
+        tf_gen = TerraformGenerator(config, tf_ver=tf_ver, workdir=workdir,
+                                    region=region, account_id=args.account_id,
+                                    aws_region=args.aws_region)
+        tf_gen.generate(func_src, package_report=args.package_report)
 
     # if only generate, exit now
-    if args.action == 'generate':
+    if action == 'generate':
         return
 
     # run the terraform action
-    if args.action == 'apply' or args.action == 'genapply':
-        runner.apply(args.stream_tf)
-        # conditionally set API Gateway Method settings
-        if config.get('api_gateway_method_settings') is not None:
-            aws = AWSInfo(config)
-            aws.set_method_settings()
-    elif args.action == 'plan':
-        runner.plan(args.stream_tf)
+    tf_opts = {
+        'parallelism': args.parallelism,
+        'refresh': args.refresh,
+        'refresh_max_age': args.refresh_max_age
+    }
+    if action in ['apply', 'genapply', 'deploy-code']:
+        if action == 'apply':
+            runner.apply(args.stream_tf,
+                         plan_file=_region_plan_path(args.plan_file, region),
+                         **tf_opts)
+        elif action == 'genapply':
+            runner.apply(args.stream_tf, **tf_opts)
+        elif not runner.deploy_code(args.stream_tf, **tf_opts):
+            # code-only deploy or no changes; nothing else to do
+            return
+        # conditionally set API Gateway Method settings; for HTTP APIs these
+        # are set on the stage by Terraform
+        if ((config.get('api_gateway_method_settings') is not None or
+                len(config.endpoint_method_settings) > 0) and
+                config.api_type != 'http'):
+            aws = AWSInfo(config, region=region)
+            aws.set_method_settings(api_id=_rest_api_id_output(runner))
+    elif action == 'plan':
+        runner.plan(args.stream_tf,
+                    out_file=_region_plan_path(args.plan_out, region),
+                    **tf_opts)
     else:  # destroy
-        runner.destroy(args.stream_tf)
+        runner.destroy(args.stream_tf, **tf_opts)
+
+
+def _run_multi_one(args, conf_path, workdir):
+    """
+    Run the ``multi`` action for one configuration; see :py:func:`~.run_multi`.
+
+    :param args: command line arguments
+    :type args: :py:class:`argparse.Namespace`
+    :param conf_path: path to the configuration file
+    :type conf_path: str
+    :param workdir: directory to generate into and run terraform in
+    :type workdir: str
+    :return: 2-tuple of (error message or None on success, duration in
+      seconds)
+    :rtype: tuple
+    """
+    start = time.time()
+    try:
+        config = Config(conf_path)
+        run_config(config, args, args.multi_action, workdir,
+                   generate=(args.multi_action == 'plan'))
+    except (Exception, SystemExit) as ex:
+        logger.error('%s (%s) failed: %s', conf_path, workdir, ex,
+                     exc_info=1)
+        return str(ex) or ex.__class__.__name__, time.time() - start
+    return None, time.time() - start
+
+
+def run_multi(args):
+    """
+    Run the ``multi`` action: generate, plan or genapply each configuration
+    in ``args.configs`` in its own directory under ``args.workdir`` (named
+    for the configuration file, without extension), running at most
+    ``args.jobs`` concurrently. Print a summary of the results and exit
+    non-zero if any failed.
+
+    :param args: command line arguments
+    :type args: :py:class:`argparse.Namespace`
+    """
+    workdirs = []
+    for conf_path in args.configs:
+        name = os.path.splitext(os.path.basename(conf_path))[0]
+        workdirs.append(os.path.join(args.workdir, name))
+    dupes = sorted(set(w for w in workdirs if workdirs.count(w) > 1))
+    if len(dupes) > 0:
+        raise Exception('ERROR: multiple configurations would use the same '
+                        'directory: %s' % ', '.join(dupes))
+    logger.warning('Running %s for %d configurations with %d jobs',
+                   args.multi_action, len(args.configs), args.jobs)
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(max(1, min(args.jobs, len(args.configs))))
+    try:
+        results = pool.map(
+            lambda x: _run_multi_one(args, x[0], x[1]),
+            zip(args.configs, workdirs)
+        )
+    finally:
+        pool.close()
+        pool.join()
+    if _print_results(args.multi_action, args.configs, workdirs, results) > 0:
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
@@ -37,17 +37,46 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import logging
 from webhook2lambda2sqs.utils import run_cmd
+from webhook2lambda2sqs.aws import AWSInfo
 import re
 import json
+import hashlib
+import os
+import threading
+import time
+
+try:
+    from shutil import which
+except ImportError:  # python 2
+    from distutils.spawn import find_executable as which
 
 logger = logging.getLogger(__name__)
 
 TF_CONFIG_NAME = 'webhook2lambda2sqs.tf.json'
+FUNC_ZIP_NAME = 'webhook2lambda2sqs_func.zip'
+LAYER_ZIP_NAME = 'webhook2lambda2sqs_layer.zip'
+
+#: File recording the hashes of the generated files as of the last successful
+#: apply or code-only deploy; see :py:meth:`~.TerraformRunner.changed_files`
+DEPLOY_RECORD_NAME = '.webhook2lambda2sqs_deployed.json'
+
+#: File marking that the function code was updated by a code-only deploy
+#: since the last successful apply, so Terraform state must be refreshed; see
+#: :py:meth:`~.TerraformRunner._refresh_arg`
+REFRESH_REQUIRED_NAME = '.webhook2lambda2sqs_refresh_required'
+
+#: On-disk cache of terraform version, validation and output results; see
+#: :py:meth:`~.TerraformRunner._cache_get`
+TF_CACHE_NAME = '.webhook2lambda2sqs_tf_cache.json'
+
+#: Serializes 'terraform init' across runners in this process, as terraform's
+#: shared plugin cache directory is not safe for concurrent use
+_init_lock = threading.Lock()
 
 
 class TerraformRunner(object):
 
-    def __init__(self, config, tf_path):
+    def __init__(self, config, tf_path, workdir='.', region=None):
         """
         Initialize the Terraform command runner.
 
@@ -55,9 +84,20 @@ class TerraformRunner(object):
         :type config: :py:class:`~.Config`
         :param tf_path: path to terraform binary
         :type tf_path: str
+        :param workdir: directory containing the generated configuration, to
+          run terraform in
+        :type workdir: str
+        :param region: AWS region of the stack, when deploying to multiple
+          regions; None for the default region.
+        :type region: str
         """
         self.config = config
+        self.region = region
+        if os.sep in tf_path:
+            # terraform runs in workdir
+            tf_path = os.path.abspath(tf_path)
         self.tf_path = tf_path
+        self.workdir = workdir
         # if we fail getting the version, assume newest
         self.tf_version = (999, 999, 999)
         self._validate()
@@ -65,14 +105,19 @@ class TerraformRunner(object):
     def _validate(self):
         """
         Confirm that we can run terraform (by calling its version action)
-        and then validate the configuration.
+        and then validate the configuration. Both results are cached; see
+        :py:meth:`~._cache_get`.
         """
-        try:
-            out = self._run_tf('version')
-        except:
-            raise Exception('ERROR: executing \'%s version\' failed; is '
-                            'terraform installed and is the path to it (%s) '
-                            'correct?' % (self.tf_path, self.tf_path))
+        bin_key = self._binary_key()
+        out = self._cache_get('version', bin_key)
+        if out is None:
+            try:
+                out = self._run_tf('version')
+            except:
+                raise Exception('ERROR: executing \'%s version\' failed; is '
+                                'terraform installed and is the path to it '
+                                '(%s) correct?' % (self.tf_path, self.tf_path))
+            self._cache_set('version', bin_key, out)
         res = re.search(r'Terraform v(\d+)\.(\d+)\.(\d+)', out)
         if res is None:
             logger.error('Unable to determine terraform version; will not '
@@ -90,6 +135,10 @@ class TerraformRunner(object):
                             'with api_gateway_integration_response resources; '
                             'see: https://github.com/hashicorp/terraform/pull'
                             '/5893')
+        val_key = self._cache_key(bin_key, self._config_hash)
+        if self._cache_get('validate', val_key) is not None:
+            logger.debug('Terraform config previously validated; skipping')
+            return
         try:
             self._run_tf('validate', ['.'])
         except Exception as ex:
@@ -101,6 +150,134 @@ class TerraformRunner(object):
             raise Exception(
                 'ERROR: Terraform config validation failed: %s' % ex
             )
+        self._cache_set('validate', val_key, True)
+
+    def _path(self, fname):
+        """
+        Return the path to ``fname`` in the working directory.
+
+        :param fname: file name
+        :type fname: str
+        :rtype: str
+        """
+        return os.path.normpath(os.path.join(self.workdir, fname))
+
+    def _binary_key(self):
+        """
+        Return a string identifying the terraform binary (its resolved path,
+        size and mtime), or None if it can't be found.
+
+        :rtype: str
+        """
+        path = self.tf_path
+        if os.sep not in path:
+            path = which(path)
+        if path is None or not os.path.exists(path):
+            return None
+        st = os.stat(path)
+        return '%s:%d:%s' % (os.path.realpath(path), st.st_size, st.st_mtime)
+
+    def _config_hash(self):
+        """
+        Return the SHA256 hex digest of the generated terraform configuration,
+        or None if it doesn't exist.
+
+        :rtype: str
+        """
+        if not os.path.exists(self._path(TF_CONFIG_NAME)):
+            return None
+        with open(self._path(TF_CONFIG_NAME), 'rb') as fh:
+            return hashlib.sha256(fh.read()).hexdigest()
+
+    def _state_serial(self):
+        """
+        Return a string identifying the current version of the local
+        terraform state (its lineage and serial), or None if there is no
+        local state.
+
+        :rtype: str
+        """
+        try:
+            with open(self._path('terraform.tfstate'), 'r') as fh:
+                state = json.loads(fh.read())
+            return '%s:%s' % (state.get('lineage', ''), state['serial'])
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+    def _cache_key(self, *parts):
+        """
+        Return a cache key from the given parts; if any part is None or a
+        callable returning None, return None (don't cache). Callables are
+        only called if all earlier parts are not None.
+
+        :return: cache key or None
+        :rtype: str
+        """
+        res = []
+        for part in parts:
+            if callable(part):
+                part = part()
+            if part is None:
+                return None
+            res.append(part)
+        return '|'.join(res)
+
+    def _read_cache(self):
+        """
+        Return the contents of the :py:const:`~.TF_CACHE_NAME` cache file, or
+        an empty dict if it doesn't exist or can't be read.
+
+        :rtype: dict
+        """
+        try:
+            with open(self._path(TF_CACHE_NAME), 'r') as fh:
+                return json.loads(fh.read())
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _cache_get(self, name, key):
+        """
+        Return the cached value for ``name`` if it was stored with ``key``.
+        The cache lives in :py:const:`~.TF_CACHE_NAME` in the working
+        directory, and is keyed on some combination of the terraform binary
+        (:py:meth:`~._binary_key`), configuration (:py:meth:`~._config_hash`)
+        and state (:py:meth:`~._state_serial`), so that repeated commands can
+        skip running terraform when nothing has changed.
+
+        :param name: name of the cached value
+        :type name: str
+        :param key: cache key, or None to not use the cache
+        :type key: str
+        :return: cached value, or None
+        """
+        if key is None:
+            return None
+        entry = self._read_cache().get(name)
+        if entry is None or entry.get('key') != key:
+            return None
+        logger.debug('Using cached terraform %s', name)
+        return entry['value']
+
+    def _cache_set(self, name, key, value):
+        """
+        Store ``value`` in the cache for ``name`` with ``key``; see
+        :py:meth:`~._cache_get`.
+
+        :param name: name of the cached value
+        :type name: str
+        :param key: cache key, or None to not use the cache
+        :type key: str
+        :param value: JSON-serializable value to cache
+        """
+        if key is None:
+            return
+        cache = self._read_cache()
+        cache[name] = {'key': key, 'value': value}
+        try:
+            with open(self._path(TF_CACHE_NAME), 'w') as fh:
+                fh.write(json.dumps(cache, sort_keys=True, indent=4))
+        except (IOError, OSError):
+            logger.debug('Unable to write terraform cache', exc_info=1)
 
     def _args_for_remote(self):
         """
@@ -113,6 +290,8 @@ class TerraformRunner(object):
         conf = self.config.get('terraform_remote_state')
         if conf is None:
             return None
+        if self.region is not None:
+            conf = self.config.region_remote_state(self.region)
         args = ['-backend=%s' % conf['backend']]
         for k, v in sorted(conf['config'].items()):
             args.append('-backend-config="%s=%s"' % (k, v))
@@ -132,15 +311,88 @@ class TerraformRunner(object):
             logger.debug('_args_for_remote() returned None; not configuring '
                          'terraform remote')
             return
+        key = self._cache_key(self._binary_key, ' '.join(args))
+        rmt_path = self._path(os.path.join('.terraform', 'terraform.tfstate'))
+        if (os.path.exists(rmt_path) and
+                self._cache_get('remote', key) is not None):
+            logger.info('Terraform remote config unchanged; not '
+                        'reconfiguring')
+            return
         logger.warning('Setting terraform remote config: %s', ' '.join(args))
-        args = ['config'] + args
-        self._run_tf('remote', cmd_args=args, stream=stream)
+        self._run_tf('remote', cmd_args=['config'] + args, stream=stream)
+        self._cache_set('remote', key, True)
         logger.info('Terraform remote configured.')
 
+    def _init_fingerprint(self):
+        """
+        Return the SHA256 hex digest of the parts of the generated terraform
+        configuration that affect 'terraform init' (the ``terraform`` block,
+        including the backend, the provider configuration, the providers
+        used by resources and data sources, and module sources), or None if
+        the configuration doesn't exist or can't be read.
+
+        :rtype: str
+        """
+        try:
+            with open(self._path(TF_CONFIG_NAME), 'r') as fh:
+                conf = json.loads(fh.read())
+        except (IOError, OSError, ValueError):
+            return None
+        providers = set()
+        for k in ['resource', 'data']:
+            for rtype in conf.get(k, {}):
+                providers.add(rtype.split('_')[0])
+        fp = {
+            'terraform': conf.get('terraform', {}),
+            'provider': conf.get('provider', {}),
+            'providers': sorted(providers),
+            'modules': sorted([
+                m.get('source') for m in conf.get('module', {}).values()
+            ])
+        }
+        return hashlib.sha256(
+            json.dumps(fp, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+
+    def _setup_plugin_cache(self):
+        """
+        Set the ``TF_PLUGIN_CACHE_DIR`` environment variable for terraform,
+        creating the directory if needed, so that provider plugins are shared
+        between working directories instead of downloaded into each. The
+        directory is the ``terraform_plugin_cache_dir`` configuration option
+        if set, else an existing ``TF_PLUGIN_CACHE_DIR`` environment
+        variable, else ``~/.terraform.d/plugin-cache``. Setting the option to
+        False disables the plugin cache.
+
+        :return: plugin cache directory, or None if disabled
+        :rtype: str
+        """
+        path = self.config.get('terraform_plugin_cache_dir')
+        if path is False:
+            return None
+        if path is None:
+            path = os.environ.get('TF_PLUGIN_CACHE_DIR')
+        if path is None:
+            path = os.path.join('~', '.terraform.d', 'plugin-cache')
+        path = os.path.abspath(os.path.expanduser(path))
+        if not os.path.isdir(path):
+            logger.debug('Creating terraform plugin cache directory: %s',
+                         path)
+            try:
+                os.makedirs(path)
+            except OSError:
+                # created concurrently by another runner
+                if not os.path.isdir(path):
+                    raise
+        os.environ['TF_PLUGIN_CACHE_DIR'] = path
+        return path
+
     def _run_tf(self, cmd, cmd_args=[], stream=False):
         """
         Run a single terraform command via :py:func:`~.utils.run_cmd`;
-        raise exception on non-zero exit status.
+        raise exception on non-zero exit status. The ``terraform_timeout``
+        and ``terraform_transcript`` configuration options are passed through
+        to it.
 
         :param cmd: terraform command to run
         :type cmd: str
@@ -153,69 +405,271 @@ class TerraformRunner(object):
         args = [self.tf_path, cmd] + cmd_args
         arg_str = ' '.join(args)
         logger.info('Running terraform command: %s', arg_str)
-        out, retcode = run_cmd(arg_str, stream=stream)
+        out, retcode = run_cmd(
+            arg_str, stream=stream,
+            timeout=self.config.get('terraform_timeout'),
+            transcript=self.config.get('terraform_transcript'),
+            cwd=self.workdir
+        )
         if retcode != 0:
             logger.critical('Terraform command (%s) failed with exit code '
                             '%d:\n%s', arg_str, retcode, out)
             raise Exception('terraform %s failed' % cmd)
         return out
 
-    def plan(self, stream=False):
+    def _refresh_arg(self, refresh=True, refresh_max_age=None):
+        """
+        Return the ``-refresh`` argument for terraform plan, apply or destroy.
+        If ``refresh`` is True but ``refresh_max_age`` is set and the local
+        state file (see :py:meth:`~._state_path`) was written less than that
+        many seconds ago, skip the refresh. This only applies when the state
+        file holds the actual state (see :py:meth:`~._state_is_local`); with
+        0.9+ backends its modification time is that of the last ``init``, so
+        state is always refreshed.
+
+        State is also always refreshed after a code-only deploy by
+        :py:meth:`~.deploy_code`, until the next successful apply; otherwise
+        the function's ``source_code_hash`` in state is that of the previous
+        code, and Terraform would plan a spurious function update.
+
+        :param refresh: whether or not to refresh state
+        :type refresh: bool
+        :param refresh_max_age: maximum age in seconds of state that will be
+          used without refreshing it, or None to always refresh
+        :type refresh_max_age: int
+        :return: terraform argument
+        :rtype: str
+        """
+        if os.path.exists(self._path(REFRESH_REQUIRED_NAME)):
+            if not refresh or refresh_max_age is not None:
+                logger.warning('Function code was updated by deploy-code '
+                               'since the last apply; refreshing state')
+            return '-refresh=true'
+        if not refresh:
+            return '-refresh=false'
+        if refresh_max_age is None:
+            return '-refresh=true'
+        path = self._state_path()
+        if path is None:
+            return '-refresh=true'
+        if not self._state_is_local(path):
+            logger.debug('%s only holds backend configuration; refreshing '
+                         'state', path)
+            return '-refresh=true'
+        age = time.time() - os.path.getmtime(path)
+        if age < refresh_max_age:
+            logger.warning('State file %s was written %d seconds ago; not '
+                           'refreshing state', path, age)
+            return '-refresh=false'
+        return '-refresh=true'
+
+    def _parallelism_args(self, parallelism=None):
+        """
+        Return a list of the ``-parallelism`` argument for terraform, if
+        ``parallelism`` is not None.
+
+        :param parallelism: number of concurrent operations, or None
+        :type parallelism: int
+        :rtype: :std:term:`list`
+        """
+        if parallelism is None:
+            return []
+        return ['-parallelism=%d' % parallelism]
+
+    def plan(self, stream=False, out_file=None, parallelism=None,
+             refresh=True, refresh_max_age=None):
         """
         Run a 'terraform plan'
 
         :param stream: whether or not to stream TF output in realtime
         :type stream: bool
+        :param out_file: if not None, path to save the plan to, for use with
+          ``apply(plan_file=...)``
+        :type out_file: str
+        :param parallelism: if not None, limit the number of concurrent
+          operations (terraform's ``-parallelism``)
+        :type parallelism: int
+        :param refresh: whether or not to refresh state before acting
+        :type refresh: bool
+        :param refresh_max_age: if not None, don't refresh state if the
+          local state file was written less than this many seconds ago
+        :type refresh_max_age: int
         """
         self._setup_tf(stream=stream)
-        args = ['-input=false', '-refresh=true', '.']
+        args = ['-input=false', self._refresh_arg(refresh, refresh_max_age)]
+        args.extend(self._parallelism_args(parallelism))
+        if out_file is not None:
+            out_file = os.path.abspath(out_file)
+            args.append('-out=%s' % out_file)
+        args.append('.')
         logger.warning('Running terraform plan: %s', ' '.join(args))
         out = self._run_tf('plan', cmd_args=args, stream=stream)
         if stream:
             logger.warning('Terraform plan finished successfully.')
         else:
             logger.warning("Terraform plan finished successfully:\n%s", out)
+        if out_file is not None:
+            logger.warning('Terraform plan saved to: %s', out_file)
 
-    def _taint_deployment(self, stream=False):
-        """
-        Run 'terraform taint aws_api_gateway_deployment.depl' to taint the
-        deployment resource. This is a workaround for
-        https://github.com/hashicorp/terraform/issues/6613
-
-        :param stream: whether or not to stream TF output in realtime
-        :type stream: bool
-        """
-        args = ['aws_api_gateway_deployment.depl']
-        logger.warning('Running terraform taint: %s as workaround for '
-                       '<https://github.com/hashicorp/terraform/issues/6613>',
-                       ' '.join(args))
-        out = self._run_tf('taint', cmd_args=args, stream=stream)
-        if stream:
-            logger.warning('Terraform taint finished successfully.')
-        else:
-            logger.warning("Terraform taint finished successfully:\n%s", out)
-
-    def apply(self, stream=False):
+    def apply(self, stream=False, plan_file=None, parallelism=None,
+              refresh=True, refresh_max_age=None):
         """
         Run a 'terraform apply'
 
         :param stream: whether or not to stream TF output in realtime
         :type stream: bool
+        :param plan_file: if not None, path to a plan saved with
+          ``plan(out_file=...)`` to apply exactly, without refreshing or
+          planning again
+        :type plan_file: str
+        :param parallelism: if not None, limit the number of concurrent
+          operations (terraform's ``-parallelism``)
+        :type parallelism: int
+        :param refresh: whether or not to refresh state before acting
+        :type refresh: bool
+        :param refresh_max_age: if not None, don't refresh state if the
+          local state file was written less than this many seconds ago
+        :type refresh_max_age: int
         """
         self._setup_tf(stream=stream)
-        try:
-            self._taint_deployment(stream=stream)
-        except Exception:
-            pass
-        args = ['-input=false', '-refresh=true', '.']
+        if plan_file is not None:
+            args = ['-input=false'] + self._parallelism_args(parallelism) + [
+                os.path.abspath(plan_file)
+            ]
+        else:
+            args = ['-input=false', self._refresh_arg(refresh, refresh_max_age)]
+            args.extend(self._parallelism_args(parallelism))
+            args.append('.')
+        # a failed apply may leave the stack partly changed
+        self._clear_deployed()
         logger.warning('Running terraform apply: %s', ' '.join(args))
         out = self._run_tf('apply', cmd_args=args, stream=stream)
         if stream:
             logger.warning('Terraform apply finished successfully.')
         else:
             logger.warning("Terraform apply finished successfully:\n%s", out)
+        self._set_refresh_required(False)
+        self._record_deployed()
         self._show_outputs()
 
+    def _file_hashes(self):
+        """
+        Return the SHA256 hex digests of the generated Terraform config,
+        function zip and layer zip files in the working directory (None for any
+        that don't exist).
+
+        :return: dict of file name to SHA256 hex digest or None
+        :rtype: dict
+        """
+        res = {}
+        for fname in [TF_CONFIG_NAME, FUNC_ZIP_NAME, LAYER_ZIP_NAME]:
+            if not os.path.exists(self._path(fname)):
+                res[fname] = None
+                continue
+            with open(self._path(fname), 'rb') as fh:
+                res[fname] = hashlib.sha256(fh.read()).hexdigest()
+        return res
+
+    def _record_deployed(self):
+        """
+        Record the hashes of the generated files (as returned by
+        :py:meth:`~._file_hashes`) to :py:const:`~.DEPLOY_RECORD_NAME`, after
+        they've been successfully deployed.
+        """
+        hashes = self._file_hashes()
+        logger.debug('Recording deployed file hashes: %s', hashes)
+        with open(self._path(DEPLOY_RECORD_NAME), 'w') as fh:
+            fh.write(json.dumps(hashes, sort_keys=True, indent=4))
+
+    def _clear_deployed(self):
+        """
+        Remove the record of the last deploy (see :py:meth:`~._record_deployed`)
+        before running something that changes the deployed stack, so that a
+        later :py:meth:`~.deploy_code` doesn't compare against a deploy that
+        no longer matches what's actually deployed.
+        """
+        path = self._path(DEPLOY_RECORD_NAME)
+        if os.path.exists(path):
+            logger.debug('Removing record of last deploy: %s', path)
+            os.remove(path)
+
+    def _set_refresh_required(self, required):
+        """
+        Create or remove :py:const:`~.REFRESH_REQUIRED_NAME`, marking whether
+        the function code was updated outside of Terraform since the last
+        successful apply (see :py:meth:`~._refresh_arg`).
+
+        :param required: whether or not state must be refreshed
+        :type required: bool
+        """
+        path = self._path(REFRESH_REQUIRED_NAME)
+        if required:
+            logger.debug('Marking state as requiring refresh: %s', path)
+            with open(path, 'w') as fh:
+                fh.write('')
+        elif os.path.exists(path):
+            logger.debug('Removing state refresh marker: %s', path)
+            os.remove(path)
+
+    def changed_files(self):
+        """
+        Return a list of the generated files which have changed since they
+        were last deployed, or None if there's no record of a previous deploy.
+
+        :return: sorted list of changed file names, or None
+        :rtype: :std:term:`list`
+        """
+        if not os.path.exists(self._path(DEPLOY_RECORD_NAME)):
+            logger.info('No record of a previous deploy (%s)',
+                        self._path(DEPLOY_RECORD_NAME))
+            return None
+        with open(self._path(DEPLOY_RECORD_NAME), 'r') as fh:
+            record = json.loads(fh.read())
+        current = self._file_hashes()
+        changed = sorted(
+            [k for k in current if current[k] != record.get(k, None)]
+        )
+        logger.debug('Files changed since last deploy: %s', changed)
+        return changed
+
+    def deploy_code(self, stream=False, **kwargs):
+        """
+        Deploy the current generated files. If the only change since the last
+        deploy is the function zip file, upload it directly via
+        :py:meth:`~.AWSInfo.update_function_code` and record it as deployed,
+        skipping the comparatively slow Terraform run; otherwise, call
+        :py:meth:`~.apply`.
+
+        Terraform doesn't drift, as the function's ``source_code_hash`` is
+        refreshed from the deployed code's ``CodeSha256``, which is the same
+        hash Terraform computes from the zip file. As that needs a refresh,
+        state is always refreshed after a code-only deploy until the next
+        successful apply, even with ``refresh=False`` or ``refresh_max_age``
+        (see :py:meth:`~._refresh_arg`).
+
+        :param stream: whether or not to stream TF output in realtime
+        :type stream: bool
+        :param kwargs: additional keyword arguments for :py:meth:`~.apply`
+        :return: whether or not a full Terraform apply was run
+        :rtype: bool
+        """
+        changed = self.changed_files()
+        if changed is None or changed not in [[], [FUNC_ZIP_NAME]]:
+            logger.warning('Infrastructure changed since last deploy (%s); '
+                           'running full terraform apply', changed)
+            self.apply(stream=stream, **kwargs)
+            return True
+        if len(changed) == 0:
+            logger.warning('Nothing changed since last deploy.')
+            return False
+        logger.warning('Only function code changed since last deploy; '
+                       'updating function code directly.')
+        AWSInfo(self.config, region=self.region).update_function_code(
+            self._path(FUNC_ZIP_NAME))
+        self._set_refresh_required(True)
+        self._record_deployed()
+        return False
+
     def _show_outputs(self):
         """
         Print the terraform outputs.
@@ -227,7 +681,112 @@ class TerraformRunner(object):
 
     def _get_outputs(self):
         """
-        Return a dict of the terraform outputs.
+        Return a dict of the terraform outputs. Read them directly from the
+        state file if possible (see :py:meth:`~._state_outputs`); otherwise
+        run 'terraform output', cached per terraform binary, configuration
+        and state serial (see :py:meth:`~._cache_get`).
+
+        :return: dict of terraform outputs
+        :rtype: dict
+        """
+        res = self._state_outputs()
+        if res is not None:
+            return res
+        key = self._cache_key(self._binary_key, self._config_hash,
+                              self._state_serial)
+        res = self._cache_get('outputs', key)
+        if res is not None:
+            return res
+        res = self._tf_outputs()
+        self._cache_set('outputs', key, res)
+        return res
+
+    def _state_path(self):
+        """
+        Return the path to a state file that contains the current state, or
+        None if there isn't one. With no remote state configured, that's the
+        local ``terraform.tfstate``. With pre-0.9 ``terraform remote config``
+        remote state, it's the local copy in ``.terraform/terraform.tfstate``;
+        with 0.9+ backends, that file only holds backend configuration, so
+        state can't be read locally.
+
+        :return: path to the state file, or None
+        :rtype: str
+        """
+        if self.config.get('terraform_remote_state') is None:
+            path = self._path('terraform.tfstate')
+        else:
+            path = self._path(os.path.join('.terraform', 'terraform.tfstate'))
+        if not os.path.exists(path):
+            return None
+        return path
+
+    def _state_is_local(self, path):
+        """
+        Return whether the state file at ``path`` (from
+        :py:meth:`~._state_path`) holds the current state; i.e. it's the local
+        ``terraform.tfstate``, or a pre-0.9 local copy of remote state. A 0.9+
+        ``.terraform/terraform.tfstate`` only holds backend configuration.
+
+        :param path: path to the state file
+        :type path: str
+        :rtype: bool
+        """
+        if path == self._path('terraform.tfstate'):
+            return True
+        try:
+            with open(path, 'r') as fh:
+                state = json.loads(fh.read())
+        except (IOError, OSError, ValueError):
+            logger.debug('Unable to read state from %s', path, exc_info=1)
+            return False
+        return 'remote' in state
+
+    def _state_outputs(self):
+        """
+        Read the root module outputs directly from the terraform state file
+        (see :py:meth:`~._state_path`), avoiding running terraform. Handles
+        state format version 4 (terraform 0.12+) as well as earlier versions,
+        including pre-0.7 plain string outputs.
+
+        :return: dict of terraform outputs, or None if they couldn't be read
+        :rtype: dict
+        """
+        path = self._state_path()
+        if path is None:
+            return None
+        try:
+            with open(path, 'r') as fh:
+                state = json.loads(fh.read())
+        except (IOError, OSError, ValueError):
+            logger.debug('Unable to read state from %s', path, exc_info=1)
+            return None
+        if 'outputs' in state:
+            # state format version 4
+            outs = state['outputs']
+        elif 'remote' in state or path == self._path('terraform.tfstate'):
+            roots = [
+                m for m in state.get('modules', [])
+                if m.get('path') == ['root']
+            ]
+            if len(roots) != 1:
+                return None
+            outs = roots[0].get('outputs', {})
+        else:
+            # backend configuration only
+            return None
+        res = {}
+        for k in outs.keys():
+            if isinstance(outs[k], type({})):
+                res[k] = outs[k]['value']
+            else:
+                res[k] = outs[k]
+        logger.debug('Terraform outputs from %s: %s', path, res)
+        return res
+
+    def _tf_outputs(self):
+        """
+        Run 'terraform output' and return a dict of the terraform outputs.
 
         :return: dict of terraform outputs
         :rtype: dict
@@ -256,28 +815,54 @@ class TerraformRunner(object):
         logger.debug('Terraform outputs: %s', outs)
         return outs
 
-    def destroy(self, stream=False):
+    def destroy(self, stream=False, parallelism=None, refresh=True,
+                refresh_max_age=None):
         """
         Run a 'terraform destroy'
 
         :param stream: whether or not to stream TF output in realtime
         :type stream: bool
+        :param parallelism: if not None, limit the number of concurrent
+          operations (terraform's ``-parallelism``)
+        :type parallelism: int
+        :param refresh: whether or not to refresh state before acting
+        :type refresh: bool
+        :param refresh_max_age: if not None, don't refresh state if the
+          local state file was written less than this many seconds ago
+        :type refresh_max_age: int
         """
         self._setup_tf(stream=stream)
-        args = ['-refresh=true', '-force', '.']
+        args = [self._refresh_arg(refresh, refresh_max_age), '-force']
+        args.extend(self._parallelism_args(parallelism))
+        args.append('.')
+        self._clear_deployed()
         logger.warning('Running terraform destroy: %s', ' '.join(args))
         out = self._run_tf('destroy', cmd_args=args, stream=stream)
         if stream:
             logger.warning('Terraform destroy finished successfully.')
         else:
             logger.warning("Terraform destroy finished successfully:\n%s", out)
+        self._set_refresh_required(False)
 
     def _setup_tf(self, stream=False):
         """
         Setup terraform; either 'remote config' or 'init' depending on version.
+        'init' is skipped if it was previously run by this program with the
+        same terraform binary and the same :py:meth:`~._init_fingerprint`,
+        and the ``.terraform`` directory still exists.
         """
         if self.tf_version < (0, 9, 0):
             self._set_remote(stream=stream)
             return
-        self._run_tf('init', stream=stream)
+        if self.tf_version >= (0, 10, 0):
+            self._setup_plugin_cache()
+        key = self._cache_key(self._binary_key, self._init_fingerprint)
+        if (os.path.isdir(self._path('.terraform')) and
+                self._cache_get('init', key) is not None):
+            logger.info('Terraform backend and providers unchanged; not '
+                        're-initializing')
+            return
+        with _init_lock:
+            self._run_tf('init', stream=stream)
+        self._cache_set('init', key, True)
         logger.info('Terraform initialized')
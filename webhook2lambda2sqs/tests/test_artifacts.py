@@ -0,0 +1,198 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/webhook2lambda2sqs>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of webhook2lambda2sqs, also known as webhook2lambda2sqs.
+
+    webhook2lambda2sqs is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    webhook2lambda2sqs is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with webhook2lambda2sqs.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/webhook2lambda2sqs> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import sys
+import pytest
+from copy import deepcopy
+from io import BytesIO
+from zipfile import ZipFile
+
+from webhook2lambda2sqs.artifacts import generate_artifacts
+from webhook2lambda2sqs.config import Config
+from webhook2lambda2sqs.tf_templates import endpoints_module
+from webhook2lambda2sqs.tests.support import exc_msg
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch, call, Mock, DEFAULT, PropertyMock  # noqa
+else:
+    from unittest.mock import patch, call, Mock, DEFAULT, PropertyMock  # noqa
+
+pbm = 'webhook2lambda2sqs.artifacts'
+
+
+class TestGenerateArtifacts(object):
+
+    def setup(self):
+        self.conf = {}
+
+        def se_get(k):
+            return self.conf.get(k, None)
+
+        self.config = Mock()
+        self.config.get.side_effect = se_get
+        type(self.config).func_name = 'myfunc'
+
+    def test_generate(self):
+        with patch.multiple(
+            pbm,
+            Config=DEFAULT,
+            LambdaFuncGenerator=DEFAULT,
+            TerraformGenerator=DEFAULT
+        ) as mocks:
+            mocks['Config'].from_dict.return_value = self.config
+            mocks['LambdaFuncGenerator'].return_value.generate.return_value = \
+                'funcsrc'
+            tfgen = mocks['TerraformGenerator'].return_value
+            tfgen._get_config.return_value = 'tfjson'
+            tfgen._zip_bytes.return_value = b'zipbytes'
+            tfgen.tf_conf = {'foo': 'bar'}
+            res = generate_artifacts(
+                {'my': 'conf'}, account_id='123456789012',
+                aws_region='us-east-1'
+            )
+        assert res == {
+            'func_src': 'funcsrc',
+            'func_zip': b'zipbytes',
+            'tf_config': {'foo': 'bar'},
+            'tf_json': 'tfjson',
+            'endpoints_module': None
+        }
+        assert mocks['Config'].mock_calls == [
+            call.from_dict({'my': 'conf'}),
+            call.from_dict().get('lambda_vendor_dir'),
+            call.from_dict().get('regions'),
+            call.from_dict().get('terraform_module')
+        ]
+        assert mocks['LambdaFuncGenerator'].mock_calls == [
+            call(self.config),
+            call().generate()
+        ]
+        assert mocks['TerraformGenerator'].mock_calls == [
+            call(self.config, tf_ver=(0, 9, 0), region=None,
+                 account_id='123456789012', aws_region='us-east-1',
+                 offline=True),
+            call()._get_config('funcsrc'),
+            call()._zip_bytes('funcsrc')
+        ]
+
+    def test_generate_terraform_module(self):
+        self.conf['terraform_module'] = True
+        with patch.multiple(
+            pbm,
+            Config=DEFAULT,
+            LambdaFuncGenerator=DEFAULT,
+            TerraformGenerator=DEFAULT
+        ) as mocks:
+            mocks['Config'].from_dict.return_value = self.config
+            res = generate_artifacts({'my': 'conf'})
+        assert res['endpoints_module'] == endpoints_module
+
+    def test_generate_region(self):
+        self.conf['regions'] = ['us-east-1', 'us-west-2']
+        with patch.multiple(
+            pbm,
+            Config=DEFAULT,
+            LambdaFuncGenerator=DEFAULT,
+            TerraformGenerator=DEFAULT
+        ) as mocks:
+            mocks['Config'].from_dict.return_value = self.config
+            generate_artifacts({'my': 'conf'}, region='us-west-2',
+                               tf_ver=(0, 13, 0))
+        assert mocks['TerraformGenerator'].mock_calls[0] == call(
+            self.config, tf_ver=(0, 13, 0), region='us-west-2',
+            account_id=None, aws_region=None, offline=True
+        )
+
+    def test_generate_region_invalid(self):
+        self.conf['regions'] = ['us-east-1', 'us-west-2']
+        with patch.multiple(
+            pbm,
+            Config=DEFAULT,
+            LambdaFuncGenerator=DEFAULT,
+            TerraformGenerator=DEFAULT
+        ) as mocks:
+            mocks['Config'].from_dict.return_value = self.config
+            with pytest.raises(Exception) as excinfo:
+                generate_artifacts({'my': 'conf'})
+        assert exc_msg(excinfo.value) == 'ERROR: region must be one of the ' \
+                                         'configured regions: us-east-1, ' \
+                                         'us-west-2'
+        assert mocks['TerraformGenerator'].mock_calls == []
+
+    def test_generate_vendor_dir(self):
+        self.conf['lambda_vendor_dir'] = '/foo'
+        with patch.multiple(
+            pbm,
+            Config=DEFAULT,
+            LambdaFuncGenerator=DEFAULT,
+            TerraformGenerator=DEFAULT
+        ) as mocks:
+            mocks['Config'].from_dict.return_value = self.config
+            with pytest.raises(Exception) as excinfo:
+                generate_artifacts({'my': 'conf'})
+        assert exc_msg(excinfo.value) == 'ERROR: lambda_vendor_dir is not ' \
+                                         'supported when generating in memory'
+        assert mocks['LambdaFuncGenerator'].mock_calls == []
+        assert mocks['TerraformGenerator'].mock_calls == []
+
+    def test_generate_example_config(self):
+        conf = deepcopy(Config._example)
+        del conf['terraform_remote_state']
+        conf['aws_account_id'] = '123456789012'
+        with patch.multiple(
+            'webhook2lambda2sqs.tf_generator',
+            autospec=True,
+            get_session=DEFAULT,
+            get_client=DEFAULT,
+            write_if_changed=DEFAULT
+        ) as mocks:
+            with patch.dict('os.environ', {}, clear=True):
+                res = generate_artifacts(conf, aws_region='eu-west-1')
+        for m in mocks.values():
+            assert m.mock_calls == []
+        assert res['tf_config']['provider'] == {
+            'aws': {'region': 'eu-west-1'}
+        }
+        assert 'arn:aws:sqs:eu-west-1:123456789012:' in res['tf_json']
+        assert 'def webhook2lambda2sqs_handler(' in res['func_src']
+        with ZipFile(BytesIO(res['func_zip'])) as z:
+            assert z.read('webhook2lambda2sqs_func.py').decode('utf-8') == \
+                res['func_src']
@@ -41,7 +41,11 @@ from time import tzset
 import os
 from pprint import pformat
 
-from webhook2lambda2sqs.aws import AWSInfo
+from webhook2lambda2sqs.aws import (
+    AWSInfo, get_client, get_session, BOTO_CONFIG
+)
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import ClientError
 from webhook2lambda2sqs.tests.support import exc_msg
 from webhook2lambda2sqs.utils import pretty_json
 
@@ -51,14 +55,66 @@ if (
         sys.version_info[0] < 3 or
         sys.version_info[0] == 3 and sys.version_info[1] < 4
 ):
-    from mock import patch, call, Mock, DEFAULT, PropertyMock  # noqa
+    from mock import patch, call, Mock, DEFAULT, PropertyMock, ANY  # noqa
 else:
-    from unittest.mock import patch, call, Mock, DEFAULT, PropertyMock  # noqa
+    from unittest.mock import patch, call, Mock, DEFAULT, PropertyMock, ANY  # noqa
 
 pbm = 'webhook2lambda2sqs.aws'
 pb = '%s.AWSInfo' % pbm
 
 
+class TestClients(object):
+
+    def setup(self):
+        self.clients = {}
+
+    def test_get_session(self):
+        with patch('%s._session' % pbm, None):
+            with patch('boto3.session.Session', autospec=True) as mock_sess:
+                res1 = get_session()
+                res2 = get_session()
+        assert mock_sess.mock_calls == [call()]
+        assert res1 is mock_sess.return_value
+        assert res2 is mock_sess.return_value
+
+    def test_get_client(self):
+        with patch('%s._clients' % pbm, self.clients):
+            with patch('%s.get_session' % pbm, autospec=True) as mock_sess:
+                mock_sess.return_value.client.side_effect = [
+                    'sqs1', 'sqs2', 'apigw1'
+                ]
+                assert get_client('sqs') == 'sqs1'
+                assert get_client('sqs') == 'sqs1'
+                assert get_client('sqs', 'eu-west-1') == 'sqs2'
+                assert get_client('apigateway') == 'apigw1'
+                assert get_client('sqs', 'eu-west-1') == 'sqs2'
+        assert mock_sess.return_value.client.mock_calls == [
+            call('sqs', region_name=None, config=ANY),
+            call('sqs', region_name='eu-west-1', config=ANY),
+            call('apigateway', region_name=None, config=ANY)
+        ]
+        for c in mock_sess.return_value.client.mock_calls:
+            conf = c[2]['config']
+            assert isinstance(conf, BotoConfig)
+            assert conf.retries == {'max_attempts': 10}
+            assert conf.max_pool_connections == 50
+            assert conf.connect_timeout == 10
+            assert conf.read_timeout == 60
+        assert self.clients == {
+            ('sqs', None): 'sqs1',
+            ('sqs', 'eu-west-1'): 'sqs2',
+            ('apigateway', None): 'apigw1'
+        }
+
+    def test_boto_config(self):
+        assert BOTO_CONFIG == {
+            'retries': {'max_attempts': 10},
+            'max_pool_connections': 50,
+            'connect_timeout': 10,
+            'read_timeout': 60
+        }
+
+
 class TestAWSInfo(object):
 
     def setup(self):
@@ -75,8 +131,24 @@ class TestAWSInfo(object):
 
     def test_init(self):
         c = Mock()
+        c.get.return_value = None
         cls = AWSInfo(c)
         assert cls.config == c
+        assert cls.region is None
+        assert c.mock_calls == [call.get('aws_region')]
+
+    def test_init_config_region(self):
+        c = Mock()
+        c.get.return_value = 'us-west-2'
+        assert AWSInfo(c).region == 'us-west-2'
+        assert AWSInfo(c, region='eu-west-1').region == 'eu-west-1'
+
+    def test_client(self):
+        self.cls.region = 'eu-west-1'
+        with patch('%s.get_client' % pbm, autospec=True) as mock_client:
+            res = self.cls._client('sqs')
+        assert mock_client.mock_calls == [call('sqs', 'eu-west-1')]
+        assert res == mock_client.return_value
 
     def test_show_cloudwatch_logs(self, capsys):
         resp = {
@@ -87,7 +159,7 @@ class TestAWSInfo(object):
             ]
         }
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-            with patch('%s.client' % pbm, autospec=True) as mock_conn:
+            with patch('%s.get_client' % pbm, autospec=True) as mock_conn:
                 with patch('%s._show_log_stream' % pb, autospec=True) as sls:
                     mock_conn.return_value.describe_log_streams.return_value = \
                         resp
@@ -97,7 +169,7 @@ class TestAWSInfo(object):
         assert err == ''
         assert out == ''
         assert mock_conn.mock_calls == [
-            call('logs'),
+            call('logs', None),
             call().describe_log_streams(descending=True, limit=5,
                                         logGroupName='/aws/lambda/myfname',
                                         orderBy='LastEventTime')
@@ -124,7 +196,7 @@ class TestAWSInfo(object):
             ]
         }
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-            with patch('%s.client' % pbm, autospec=True) as mock_conn:
+            with patch('%s.get_client' % pbm, autospec=True) as mock_conn:
                 with patch('%s._show_log_stream' % pb, autospec=True) as sls:
                     mock_conn.return_value.describe_log_streams.return_value = \
                         resp
@@ -134,7 +206,7 @@ class TestAWSInfo(object):
         assert err == ''
         assert out == ''
         assert mock_conn.mock_calls == [
-            call('logs'),
+            call('logs', None),
             call().describe_log_streams(descending=True, limit=5,
                                         logGroupName='foobar',
                                         orderBy='LastEventTime')
@@ -157,7 +229,7 @@ class TestAWSInfo(object):
             'logStreams': []
         }
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-            with patch('%s.client' % pbm, autospec=True) as mock_conn:
+            with patch('%s.get_client' % pbm, autospec=True) as mock_conn:
                 with patch('%s._show_log_stream' % pb, autospec=True) as sls:
                     mock_conn.return_value.describe_log_streams.return_value = \
                         resp
@@ -167,7 +239,7 @@ class TestAWSInfo(object):
         assert err == ''
         assert out == ''
         assert mock_conn.mock_calls == [
-            call('logs'),
+            call('logs', None),
             call().describe_log_streams(descending=True, limit=5,
                                         logGroupName='/aws/lambda/myfname',
                                         orderBy='LastEventTime')
@@ -258,7 +330,7 @@ class TestAWSInfo(object):
 
     def test_show_queue_by_name(self):
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-            with patch('%s.client' % pbm, autospec=True) as mock_sqs:
+            with patch('%s.get_client' % pbm, autospec=True) as mock_sqs:
                 with patch('%s._show_one_queue' % pb,
                            autospec=True) as mock_show:
                     with patch('%s._all_queue_names' % pb,
@@ -266,7 +338,7 @@ class TestAWSInfo(object):
                                ) as mock_aqn:
                         mock_aqn.return_value = []
                         self.cls.show_queue(name='foo')
-        assert mock_sqs.mock_calls == [call('sqs')]
+        assert mock_sqs.mock_calls == [call('sqs', None)]
         assert mock_show.mock_calls == [
             call(self.cls, mock_sqs.return_value, 'foo', 10, delete=False)
         ]
@@ -282,7 +354,7 @@ class TestAWSInfo(object):
                 raise Exception()
 
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-            with patch('%s.client' % pbm, autospec=True) as mock_sqs:
+            with patch('%s.get_client' % pbm, autospec=True) as mock_sqs:
                 with patch('%s._show_one_queue' % pb,
                            autospec=True) as mock_show:
                     mock_show.side_effect = se_show
@@ -291,7 +363,7 @@ class TestAWSInfo(object):
                                ) as mock_aqn:
                         mock_aqn.return_value = ['foo', 'bar', 'baz']
                         self.cls.show_queue(count=3, delete=True)
-        assert mock_sqs.mock_calls == [call('sqs')]
+        assert mock_sqs.mock_calls == [call('sqs', None)]
         assert mock_show.mock_calls == [
             call(self.cls, mock_sqs.return_value, 'foo', 3, delete=True),
             call(self.cls, mock_sqs.return_value, 'bar', 3, delete=True),
@@ -550,56 +622,208 @@ class TestAWSInfo(object):
 
     def test_get_api_id(self):
         mock_conf = Mock(region_name='myrname')
-        apis = {
-            'items': [
-                {'name': 'foo', 'id': 'apiid1'},
-                {'name': 'myfname', 'id': 'apiid2'},
-                {'name': 'bar', 'id': 'apiid3'},
-            ]
-        }
-        with patch('%s.client' % pbm, autospec=True) as mock_client:
-            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-                mock_client.return_value.get_rest_apis.return_value = apis
-                type(mock_client.return_value)._client_config = mock_conf
-                res = self.cls.get_api_id()
+        pages = [
+            {'items': [{'name': 'foo', 'id': 'apiid1'}]},
+            {
+                'items': [
+                    {'name': 'myfname', 'id': 'apiid2'},
+                    {'name': 'bar', 'id': 'apiid3'}
+                ]
+            }
+        ]
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            get_client=DEFAULT,
+            cache_get=DEFAULT,
+            cache_set=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            conn = mocks['get_client'].return_value
+            conn.get_paginator.return_value.paginate.return_value = pages
+            type(conn)._client_config = mock_conf
+            mocks['cache_get'].return_value = None
+            res = self.cls.get_api_id()
+            # memoized on the instance
+            assert self.cls.get_api_id() == 'apiid2'
         assert res == 'apiid2'
-        assert mock_client.mock_calls == [
-            call('apigateway'),
-            call().get_rest_apis()
+        assert mocks['get_client'].mock_calls == [
+            call('apigateway', None),
+            call().get_paginator('get_rest_apis'),
+            call().get_paginator().paginate(
+                PaginationConfig={'PageSize': 500})
         ]
-        assert mock_logger.mock_calls == [
+        assert mocks['cache_get'].mock_calls == [
+            call('api_id', 'myrname|myfname', 3600)
+        ]
+        assert mocks['cache_set'].mock_calls == [
+            call('api_id', 'myrname|myfname', 'apiid2')
+        ]
+        assert mocks['logger'].mock_calls == [
             call.debug('Connecting to AWS apigateway API'),
             call.debug('Found API id: %s', 'apiid2')
         ]
 
-    def test_get_api_base_url_exception(self):
+    def test_get_api_id_cached(self):
+        mock_conf = Mock(region_name='myrname')
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            get_client=DEFAULT,
+            cache_get=DEFAULT,
+            cache_set=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            conn = mocks['get_client'].return_value
+            conn.get_rest_api.return_value = {'name': 'myfname', 'id': 'a1'}
+            type(conn)._client_config = mock_conf
+            mocks['cache_get'].return_value = 'a1'
+            res = self.cls.get_api_id()
+        assert res == 'a1'
+        assert mocks['get_client'].mock_calls == [
+            call('apigateway', None),
+            call().get_rest_api(restApiId='a1')
+        ]
+        assert mocks['cache_set'].mock_calls == []
+        assert mocks['logger'].mock_calls == [
+            call.debug('Connecting to AWS apigateway API'),
+            call.debug('Using cached API id: %s', 'a1')
+        ]
+
+    def test_get_api_id_cached_renamed(self):
         mock_conf = Mock(region_name='myrname')
-        apis = {
-            'items': [
-                {'name': 'foo', 'id': 'apiid1'},
-                {'name': 'baz', 'id': 'apiid2'},
-                {'name': 'bar', 'id': 'apiid3'},
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            get_client=DEFAULT,
+            cache_get=DEFAULT,
+            cache_set=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            conn = mocks['get_client'].return_value
+            conn.get_rest_api.return_value = {'name': 'other', 'id': 'a1'}
+            conn.get_paginator.return_value.paginate.return_value = [
+                {'items': [{'name': 'myfname', 'id': 'a2'}]}
             ]
-        }
-        with patch('%s.client' % pbm, autospec=True) as mock_client:
-            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-                mock_client.return_value.get_rest_apis.return_value = apis
-                type(mock_client.return_value)._client_config = mock_conf
-                with pytest.raises(Exception) as excinfo:
-                    self.cls.get_api_id()
+            type(conn)._client_config = mock_conf
+            mocks['cache_get'].return_value = 'a1'
+            res = self.cls.get_api_id()
+        assert res == 'a2'
+        assert mocks['cache_set'].mock_calls == [
+            call('api_id', 'myrname|myfname', 'a2')
+        ]
+        assert mocks['logger'].mock_calls == [
+            call.debug('Connecting to AWS apigateway API'),
+            call.debug('Cached ReST API %s is now named %s', 'a1', 'other'),
+            call.debug('Found API id: %s', 'a2')
+        ]
+
+    def test_get_api_id_cached_deleted(self):
+        mock_conf = Mock(region_name='myrname')
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            get_client=DEFAULT,
+            cache_get=DEFAULT,
+            cache_set=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            conn = mocks['get_client'].return_value
+            conn.get_rest_api.side_effect = ClientError(
+                {'Error': {'Code': 'NotFoundException', 'Message': 'foo'}},
+                'GetRestApi'
+            )
+            conn.get_paginator.return_value.paginate.return_value = [
+                {'items': [{'name': 'myfname', 'id': 'a2'}]}
+            ]
+            type(conn)._client_config = mock_conf
+            mocks['cache_get'].return_value = 'a1'
+            res = self.cls.get_api_id()
+        assert res == 'a2'
+        assert mocks['cache_set'].mock_calls == [
+            call('api_id', 'myrname|myfname', 'a2')
+        ]
+
+    def test_get_api_id_not_found(self):
+        mock_conf = Mock(region_name='myrname')
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            get_client=DEFAULT,
+            cache_get=DEFAULT,
+            cache_set=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            conn = mocks['get_client'].return_value
+            conn.get_paginator.return_value.paginate.return_value = [
+                {'items': [{'name': 'foo', 'id': 'apiid1'}]},
+                {'items': []}
+            ]
+            type(conn)._client_config = mock_conf
+            mocks['cache_get'].return_value = None
+            with pytest.raises(Exception) as excinfo:
+                self.cls.get_api_id()
         assert exc_msg(excinfo.value) == 'Unable to find ReST API named myfname'
+        assert mocks['cache_set'].mock_calls == []
+
+    def test_update_function_code(self, tmpdir):
+        fpath = str(tmpdir.join('func.zip'))
+        tmpdir.join('func.zip').write_binary(b'zipcontent')
+        with patch('%s.get_client' % pbm, autospec=True) as mock_client:
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                mock_client.return_value.update_function_code.return_value = {
+                    'CodeSha256': 'mysha'
+                }
+                mock_client.return_value.publish_version.return_value = {
+                    'Version': '12'
+                }
+                res = self.cls.update_function_code(fpath)
+        assert res == '12'
         assert mock_client.mock_calls == [
-            call('apigateway'),
-            call().get_rest_apis()
+            call('lambda', None),
+            call().update_function_code(FunctionName='myfname',
+                                        ZipFile=b'zipcontent'),
+            call().get_waiter('function_updated'),
+            call().get_waiter().wait(FunctionName='myfname'),
+            call().publish_version(FunctionName='myfname',
+                                   CodeSha256='mysha')
         ]
         assert mock_logger.mock_calls == [
-            call.debug('Connecting to AWS apigateway API')
+            call.info('Updating code for function %s from %s', 'myfname',
+                      fpath),
+            call.debug('update_function_code response: %s',
+                       {'CodeSha256': 'mysha'}),
+            call.debug('Waiting for function update to complete'),
+            call.warning('Updated function %s code (CodeSha256 %s); '
+                         'published version %s', 'myfname', 'mysha', '12')
+        ]
+
+    def test_update_function_code_no_waiter(self, tmpdir):
+        fpath = str(tmpdir.join('func.zip'))
+        tmpdir.join('func.zip').write_binary(b'zipcontent')
+        with patch('%s.get_client' % pbm, autospec=True) as mock_client:
+            mock_client.return_value.update_function_code.return_value = {
+                'CodeSha256': 'mysha'
+            }
+            mock_client.return_value.get_waiter.side_effect = ValueError()
+            mock_client.return_value.publish_version.return_value = {
+                'Version': '12'
+            }
+            res = self.cls.update_function_code(fpath)
+        assert res == '12'
+        assert mock_client.mock_calls == [
+            call('lambda', None),
+            call().update_function_code(FunctionName='myfname',
+                                        ZipFile=b'zipcontent'),
+            call().get_waiter('function_updated'),
+            call().publish_version(FunctionName='myfname',
+                                   CodeSha256='mysha')
         ]
 
     def test_get_api_base_url(self):
         mock_conf = Mock(region_name='myrname')
         with patch('%s.get_api_id' % pb, autospec=True) as mock_id:
-            with patch('%s.client' % pbm, autospec=True) as mock_client:
+            with patch('%s.get_client' % pbm, autospec=True) as mock_client:
                 type(mock_client.return_value)._client_config = mock_conf
                 mock_id.return_value = 'apiid2'
                 res = self.cls.get_api_base_url()
@@ -611,7 +835,16 @@ class TestAWSInfo(object):
         self.conf['api_gateway_method_settings'] = {
             'metricsEnabled': True,
             'loggingLevel': 'INFO',
-            'dataTraceEnabled': False
+            'dataTraceEnabled': False,
+            'throttlingBurstLimit': None
+        }
+        self.conf['endpoints'] = {
+            'foo': {
+                'method': 'POST',
+                'queues': ['q1'],
+                'method_settings': {'throttlingBurstLimit': 500}
+            },
+            'bar': {'method': 'GET', 'queues': ['q1']}
         }
         stage = {
             'methodSettings': {
@@ -625,26 +858,29 @@ class TestAWSInfo(object):
         }
         with patch('%s.get_api_id' % pb, autospec=True) as mock_id:
             with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-                with patch('%s.client' % pbm, autospec=True) as mock_client:
-                    with patch('%s._add_method_setting' % pb,
-                               autospec=True) as mock_add:
+                with patch('%s.get_client' % pbm, autospec=True) as mock_client:
+                    with patch('%s._update_method_settings' % pb,
+                               autospec=True) as mock_update:
                         mock_id.return_value = 'myapiid'
                         mock_client.return_value.get_stage.return_value = stage
                         self.cls.set_method_settings()
         assert self.cls.config.mock_calls == [
-            call.get('api_gateway_method_settings')
+            call.get('aws_region'),
+            call.get('api_gateway_method_settings'),
+            call.get('endpoints')
         ]
         assert mock_id.mock_calls == [call(self.cls)]
         assert mock_client.mock_calls == [
-            call('apigateway'),
+            call('apigateway', None),
             call().get_stage(restApiId='myapiid', stageName='mystagename')
         ]
-        assert mock_add.mock_calls == [
+        assert mock_update.mock_calls == [
             call(self.cls, mock_client.return_value, 'myapiid', 'mystagename',
-                 '/*/*/logging/dataTrace', 'dataTraceEnabled', False,
-                 'replace'),
-            call(self.cls, mock_client.return_value, 'myapiid', 'mystagename',
-                 '/*/*/logging/loglevel', 'loggingLevel', 'INFO', 'replace'),
+                 [
+                     ('*/*', 'dataTraceEnabled', False),
+                     ('*/*', 'loggingLevel', 'INFO'),
+                     ('~1foo/POST', 'throttlingBurstLimit', 500)
+                 ])
         ]
         assert mock_logger.mock_calls == [
             call.info('Setting API Gateway Stage methodSettings'),
@@ -652,44 +888,41 @@ class TestAWSInfo(object):
             call.debug('Getting Stage configuration: api_id=%s stage_name=%s',
                        'myapiid', 'mystagename'),
             call.debug("Got stage config: \n%s", pformat(stage)),
-            call.debug('Adding new methodSetting "%s" value %s',
-                       'dataTraceEnabled', False),
-            call.debug('Updating methodSetting "%s" from %s to %s',
-                       'loggingLevel', 'OFF', 'INFO'),
-            call.debug('methodSetting "%s" is correct (%s)', 'metricsEnabled',
-                       True)
+            call.debug('Adding new methodSetting "%s" for %s value %s',
+                       'dataTraceEnabled', '*/*', False),
+            call.debug('Updating methodSetting "%s" for %s from %s to %s',
+                       'loggingLevel', '*/*', 'OFF', 'INFO'),
+            call.debug('methodSetting "%s" for %s is correct (%s)',
+                       'metricsEnabled', '*/*', True),
+            call.debug('Adding new methodSetting "%s" for %s value %s',
+                       'throttlingBurstLimit', '~1foo/POST', 500)
         ]
 
     def test_set_method_settings_initial(self):
         self.conf['api_gateway_method_settings'] = {
             'loggingLevel': 'INFO',
-            'dataTraceEnabled': False
+            'dataTraceEnabled': False,
+            'cachingEnabled': True
         }
+        self.conf['endpoints'] = {'foo': {'method': 'POST', 'queues': ['q1']}}
         stage = {
             'methodSettings': {}
         }
         with patch('%s.get_api_id' % pb, autospec=True) as mock_id:
             with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-                with patch('%s.client' % pbm, autospec=True) as mock_client:
-                    with patch('%s._add_method_setting' % pb,
-                               autospec=True) as mock_add:
+                with patch('%s.get_client' % pbm, autospec=True) as mock_client:
+                    with patch('%s._update_method_settings' % pb,
+                               autospec=True) as mock_update:
                         mock_id.return_value = 'myapiid'
                         mock_client.return_value.get_stage.return_value = stage
                         self.cls.set_method_settings()
-        assert self.cls.config.mock_calls == [
-            call.get('api_gateway_method_settings')
-        ]
-        assert mock_id.mock_calls == [call(self.cls)]
-        assert mock_client.mock_calls == [
-            call('apigateway'),
-            call().get_stage(restApiId='myapiid', stageName='mystagename')
-        ]
-        assert mock_add.mock_calls == [
+        assert mock_update.mock_calls == [
             call(self.cls, mock_client.return_value, 'myapiid', 'mystagename',
-                 '/*/*/logging/dataTrace', 'dataTraceEnabled', False,
-                 'replace'),
-            call(self.cls, mock_client.return_value, 'myapiid', 'mystagename',
-                 '/*/*/logging/loglevel', 'loggingLevel', 'INFO', 'replace'),
+                 [
+                     ('*/*', 'cachingEnabled', True),
+                     ('*/*', 'dataTraceEnabled', False),
+                     ('*/*', 'loggingLevel', 'INFO')
+                 ])
         ]
         assert mock_logger.mock_calls == [
             call.info('Setting API Gateway Stage methodSettings'),
@@ -698,73 +931,139 @@ class TestAWSInfo(object):
                        'myapiid', 'mystagename'),
             call.debug("Got stage config: \n%s",
                        pformat({'methodSettings': {}})),
-            call.debug('Adding new methodSetting "%s" value %s',
-                       'dataTraceEnabled', False),
-            call.debug('Adding new methodSetting "%s" value %s',
-                       'loggingLevel', 'INFO')
+            call.debug('Adding new methodSetting "%s" for %s value %s',
+                       'cachingEnabled', '*/*', True),
+            call.debug('Adding new methodSetting "%s" for %s value %s',
+                       'dataTraceEnabled', '*/*', False),
+            call.debug('Adding new methodSetting "%s" for %s value %s',
+                       'loggingLevel', '*/*', 'INFO'),
+            call.warning('methodSettings enable caching, but stage %s has no '
+                         'cache cluster enabled', 'mystagename')
+        ]
+
+    def test_set_method_settings_correct(self):
+        self.conf['endpoints'] = {
+            'foo': {
+                'method': 'get',
+                'queues': ['q1'],
+                'method_settings': {'metricsEnabled': True}
+            }
+        }
+        stage = {
+            'methodSettings': {
+                '~1foo/GET': {'metricsEnabled': True}
+            }
+        }
+        with patch('%s.get_api_id' % pb, autospec=True) as mock_id:
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                with patch('%s.get_client' % pbm, autospec=True) as mock_client:
+                    with patch('%s._update_method_settings' % pb,
+                               autospec=True) as mock_update:
+                        mock_id.return_value = 'myapiid'
+                        mock_client.return_value.get_stage.return_value = stage
+                        self.cls.set_method_settings()
+        assert mock_update.mock_calls == []
+        assert mock_logger.mock_calls[-2:] == [
+            call.debug('methodSetting "%s" for %s is correct (%s)',
+                       'metricsEnabled', '~1foo/GET', True),
+            call.info('All methodSettings are correct')
+        ]
+
+    def test_set_method_settings_api_id(self):
+        self.conf['endpoints'] = {
+            'foo': {
+                'method': 'get',
+                'queues': ['q1'],
+                'method_settings': {'metricsEnabled': True}
+            }
+        }
+        stage = {
+            'methodSettings': {
+                '~1foo/GET': {'metricsEnabled': True}
+            }
+        }
+        with patch('%s.get_api_id' % pb, autospec=True) as mock_id:
+            with patch('%s.logger' % pbm, autospec=True):
+                with patch('%s.get_client' % pbm, autospec=True) as mock_client:
+                    mock_client.return_value.get_stage.return_value = stage
+                    self.cls.set_method_settings(api_id='tfapiid')
+        assert mock_id.mock_calls == []
+        assert mock_client.mock_calls == [
+            call('apigateway', None),
+            call().get_stage(restApiId='tfapiid', stageName='mystagename')
         ]
 
     def test_set_method_settings_no_config(self):
+        self.conf['endpoints'] = {'foo': {'method': 'POST', 'queues': ['q1']}}
         with patch('%s.get_api_id' % pb, autospec=True) as mock_id:
             with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-                with patch('%s.client' % pbm, autospec=True) as mock_client:
-                    with patch('%s._add_method_setting' % pb,
-                               autospec=True) as mock_add:
+                with patch('%s.get_client' % pbm, autospec=True) as mock_client:
+                    with patch('%s._update_method_settings' % pb,
+                               autospec=True) as mock_update:
                         mock_id.return_value = 'myapiid'
                         mock_client.return_value.get_stage.return_value = None
                         self.cls.set_method_settings()
         assert self.cls.config.mock_calls == [
-            call.get('api_gateway_method_settings')
+            call.get('aws_region'),
+            call.get('api_gateway_method_settings'),
+            call.get('endpoints')
         ]
         assert mock_id.mock_calls == []
         assert mock_client.mock_calls == []
-        assert mock_add.mock_calls == []
+        assert mock_update.mock_calls == []
         assert mock_logger.mock_calls == [
             call.debug('api_gateway_method_settings not set in config')
         ]
 
-    def test_add_method_setting_success(self):
+    def test_update_method_settings_success(self):
         resp = {
             'methodSettings': {
                 '*/*': {
                     'foo': 'bar',
                     'loggingLevel': 'INFO'
+                },
+                '~1foo/POST': {
+                    'throttlingBurstLimit': 500
                 }
             }
         }
         mock_conn = Mock()
         mock_conn.update_stage.return_value = resp
+        ops = [
+            {
+                'op': 'replace',
+                'path': '/*/*/logging/loglevel',
+                'value': 'INFO'
+            },
+            {
+                'op': 'replace',
+                'path': '/~1foo/POST/throttling/burstLimit',
+                'value': '500'
+            }
+        ]
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-            self.cls._add_method_setting(
+            self.cls._update_method_settings(
                 mock_conn,
                 'myapiid',
                 'mysname',
-                '/*/*/logging/logLevel',
-                'loggingLevel',
-                'INFO',
-                'add'
+                [
+                    ('*/*', 'loggingLevel', 'INFO'),
+                    ('~1foo/POST', 'throttlingBurstLimit', 500)
+                ]
             )
         assert mock_conn.mock_calls == [
             call.update_stage(
                 restApiId='myapiid',
                 stageName='mysname',
-                patchOperations=[
-                    {
-                        'op': 'add',
-                        'path': '/*/*/logging/logLevel',
-                        'value': 'INFO'
-                    }
-                ]
+                patchOperations=ops
             )
         ]
         assert mock_logger.mock_calls == [
-            call.debug('update_stage PATCH %s on %s; value=%s', 'add',
-                       '/*/*/logging/logLevel', 'INFO'),
-            call.info('Successfully updated methodSetting %s to %s',
-                      'loggingLevel', 'INFO')
+            call.debug('update_stage PATCH with %d operations: %s', 2, ops),
+            call.info('Successfully updated %d methodSettings', 2)
         ]
 
-    def test_add_method_setting_failure(self):
+    def test_update_method_settings_failure(self):
         resp = {
             'methodSettings': {
                 '*/*': {
@@ -776,32 +1075,21 @@ class TestAWSInfo(object):
         mock_conn = Mock()
         mock_conn.update_stage.return_value = resp
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-            self.cls._add_method_setting(
+            self.cls._update_method_settings(
                 mock_conn,
                 'myapiid',
                 'mysname',
-                '/*/*/logging/logLevel',
-                'loggingLevel',
-                'INFO',
-                'replace'
-            )
-        assert mock_conn.mock_calls == [
-            call.update_stage(
-                restApiId='myapiid',
-                stageName='mysname',
-                patchOperations=[
-                    {
-                        'op': 'replace',
-                        'path': '/*/*/logging/logLevel',
-                        'value': 'INFO'
-                    }
+                [
+                    ('*/*', 'loggingLevel', 'INFO'),
+                    ('~1foo/POST', 'cacheTtlInSeconds', 60)
                 ]
             )
-        ]
-        assert mock_logger.mock_calls == [
-            call.debug('update_stage PATCH %s on %s; value=%s', 'replace',
-                       '/*/*/logging/logLevel', 'INFO'),
-            call.error('methodSettings PATCH expected to update %s to %s,but '
-                       'instead found value as %s', 'loggingLevel', 'INFO',
-                       'ERROR')
+        assert len(mock_conn.mock_calls) == 1
+        assert mock_logger.mock_calls[1:] == [
+            call.error('methodSettings PATCH expected to update %s for %s to '
+                       '%s, but instead found value as %s', 'loggingLevel',
+                       '*/*', 'INFO', 'ERROR'),
+            call.error('methodSettings PATCH expected to update %s for %s to '
+                       '%s, but instead found value as %s',
+                       'cacheTtlInSeconds', '~1foo/POST', 60, None)
         ]
@@ -83,6 +83,22 @@ class TestConfig(object):
         ]
         assert mock_v.mock_calls == [call(cls)]
 
+    def test_from_dict(self):
+        conf = {'my': 'config', 'endpoints': {'a': {'method': 'GET'}}}
+        with patch('%s._load_config' % pb, autospec=True) as mock_load:
+            with patch('%s._validate_config' % pb, autospec=True) as mock_v:
+                cls = Config.from_dict(conf)
+        assert cls.path is None
+        assert cls._config == conf
+        conf['endpoints']['a']['method'] = 'POST'
+        assert cls._config['endpoints']['a']['method'] == 'GET'
+        assert mock_load.mock_calls == []
+        assert mock_v.mock_calls == [call(cls)]
+
+    def test_from_dict_invalid(self):
+        with pytest.raises(InvalidConfigError):
+            Config.from_dict({'endpoints': {}})
+
     def test_load_config(self):
         with patch('%s.read_json_file' % pbm, autospec=True) as mock_read:
             with patch('%s.logger' % pbm, autospec=True) as mock_logger:
@@ -120,6 +136,46 @@ class TestConfig(object):
         self.cls._config = {'deployment_stage_name': 'foo'}
         assert self.cls.stage_name == 'foo'
 
+    def test_api_type(self):
+        self.cls._config = {}
+        assert self.cls.api_type == 'rest'
+
+    def test_api_type_custom(self):
+        self.cls._config = {'api_type': 'http'}
+        assert self.cls.api_type == 'http'
+
+    def test_api_definition(self):
+        self.cls._config = {}
+        assert self.cls.api_definition == 'resources'
+
+    def test_api_definition_custom(self):
+        self.cls._config = {'api_definition': 'openapi'}
+        assert self.cls.api_definition == 'openapi'
+
+    def test_api_layout(self):
+        self.cls._config = {}
+        assert self.cls.api_layout == 'endpoints'
+
+    def test_api_layout_custom(self):
+        self.cls._config = {'api_layout': 'proxy'}
+        assert self.cls.api_layout == 'proxy'
+
+    def test_json_sort_keys(self):
+        self.cls._config = {}
+        assert self.cls.json_sort_keys is True
+
+    def test_json_sort_keys_false(self):
+        self.cls._config = {'json_sort_keys': False}
+        assert self.cls.json_sort_keys is False
+
+    def test_lambda_runtime(self):
+        self.cls._config = {}
+        assert self.cls.lambda_runtime == 'python2.7'
+
+    def test_lambda_runtime_custom(self):
+        self.cls._config = {'lambda_runtime': 'python3.12'}
+        assert self.cls.lambda_runtime == 'python3.12'
+
     def test_logging_level(self):
         self.cls._config = {}
         assert self.cls.logging_level == 'INFO'
@@ -174,8 +230,8 @@ class TestConfig(object):
         with pytest.raises(InvalidConfigError) as excinfo:
             self.cls._validate_config()
         assert excinfo.value._orig_message == 'Endpoint other_resource_path ' \
-                                              'configuration keys must be ' \
-                                              '"method" and "queues".'
+                                              'configuration must include ' \
+                                              '"method" and "queues" keys.'
 
     def test_validate_endpoint_additional_key(self):
         self.cls._config = deepcopy(self.cls._example)
@@ -183,8 +239,216 @@ class TestConfig(object):
         with pytest.raises(InvalidConfigError) as excinfo:
             self.cls._validate_config()
         assert excinfo.value._orig_message == 'Endpoint other_resource_path ' \
-                                              'configuration keys must be ' \
-                                              '"method" and "queues".'
+                                              'has invalid configuration ' \
+                                              'keys: %s' % ['foo']
+
+    def test_validate_endpoint_direct(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['endpoints']['other_resource_path'] = {
+            'method': 'GET',
+            'queues': ['queueName2'],
+            'integration': 'direct'
+        }
+        self.cls._validate_config()
+
+    def test_validate_endpoint_bad_integration(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['endpoints']['other_resource_path'][
+            'integration'] = 'foo'
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'Endpoint other_resource_path ' \
+                                              'integration foo not allowed ' \
+                                              '(allowed integrations: ' \
+                                              '%s)' % ['lambda', 'direct']
+
+    def test_validate_endpoint_direct_multiple_queues(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['endpoints']['other_resource_path'][
+            'integration'] = 'direct'
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'Endpoint other_resource_path ' \
+                                              'uses "direct" integration ' \
+                                              'and must have exactly one queue'
+
+    def test_validate_endpoint_sns_fanout(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['endpoints']['other_resource_path'][
+            'sns_fanout'] = True
+        self.cls._config['endpoints']['other_resource_path'][
+            'sns_filter_policies'] = {'queueName3': {'data': {'a': ['b']}}}
+        self.cls._validate_config()
+
+    def test_validate_endpoint_sns_fanout_not_bool(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['endpoints']['other_resource_path'][
+            'sns_fanout'] = 'yes'
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'Endpoint other_resource_path ' \
+                                              'sns_fanout must be omitted ' \
+                                              'or a boolean'
+
+    def test_validate_endpoint_sns_fanout_direct(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['endpoints']['other_resource_path'] = {
+            'method': 'GET',
+            'queues': ['queueName2'],
+            'integration': 'direct',
+            'sns_fanout': True
+        }
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'Endpoint other_resource_path ' \
+                                              'cannot use sns_fanout with ' \
+                                              '"direct" integration'
+
+    def test_validate_endpoint_filter_policies_no_fanout(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['endpoints']['other_resource_path'][
+            'sns_filter_policies'] = {'queueName3': {'data': {'a': ['b']}}}
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'Endpoint other_resource_path ' \
+                                              'sns_filter_policies requires ' \
+                                              'sns_fanout'
+
+    def test_validate_endpoint_filter_policies_bad_queue(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['endpoints']['other_resource_path'][
+            'sns_fanout'] = True
+        self.cls._config['endpoints']['other_resource_path'][
+            'sns_filter_policies'] = {'foo': {'data': {'a': ['b']}}}
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'Endpoint other_resource_path ' \
+                                              'sns_filter_policies has ' \
+                                              'policies for queues not in ' \
+                                              'its "queues" list: ' \
+                                              "['foo']"
+
+    def test_validate_bad_api_type(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['api_type'] = 'foo'
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'api_type must be one of ' \
+                                              "['rest', 'http']"
+
+    def test_validate_http_api_direct(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['api_type'] = 'http'
+        self.cls._config['endpoints']['other_resource_path'] = {
+            'method': 'GET',
+            'queues': ['queueName2'],
+            'integration': 'direct'
+        }
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'Endpoint other_resource_path ' \
+                                              '"direct" integration is not ' \
+                                              'supported with an "http" ' \
+                                              'api_type'
+
+    def test_validate_bad_api_definition(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['api_definition'] = 'foo'
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'api_definition must be one ' \
+                                              "of ['resources', 'openapi']"
+
+    def test_validate_openapi(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['api_definition'] = 'openapi'
+        self.cls._validate_config()
+
+    def test_validate_openapi_http(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['api_definition'] = 'openapi'
+        self.cls._config['api_type'] = 'http'
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'api_definition "openapi" is ' \
+                                              'not supported with an "http" ' \
+                                              'api_type'
+
+    def test_validate_bad_api_layout(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['api_layout'] = 'foo'
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'api_layout must be one of ' \
+                                              "['endpoints', 'proxy']"
+
+    def test_validate_proxy_layout(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['api_layout'] = 'proxy'
+        self.cls._validate_config()
+
+    def test_validate_proxy_layout_direct(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['api_layout'] = 'proxy'
+        self.cls._config['endpoints']['other_resource_path'] = {
+            'method': 'GET',
+            'queues': ['queueName2'],
+            'integration': 'direct'
+        }
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'Endpoint other_resource_path ' \
+                                              '"direct" integration is not ' \
+                                              'supported with a "proxy" ' \
+                                              'api_layout'
+
+    def test_validate_proxy_layout_async(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['api_layout'] = 'proxy'
+        self.cls._config['endpoints']['other_resource_path']['async'] = True
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'Endpoint other_resource_path ' \
+                                              'async is not supported with ' \
+                                              'a "proxy" api_layout'
+
+    def test_validate_endpoint_async(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['endpoints']['other_resource_path']['async'] = True
+        self.cls._validate_config()
+
+    def test_validate_endpoint_async_not_bool(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['endpoints']['other_resource_path']['async'] = 'yes'
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'Endpoint other_resource_path ' \
+                                              'async must be omitted or a ' \
+                                              'boolean'
+
+    def test_validate_endpoint_async_direct(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['endpoints']['other_resource_path'] = {
+            'method': 'GET',
+            'queues': ['queueName2'],
+            'integration': 'direct',
+            'async': True
+        }
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'Endpoint other_resource_path ' \
+                                              'cannot use async with ' \
+                                              '"direct" integration'
+
+    def test_validate_http_api_async(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['api_type'] = 'http'
+        self.cls._config['endpoints']['other_resource_path']['async'] = True
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'Endpoint other_resource_path ' \
+                                              'async is not supported with ' \
+                                              'an "http" api_type'
 
     def test_validate_bad_logging_level(self):
         self.cls._config = deepcopy(self.cls._example)
@@ -196,6 +460,328 @@ class TestConfig(object):
                                                       'WARNING', 'INFO',
                                                       'DEBUG', 'NOTSET']
 
+    def test_validate_bad_json_sort_keys(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['json_sort_keys'] = 'foo'
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'json_sort_keys must be ' \
+                                              'omitted or a boolean'
+
+    def test_validate_bad_lambda_precompile(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['lambda_precompile'] = 'yes'
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'lambda_precompile must be ' \
+                                              'omitted or a boolean'
+
+    def test_validate_bad_sns_fanout_queue_policies(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['sns_fanout_queue_policies'] = 'yes'
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'sns_fanout_queue_policies ' \
+                                              'must be omitted or a boolean'
+
+    def test_validate_terraform_module(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['terraform_module'] = True
+        self.cls._validate_config()
+
+    def test_validate_bad_terraform_module(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['terraform_module'] = 'yes'
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'terraform_module must be ' \
+                                              'omitted or a boolean'
+
+    def test_validate_terraform_module_proxy(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['terraform_module'] = True
+        self.cls._config['api_layout'] = 'proxy'
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'terraform_module is only ' \
+                                              'supported with a "rest" ' \
+                                              'api_type, "resources" ' \
+                                              'api_definition and ' \
+                                              '"endpoints" api_layout'
+
+    def test_validate_regions(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['regions'] = ['us-east-1', 'eu-west-1']
+        self.cls._config['terraform_remote_state']['config']['key'] = 'k'
+        self.cls._config['queue_region'] = 'us-east-1'
+        self.cls._config['custom_domain'] = {
+            'domain_name': 'hooks.example.com',
+            'route53_zone_id': 'Z123',
+            'certificate_arns': {'us-east-1': 'arn1', 'eu-west-1': 'arn2'}
+        }
+        self.cls._validate_config()
+
+    def test_validate_bad_regions(self):
+        for regions in [[], 'us-east-1', ['us-east-1', 'us-east-1'], [2]]:
+            self.cls._config = deepcopy(self.cls._example)
+            self.cls._config['regions'] = regions
+            with pytest.raises(InvalidConfigError) as excinfo:
+                self.cls._validate_config()
+            assert excinfo.value._orig_message == 'regions must be omitted ' \
+                                                  'or a list of unique ' \
+                                                  'region names'
+
+    def test_validate_regions_remote_state_no_key(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['regions'] = ['us-east-1']
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'terraform_remote_state config ' \
+                                              'must have a "key" or "path" ' \
+                                              'to deploy to multiple regions'
+
+    def test_validate_bad_queue_region(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['queue_region'] = ['us-east-1']
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'queue_region must be omitted ' \
+                                              'or a region name'
+
+    def test_validate_queue_region_sns_fanout(self):
+        self.cls._config = deepcopy(self.cls._example)
+        del self.cls._config['terraform_remote_state']
+        self.cls._config['regions'] = ['us-east-1', 'eu-west-1']
+        self.cls._config['queue_region'] = 'us-east-1'
+        self.cls._config['endpoints']['other_resource_path'][
+            'sns_fanout'] = True
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'Endpoint other_resource_path ' \
+                                              'sns_fanout is not supported ' \
+                                              'with queue_region and ' \
+                                              'multiple regions'
+
+    def test_validate_custom_domain_http(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['api_type'] = 'http'
+        self.cls._config['api_gateway_method_settings'] = {}
+        self.cls._config['custom_domain'] = {}
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'custom_domain is only ' \
+                                              'supported with a "rest" ' \
+                                              'api_type'
+
+    def test_validate_bad_custom_domain(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['custom_domain'] = {'domain_name': 'foo'}
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'custom_domain must be a dict ' \
+                                              'with domain_name, ' \
+                                              'route53_zone_id and ' \
+                                              'certificate_arns keys'
+
+    def test_validate_custom_domain_missing_cert(self):
+        self.cls._config = deepcopy(self.cls._example)
+        del self.cls._config['terraform_remote_state']
+        self.cls._config['regions'] = ['us-east-1', 'eu-west-1']
+        self.cls._config['custom_domain'] = {
+            'domain_name': 'hooks.example.com',
+            'route53_zone_id': 'Z123',
+            'certificate_arns': {'us-east-1': 'arn1'}
+        }
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'custom_domain ' \
+                                              'certificate_arns has no ' \
+                                              'certificate for region ' \
+                                              'eu-west-1'
+
+    def test_validate_aws_account_region(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['aws_account_id'] = '012345678901'
+        self.cls._config['aws_region'] = 'us-west-2'
+        self.cls._validate_config()
+
+    def test_validate_bad_aws_account_id(self):
+        for val in [12345678901, '12345', 'abcdefghijkl']:
+            self.cls._config = deepcopy(self.cls._example)
+            self.cls._config['aws_account_id'] = val
+            with pytest.raises(InvalidConfigError) as excinfo:
+                self.cls._validate_config()
+            assert excinfo.value._orig_message == 'aws_account_id must be ' \
+                                                  'omitted or a 12-digit ' \
+                                                  'string'
+
+    def test_validate_bad_aws_region(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['aws_region'] = ['us-east-1']
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'aws_region must be omitted or ' \
+                                              'a region name'
+
+    def test_validate_aws_region_regions(self):
+        self.cls._config = deepcopy(self.cls._example)
+        del self.cls._config['terraform_remote_state']
+        self.cls._config['aws_region'] = 'us-east-1'
+        self.cls._config['regions'] = ['us-east-1', 'eu-west-1']
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'aws_region cannot be used ' \
+                                              'with regions'
+
+    def test_region_remote_state(self):
+        self.cls._config = {
+            'terraform_remote_state': {
+                'backend': 's3',
+                'config': {'bucket': 'b', 'key': 'w2l2s.tfstate'}
+            }
+        }
+        assert self.cls.region_remote_state('eu-west-1') == {
+            'backend': 's3',
+            'config': {'bucket': 'b', 'key': 'eu-west-1/w2l2s.tfstate'}
+        }
+        # the configuration itself is unchanged
+        assert self.cls._config['terraform_remote_state']['config'][
+            'key'] == 'w2l2s.tfstate'
+
+    def test_region_remote_state_path(self):
+        self.cls._config = {
+            'terraform_remote_state': {
+                'backend': 'consul',
+                'config': {'path': 'w2l2s'}
+            }
+        }
+        assert self.cls.region_remote_state('us-east-1') == {
+            'backend': 'consul',
+            'config': {'path': 'us-east-1/w2l2s'}
+        }
+
+    def test_region_remote_state_none(self):
+        self.cls._config = {}
+        assert self.cls.region_remote_state('us-east-1') is None
+
+    def test_queue_region(self):
+        self.cls._config = {'queue_region': 'us-west-2'}
+        assert self.cls.queue_region == 'us-west-2'
+
+    def test_validate_lambda_layer_no_vendor_dir(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['lambda_layer'] = True
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'lambda_layer requires ' \
+                                              'lambda_vendor_dir'
+
+    def test_validate_bad_lambda_botocore_services(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['lambda_botocore_services'] = 'sqs'
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'lambda_botocore_services ' \
+                                              'must be omitted or a list'
+
+    def test_validate_bad_terraform_timeout(self):
+        for val in ['10', 0, -1, True]:
+            self.cls._config = deepcopy(self.cls._example)
+            self.cls._config['terraform_timeout'] = val
+            with pytest.raises(InvalidConfigError) as excinfo:
+                self.cls._validate_config()
+            assert excinfo.value._orig_message == 'terraform_timeout must ' \
+                                                  'be omitted or a positive ' \
+                                                  'number of seconds'
+
+    def test_validate_bad_terraform_plugin_cache_dir(self):
+        for val in [True, 1, ['foo']]:
+            self.cls._config = deepcopy(self.cls._example)
+            self.cls._config['terraform_plugin_cache_dir'] = val
+            with pytest.raises(InvalidConfigError) as excinfo:
+                self.cls._validate_config()
+            assert excinfo.value._orig_message == 'terraform_plugin_cache_' \
+                                                  'dir must be omitted, a ' \
+                                                  'string or false'
+        for val in [None, False, '/tmp/plugins']:
+            self.cls._config = deepcopy(self.cls._example)
+            self.cls._config['terraform_plugin_cache_dir'] = val
+            self.cls._validate_config()
+
+    def test_validate_endpoint_method_settings(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['endpoints']['some_resource_path'][
+            'method_settings'] = {
+                'throttlingBurstLimit': 500,
+                'throttlingRateLimit': 250.5,
+                'cachingEnabled': True,
+                'cacheTtlInSeconds': 60
+            }
+        self.cls._validate_config()
+        assert self.cls.endpoint_method_settings == {
+            'some_resource_path': {
+                'throttlingBurstLimit': 500,
+                'throttlingRateLimit': 250.5,
+                'cachingEnabled': True,
+                'cacheTtlInSeconds': 60
+            }
+        }
+
+    def test_validate_endpoint_method_settings_not_dict(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['endpoints']['some_resource_path'][
+            'method_settings'] = ['foo']
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'Endpoint some_resource_path ' \
+                                              'method_settings must be a dict'
+
+    def test_validate_endpoint_method_settings_bad(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['endpoints']['some_resource_path'][
+            'method_settings'] = {'cacheTtlInSeconds': 'foo'}
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'Endpoint some_resource_path ' \
+                                              'method_settings ' \
+                                              'cacheTtlInSeconds key must ' \
+                                              'be omitted, null or an integer'
+
+    def test_validate_endpoint_method_settings_bad_keys(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['endpoints']['some_resource_path'][
+            'method_settings'] = {'foo': 1}
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'Invalid keys in "Endpoint ' \
+                                              'some_resource_path method_' \
+                                              'settings": %s' % ['foo']
+
+    def test_validate_endpoint_method_settings_proxy(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['api_layout'] = 'proxy'
+        self.cls._config['endpoints']['some_resource_path'][
+            'method_settings'] = {'metricsEnabled': True}
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'Endpoint some_resource_path ' \
+                                              'method_settings are not ' \
+                                              'supported with a "proxy" ' \
+                                              'api_layout'
+
+    def test_endpoint_method_settings_none(self):
+        self.cls._config = deepcopy(self.cls._example)
+        assert self.cls.endpoint_method_settings == {}
+
+    def test_validate_method_settings_caching_enabled(self):
+        self.cls._config = deepcopy(self.cls._example)
+        self.cls._config['api_gateway_method_settings']['cachingEnabled'] = 'y'
+        with pytest.raises(InvalidConfigError) as excinfo:
+            self.cls._validate_config()
+        assert excinfo.value._orig_message == 'api_gateway_method_settings ' \
+                                              'cachingEnabled key must be ' \
+                                              'omitted or a boolean'
+
     def test_validate_method_settings_bad_keys(self):
         self.cls._config = deepcopy(self.cls._example)
         self.cls._config['api_gateway_method_settings']['foo'] = 'bar'
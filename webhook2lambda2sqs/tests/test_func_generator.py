@@ -65,6 +65,8 @@ class TestLambdaFuncGenerator(object):
         config.get.side_effect = se_get
         type(config).func_name = 'webhook2lambda2sqs'
         type(config).logging_level = 'WARN'
+        type(config).json_sort_keys = False
+        type(config).queue_region = None
         self.cls = LambdaFuncGenerator(config)
 
     def test_init(self):
@@ -94,10 +96,19 @@ class TestLambdaFuncGenerator(object):
         ]
         src = src + expected
         expected_lines = ''.join(expected)
-        with patch('%s.getsourcelines' % pbm) as mock_gsl:
-            mock_gsl.return_value = (src, 0)
+        with patch('%s.pkgutil.get_data' % pbm) as mock_get_data:
+            mock_get_data.return_value = ''.join(src).encode('utf-8')
             res = self.cls._get_source()
         assert res == expected_lines
+        assert mock_get_data.mock_calls == [
+            call('webhook2lambda2sqs', 'lambda_func.py')
+        ]
+
+    def test_get_source_package_data(self):
+        res = self.cls._get_source()
+        assert res.startswith('\nimport logging\n')
+        assert 'endpoints = {}\n' in res
+        assert 'def webhook2lambda2sqs_handler(event, context):' in res
 
     def test_docstring(self):
         s = '"""' + "\n"
@@ -121,13 +132,15 @@ class TestLambdaFuncGenerator(object):
         src = "import foo\n\n"
         src += "logger.setLevel(logging.INFO)\n\n"
         src += "endpoints = {}\n"
+        src += "json_sort_keys = True\n"
         src += "\ndef foo():\n"
         src += "    return 1\n"
         expected = "mydocstring\n"
         expected += "import foo\n\n"
         expected += "logger.setLevel(logging.WARN)\n\n"
         expected += "endpoints = myconfig\n"
-        expected += "\n\ndef foo():\n"
+        expected += "\njson_sort_keys = False\n"
+        expected += "\ndef foo():\n"
         expected += "    return 1\n"
         with patch('%s._config_src' % pb, new_callable=PropertyMock) as mock_cs:
             with patch('%s._docstring' % pb, new_callable=PropertyMock) as m_ds:
@@ -141,3 +154,17 @@ class TestLambdaFuncGenerator(object):
         print('### expected ###')
         print(expected)
         assert res == expected
+
+    def test_generate_queue_region(self):
+        type(self.cls.config).queue_region = 'us-west-2'
+        src = "json_sort_keys = True\n"
+        src += "queue_region = None\n"
+        with patch('%s._config_src' % pb, new_callable=PropertyMock) as mock_cs:
+            with patch('%s._docstring' % pb, new_callable=PropertyMock) as m_ds:
+                with patch('%s._get_source' % pb) as mock_get_src:
+                    mock_cs.return_value = "myconfig\n"
+                    m_ds.return_value = "mydocstring\n"
+                    mock_get_src.return_value = src
+                    res = self.cls.generate()
+        assert res == "mydocstring\njson_sort_keys = False\n" \
+                      "queue_region = 'us-west-2'\n"
@@ -40,10 +40,14 @@ import sys
 from copy import deepcopy
 import pytest
 import json
+import base64
 
 from webhook2lambda2sqs.lambda_func import (
     webhook2lambda2sqs_handler, handle_event, serializable_dict,
-    try_enqueue, queues_for_endpoint, msg_body_for_event
+    try_enqueue, queues_for_endpoint, msg_body_for_event,
+    sns_topic_for_endpoint, handle_sns_fanout, is_http_api_event,
+    http_api_handler, event_from_http_api, json_dumps, endpoint_name,
+    endpoint_is_async
 )
 from webhook2lambda2sqs.tests.support import exc_msg
 
@@ -180,6 +184,35 @@ class TestLambdaFunc(object):
                        {'foo': 'bar', 'SQSMessageIds': []})
         ]
 
+    def test_webhook2lambda2sqs_handler_async_partial(self):
+        self.endpoints['foo']['async'] = True
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch('%s.handle_event' % pbm, autospec=True) as mock_handle:
+                mock_handle.return_value = {
+                    'status': 'partial',
+                    'message': 'enqueued 1 messages; 1 failed',
+                    'SQSMessageIds': [1]
+                }
+                with patch('%s.endpoints' % pbm, self.endpoints):
+                    with pytest.raises(Exception) as excinfo:
+                        webhook2lambda2sqs_handler(self.mock_event,
+                                                   self.mock_context)
+        assert exc_msg(excinfo.value) == 'Failed enqueueing some messages: ' \
+                                         'enqueued 1 messages; 1 failed'
+
+    def test_webhook2lambda2sqs_handler_partial(self):
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch('%s.handle_event' % pbm, autospec=True) as mock_handle:
+                mock_handle.return_value = {
+                    'status': 'partial',
+                    'message': 'enqueued 1 messages; 1 failed',
+                    'SQSMessageIds': [1]
+                }
+                with patch('%s.endpoints' % pbm, self.endpoints):
+                    res = webhook2lambda2sqs_handler(self.mock_event,
+                                                     self.mock_context)
+        assert res == mock_handle.return_value
+
     def test_webhook2lambda2sqs_handler_exception(self):
 
         def se_exc(*args):
@@ -201,6 +234,120 @@ class TestLambdaFunc(object):
                        self.mock_event, vars(self.mock_context), exc_info=1)
         ]
 
+    def http_api_event(self):
+        return {
+            'version': '2.0',
+            'routeKey': 'POST /bar',
+            'rawPath': '/webhook2lambda2sqs/bar',
+            'rawQueryString': 'a=b',
+            'headers': {'content-type': 'application/json'},
+            'queryStringParameters': {'a': 'b'},
+            'requestContext': {
+                'accountId': '123456789012',
+                'apiId': 'api123',
+                'http': {
+                    'method': 'POST',
+                    'path': '/webhook2lambda2sqs/bar',
+                    'sourceIp': '24.98.0.0',
+                    'userAgent': 'curl/7.49.1'
+                },
+                'requestId': 'reqid',
+                'stage': 'webhook2lambda2sqs'
+            },
+            'body': '{"foo": "bar"}',
+            'isBase64Encoded': False
+        }
+
+    def test_is_http_api_event(self):
+        assert is_http_api_event(self.http_api_event()) is True
+        assert is_http_api_event(self.mock_event) is False
+
+    def test_handler_http_api(self):
+        event = self.http_api_event()
+        with patch('%s.http_api_handler' % pbm, autospec=True) as mock_h:
+            with patch('%s.handle_event' % pbm, autospec=True) as mock_handle:
+                mock_h.return_value = {'statusCode': 202}
+                res = webhook2lambda2sqs_handler(event, self.mock_context)
+        assert res == {'statusCode': 202}
+        assert mock_h.mock_calls == [call(event, self.mock_context)]
+        assert mock_handle.mock_calls == []
+
+    def test_event_from_http_api(self):
+        res = event_from_http_api(self.http_api_event())
+        assert res == {
+            'body-json': {'foo': 'bar'},
+            'params': {
+                'header': {'content-type': 'application/json'},
+                'path': {},
+                'querystring': {'a': 'b'}
+            },
+            'stage-variables': {},
+            'context': {
+                'account-id': '123456789012',
+                'api-id': 'api123',
+                'http-method': 'POST',
+                'stage': 'webhook2lambda2sqs',
+                'source-ip': '24.98.0.0',
+                'user-agent': 'curl/7.49.1',
+                'request-id': 'reqid',
+                'resource-path': '/bar'
+            }
+        }
+        with patch('%s.endpoints' % pbm, self.endpoints):
+            assert queues_for_endpoint(res) == ['q2']
+
+    def test_event_from_http_api_base64_not_json(self):
+        event = self.http_api_event()
+        event['body'] = base64.b64encode(b'foo=bar').decode('utf-8')
+        event['isBase64Encoded'] = True
+        del event['queryStringParameters']
+        res = event_from_http_api(event)
+        assert res['body-json'] == 'foo=bar'
+        assert res['params']['querystring'] == {}
+
+    def test_http_api_handler(self):
+        event = self.http_api_event()
+        with patch('%s.handle_event' % pbm, autospec=True) as mock_handle:
+            with patch('%s.logger' % pbm, autospec=True):
+                mock_handle.return_value = {
+                    'status': 'success',
+                    'message': 'enqueued 1 messages',
+                    'SQSMessageIds': ['msgid']
+                }
+                res = http_api_handler(event, self.mock_context)
+        assert mock_handle.mock_calls == [
+            call(event_from_http_api(event), self.mock_context)
+        ]
+        assert res['statusCode'] == 202
+        assert res['headers'] == {'Content-Type': 'application/json'}
+        assert json.loads(res['body']) == {
+            'status': 'success',
+            'message': 'enqueued 1 messages',
+            'SQSMessageIds': ['msgid'],
+            'request_id': 'reqid'
+        }
+
+    def test_http_api_handler_no_updates(self):
+        event = self.http_api_event()
+        with patch('%s.handle_event' % pbm, autospec=True) as mock_handle:
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                mock_handle.return_value = {
+                    'status': 'success',
+                    'message': 'enqueued 0 messages',
+                    'SQSMessageIds': []
+                }
+                res = http_api_handler(event, self.mock_context)
+        assert res['statusCode'] == 500
+        assert json.loads(res['body']) == {
+            'status': 'error',
+            'message': 'Exception: Failed enqueueing all messages',
+            'request_id': 'reqid'
+        }
+        assert mock_logger.mock_calls == [
+            call.error('Error handling event; event=%s context=%s',
+                       event, vars(self.mock_context), exc_info=1)
+        ]
+
     def test_queues_for_endpoint(self):
         with patch('%s.endpoints' % pbm, self.endpoints):
             res = queues_for_endpoint(self.mock_event)
@@ -213,13 +360,76 @@ class TestLambdaFunc(object):
                 queues_for_endpoint(self.mock_event)
         assert exc_msg(excinfo.value) == 'Endpoint not in configuration: /wrong'
 
+    def test_endpoint_name(self):
+        assert endpoint_name(self.mock_event) == 'foo'
+
+    def test_endpoint_name_proxy(self):
+        self.mock_event['context']['resource-path'] = '/{proxy+}'
+        self.mock_event['params']['path'] = {'proxy': 'bar/'}
+        assert endpoint_name(self.mock_event) == 'bar'
+
+    def test_queues_for_endpoint_proxy(self):
+        self.mock_event['context']['resource-path'] = '/{proxy+}'
+        self.mock_event['context']['http-method'] = 'POST'
+        self.mock_event['params']['path'] = {'proxy': 'bar'}
+        with patch('%s.endpoints' % pbm, self.endpoints):
+            res = queues_for_endpoint(self.mock_event)
+        assert res == ['q2']
+
+    def test_queues_for_endpoint_proxy_wrong_method(self):
+        self.mock_event['context']['resource-path'] = '/{proxy+}'
+        self.mock_event['context']['http-method'] = 'GET'
+        self.mock_event['params']['path'] = {'proxy': 'bar'}
+        with patch('%s.endpoints' % pbm, self.endpoints):
+            with pytest.raises(Exception) as excinfo:
+                queues_for_endpoint(self.mock_event)
+        assert exc_msg(excinfo.value) == 'Method GET not allowed for ' \
+                                         'endpoint /bar'
+
+    def test_queues_for_endpoint_proxy_unknown(self):
+        self.mock_event['context']['resource-path'] = '/{proxy+}'
+        self.mock_event['params']['path'] = {'proxy': 'foo/baz'}
+        with patch('%s.endpoints' % pbm, self.endpoints):
+            with pytest.raises(Exception) as excinfo:
+                queues_for_endpoint(self.mock_event)
+        assert exc_msg(excinfo.value) == 'Endpoint not in configuration: ' \
+                                         '/foo/baz'
+
+    def test_endpoint_is_async_proxy(self):
+        self.endpoints['bar']['async'] = True
+        self.mock_event['context']['resource-path'] = '/{proxy+}'
+        self.mock_event['params']['path'] = {'proxy': 'bar'}
+        with patch('%s.endpoints' % pbm, self.endpoints):
+            assert endpoint_is_async(self.mock_event) is True
+
+    def test_queues_for_endpoint_http_api_proxy(self):
+        event = self.http_api_event()
+        event['routeKey'] = 'ANY /{proxy+}'
+        event['pathParameters'] = {'proxy': 'bar'}
+        with patch('%s.endpoints' % pbm, self.endpoints):
+            res = queues_for_endpoint(event_from_http_api(event))
+        assert res == ['q2']
+
+    def test_sns_topic_for_endpoint_none(self):
+        with patch('%s.endpoints' % pbm, self.endpoints):
+            res = sns_topic_for_endpoint(self.mock_event, self.mock_context)
+        assert res is None
+
+    def test_sns_topic_for_endpoint(self):
+        self.endpoints['foo']['sns_fanout'] = True
+        with patch('%s.endpoints' % pbm, self.endpoints):
+            res = sns_topic_for_endpoint(self.mock_event, self.mock_context)
+        assert res == 'arn:aws:sns:us-east-1:423319072129:' \
+                      'webhook2lambda2sqsintegrtest-foo'
+
     def test_msg_body_for_event_GET(self):
         self.mock_event['context']['http-method'] = 'GET'
         self.mock_event['params']['querystring'] = {
             'method': 'foo',
             'run_id': '98765'
         }
-        res = msg_body_for_event(self.mock_event, self.mock_context)
+        with patch('%s.orjson' % pbm, None):
+            res = msg_body_for_event(self.mock_event, self.mock_context)
         assert res == json.dumps({
             'data': {
                 'method': 'foo',
@@ -236,7 +446,8 @@ class TestLambdaFunc(object):
             'method': 'foo',
             'run_id': '98765'
         }
-        res = msg_body_for_event(self.mock_event, self.mock_context)
+        with patch('%s.orjson' % pbm, None):
+            res = msg_body_for_event(self.mock_event, self.mock_context)
         assert res == json.dumps({
             'data': {
                 'method': 'foo',
@@ -246,6 +457,48 @@ class TestLambdaFunc(object):
             'context': vars(self.mock_context)
         }, sort_keys=True)
 
+    def test_json_dumps_stdlib(self):
+        with patch('%s.orjson' % pbm, None):
+            res = json_dumps({'b': 1, 'a': [2, 3]})
+        assert res == '{"a": [2, 3], "b": 1}'
+
+    def test_json_dumps_stdlib_unsorted(self):
+        with patch('%s.orjson' % pbm, None):
+            with patch('%s.json_sort_keys' % pbm, False):
+                res = json_dumps({'b': 1, 'a': [2, 3]})
+        assert res == '{"b": 1, "a": [2, 3]}'
+
+    def test_json_dumps_orjson(self):
+        with patch('%s.orjson' % pbm) as mock_orjson:
+            mock_orjson.OPT_SORT_KEYS = 32
+            mock_orjson.dumps.return_value = b'{"a":1}'
+            res = json_dumps({'a': 1})
+        assert res == '{"a":1}'
+        assert mock_orjson.mock_calls == [
+            call.dumps({'a': 1}, option=32)
+        ]
+
+    def test_json_dumps_orjson_unsorted(self):
+        with patch('%s.orjson' % pbm) as mock_orjson:
+            with patch('%s.json_sort_keys' % pbm, False):
+                mock_orjson.OPT_SORT_KEYS = 32
+                mock_orjson.dumps.return_value = b'{"a":1}'
+                res = json_dumps({'a': 1})
+        assert res == '{"a":1}'
+        assert mock_orjson.mock_calls == [
+            call.dumps({'a': 1}, option=0)
+        ]
+
+    def test_json_dumps_orjson_fallback(self):
+        with patch('%s.orjson' % pbm) as mock_orjson:
+            mock_orjson.OPT_SORT_KEYS = 32
+            mock_orjson.dumps.side_effect = TypeError('Integer exceeds 64-bit')
+            res = json_dumps({'b': 2 ** 70, 'a': 1})
+        assert res == '{"a": 1, "b": 1180591620717411303424}'
+        assert mock_orjson.mock_calls == [
+            call.dumps({'b': 2 ** 70, 'a': 1}, option=32)
+        ]
+
     def test_handle_event(self):
 
         def se_enqueue(conn, qname, msg):
@@ -293,6 +546,87 @@ class TestLambdaFunc(object):
             call.error('Failed enqueueing message in %s:', 'q2', exc_info=1)
         ]
 
+    def test_handle_event_async_retry(self):
+        self.endpoints['foo']['async'] = True
+        attempts = {'q2': 0}
+
+        def se_enqueue(conn, qname, msg):
+            if qname == 'q2':
+                attempts['q2'] += 1
+                if attempts['q2'] < 3:
+                    raise Exception('foo')
+            return 'msgid-%s' % qname
+
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            logger=DEFAULT,
+            queues_for_endpoint=DEFAULT,
+            msg_body_for_event=DEFAULT,
+            boto3=DEFAULT,
+            try_enqueue=DEFAULT,
+            time=DEFAULT
+        ) as mocks:
+            mocks['queues_for_endpoint'].return_value = ['q1', 'q2', 'q3']
+            mocks['msg_body_for_event'].return_value = 'mybody'
+            mocks['try_enqueue'].side_effect = se_enqueue
+            with patch('%s.endpoints' % pbm, self.endpoints):
+                res = handle_event(self.mock_event, self.mock_context)
+        assert res == {
+            'status': 'success',
+            'message': 'enqueued 3 messages',
+            'SQSMessageIds': ['msgid-q1', 'msgid-q3', 'msgid-q2']
+        }
+        conn = mocks['boto3'].client.return_value
+        # only the failed queue is retried
+        assert mocks['try_enqueue'].mock_calls == [
+            call(conn, 'q1', 'mybody'),
+            call(conn, 'q2', 'mybody'),
+            call(conn, 'q3', 'mybody'),
+            call(conn, 'q2', 'mybody'),
+            call(conn, 'q2', 'mybody')
+        ]
+        assert mocks['time'].mock_calls == [call.sleep(0.2), call.sleep(0.4)]
+
+    def test_handle_event_async_retry_failed(self):
+        self.endpoints['foo']['async'] = True
+
+        def se_enqueue(conn, qname, msg):
+            if qname == 'q2':
+                raise Exception('foo')
+            return 'msgid-%s' % qname
+
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            logger=DEFAULT,
+            queues_for_endpoint=DEFAULT,
+            msg_body_for_event=DEFAULT,
+            boto3=DEFAULT,
+            try_enqueue=DEFAULT,
+            time=DEFAULT
+        ) as mocks:
+            mocks['queues_for_endpoint'].return_value = ['q1', 'q2']
+            mocks['msg_body_for_event'].return_value = 'mybody'
+            mocks['try_enqueue'].side_effect = se_enqueue
+            with patch('%s.endpoints' % pbm, self.endpoints):
+                res = handle_event(self.mock_event, self.mock_context)
+        assert res == {
+            'status': 'partial',
+            'message': 'enqueued 1 messages; 1 failed',
+            'SQSMessageIds': ['msgid-q1']
+        }
+        assert len(mocks['try_enqueue'].mock_calls) == 4
+        assert mocks['logger'].mock_calls == [
+            call.error('Failed enqueueing message in %s:', 'q2', exc_info=1),
+            call.warning('Retrying enqueueing message in %d failed '
+                         'queue(s): %s', 1, ['q2']),
+            call.error('Failed enqueueing message in %s:', 'q2', exc_info=1),
+            call.warning('Retrying enqueueing message in %d failed '
+                         'queue(s): %s', 1, ['q2']),
+            call.error('Failed enqueueing message in %s:', 'q2', exc_info=1)
+        ]
+
     def test_handle_event_success(self):
         with patch.multiple(
             pbm,
@@ -326,6 +660,90 @@ class TestLambdaFunc(object):
         ]
         assert mocks['logger'].mock_calls == []
 
+    def test_handle_event_queue_region(self):
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            logger=DEFAULT,
+            queues_for_endpoint=DEFAULT,
+            msg_body_for_event=DEFAULT,
+            boto3=DEFAULT,
+            try_enqueue=DEFAULT
+        ) as mocks:
+            with patch('%s.queue_region' % pbm, 'us-west-2'):
+                mocks['queues_for_endpoint'].return_value = ['q1']
+                mocks['msg_body_for_event'].return_value = 'mybody'
+                mocks['try_enqueue'].return_value = 'msgid'
+                res = handle_event(self.mock_event, self.mock_context)
+        assert res['SQSMessageIds'] == ['msgid']
+        assert mocks['boto3'].mock_calls == [
+            call.client('sqs', region_name='us-west-2')
+        ]
+
+    def test_handle_event_sns_fanout(self):
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            queues_for_endpoint=DEFAULT,
+            msg_body_for_event=DEFAULT,
+            sns_topic_for_endpoint=DEFAULT,
+            handle_sns_fanout=DEFAULT,
+            boto3=DEFAULT,
+            try_enqueue=DEFAULT
+        ) as mocks:
+            mocks['queues_for_endpoint'].return_value = ['q1', 'q2']
+            mocks['msg_body_for_event'].return_value = 'mybody'
+            mocks['sns_topic_for_endpoint'].return_value = 'tarn'
+            mocks['handle_sns_fanout'].return_value = {'foo': 'bar'}
+            res = handle_event(self.mock_event, self.mock_context)
+        assert res == {'foo': 'bar'}
+        assert mocks['handle_sns_fanout'].mock_calls == [
+            call('tarn', ['q1', 'q2'], 'mybody')
+        ]
+        assert mocks['try_enqueue'].mock_calls == []
+        assert mocks['boto3'].mock_calls == []
+
+    def test_handle_sns_fanout(self):
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            logger=DEFAULT,
+            boto3=DEFAULT
+        ) as mocks:
+            mocks['boto3'].client.return_value.publish.return_value = {
+                'MessageId': 'snsid'
+            }
+            res = handle_sns_fanout('tarn', ['q1', 'q2'], 'mybody')
+        assert res == {
+            'status': 'success',
+            'message': 'published message to SNS for 2 queues',
+            'SQSMessageIds': ['snsid']
+        }
+        assert mocks['boto3'].mock_calls == [
+            call.client('sns'),
+            call.client().publish(TopicArn='tarn', Message='mybody')
+        ]
+
+    def test_handle_sns_fanout_exception(self):
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            logger=DEFAULT,
+            boto3=DEFAULT
+        ) as mocks:
+            mocks['boto3'].client.return_value.publish.side_effect = \
+                Exception('foo')
+            res = handle_sns_fanout('tarn', ['q1', 'q2'], 'mybody')
+        assert res == {
+            'status': 'error',
+            'message': 'failed publishing message to SNS for 2 queues',
+            'SQSMessageIds': []
+        }
+        assert mocks['logger'].mock_calls == [
+            call.debug('Publishing message to SNS topic: %s', 'tarn'),
+            call.error('Failed publishing message to %s:', 'tarn', exc_info=1)
+        ]
+
     def test_try_enqueue(self):
         mock_conn = Mock()
         mock_conn.get_queue_url.return_value = {'QueueUrl': 'qurl'}
@@ -354,3 +772,11 @@ class TestLambdaFunc(object):
         in_dict['three'] = Mock()
         in_dict['four']['seven'] = Mock()
         assert serializable_dict(in_dict) == expected_dict
+
+    def test_serializable_dict_orjson(self):
+        # values json can serialize are kept even if orjson can't
+        with patch('%s.orjson' % pbm) as mock_orjson:
+            mock_orjson.dumps.side_effect = TypeError('Integer exceeds 64-bit')
+            res = serializable_dict({'a': 2 ** 70, 'b': 1})
+        assert res == {'a': 2 ** 70, 'b': 1}
+        assert mock_orjson.mock_calls == []
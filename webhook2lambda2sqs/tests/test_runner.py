@@ -36,7 +36,9 @@ AUTHORS:
 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ################################################################################
 """
+import os
 import sys
+import subprocess
 import logging
 import pytest
 from requests.models import Response
@@ -45,7 +47,11 @@ from freezegun import freeze_time
 
 from webhook2lambda2sqs.runner import (main, parse_args, set_log_info,
                                        set_log_debug, set_log_level_format,
-                                       get_base_url, run_test, get_api_id)
+                                       get_base_url, run_test, get_api_id,
+                                       run_multi, _run_multi_one,
+                                       run_config, _run_region_one,
+                                       _stack_location, _rest_api_id_output,
+                                       run_stack)
 from webhook2lambda2sqs.version import PROJECT_URL, VERSION
 
 from webhook2lambda2sqs.tests.support import exc_msg
@@ -144,7 +150,9 @@ class TestRunner(object):
         """
 
         mock_args = Mock(verbose=1, action='generate', config='cpath',
-                         stream_tf=False, tf_ver='0.9.0')
+                         workdir='.', stream_tf=False, tf_ver='0.9.0',
+                         package_report=True, account_id='123456789012',
+                         aws_region='us-west-2')
         with patch('%s.logger' % pbm, autospec=True) as mocklogger:
             with patch.multiple(
                 pbm,
@@ -162,8 +170,11 @@ class TestRunner(object):
                 mocks['Config'].example_config.return_value = 'config-ex'
                 mocks['LambdaFuncGenerator'
                       ''].return_value.generate.return_value = 'myfunc'
+                mocks['Config'].return_value.get.return_value = None
                 main(mock_args)
-        assert mocks['Config'].mock_calls == [call('cpath')]
+        assert mocks['Config'].mock_calls == [
+            call('cpath'), call().get('regions')
+        ]
         assert mocks['set_log_info'].mock_calls == [call()]
         assert mocks['set_log_debug'].mock_calls == []
         assert mocks['LambdaFuncGenerator'].mock_calls == [
@@ -171,8 +182,10 @@ class TestRunner(object):
             call().generate()
         ]
         assert mocks['TerraformGenerator'].mock_calls == [
-            call(mocks['Config'].return_value, tf_ver=(0, 9, 0)),
-            call().generate('myfunc')
+            call(mocks['Config'].return_value, tf_ver=(0, 9, 0),
+                 workdir='.', region=None, account_id='123456789012',
+                 aws_region='us-west-2'),
+            call().generate('myfunc', package_report=True)
         ]
         assert mocks['TerraformRunner'].mock_calls == []
         assert mocks['parse_args'].mock_calls == []
@@ -189,7 +202,10 @@ class TestRunner(object):
             return None
 
         mock_args = Mock(verbose=2, action='genapply', config='cpath',
-                         stream_tf=True, tf_path='terraform')
+                         workdir='.', stream_tf=True, tf_path='terraform',
+                         package_report=False, parallelism=None, refresh=True,
+                         refresh_max_age=None, account_id=None,
+                         aws_region=None)
         with patch('%s.logger' % pbm, autospec=True) as mocklogger:
             with patch.multiple(
                 pbm,
@@ -206,6 +222,7 @@ class TestRunner(object):
             ) as mocks:
                 mocks['Config'].example_config.return_value = 'config-ex'
                 mocks['Config'].return_value.get.side_effect = se_get
+                type(mocks['Config'].return_value).api_type = 'rest'
                 type(
                     mocks['TerraformRunner'].return_value
                 ).tf_version = PropertyMock(return_value=(0, 7, 9))
@@ -214,7 +231,9 @@ class TestRunner(object):
                 main(mock_args)
         assert mocks['Config'].mock_calls == [
             call('cpath'),
-            call().get('api_gateway_method_settings')
+            call().get('regions'),
+            call().get('api_gateway_method_settings'),
+            call().endpoint_method_settings.__len__()
         ]
         assert mocks['set_log_info'].mock_calls == []
         assert mocks['set_log_debug'].mock_calls == [call()]
@@ -223,12 +242,15 @@ class TestRunner(object):
             call().generate()
         ]
         assert mocks['TerraformGenerator'].mock_calls == [
-            call(mocks['Config'].return_value, tf_ver=(0, 7, 9)),
-            call().generate('myfunc')
+            call(mocks['Config'].return_value, tf_ver=(0, 7, 9),
+                 workdir='.', region=None, account_id=None, aws_region=None),
+            call().generate('myfunc', package_report=False)
         ]
         assert mocks['TerraformRunner'].mock_calls == [
-            call(mocks['Config'].return_value, 'terraform'),
-            call().apply(True)
+            call(mocks['Config'].return_value, 'terraform', workdir='.',
+                 region=None),
+            call().apply(True, parallelism=None, refresh=True,
+                         refresh_max_age=None)
         ]
         assert mocks['parse_args'].mock_calls == []
         assert mocks['AWSInfo'].mock_calls == []
@@ -241,10 +263,14 @@ class TestRunner(object):
         """
 
         def se_get(name):
+            if name == 'regions':
+                return None
             return {'foo': 'bar'}
 
         mock_args = Mock(verbose=0, action='apply', config='cpath',
-                         stream_tf=False, tf_path='terraform')
+                         workdir='.', stream_tf=False, tf_path='terraform',
+                         plan_file=None, parallelism=None, refresh=True,
+                         refresh_max_age=None)
         with patch('%s.logger' % pbm, autospec=True) as mocklogger:
             with patch.multiple(
                 pbm,
@@ -260,12 +286,18 @@ class TestRunner(object):
                 get_api_id=DEFAULT,
             ) as mocks:
                 mocks['Config'].example_config.return_value = 'config-ex'
-                mocks['Config'].get.side_effect = se_get
+                mocks['Config'].return_value.get.side_effect = se_get
+                type(mocks['Config'].return_value).api_type = 'rest'
                 mocks['LambdaFuncGenerator'
                       ''].return_value.generate.return_value = 'myfunc'
+                mocks['TerraformRunner'
+                      ''].return_value._get_outputs.return_value = {
+                    'rest_api_id': 'myid'
+                }
                 main(mock_args)
         assert mocks['Config'].mock_calls == [
             call('cpath'),
+            call().get('regions'),
             call().get('api_gateway_method_settings')
         ]
         assert mocks['set_log_info'].mock_calls == []
@@ -273,24 +305,211 @@ class TestRunner(object):
         assert mocks['LambdaFuncGenerator'].mock_calls == []
         assert mocks['TerraformGenerator'].mock_calls == []
         assert mocks['TerraformRunner'].mock_calls == [
-            call(mocks['Config'].return_value, 'terraform'),
-            call().apply(False)
+            call(mocks['Config'].return_value, 'terraform', workdir='.',
+                 region=None),
+            call().apply(False, plan_file=None, parallelism=None,
+                         refresh=True, refresh_max_age=None),
+            call()._get_outputs()
         ]
         assert mocks['parse_args'].mock_calls == []
         assert mocks['AWSInfo'].mock_calls == [
-            call(mocks['Config'].return_value),
-            call().set_method_settings()
+            call(mocks['Config'].return_value, region=None),
+            call().set_method_settings(api_id='myid')
         ]
         assert mocks['get_api_id'].mock_calls == []
         assert mocklogger.mock_calls == []
 
+    def test_main_apply_http_api(self):
+        """
+        test main function
+        """
+
+        def se_get(name):
+            if name == 'regions':
+                return None
+            return {'foo': 'bar'}
+
+        mock_args = Mock(verbose=0, action='apply', config='cpath',
+                         workdir='.', stream_tf=False, tf_path='terraform',
+                         plan_file=None, parallelism=None, refresh=True,
+                         refresh_max_age=None)
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch.multiple(
+                pbm,
+                Config=DEFAULT,
+                AWSInfo=DEFAULT,
+                TerraformRunner=DEFAULT,
+            ) as mocks:
+                mocks['Config'].return_value.get.side_effect = se_get
+                type(mocks['Config'].return_value).api_type = 'http'
+                type(
+                    mocks['TerraformRunner'].return_value
+                ).tf_version = PropertyMock(return_value=(0, 12, 31))
+                main(mock_args)
+        assert mocks['TerraformRunner'].mock_calls == [
+            call(mocks['Config'].return_value, 'terraform', workdir='.',
+                 region=None),
+            call().apply(False, plan_file=None, parallelism=None,
+                         refresh=True, refresh_max_age=None)
+        ]
+        assert mocks['AWSInfo'].mock_calls == []
+
+    def test_main_apply_http_api_old_terraform(self):
+        mock_args = Mock(verbose=0, action='apply', config='cpath',
+                         workdir='.', stream_tf=False, tf_path='terraform',
+                         plan_file=None, parallelism=None, refresh=True,
+                         refresh_max_age=None)
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch.multiple(
+                pbm,
+                Config=DEFAULT,
+                AWSInfo=DEFAULT,
+                TerraformGenerator=DEFAULT,
+                TerraformRunner=DEFAULT,
+            ) as mocks:
+                mocks['Config'].return_value.get.return_value = None
+                type(mocks['Config'].return_value).api_type = 'http'
+                type(
+                    mocks['TerraformRunner'].return_value
+                ).tf_version = PropertyMock(return_value=(0, 11, 14))
+                with pytest.raises(Exception) as excinfo:
+                    main(mock_args)
+        assert exc_msg(excinfo.value) == 'ERROR: an "http" api_type ' \
+                                         'requires terraform >= 0.12.0, but ' \
+                                         'found terraform 0.11.14'
+        assert mocks['TerraformRunner'].mock_calls == [
+            call(mocks['Config'].return_value, 'terraform', workdir='.',
+                 region=None)
+        ]
+        assert mocks['TerraformGenerator'].mock_calls == []
+        assert mocks['AWSInfo'].mock_calls == []
+
+    def test_main_apply_endpoint_method_settings(self):
+        mock_args = Mock(verbose=0, action='apply', config='cpath',
+                         workdir='.', stream_tf=False, tf_path='terraform',
+                         plan_file=None, parallelism=None, refresh=True,
+                         refresh_max_age=None)
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch.multiple(
+                pbm,
+                Config=DEFAULT,
+                AWSInfo=DEFAULT,
+                TerraformRunner=DEFAULT,
+            ) as mocks:
+                mocks['Config'].return_value.get.return_value = None
+                type(mocks['Config'].return_value).endpoint_method_settings = {
+                    'foo': {'throttlingBurstLimit': 100}
+                }
+                mocks['TerraformRunner'
+                      ''].return_value._get_outputs.return_value = {
+                    'rest_api_id': 'myid'
+                }
+                main(mock_args)
+        assert mocks['AWSInfo'].mock_calls == [
+            call(mocks['Config'].return_value, region=None),
+            call().set_method_settings(api_id='myid')
+        ]
+
+    def test_main_deploy_code(self):
+        """
+        test main function
+        """
+        mock_args = Mock(verbose=0, action='deploy-code', config='cpath',
+                         workdir='.', stream_tf=True, tf_path='terraform',
+                         package_report=False, parallelism=None, refresh=True,
+                         refresh_max_age=None, account_id=None,
+                         aws_region=None)
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch.multiple(
+                pbm,
+                Config=DEFAULT,
+                AWSInfo=DEFAULT,
+                LambdaFuncGenerator=DEFAULT,
+                TerraformGenerator=DEFAULT,
+                TerraformRunner=DEFAULT,
+            ) as mocks:
+                type(
+                    mocks['TerraformRunner'].return_value
+                ).tf_version = PropertyMock(return_value=(0, 9, 2))
+                mocks['LambdaFuncGenerator'
+                      ''].return_value.generate.return_value = 'myfunc'
+                mocks['TerraformRunner'
+                      ''].return_value.deploy_code.return_value = False
+                mocks['Config'].return_value.get.return_value = None
+                type(mocks['Config'].return_value).api_type = 'rest'
+                main(mock_args)
+        assert mocks['TerraformGenerator'].mock_calls == [
+            call(mocks['Config'].return_value, tf_ver=(0, 9, 2),
+                 workdir='.', region=None, account_id=None, aws_region=None),
+            call().generate('myfunc', package_report=False)
+        ]
+        assert mocks['TerraformRunner'].mock_calls == [
+            call(mocks['Config'].return_value, 'terraform', workdir='.',
+                 region=None),
+            call().deploy_code(True, parallelism=None, refresh=True,
+                               refresh_max_age=None)
+        ]
+        assert mocks['Config'].mock_calls == [
+            call('cpath'), call().get('regions')
+        ]
+        assert mocks['AWSInfo'].mock_calls == []
+
+    def test_main_deploy_code_applied(self):
+        """
+        test main function
+        """
+
+        def se_get(name):
+            if name == 'regions':
+                return None
+            return {'foo': 'bar'}
+
+        mock_args = Mock(verbose=0, action='deploy-code', config='cpath',
+                         workdir='.', stream_tf=False, tf_path='terraform',
+                         package_report=False, parallelism=None, refresh=True,
+                         refresh_max_age=None)
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch.multiple(
+                pbm,
+                Config=DEFAULT,
+                AWSInfo=DEFAULT,
+                LambdaFuncGenerator=DEFAULT,
+                TerraformGenerator=DEFAULT,
+                TerraformRunner=DEFAULT,
+            ) as mocks:
+                mocks['Config'].return_value.get.side_effect = se_get
+                type(mocks['Config'].return_value).api_type = 'rest'
+                type(
+                    mocks['TerraformRunner'].return_value
+                ).tf_version = PropertyMock(return_value=(0, 9, 2))
+                mocks['TerraformRunner'
+                      ''].return_value.deploy_code.return_value = True
+                mocks['TerraformRunner'
+                      ''].return_value._get_outputs.return_value = {
+                    'rest_api_id': 'myid'
+                }
+                main(mock_args)
+        assert mocks['TerraformRunner'].mock_calls == [
+            call(mocks['Config'].return_value, 'terraform', workdir='.',
+                 region=None),
+            call().deploy_code(False, parallelism=None, refresh=True,
+                               refresh_max_age=None),
+            call()._get_outputs()
+        ]
+        assert mocks['AWSInfo'].mock_calls == [
+            call(mocks['Config'].return_value, region=None),
+            call().set_method_settings(api_id='myid')
+        ]
+
     def test_main_plan(self):
         """
         test main function
         """
 
-        mock_args = Mock(verbose=0, action='plan', config='cpath',
-                         stream_tf=True, tf_path='terraform')
+        mock_args = Mock(verbose=0, action='plan', config='cpath', workdir='.',
+                         stream_tf=True, tf_path='terraform',
+                         plan_out='w2l2s.tfplan', parallelism=4, refresh=False,
+                         refresh_max_age=None)
         with patch('%s.logger' % pbm, autospec=True) as mocklogger:
             with patch.multiple(
                 pbm,
@@ -306,15 +525,21 @@ class TestRunner(object):
                 get_api_id=DEFAULT,
             ) as mocks:
                 mocks['Config'].example_config.return_value = 'config-ex'
+                mocks['Config'].return_value.get.return_value = None
+                type(mocks['Config'].return_value).api_type = 'rest'
                 main(mock_args)
-        assert mocks['Config'].mock_calls == [call('cpath')]
+        assert mocks['Config'].mock_calls == [
+            call('cpath'), call().get('regions')
+        ]
         assert mocks['set_log_info'].mock_calls == []
         assert mocks['set_log_debug'].mock_calls == []
         assert mocks['LambdaFuncGenerator'].mock_calls == []
         assert mocks['TerraformGenerator'].mock_calls == []
         assert mocks['TerraformRunner'].mock_calls == [
-            call(mocks['Config'].return_value, 'terraform'),
-            call().plan(True)
+            call(mocks['Config'].return_value, 'terraform', workdir='.',
+                 region=None),
+            call().plan(True, out_file='w2l2s.tfplan', parallelism=4,
+                        refresh=False, refresh_max_age=None)
         ]
         assert mocks['parse_args'].mock_calls == []
         assert mocks['AWSInfo'].mock_calls == []
@@ -327,7 +552,9 @@ class TestRunner(object):
         """
 
         mock_args = Mock(verbose=0, action='destroy', config='cpath',
-                         stream_tf=False, tf_path='/some/other/path')
+                         workdir='.', stream_tf=False,
+                         tf_path='/some/other/path',
+                         parallelism=None, refresh=True, refresh_max_age=300)
         with patch('%s.logger' % pbm, autospec=True) as mocklogger:
             with patch.multiple(
                 pbm,
@@ -343,15 +570,21 @@ class TestRunner(object):
                 get_api_id=DEFAULT,
             ) as mocks:
                 mocks['Config'].example_config.return_value = 'config-ex'
+                mocks['Config'].return_value.get.return_value = None
+                type(mocks['Config'].return_value).api_type = 'rest'
                 main(mock_args)
-        assert mocks['Config'].mock_calls == [call('cpath')]
+        assert mocks['Config'].mock_calls == [
+            call('cpath'), call().get('regions')
+        ]
         assert mocks['set_log_info'].mock_calls == []
         assert mocks['set_log_debug'].mock_calls == []
         assert mocks['LambdaFuncGenerator'].mock_calls == []
         assert mocks['TerraformGenerator'].mock_calls == []
         assert mocks['TerraformRunner'].mock_calls == [
-            call(mocks['Config'].return_value, '/some/other/path'),
-            call().destroy(False)
+            call(mocks['Config'].return_value, '/some/other/path', workdir='.',
+                 region=None),
+            call().destroy(False, parallelism=None, refresh=True,
+                           refresh_max_age=300)
         ]
         assert mocks['get_api_id'].mock_calls == []
         assert mocks['parse_args'].mock_calls == []
@@ -380,8 +613,11 @@ class TestRunner(object):
                 get_api_id=DEFAULT,
             ) as mocks:
                 mocks['Config'].example_config.return_value = 'config-ex'
+                mocks['Config'].return_value.get.return_value = None
                 main(mock_args)
-        assert mocks['Config'].mock_calls == [call('cpath')]
+        assert mocks['Config'].mock_calls == [
+            call('cpath'), call().get('regions')
+        ]
         assert mocks['set_log_info'].mock_calls == []
         assert mocks['set_log_debug'].mock_calls == []
         assert mocks['LambdaFuncGenerator'].mock_calls == []
@@ -389,7 +625,7 @@ class TestRunner(object):
         assert mocks['TerraformRunner'].mock_calls == []
         assert mocks['parse_args'].mock_calls == []
         assert mocks['AWSInfo'].mock_calls == [
-            call(mocks['Config'].return_value),
+            call(mocks['Config'].return_value, region=None),
             call().show_cloudwatch_logs(count=4)
         ]
         assert mocks['get_api_id'].mock_calls == []
@@ -420,8 +656,11 @@ class TestRunner(object):
                 type(mocks['Config'].return_value).func_name = 'myfname'
                 type(mocks['Config'].return_value).stage_name = 'mysname'
                 mocks['get_api_id'].return_value = 'did'
+                mocks['Config'].return_value.get.return_value = None
                 main(mock_args)
-        assert mocks['Config'].mock_calls == [call('cpath')]
+        assert mocks['Config'].mock_calls == [
+            call('cpath'), call().get('regions')
+        ]
         assert mocks['set_log_info'].mock_calls == []
         assert mocks['set_log_debug'].mock_calls == []
         assert mocks['LambdaFuncGenerator'].mock_calls == []
@@ -429,7 +668,7 @@ class TestRunner(object):
         assert mocks['TerraformRunner'].mock_calls == []
         assert mocks['parse_args'].mock_calls == []
         assert mocks['AWSInfo'].mock_calls == [
-            call(mocks['Config'].return_value),
+            call(mocks['Config'].return_value, region=None),
             call().show_cloudwatch_logs(
                 count=6,
                 grp_name='API-Gateway-Execution-Logs_did/mysname'
@@ -462,8 +701,11 @@ class TestRunner(object):
                 get_api_id=DEFAULT,
             ) as mocks:
                 mocks['Config'].example_config.return_value = 'config-ex'
+                mocks['Config'].return_value.get.return_value = None
                 main(mock_args)
-        assert mocks['Config'].mock_calls == [call('cpath')]
+        assert mocks['Config'].mock_calls == [
+            call('cpath'), call().get('regions')
+        ]
         assert mocks['set_log_info'].mock_calls == []
         assert mocks['set_log_debug'].mock_calls == []
         assert mocks['LambdaFuncGenerator'].mock_calls == []
@@ -471,7 +713,7 @@ class TestRunner(object):
         assert mocks['TerraformRunner'].mock_calls == []
         assert mocks['parse_args'].mock_calls == []
         assert mocks['AWSInfo'].mock_calls == [
-            call(mocks['Config'].return_value),
+            call(mocks['Config'].return_value, region=None),
             call().show_queue(name='foo', delete=True, count=2)
         ]
         assert mocks['get_api_id'].mock_calls == []
@@ -541,27 +783,91 @@ class TestRunner(object):
             assert res.verbose == 0
 
     def test_parse_args_tf_actions_default(self):
-        for action in ['genapply', 'apply', 'plan', 'destroy']:
+        for action in ['genapply', 'apply', 'plan', 'destroy', 'deploy-code']:
             res = parse_args([action])
             assert res.action == action
             assert res.verbose == 0
             assert res.tf_path == 'terraform'
             assert res.stream_tf is True
             assert res.tf_ver == '0.9.0'
+            assert res.parallelism is None
+            assert res.refresh is True
+            assert res.refresh_max_age is None
+            assert res.plan_file is None
+            assert res.plan_out is None
 
     def test_parse_args_tf_actions_non_default(self):
-        for action in ['genapply', 'apply', 'plan', 'destroy']:
+        for action in ['genapply', 'apply', 'plan', 'destroy', 'deploy-code']:
             res = parse_args([
                 '--tf-version=0.8.4',
                 action,
                 '--terraform-path=/path/to/tf',
                 '-S',
+                '--parallelism=2',
+                '--no-refresh',
+                '--refresh-max-age=600'
             ])
             assert res.action == action
             assert res.verbose == 0
             assert res.tf_path == '/path/to/tf'
             assert res.stream_tf is False
             assert res.tf_ver == '0.8.4'
+            assert res.parallelism == 2
+            assert res.refresh is False
+            assert res.refresh_max_age == 600
+
+    def test_parse_args_plan_out(self):
+        assert parse_args(['plan', '-o', 'foo.tfplan']).plan_out == 'foo.tfplan'
+        assert parse_args(
+            ['plan', '--out=foo.tfplan']).plan_out == 'foo.tfplan'
+
+    def test_parse_args_apply_plan(self):
+        res = parse_args(['apply', '--plan', 'foo.tfplan'])
+        assert res.plan_file == 'foo.tfplan'
+
+    def test_parse_args_workdir(self):
+        assert parse_args(['generate']).workdir == '.'
+        assert parse_args(['-w', 'stacks/foo', 'plan']).workdir == 'stacks/foo'
+
+    def test_parse_args_multi(self):
+        res = parse_args(['-w', 'stacks', 'multi', '-j', '8', '--no-refresh',
+                          'plan', 'a.json', 'b/c.json'])
+        assert res.action == 'multi'
+        assert res.workdir == 'stacks'
+        assert res.jobs == 8
+        assert res.refresh is False
+        assert res.multi_action == 'plan'
+        assert res.configs == ['a.json', 'b/c.json']
+        assert res.package_report is False
+        assert res.plan_out is None
+
+    def test_parse_args_multi_defaults(self):
+        res = parse_args(['multi', 'genapply', 'a.json'])
+        assert res.jobs == 4
+        assert res.workdir == '.'
+        assert res.configs == ['a.json']
+
+    def test_parse_args_multi_bad_action(self, capsys):
+        with pytest.raises(SystemExit):
+            parse_args(['multi', 'destroy', 'a.json'])
+
+    def test_parse_args_package_report(self):
+        for action in ['generate', 'genapply', 'deploy-code']:
+            assert parse_args([action]).package_report is False
+            assert parse_args([action, '-r']).package_report is True
+
+    def test_parse_args_account_region(self):
+        for action in ['generate', 'genapply', 'deploy-code']:
+            res = parse_args([action])
+            assert res.account_id is None
+            assert res.aws_region is None
+            res = parse_args([action, '--account-id', '123456789012',
+                              '--region', 'us-west-2'])
+            assert res.account_id == '123456789012'
+            assert res.aws_region == 'us-west-2'
+        res = parse_args(['multi', '--region', 'eu-west-1', 'generate',
+                          'a.json'])
+        assert res.aws_region == 'eu-west-1'
 
     def test_parse_args_apilogs(self):
         res = parse_args(['apilogs'])
@@ -669,7 +975,8 @@ class TestRunner(object):
 
     def test_get_base_url_tf(self):
         conf = Mock()
-        args = Mock(tf_path='tfpath')
+        conf.get.return_value = None
+        args = Mock(tf_path='tfpath', workdir='wd')
         with patch.multiple(
             pbm,
             autospec=True,
@@ -683,7 +990,7 @@ class TestRunner(object):
             res = get_base_url(conf, args)
         assert res == 'mytfbase/'
         assert mocks['TerraformRunner'].mock_calls == [
-            call(conf, 'tfpath'),
+            call(conf, 'tfpath', workdir='wd', region=None),
             call()._get_outputs()
         ]
         assert mocks['AWSInfo'].mock_calls == []
@@ -698,7 +1005,8 @@ class TestRunner(object):
             raise Exception()
 
         conf = Mock()
-        args = Mock(tf_path='tfpath')
+        conf.get.return_value = None
+        args = Mock(tf_path='tfpath', workdir='wd')
         with patch.multiple(
             pbm,
             autospec=True,
@@ -712,11 +1020,11 @@ class TestRunner(object):
             res = get_base_url(conf, args)
         assert res == 'au/'
         assert mocks['TerraformRunner'].mock_calls == [
-            call(conf, 'tfpath'),
+            call(conf, 'tfpath', workdir='wd', region=None),
             call()._get_outputs()
         ]
         assert mocks['AWSInfo'].mock_calls == [
-            call(conf),
+            call(conf, region=None),
             call().get_api_base_url()
         ]
         assert mocks['logger'].mock_calls == [
@@ -728,7 +1036,8 @@ class TestRunner(object):
 
     def test_get_api_id_tf(self):
         conf = Mock()
-        args = Mock(tf_path='tfpath')
+        conf.get.return_value = None
+        args = Mock(tf_path='tfpath', workdir='wd')
         with patch.multiple(
             pbm,
             autospec=True,
@@ -743,7 +1052,7 @@ class TestRunner(object):
             res = get_api_id(conf, args)
         assert res == 'myid'
         assert mocks['TerraformRunner'].mock_calls == [
-            call(conf, 'tfpath'),
+            call(conf, 'tfpath', workdir='wd', region=None),
             call()._get_outputs()
         ]
         assert mocks['AWSInfo'].mock_calls == []
@@ -758,7 +1067,8 @@ class TestRunner(object):
             raise Exception()
 
         conf = Mock()
-        args = Mock(tf_path='tfpath')
+        conf.get.return_value = None
+        args = Mock(tf_path='tfpath', workdir='wd')
         with patch.multiple(
             pbm,
             autospec=True,
@@ -772,11 +1082,11 @@ class TestRunner(object):
             res = get_api_id(conf, args)
         assert res == 'myaid'
         assert mocks['TerraformRunner'].mock_calls == [
-            call(conf, 'tfpath'),
+            call(conf, 'tfpath', workdir='wd', region=None),
             call()._get_outputs()
         ]
         assert mocks['AWSInfo'].mock_calls == [
-            call(conf),
+            call(conf, region=None),
             call().get_api_id()
         ]
         assert mocks['logger'].mock_calls == [
@@ -786,6 +1096,25 @@ class TestRunner(object):
             call.debug('AWS API ID: \'%s\'', 'myaid')
         ]
 
+    def test_rest_api_id_output(self):
+        runner = Mock()
+        runner._get_outputs.return_value = {'rest_api_id': 'myid'}
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            res = _rest_api_id_output(runner)
+        assert res == 'myid'
+        assert mock_logger.mock_calls == []
+
+    def test_rest_api_id_output_exception(self):
+        runner = Mock()
+        runner._get_outputs.return_value = {'base_url': 'foo'}
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            res = _rest_api_id_output(runner)
+        assert res is None
+        assert mock_logger.mock_calls == [
+            call.debug('Unable to get rest_api_id Terraform output',
+                       exc_info=1)
+        ]
+
     @freeze_time("2016-07-01 02:03:04")
     def test_run_test(self, capsys):
         conf = Mock()
@@ -816,19 +1145,20 @@ class TestRunner(object):
             'datetime': '2016-07-01T02:03:04.000000'
         }
 
-        with patch.multiple(
-            pbm,
-            autospec=True,
-            requests=DEFAULT,
-            logger=DEFAULT,
-            get_base_url=DEFAULT,
-            node=DEFAULT
-        ) as mocks:
-            mocks['get_base_url'].return_value = 'mybase/'
-            mocks['node'].return_value = 'mynode'
-            mocks['requests'].get.return_value = res1
-            mocks['requests'].post.return_value = res2
-            run_test(conf, args)
+        mock_requests = Mock()
+        with patch.dict('sys.modules', {'requests': mock_requests}):
+            with patch.multiple(
+                pbm,
+                autospec=True,
+                logger=DEFAULT,
+                get_base_url=DEFAULT,
+                node=DEFAULT
+            ) as mocks:
+                mocks['get_base_url'].return_value = 'mybase/'
+                mocks['node'].return_value = 'mynode'
+                mock_requests.get.return_value = res1
+                mock_requests.post.return_value = res2
+                run_test(conf, args)
         out, err = capsys.readouterr()
         assert err == ''
         expected_out = "=> Testing endpoint mybase/ep1/ with GET: "
@@ -849,7 +1179,7 @@ class TestRunner(object):
         assert mocks['logger'].mock_calls == [
             call.debug('API base url: %s', 'mybase/')
         ]
-        assert mocks['requests'].mock_calls == [
+        assert mock_requests.mock_calls == [
             call.get('mybase/ep1/', params={
                 'message': 'testing via webhook2lambda2sqs CLI',
                 'version': VERSION,
@@ -887,18 +1217,19 @@ class TestRunner(object):
             'datetime': '2016-07-01T02:03:04.000000'
         }
 
-        with patch.multiple(
-            pbm,
-            autospec=True,
-            requests=DEFAULT,
-            logger=DEFAULT,
-            get_base_url=DEFAULT,
-            node=DEFAULT
-        ) as mocks:
-            mocks['get_base_url'].return_value = 'mybase/'
-            mocks['node'].return_value = 'mynode'
-            mocks['requests'].get.return_value = res1
-            run_test(conf, args)
+        mock_requests = Mock()
+        with patch.dict('sys.modules', {'requests': mock_requests}):
+            with patch.multiple(
+                pbm,
+                autospec=True,
+                logger=DEFAULT,
+                get_base_url=DEFAULT,
+                node=DEFAULT
+            ) as mocks:
+                mocks['get_base_url'].return_value = 'mybase/'
+                mocks['node'].return_value = 'mynode'
+                mock_requests.get.return_value = res1
+                run_test(conf, args)
         out, err = capsys.readouterr()
         assert err == ''
         expected_out = "=> Testing endpoint mybase/ep1/ with GET: "
@@ -913,7 +1244,7 @@ class TestRunner(object):
         assert mocks['logger'].mock_calls == [
             call.debug('API base url: %s', 'mybase/')
         ]
-        assert mocks['requests'].mock_calls == [
+        assert mock_requests.mock_calls == [
             call.get('mybase/ep1/', params={
                 'message': 'testing via webhook2lambda2sqs CLI',
                 'version': VERSION,
@@ -938,17 +1269,392 @@ class TestRunner(object):
             'hz': 'hzval'
         }
 
+        mock_requests = Mock()
+        with patch.dict('sys.modules', {'requests': mock_requests}):
+            with patch.multiple(
+                pbm,
+                autospec=True,
+                logger=DEFAULT,
+                get_base_url=DEFAULT,
+                node=DEFAULT
+            ) as mocks:
+                mocks['get_base_url'].return_value = 'mybase/'
+                mocks['node'].return_value = 'mynode'
+                mock_requests.get.return_value = res1
+                with pytest.raises(Exception) as excinfo:
+                    run_test(conf, args)
+        assert exc_msg(excinfo.value) == 'Unimplemented method: FOO'
+
+    def test_main_multi(self):
+        mock_args = Mock(verbose=0, action='multi')
         with patch.multiple(
             pbm,
             autospec=True,
-            requests=DEFAULT,
-            logger=DEFAULT,
-            get_base_url=DEFAULT,
-            node=DEFAULT
+            Config=DEFAULT,
+            TerraformRunner=DEFAULT,
+            run_multi=DEFAULT
         ) as mocks:
-            mocks['get_base_url'].return_value = 'mybase/'
-            mocks['node'].return_value = 'mynode'
-            mocks['requests'].get.return_value = res1
+            main(mock_args)
+        assert mocks['run_multi'].mock_calls == [call(mock_args)]
+        assert mocks['Config'].mock_calls == []
+        assert mocks['TerraformRunner'].mock_calls == []
+
+    def test_run_multi_one(self):
+        args = Mock(multi_action='plan')
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            Config=DEFAULT,
+            run_config=DEFAULT
+        ) as mocks:
+            err, duration = _run_multi_one(args, 'a.json', 'stacks/a')
+        assert err is None
+        assert duration >= 0
+        assert mocks['Config'].mock_calls == [call('a.json')]
+        assert mocks['run_config'].mock_calls == [
+            call(mocks['Config'].return_value, args, 'plan', 'stacks/a',
+                 generate=True)
+        ]
+
+    def test_run_multi_one_fail(self):
+        args = Mock(multi_action='genapply')
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            Config=DEFAULT,
+            run_config=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            mocks['run_config'].side_effect = Exception(
+                'terraform apply failed')
+            err, duration = _run_multi_one(args, 'a.json', 'stacks/a')
+        assert err == 'terraform apply failed'
+        assert mocks['run_config'].mock_calls == [
+            call(mocks['Config'].return_value, args, 'genapply', 'stacks/a',
+                 generate=False)
+        ]
+
+    def test_run_multi(self, capsys):
+        args = Mock(multi_action='plan', jobs=2, workdir='stacks',
+                    configs=['a.json', 'conf/b.json', 'c.json'])
+
+        def se_one(a, conf_path, workdir):
+            if conf_path == 'conf/b.json':
+                return 'terraform plan failed', 2.0
+            return None, 1.0
+
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            _run_multi_one=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            mocks['_run_multi_one'].side_effect = se_one
+            with pytest.raises(SystemExit) as excinfo:
+                run_multi(args)
+        assert excinfo.value.code == 1
+        assert sorted(mocks['_run_multi_one'].mock_calls) == sorted([
+            call(args, 'a.json', os.path.join('stacks', 'a')),
+            call(args, 'conf/b.json', os.path.join('stacks', 'b')),
+            call(args, 'c.json', os.path.join('stacks', 'c'))
+        ])
+        out, err = capsys.readouterr()
+        assert out == "\n\n=> plan results:\n" \
+            "OK      a.json (%s) 1.0s\n" \
+            "FAILED  conf/b.json (%s) 2.0s: terraform plan failed\n" \
+            "OK      c.json (%s) 1.0s\n" \
+            "2 succeeded, 1 failed\n" % (
+                os.path.join('stacks', 'a'), os.path.join('stacks', 'b'),
+                os.path.join('stacks', 'c')
+            )
+
+    def test_run_multi_success(self, capsys):
+        args = Mock(multi_action='generate', jobs=4, workdir='.',
+                    configs=['a.json'])
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            _run_multi_one=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            mocks['_run_multi_one'].return_value = (None, 0.5)
+            run_multi(args)
+        assert mocks['_run_multi_one'].mock_calls == [
+            call(args, 'a.json', os.path.join('.', 'a'))
+        ]
+        out, err = capsys.readouterr()
+        assert out.endswith('1 succeeded, 0 failed\n')
+
+    def test_run_multi_duplicate_dirs(self):
+        args = Mock(multi_action='plan', jobs=2, workdir='stacks',
+                    configs=['a.json', 'other/a.json'])
+        with patch('%s._run_multi_one' % pbm, autospec=True) as mock_one:
             with pytest.raises(Exception) as excinfo:
-                run_test(conf, args)
-        assert exc_msg(excinfo.value) == 'Unimplemented method: FOO'
+                run_multi(args)
+        assert exc_msg(excinfo.value) == 'ERROR: multiple configurations ' \
+                                         'would use the same directory: %s' \
+                                         '' % os.path.join('stacks', 'a')
+        assert mock_one.mock_calls == []
+
+    def test_stack_location(self):
+        conf = Mock()
+        conf.get.return_value = None
+        args = Mock(workdir='wd')
+        assert _stack_location(conf, args) == ('wd', None)
+        conf.get.return_value = ['eu-west-1', 'us-east-1']
+        assert _stack_location(conf, args) == (
+            os.path.join('wd', 'eu-west-1'), 'eu-west-1'
+        )
+        assert conf.get.mock_calls == [call('regions'), call('regions')]
+
+    def test_run_stack_new_workdir(self, tmpdir):
+        workdir = str(tmpdir.join('out', 'a'))
+        conf = Mock()
+        conf.get.return_value = None
+        args = Mock(tf_path='terraform', stream_tf=False, plan_out=None,
+                    parallelism=None, refresh=True, refresh_max_age=None)
+
+        def se_runner(*a, **kw):
+            # terraform version is run in workdir on construction
+            assert os.path.isdir(workdir)
+            return DEFAULT
+
+        with patch.multiple(
+            pbm,
+            TerraformRunner=DEFAULT,
+            LambdaFuncGenerator=DEFAULT,
+            TerraformGenerator=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            mocks['TerraformRunner'].side_effect = se_runner
+            type(
+                mocks['TerraformRunner'].return_value
+            ).tf_version = PropertyMock(return_value=(0, 9, 2))
+            run_stack(conf, args, 'plan', workdir, generate=True)
+        assert os.path.isdir(workdir)
+        assert mocks['TerraformRunner'].mock_calls[0] == call(
+            conf, 'terraform', workdir=workdir, region=None
+        )
+        assert mocks['logger'].mock_calls == [
+            call.debug('Creating working directory: %s', workdir)
+        ]
+
+    def test_run_config(self):
+        conf = Mock()
+        conf.get.return_value = None
+        args = Mock()
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            run_stack=DEFAULT,
+            _run_region_one=DEFAULT
+        ) as mocks:
+            run_config(conf, args, 'plan', 'wd', generate=True)
+        assert mocks['run_stack'].mock_calls == [
+            call(conf, args, 'plan', 'wd', generate=True)
+        ]
+        assert mocks['_run_region_one'].mock_calls == []
+
+    def test_run_config_regions(self, capsys):
+        conf = Mock()
+        conf.get.return_value = ['us-east-1', 'eu-west-1']
+        args = Mock()
+
+        def se_one(c, a, action, workdir, region, generate):
+            if region == 'eu-west-1':
+                return 'terraform apply failed', 2.0
+            return None, 1.0
+
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            run_stack=DEFAULT,
+            _run_region_one=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            mocks['_run_region_one'].side_effect = se_one
+            with pytest.raises(SystemExit) as excinfo:
+                run_config(conf, args, 'genapply', 'wd')
+        assert excinfo.value.code == 1
+        assert mocks['run_stack'].mock_calls == []
+        assert sorted(mocks['_run_region_one'].mock_calls) == sorted([
+            call(conf, args, 'genapply', os.path.join('wd', 'us-east-1'),
+                 'us-east-1', False),
+            call(conf, args, 'genapply', os.path.join('wd', 'eu-west-1'),
+                 'eu-west-1', False)
+        ])
+        assert mocks['logger'].mock_calls == [
+            call.warning('Running %s for %d regions', 'genapply', 2)
+        ]
+        out, err = capsys.readouterr()
+        assert out == "\n\n=> genapply results:\n" \
+            "OK      us-east-1 (%s) 1.0s\n" \
+            "FAILED  eu-west-1 (%s) 2.0s: terraform apply failed\n" \
+            "1 succeeded, 1 failed\n" % (
+                os.path.join('wd', 'us-east-1'),
+                os.path.join('wd', 'eu-west-1')
+            )
+
+    def test_run_config_regions_success(self, capsys):
+        conf = Mock()
+        conf.get.return_value = ['us-east-1']
+        args = Mock()
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            _run_region_one=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            mocks['_run_region_one'].return_value = (None, 0.5)
+            run_config(conf, args, 'plan', 'wd', generate=True)
+        assert mocks['_run_region_one'].mock_calls == [
+            call(conf, args, 'plan', os.path.join('wd', 'us-east-1'),
+                 'us-east-1', True)
+        ]
+        out, err = capsys.readouterr()
+        assert out.endswith('1 succeeded, 0 failed\n')
+
+    def test_run_config_regions_new_workdir(self, tmpdir, capsys):
+        workdir = str(tmpdir.join('rout'))
+
+        def se_get(name):
+            if name == 'regions':
+                return ['us-east-1', 'eu-west-1']
+            return None
+
+        conf = Mock()
+        conf.get.side_effect = se_get
+        conf.endpoint_method_settings = {}
+        args = Mock(tf_path='terraform', stream_tf=False, parallelism=None,
+                    refresh=True, refresh_max_age=None, account_id=None,
+                    aws_region=None, package_report=False)
+
+        def se_runner(c, tf_path, workdir=None, region=None):
+            # terraform version is run in workdir on construction
+            if not os.path.isdir(workdir):
+                raise Exception('workdir %s does not exist' % workdir)
+            return DEFAULT
+
+        with patch.multiple(
+            pbm,
+            TerraformRunner=DEFAULT,
+            LambdaFuncGenerator=DEFAULT,
+            TerraformGenerator=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            mocks['TerraformRunner'].side_effect = se_runner
+            type(
+                mocks['TerraformRunner'].return_value
+            ).tf_version = PropertyMock(return_value=(0, 9, 2))
+            run_config(conf, args, 'genapply', workdir)
+        out, err = capsys.readouterr()
+        assert out.endswith('2 succeeded, 0 failed\n')
+        for region in ['us-east-1', 'eu-west-1']:
+            assert os.path.isdir(os.path.join(workdir, region))
+
+    def test_run_config_regions_plan_files(self, tmpdir, capsys):
+        workdir = str(tmpdir)
+
+        def se_get(name):
+            if name == 'regions':
+                return ['us-east-1', 'eu-west-1']
+            return None
+
+        conf = Mock()
+        conf.get.side_effect = se_get
+        type(conf).api_type = 'rest'
+        args = Mock(tf_path='terraform', stream_tf=False, parallelism=None,
+                    refresh=True, refresh_max_age=None, plan_out='my.tfplan')
+        runners = {}
+
+        def se_runner(c, tf_path, workdir=None, region=None):
+            runners[region] = Mock()
+            return runners[region]
+
+        with patch.multiple(
+            pbm,
+            TerraformRunner=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            mocks['TerraformRunner'].side_effect = se_runner
+            run_config(conf, args, 'plan', workdir)
+        out, err = capsys.readouterr()
+        assert out.endswith('2 succeeded, 0 failed\n')
+        assert runners['us-east-1'].mock_calls == [
+            call.plan(False, out_file='my.tfplan.us-east-1',
+                      parallelism=None, refresh=True, refresh_max_age=None)
+        ]
+        assert runners['eu-west-1'].mock_calls == [
+            call.plan(False, out_file='my.tfplan.eu-west-1',
+                      parallelism=None, refresh=True, refresh_max_age=None)
+        ]
+        assert call.info(
+            'Using plan file for region %s: %s', 'us-east-1',
+            'my.tfplan.us-east-1'
+        ) in mocks['logger'].mock_calls
+
+    def test_run_stack_region_plan_file(self):
+        conf = Mock()
+        type(conf).api_type = 'rest'
+        conf.get.return_value = None
+        conf.endpoint_method_settings = {}
+        args = Mock(tf_path='terraform', stream_tf=True, parallelism=None,
+                    refresh=False, refresh_max_age=None,
+                    plan_file='my.tfplan')
+        with patch.multiple(
+            pbm,
+            TerraformRunner=DEFAULT,
+            AWSInfo=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            run_stack(conf, args, 'apply', '.', region='r1')
+        assert mocks['TerraformRunner'].mock_calls == [
+            call(conf, 'terraform', workdir='.', region='r1'),
+            call().apply(True, plan_file='my.tfplan.r1', parallelism=None,
+                         refresh=False, refresh_max_age=None)
+        ]
+
+    def test_run_region_one(self):
+        conf = Mock()
+        args = Mock()
+        with patch('%s.run_stack' % pbm, autospec=True) as mock_run:
+            err, duration = _run_region_one(conf, args, 'plan', 'wd/r1',
+                                            'r1', True)
+        assert err is None
+        assert duration >= 0
+        assert mock_run.mock_calls == [
+            call(conf, args, 'plan', 'wd/r1', generate=True, region='r1')
+        ]
+
+    def test_run_region_one_fail(self):
+        conf = Mock()
+        args = Mock()
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            run_stack=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            mocks['run_stack'].side_effect = SystemExit(1)
+            err, duration = _run_region_one(conf, args, 'apply', 'wd/r1',
+                                            'r1', False)
+        assert err == '1'
+        assert mocks['run_stack'].mock_calls == [
+            call(conf, args, 'apply', 'wd/r1', generate=False, region='r1')
+        ]
+
+
+class TestImports(object):
+
+    def test_runner_import_is_light(self):
+        # boto3 and requests are imported by the actions that use them, so
+        # that ``--help``, ``example-config`` and an offline ``generate``
+        # start quickly; see benchmarks/cli_startup.py
+        code = 'import sys; import webhook2lambda2sqs.runner; ' \
+               'print(" ".join(sorted(sys.modules.keys())))'
+        out = subprocess.check_output([sys.executable, '-c', code])
+        mods = set(m.split('.')[0] for m in out.decode('utf-8').split())
+        assert 'webhook2lambda2sqs' in mods
+        assert mods.intersection(
+            ['boto3', 'botocore', 'requests', 'urllib3']
+        ) == set([])
@@ -35,8 +35,10 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ################################################################################
 """
 import sys
+import os
 import pytest
 import json
+import hashlib
 
 from webhook2lambda2sqs.terraform_runner import TerraformRunner
 from webhook2lambda2sqs.tests.support import exc_msg
@@ -54,9 +56,19 @@ else:
 pbm = 'webhook2lambda2sqs.terraform_runner'
 pb = '%s.TerraformRunner' % pbm
 
+# unpatched, as TestTerraformRunner patches it for every test
+orig_binary_key = TerraformRunner._binary_key
+
 
 class TestTerraformRunner(object):
 
+    @pytest.fixture(autouse=True)
+    def no_tf_cache(self):
+        # don't use the terraform cache unless a test explicitly sets it up
+        with patch('%s._binary_key' % pb, autospec=True) as mock_bk:
+            mock_bk.return_value = None
+            yield
+
     def mock_config(self, conf={}):
 
         def se_get(k):
@@ -74,6 +86,57 @@ class TestTerraformRunner(object):
         assert cls.tf_path == 'mypath'
         assert cls.tf_version == (999, 999, 999)
         assert mock_validate.mock_calls == [call(cls)]
+        assert cls.workdir == '.'
+
+    def test_init_workdir(self):
+        c = Mock()
+        with patch('%s._validate' % pb, autospec=True) as mock_validate:
+            cls = TerraformRunner(c, 'bin/terraform', workdir='stacks/foo')
+        assert cls.tf_path == os.path.abspath('bin/terraform')
+        assert cls.workdir == 'stacks/foo'
+        assert mock_validate.mock_calls == [call(cls)]
+
+    def test_path(self):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform')
+        assert cls._path('terraform.tfstate') == 'terraform.tfstate'
+        cls.workdir = 'stacks/foo'
+        assert cls._path('terraform.tfstate') == os.path.join(
+            'stacks', 'foo', 'terraform.tfstate')
+
+    def test_workdir_files(self, tmpdir):
+        wd = tmpdir.mkdir('stack1')
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform',
+                                  workdir=str(wd))
+        wd.join('webhook2lambda2sqs.tf.json').write('{}')
+        wd.join('terraform.tfstate').write(json.dumps({
+            'version': 4, 'lineage': 'foo', 'serial': 3,
+            'outputs': {'base_url': {'value': 'https://foo/'}}
+        }))
+        with tmpdir.as_cwd():
+            assert cls._state_serial() == 'foo:3'
+            assert cls._state_outputs() == {'base_url': 'https://foo/'}
+            assert cls._config_hash() == hashlib.sha256(b'{}').hexdigest()
+            cls._record_deployed()
+            assert cls.changed_files() == []
+            cls._cache_set('foo', 'key', 'bar')
+            assert cls._cache_get('foo', 'key') == 'bar'
+        assert sorted(os.listdir(str(tmpdir))) == ['stack1']
+        assert wd.join('.webhook2lambda2sqs_deployed.json').exists()
+        assert wd.join('.webhook2lambda2sqs_tf_cache.json').exists()
+
+    def test_run_tf_workdir(self):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform',
+                                  workdir='stacks/foo')
+        with patch('%s.run_cmd' % pbm, autospec=True) as mock_run:
+            mock_run.return_value = ('output', 0)
+            cls._run_tf('plan')
+        assert mock_run.mock_calls == [
+            call('terraform plan', stream=False, timeout=None,
+                 transcript=None, cwd='stacks/foo')
+        ]
 
     def test_init_version_fail(self):
 
@@ -114,6 +177,26 @@ class TestTerraformRunner(object):
             '-backend-config="path=consul/path"'
         ]
 
+    def test_args_for_remote_region(self):
+        conf = self.mock_config(conf={
+            'terraform_remote_state': {
+                'backend': 'consul',
+                'config': {'path': 'consul/path'}
+            }
+        })
+        conf.region_remote_state.return_value = {
+            'backend': 'consul',
+            'config': {'path': 'eu-west-1/consul/path'}
+        }
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(conf, 'tfpath', region='eu-west-1')
+        assert cls.region == 'eu-west-1'
+        assert cls._args_for_remote() == [
+            '-backend=consul',
+            '-backend-config="path=eu-west-1/consul/path"'
+        ]
+        assert conf.region_remote_state.mock_calls == [call('eu-west-1')]
+
     def test_set_remote_none(self):
         with patch('%s._validate' % pb):
             cls = TerraformRunner(self.mock_config(), '/path/to/terraform')
@@ -148,6 +231,40 @@ class TestTerraformRunner(object):
             call.info('Terraform remote configured.')
         ]
 
+    def test_set_remote_unchanged(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform')
+        with tmpdir.as_cwd():
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                with patch('%s._args_for_remote' % pb,
+                           autospec=True) as mock_args:
+                    with patch('%s._run_tf' % pb, autospec=True) as mock_run:
+                        with patch('%s._binary_key' % pb) as mock_bk:
+                            mock_bk.return_value = 'tfbin'
+                            mock_args.return_value = ['foo', 'bar']
+                            # no .terraform/terraform.tfstate yet
+                            cls._set_remote()
+                            tmpdir.mkdir('.terraform').join(
+                                'terraform.tfstate').write('{}')
+                            cls._set_remote()
+                            mock_args.return_value = ['foo', 'baz']
+                            cls._set_remote()
+        assert mock_run.mock_calls == [
+            call(cls, 'remote', cmd_args=['config', 'foo', 'bar'],
+                 stream=False),
+            call(cls, 'remote', cmd_args=['config', 'foo', 'baz'],
+                 stream=False)
+        ]
+        assert mock_logger.mock_calls == [
+            call.warning('Setting terraform remote config: %s', 'foo bar'),
+            call.info('Terraform remote configured.'),
+            call.debug('Using cached terraform %s', 'remote'),
+            call.info('Terraform remote config unchanged; not '
+                      'reconfiguring'),
+            call.warning('Setting terraform remote config: %s', 'foo baz'),
+            call.info('Terraform remote configured.')
+        ]
+
     def test_run_tf(self):
         expected_args = 'terraform plan config foo bar'
         with patch('%s._validate' % pb):
@@ -157,12 +274,28 @@ class TestTerraformRunner(object):
                 mock_run.return_value = ('myoutput', 0)
                 cls._run_tf('plan', cmd_args=['config', 'foo', 'bar'])
         assert mock_run.mock_calls == [
-            call(expected_args, stream=False)
+            call(expected_args, stream=False, timeout=None, transcript=None,
+                 cwd='.')
         ]
         assert mock_logger.mock_calls == [
             call.info('Running terraform command: %s', expected_args)
         ]
 
+    def test_run_tf_timeout_transcript(self):
+        expected_args = 'terraform plan'
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config({
+                'terraform_timeout': 600,
+                'terraform_transcript': '/tmp/tf.log'
+            }), 'terraform')
+        with patch('%s.run_cmd' % pbm, autospec=True) as mock_run:
+            mock_run.return_value = ('myoutput', 0)
+            assert cls._run_tf('plan') == 'myoutput'
+        assert mock_run.mock_calls == [
+            call(expected_args, stream=False, timeout=600,
+                 transcript='/tmp/tf.log', cwd='.')
+        ]
+
     def test_run_tf_fail(self):
         expected_args = 'terraform-bin plan config foo bar'
         with patch('%s._validate' % pb):
@@ -175,7 +308,8 @@ class TestTerraformRunner(object):
                                 stream=True)
         assert exc_msg(excinfo.value) == 'terraform plan failed'
         assert mock_run.mock_calls == [
-            call(expected_args, stream=True)
+            call(expected_args, stream=True, timeout=None, transcript=None,
+                 cwd='.')
         ]
         assert mock_logger.mock_calls == [
             call.info('Running terraform command: %s', expected_args),
@@ -225,46 +359,123 @@ class TestTerraformRunner(object):
             call.warning("Terraform plan finished successfully.")
         ]
 
-    def test_taint_deployment(self):
+    def test_plan_out_options(self):
         with patch('%s._validate' % pb):
             cls = TerraformRunner(self.mock_config(), 'terraform-bin')
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-            with patch('%s._set_remote' % pb, autospec=True) as mock_set:
+            with patch('%s._setup_tf' % pb, autospec=True):
                 with patch('%s._run_tf' % pb, autospec=True) as mock_run:
                     mock_run.return_value = 'output'
-                    cls._taint_deployment()
-        assert mock_set.mock_calls == []
+                    cls.plan(out_file='/plans/w2l2s.tfplan', parallelism=3,
+                             refresh=False)
         assert mock_run.mock_calls == [
-            call(cls, 'taint', cmd_args=['aws_api_gateway_deployment.depl'],
-                 stream=False)
+            call(cls, 'plan', cmd_args=[
+                '-input=false', '-refresh=false', '-parallelism=3',
+                '-out=/plans/w2l2s.tfplan', '.'
+            ], stream=False)
         ]
         assert mock_logger.mock_calls == [
-            call.warning('Running terraform taint: %s as workaround for '
-                         '<https://github.com/hashicorp/terraform/issues/6613>',
-                         'aws_api_gateway_deployment.depl'),
-            call.warning("Terraform taint finished successfully:\n%s", 'output')
+            call.warning('Running terraform plan: %s',
+                         '-input=false -refresh=false -parallelism=3 '
+                         '-out=/plans/w2l2s.tfplan .'),
+            call.warning("Terraform plan finished successfully:\n%s",
+                         'output'),
+            call.warning('Terraform plan saved to: %s', '/plans/w2l2s.tfplan')
         ]
 
-    def test_taint_deployment_stream(self):
+    def test_refresh_arg(self):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        with patch('%s._state_path' % pb, autospec=True) as mock_path:
+            mock_path.return_value = 'terraform.tfstate'
+            assert cls._refresh_arg() == '-refresh=true'
+            assert cls._refresh_arg(refresh=False) == '-refresh=false'
+            assert cls._refresh_arg(
+                refresh=False, refresh_max_age=60) == '-refresh=false'
+        assert mock_path.mock_calls == []
+
+    def test_refresh_arg_max_age(self):
         with patch('%s._validate' % pb):
             cls = TerraformRunner(self.mock_config(), 'terraform-bin')
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-            with patch('%s._set_remote' % pb, autospec=True) as mock_set:
-                with patch('%s._run_tf' % pb, autospec=True) as mock_run:
-                    mock_run.return_value = 'output'
-                    cls._taint_deployment(stream=True)
-        assert mock_set.mock_calls == []
-        assert mock_run.mock_calls == [
-            call(cls, 'taint', cmd_args=['aws_api_gateway_deployment.depl'],
-                 stream=True)
+            with patch('%s._state_path' % pb, autospec=True) as mock_path:
+                with patch('%s.time.time' % pbm) as mock_time:
+                    with patch('%s.os.path.getmtime' % pbm) as mock_mtime:
+                        mock_path.return_value = 'terraform.tfstate'
+                        mock_time.return_value = 1000.0
+                        mock_mtime.return_value = 950.0
+                        fresh = cls._refresh_arg(refresh_max_age=60)
+                        stale = cls._refresh_arg(refresh_max_age=30)
+        assert fresh == '-refresh=false'
+        assert stale == '-refresh=true'
+        assert mock_mtime.mock_calls == [
+            call('terraform.tfstate'), call('terraform.tfstate')
         ]
         assert mock_logger.mock_calls == [
-            call.warning('Running terraform taint: %s as workaround for '
-                         '<https://github.com/hashicorp/terraform/issues/6613>',
-                         'aws_api_gateway_deployment.depl'),
-            call.warning("Terraform taint finished successfully.")
+            call.warning('State file %s was written %d seconds ago; not '
+                         'refreshing state', 'terraform.tfstate', 50.0)
         ]
 
+    def test_refresh_arg_max_age_no_state(self):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        with patch('%s._state_path' % pb, autospec=True) as mock_path:
+            with patch('%s.os.path.getmtime' % pbm) as mock_mtime:
+                mock_path.return_value = None
+                assert cls._refresh_arg(
+                    refresh_max_age=60) == '-refresh=true'
+        assert mock_mtime.mock_calls == []
+
+    def test_refresh_arg_max_age_backend_only(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config({
+                'terraform_remote_state': {'backend': 's3', 'config': {}}
+            }), 'terraform-bin')
+        cls.workdir = str(tmpdir)
+        # 0.9+ backend configuration, just written by init
+        tmpdir.mkdir('.terraform').join('terraform.tfstate').write(json.dumps({
+            'version': 3,
+            'backend': {'type': 's3', 'config': {}},
+            'modules': []
+        }))
+        path = os.path.join(str(tmpdir), '.terraform', 'terraform.tfstate')
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            res = cls._refresh_arg(refresh_max_age=3600)
+        assert res == '-refresh=true'
+        assert mock_logger.mock_calls == [
+            call.debug('%s only holds backend configuration; refreshing '
+                       'state', path)
+        ]
+
+    def test_refresh_arg_max_age_remote_pre0point9(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config({
+                'terraform_remote_state': {'backend': 's3', 'config': {}}
+            }), 'terraform-bin')
+        cls.workdir = str(tmpdir)
+        tmpdir.mkdir('.terraform').join('terraform.tfstate').write(json.dumps({
+            'version': 3,
+            'remote': {'type': 's3', 'config': {}},
+            'modules': []
+        }))
+        with patch('%s.logger' % pbm, autospec=True):
+            assert cls._refresh_arg(refresh_max_age=3600) == '-refresh=false'
+
+    def test_state_is_local(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        cls.workdir = str(tmpdir)
+        # not read
+        assert cls._state_is_local(
+            os.path.join(str(tmpdir), 'terraform.tfstate')) is True
+        p = tmpdir.mkdir('.terraform').join('terraform.tfstate')
+        p.write('not json')
+        assert cls._state_is_local(str(p)) is False
+        p.write(json.dumps({'version': 3, 'backend': {'type': 's3'}}))
+        assert cls._state_is_local(str(p)) is False
+        p.write(json.dumps({'version': 3, 'remote': {'type': 's3'}}))
+        assert cls._state_is_local(str(p)) is True
+
     def test_apply(self):
         with patch('%s._validate' % pb):
             cls = TerraformRunner(self.mock_config(), 'terraform-bin')
@@ -272,12 +483,16 @@ class TestTerraformRunner(object):
             with patch('%s._set_remote' % pb, autospec=True) as mock_set:
                 with patch('%s._setup_tf' % pb, autospec=True) as mock_setup:
                     with patch('%s._run_tf' % pb, autospec=True) as mock_run:
-                        with patch('%s._taint_deployment' % pb,
-                                   autospec=True) as mock_taint:
-                            mock_run.return_value = 'output'
-                            with patch('%s._show_outputs' % pb,
-                                       autospec=True) as mock_show:
-                                cls.apply()
+                        mock_run.return_value = 'output'
+                        with patch.multiple(
+                            pb,
+                            autospec=True,
+                            _show_outputs=DEFAULT,
+                            _record_deployed=DEFAULT,
+                            _clear_deployed=DEFAULT,
+                            _set_refresh_required=DEFAULT
+                        ) as mocks:
+                            cls.apply()
         assert mock_setup.mock_calls == [call(cls, stream=False)]
         assert mock_set.mock_calls == []
         assert mock_run.mock_calls == [
@@ -289,27 +504,28 @@ class TestTerraformRunner(object):
                          '-input=false -refresh=true .'),
             call.warning("Terraform apply finished successfully:\n%s", 'output')
         ]
-        assert mock_show.mock_calls == [call(cls)]
-        assert mock_taint.mock_calls == [call(cls, stream=False)]
+        assert mocks['_show_outputs'].mock_calls == [call(cls)]
+        assert mocks['_clear_deployed'].mock_calls == [call(cls)]
+        assert mocks['_set_refresh_required'].mock_calls == [call(cls, False)]
+        assert mocks['_record_deployed'].mock_calls == [call(cls)]
 
     def test_apply_stream(self):
-
-        def se_exc(*args, **kwargs):
-            raise Exception('foo')
-
         with patch('%s._validate' % pb):
             cls = TerraformRunner(self.mock_config(), 'terraform-bin')
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
             with patch('%s._set_remote' % pb, autospec=True) as mock_set:
                 with patch('%s._setup_tf' % pb, autospec=True) as mock_setup:
                     with patch('%s._run_tf' % pb, autospec=True) as mock_run:
-                        with patch('%s._taint_deployment' % pb,
-                                   autospec=True) as mock_taint:
-                            mock_run.return_value = 'output'
-                            mock_taint.side_effect = se_exc
-                            with patch('%s._show_outputs' % pb,
-                                       autospec=True) as mock_show:
-                                cls.apply(stream=True)
+                        mock_run.return_value = 'output'
+                        with patch.multiple(
+                            pb,
+                            autospec=True,
+                            _show_outputs=DEFAULT,
+                            _record_deployed=DEFAULT,
+                            _clear_deployed=DEFAULT,
+                            _set_refresh_required=DEFAULT
+                        ) as mocks:
+                            cls.apply(stream=True)
         assert mock_setup.mock_calls == [call(cls, stream=True)]
         assert mock_set.mock_calls == []
         assert mock_run.mock_calls == [
@@ -321,8 +537,472 @@ class TestTerraformRunner(object):
                          '-input=false -refresh=true .'),
             call.warning("Terraform apply finished successfully.")
         ]
-        assert mock_show.mock_calls == [call(cls)]
-        assert mock_taint.mock_calls == [call(cls, stream=True)]
+        assert mocks['_show_outputs'].mock_calls == [call(cls)]
+        assert mocks['_clear_deployed'].mock_calls == [call(cls)]
+        assert mocks['_set_refresh_required'].mock_calls == [call(cls, False)]
+        assert mocks['_record_deployed'].mock_calls == [call(cls)]
+
+    def test_apply_plan_file(self):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            with patch('%s._setup_tf' % pb, autospec=True):
+                with patch('%s._run_tf' % pb, autospec=True) as mock_run:
+                    mock_run.return_value = 'output'
+                    with patch.multiple(
+                        pb,
+                        autospec=True,
+                        _show_outputs=DEFAULT,
+                        _record_deployed=DEFAULT,
+                        _clear_deployed=DEFAULT,
+                        _set_refresh_required=DEFAULT,
+                        _refresh_arg=DEFAULT
+                    ) as mocks:
+                        cls.apply(plan_file='/plans/w2l2s.tfplan',
+                                  parallelism=2)
+        assert mock_run.mock_calls == [
+            call(cls, 'apply', cmd_args=[
+                '-input=false', '-parallelism=2', '/plans/w2l2s.tfplan'
+            ], stream=False)
+        ]
+        assert mock_logger.mock_calls == [
+            call.warning('Running terraform apply: %s',
+                         '-input=false -parallelism=2 /plans/w2l2s.tfplan'),
+            call.warning("Terraform apply finished successfully:\n%s",
+                         'output')
+        ]
+        assert mocks['_refresh_arg'].mock_calls == []
+        assert mocks['_clear_deployed'].mock_calls == [call(cls)]
+        assert mocks['_set_refresh_required'].mock_calls == [call(cls, False)]
+        assert mocks['_record_deployed'].mock_calls == [call(cls)]
+        assert mocks['_show_outputs'].mock_calls == [call(cls)]
+
+    def test_file_hashes(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        tmpdir.join('webhook2lambda2sqs.tf.json').write_binary(b'foo')
+        tmpdir.join('webhook2lambda2sqs_func.zip').write_binary(b'bar')
+        with tmpdir.as_cwd():
+            res = cls._file_hashes()
+        assert res == {
+            'webhook2lambda2sqs.tf.json': hashlib.sha256(b'foo').hexdigest(),
+            'webhook2lambda2sqs_func.zip': hashlib.sha256(b'bar').hexdigest(),
+            'webhook2lambda2sqs_layer.zip': None
+        }
+
+    def test_record_deployed(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        with patch('%s._file_hashes' % pb, autospec=True) as mock_fh:
+            mock_fh.return_value = {'a': 'b', 'c': None}
+            with tmpdir.as_cwd():
+                cls._record_deployed()
+        assert json.loads(
+            tmpdir.join('.webhook2lambda2sqs_deployed.json').read()
+        ) == {'a': 'b', 'c': None}
+
+    def test_clear_deployed(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        tmpdir.join('.webhook2lambda2sqs_deployed.json').write('{}')
+        with tmpdir.as_cwd():
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                cls._clear_deployed()
+                cls._clear_deployed()
+        assert not tmpdir.join('.webhook2lambda2sqs_deployed.json').exists()
+        assert mock_logger.mock_calls == [
+            call.debug('Removing record of last deploy: %s',
+                       '.webhook2lambda2sqs_deployed.json')
+        ]
+
+    def test_apply_failed_clears_record(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        tmpdir.join('.webhook2lambda2sqs_deployed.json').write('{}')
+        with tmpdir.as_cwd():
+            with patch('%s.logger' % pbm, autospec=True):
+                with patch('%s._setup_tf' % pb, autospec=True):
+                    with patch('%s._run_tf' % pb, autospec=True) as mock_run:
+                        mock_run.side_effect = Exception('apply failed')
+                        with pytest.raises(Exception):
+                            cls.apply()
+        assert not tmpdir.join('.webhook2lambda2sqs_deployed.json').exists()
+
+    def test_destroy_then_deploy_code(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        tmpdir.join('webhook2lambda2sqs.tf.json').write('{}')
+        tmpdir.join('webhook2lambda2sqs_func.zip').write('zip')
+        with tmpdir.as_cwd():
+            cls._record_deployed()
+            assert cls.changed_files() == []
+            with patch('%s.logger' % pbm, autospec=True):
+                with patch('%s._setup_tf' % pb, autospec=True):
+                    with patch('%s._run_tf' % pb, autospec=True) as mock_run:
+                        mock_run.return_value = 'output'
+                        cls.destroy()
+            # unchanged files must not be treated as already deployed
+            with patch('%s.apply' % pb, autospec=True) as mock_apply:
+                with patch('%s.AWSInfo' % pbm, autospec=True) as mock_aws:
+                    assert cls.deploy_code() is True
+        assert mock_apply.mock_calls == [call(cls, stream=False)]
+        assert mock_aws.mock_calls == []
+
+    def test_changed_files_no_record(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        with tmpdir.as_cwd():
+            assert cls.changed_files() is None
+
+    def test_changed_files(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        tmpdir.join('.webhook2lambda2sqs_deployed.json').write(json.dumps({
+            'a': 'hash1', 'b': 'hash2', 'c': None
+        }))
+        with patch('%s._file_hashes' % pb, autospec=True) as mock_fh:
+            mock_fh.return_value = {'a': 'hash1', 'b': 'hash3', 'c': 'hash4'}
+            with tmpdir.as_cwd():
+                res = cls.changed_files()
+        assert res == ['b', 'c']
+
+    def test_deploy_code_no_record(self):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        with patch.multiple(
+            pb,
+            autospec=True,
+            changed_files=DEFAULT,
+            apply=DEFAULT,
+            _record_deployed=DEFAULT
+        ) as mocks:
+            with patch('%s.AWSInfo' % pbm, autospec=True) as mock_aws:
+                mocks['changed_files'].return_value = None
+                assert cls.deploy_code(stream=True) is True
+        assert mocks['apply'].mock_calls == [call(cls, stream=True)]
+        assert mocks['_record_deployed'].mock_calls == []
+        assert mock_aws.mock_calls == []
+
+    def test_deploy_code_infra_changed(self):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        with patch.multiple(
+            pb,
+            autospec=True,
+            changed_files=DEFAULT,
+            apply=DEFAULT,
+            _record_deployed=DEFAULT
+        ) as mocks:
+            with patch('%s.AWSInfo' % pbm, autospec=True) as mock_aws:
+                mocks['changed_files'].return_value = [
+                    'webhook2lambda2sqs.tf.json', 'webhook2lambda2sqs_func.zip'
+                ]
+                assert cls.deploy_code() is True
+        assert mocks['apply'].mock_calls == [call(cls, stream=False)]
+        assert mock_aws.mock_calls == []
+
+    def test_deploy_code_unchanged(self):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        with patch.multiple(
+            pb,
+            autospec=True,
+            changed_files=DEFAULT,
+            apply=DEFAULT,
+            _record_deployed=DEFAULT
+        ) as mocks:
+            with patch('%s.AWSInfo' % pbm, autospec=True) as mock_aws:
+                mocks['changed_files'].return_value = []
+                assert cls.deploy_code() is False
+        assert mocks['apply'].mock_calls == []
+        assert mocks['_record_deployed'].mock_calls == []
+        assert mock_aws.mock_calls == []
+
+    def test_deploy_code_code_only(self):
+        conf = self.mock_config()
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(conf, 'terraform-bin')
+        with patch.multiple(
+            pb,
+            autospec=True,
+            changed_files=DEFAULT,
+            apply=DEFAULT,
+            _record_deployed=DEFAULT,
+            _set_refresh_required=DEFAULT
+        ) as mocks:
+            with patch('%s.AWSInfo' % pbm, autospec=True) as mock_aws:
+                mocks['changed_files'].return_value = [
+                    'webhook2lambda2sqs_func.zip'
+                ]
+                assert cls.deploy_code() is False
+        assert mocks['apply'].mock_calls == []
+        assert mocks['_record_deployed'].mock_calls == [call(cls)]
+        assert mocks['_set_refresh_required'].mock_calls == [call(cls, True)]
+        assert mock_aws.mock_calls == [
+            call(conf, region=None),
+            call().update_function_code('webhook2lambda2sqs_func.zip')
+        ]
+
+    def test_set_refresh_required(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        cls.workdir = str(tmpdir)
+        path = tmpdir.join('.webhook2lambda2sqs_refresh_required')
+        cls._set_refresh_required(True)
+        assert path.exists()
+        cls._set_refresh_required(True)
+        assert path.exists()
+        cls._set_refresh_required(False)
+        assert not path.exists()
+        cls._set_refresh_required(False)
+        assert not path.exists()
+
+    def test_plan_after_deploy_code_no_refresh(self, tmpdir):
+        """
+        A code-only deploy changes the function's CodeSha256 outside of
+        Terraform; plans and applies must refresh state until the next apply,
+        even with refresh=False, or they'd show a spurious function update.
+        """
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        cls.workdir = str(tmpdir)
+        tmpdir.join('terraform.tfstate').write('{}')
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch.multiple(
+                pb,
+                autospec=True,
+                changed_files=DEFAULT,
+                _setup_tf=DEFAULT,
+                _run_tf=DEFAULT,
+                _show_outputs=DEFAULT
+            ) as mocks:
+                mocks['changed_files'].return_value = [
+                    'webhook2lambda2sqs_func.zip'
+                ]
+                mocks['_run_tf'].return_value = 'output'
+                with patch('%s.AWSInfo' % pbm, autospec=True):
+                    assert cls.deploy_code() is False
+                cls.plan(refresh=False)
+                cls.plan(refresh_max_age=3600)
+                cls.apply(refresh=False)
+                cls.plan(refresh=False)
+        assert mocks['_run_tf'].mock_calls == [
+            call(cls, 'plan', cmd_args=['-input=false', '-refresh=true', '.'],
+                 stream=False),
+            call(cls, 'plan', cmd_args=['-input=false', '-refresh=true', '.'],
+                 stream=False),
+            call(cls, 'apply', cmd_args=['-input=false', '-refresh=true',
+                                         '.'], stream=False),
+            # state was refreshed by the apply
+            call(cls, 'plan', cmd_args=['-input=false', '-refresh=false',
+                                        '.'], stream=False)
+        ]
+
+    def test_get_outputs_cached(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        tmpdir.join('.webhook2lambda2sqs_tf_cache.json').write(json.dumps({
+            'outputs': {'key': 'bkey|chash|lin:3', 'value': {'foo': 'bar'}}
+        }))
+        tmpdir.join('terraform.tfstate').write(json.dumps({
+            'lineage': 'lin', 'serial': 3
+        }))
+        with patch('%s._binary_key' % pb) as mock_bk:
+            with patch('%s._config_hash' % pb) as mock_ch:
+                with patch('%s._tf_outputs' % pb, autospec=True) as mock_out:
+                    mock_bk.return_value = 'bkey'
+                    mock_ch.return_value = 'chash'
+                    with tmpdir.as_cwd():
+                        res = cls._get_outputs()
+        assert res == {'foo': 'bar'}
+        assert mock_out.mock_calls == []
+
+    def test_get_outputs_cache_miss(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        cache = tmpdir.join('.webhook2lambda2sqs_tf_cache.json')
+        cache.write(json.dumps({
+            'outputs': {'key': 'bkey|chash|lin:2', 'value': {'foo': 'bar'}}
+        }))
+        tmpdir.join('terraform.tfstate').write(json.dumps({
+            'lineage': 'lin', 'serial': 3
+        }))
+        with patch('%s._binary_key' % pb) as mock_bk:
+            with patch('%s._config_hash' % pb) as mock_ch:
+                with patch('%s._tf_outputs' % pb, autospec=True) as mock_out:
+                    mock_bk.return_value = 'bkey'
+                    mock_ch.return_value = 'chash'
+                    mock_out.return_value = {'foo': 'baz'}
+                    with tmpdir.as_cwd():
+                        res = cls._get_outputs()
+        assert res == {'foo': 'baz'}
+        assert mock_out.mock_calls == [call(cls)]
+        assert json.loads(cache.read()) == {
+            'outputs': {'key': 'bkey|chash|lin:3', 'value': {'foo': 'baz'}}
+        }
+
+    def test_get_outputs_no_state(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        with patch('%s._binary_key' % pb) as mock_bk:
+            with patch('%s._config_hash' % pb) as mock_ch:
+                with patch('%s._tf_outputs' % pb, autospec=True) as mock_out:
+                    mock_bk.return_value = 'bkey'
+                    mock_ch.return_value = 'chash'
+                    mock_out.return_value = {'foo': 'baz'}
+                    with tmpdir.as_cwd():
+                        res = cls._get_outputs()
+        assert res == {'foo': 'baz'}
+        assert not tmpdir.join('.webhook2lambda2sqs_tf_cache.json').exists()
+
+    def test_binary_key(self, tmpdir):
+        f = tmpdir.join('terraform')
+        f.write('foo')
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), str(f))
+        with patch('%s.which' % pbm) as mock_which:
+            res = orig_binary_key(cls)
+        assert mock_which.mock_calls == []
+        assert res == '%s:3:%s' % (f.realpath(), os.stat(str(f)).st_mtime)
+
+    def test_binary_key_path(self, tmpdir):
+        f = tmpdir.join('terraform')
+        f.write('foo')
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform')
+        with patch('%s.which' % pbm) as mock_which:
+            mock_which.return_value = str(f)
+            res = orig_binary_key(cls)
+        assert mock_which.mock_calls == [call('terraform')]
+        assert res.startswith('%s:3:' % f.realpath())
+
+    def test_binary_key_not_found(self):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform')
+        with patch('%s.which' % pbm) as mock_which:
+            mock_which.return_value = None
+            assert orig_binary_key(cls) is None
+
+    def test_state_serial(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform')
+        with tmpdir.as_cwd():
+            assert cls._state_serial() is None
+            tmpdir.join('terraform.tfstate').write('not json')
+            assert cls._state_serial() is None
+            tmpdir.join('terraform.tfstate').write(json.dumps({
+                'lineage': 'foo', 'serial': 12
+            }))
+            assert cls._state_serial() == 'foo:12'
+
+    def test_get_outputs_state(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        with patch('%s._state_outputs' % pb, autospec=True) as mock_so:
+            with patch('%s._tf_outputs' % pb, autospec=True) as mock_out:
+                mock_so.return_value = {'foo': 'bar'}
+                res = cls._get_outputs()
+        assert res == {'foo': 'bar'}
+        assert mock_so.mock_calls == [call(cls)]
+        assert mock_out.mock_calls == []
+
+    def test_get_outputs_no_state_outputs(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        with patch('%s._state_outputs' % pb, autospec=True) as mock_so:
+            with patch('%s._tf_outputs' % pb, autospec=True) as mock_out:
+                mock_so.return_value = None
+                mock_out.return_value = {'foo': 'baz'}
+                res = cls._get_outputs()
+        assert res == {'foo': 'baz'}
+        assert mock_out.mock_calls == [call(cls)]
+
+    def test_state_outputs_v4(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        tmpdir.join('terraform.tfstate').write(json.dumps({
+            'version': 4,
+            'serial': 3,
+            'outputs': {
+                'base_url': {'value': 'https://foo/', 'type': 'string'},
+                'rest_api_id': {'value': 'abc', 'type': 'string'}
+            },
+            'resources': []
+        }))
+        with tmpdir.as_cwd():
+            res = cls._state_outputs()
+        assert res == {'base_url': 'https://foo/', 'rest_api_id': 'abc'}
+
+    def test_state_outputs_v3(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        tmpdir.join('terraform.tfstate').write(json.dumps({
+            'version': 3,
+            'serial': 3,
+            'modules': [
+                {
+                    'path': ['root'],
+                    'outputs': {
+                        'base_url': {
+                            'sensitive': False,
+                            'type': 'string',
+                            'value': 'https://foo/'
+                        },
+                        'old_style': 'bar'
+                    }
+                },
+                {
+                    'path': ['root', 'child'],
+                    'outputs': {'base_url': {'value': 'wrong'}}
+                }
+            ]
+        }))
+        with tmpdir.as_cwd():
+            res = cls._state_outputs()
+        assert res == {'base_url': 'https://foo/', 'old_style': 'bar'}
+
+    def test_state_outputs_no_state(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        with tmpdir.as_cwd():
+            assert cls._state_outputs() is None
+            tmpdir.join('terraform.tfstate').write('not json')
+            assert cls._state_outputs() is None
+
+    def test_state_outputs_remote_pre0point9(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config({
+                'terraform_remote_state': {'backend': 's3', 'config': {}}
+            }), 'terraform-bin')
+        # stale local state must be ignored
+        tmpdir.join('terraform.tfstate').write(json.dumps({
+            'version': 4, 'outputs': {'foo': {'value': 'stale'}}
+        }))
+        tmpdir.mkdir('.terraform').join('terraform.tfstate').write(json.dumps({
+            'version': 3,
+            'remote': {'type': 's3', 'config': {}},
+            'modules': [
+                {'path': ['root'], 'outputs': {'foo': {'value': 'bar'}}}
+            ]
+        }))
+        with tmpdir.as_cwd():
+            res = cls._state_outputs()
+        assert res == {'foo': 'bar'}
+
+    def test_state_outputs_backend_only(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config({
+                'terraform_remote_state': {'backend': 's3', 'config': {}}
+            }), 'terraform-bin')
+        tmpdir.mkdir('.terraform').join('terraform.tfstate').write(json.dumps({
+            'version': 3,
+            'backend': {'type': 's3', 'config': {}},
+            'modules': [
+                {'path': ['root'], 'outputs': {}}
+            ]
+        }))
+        with tmpdir.as_cwd():
+            assert cls._state_outputs() is None
 
     def test_get_outputs_pre0point7(self):
         resp = "base_url = https://ljgx260ix7.execute-api.us-east-1.ama/bar/\n"
@@ -460,6 +1140,24 @@ class TestTerraformRunner(object):
             call.warning("Terraform destroy finished successfully.")
         ]
 
+    def test_destroy_options(self):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform-bin')
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch('%s._setup_tf' % pb, autospec=True):
+                with patch('%s._run_tf' % pb, autospec=True) as mock_run:
+                    with patch('%s._refresh_arg' % pb,
+                               autospec=True) as mock_refresh:
+                        mock_run.return_value = 'output'
+                        mock_refresh.return_value = '-refresh=false'
+                        cls.destroy(parallelism=5, refresh_max_age=120)
+        assert mock_refresh.mock_calls == [call(cls, True, 120)]
+        assert mock_run.mock_calls == [
+            call(cls, 'destroy', cmd_args=[
+                '-refresh=false', '-force', '-parallelism=5', '.'
+            ], stream=False)
+        ]
+
     def test_validate(self):
 
         def se_run(*args, **kwargs):
@@ -480,6 +1178,51 @@ class TestTerraformRunner(object):
             call.debug('Terraform version: %s', (1, 2, 3)),
         ]
 
+    def test_validate_cached(self, tmpdir):
+        tmpdir.join('.webhook2lambda2sqs_tf_cache.json').write(json.dumps({
+            'version': {'key': 'bkey', 'value': 'Terraform v0.9.2\n'},
+            'validate': {'key': 'bkey|chash', 'value': True}
+        }))
+        with patch('%s._binary_key' % pb) as mock_bk:
+            with patch('%s._config_hash' % pb) as mock_ch:
+                with patch('%s._run_tf' % pb, autospec=True) as mock_run:
+                    mock_bk.return_value = 'bkey'
+                    mock_ch.return_value = 'chash'
+                    with tmpdir.as_cwd():
+                        cls = TerraformRunner(self.mock_config(), 'tf')
+        assert cls.tf_version == (0, 9, 2)
+        assert mock_run.mock_calls == []
+
+    def test_validate_cache_miss(self, tmpdir):
+
+        def se_run(*args, **kwargs):
+            if args[1] == 'version':
+                return "Terraform v1.2.3\nfoo\n"
+            return
+
+        cache = tmpdir.join('.webhook2lambda2sqs_tf_cache.json')
+        cache.write(json.dumps({
+            'version': {'key': 'oldkey', 'value': 'Terraform v0.9.2\n'},
+            'validate': {'key': 'oldkey|chash', 'value': True}
+        }))
+        with patch('%s._binary_key' % pb) as mock_bk:
+            with patch('%s._config_hash' % pb) as mock_ch:
+                with patch('%s._run_tf' % pb, autospec=True) as mock_run:
+                    mock_bk.return_value = 'bkey'
+                    mock_ch.return_value = 'chash'
+                    mock_run.side_effect = se_run
+                    with tmpdir.as_cwd():
+                        cls = TerraformRunner(self.mock_config(), 'tf')
+        assert cls.tf_version == (1, 2, 3)
+        assert mock_run.mock_calls == [
+            call(cls, 'version'),
+            call(cls, 'validate', ['.'])
+        ]
+        assert json.loads(cache.read()) == {
+            'version': {'key': 'bkey', 'value': 'Terraform v1.2.3\nfoo\n'},
+            'validate': {'key': 'bkey|chash', 'value': True}
+        }
+
     def test_validate_version_fail(self):
         def se_run(*args, **kwargs):
             if args[0] == 'version':
@@ -576,6 +1319,159 @@ class TestTerraformRunner(object):
                           "Exception: %s", exc)
         ]
 
+    def test_setup_tf_010(self):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform')
+        cls.tf_version = (0, 10, 0)
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch.multiple(
+                pb,
+                autospec=True,
+                _set_remote=DEFAULT,
+                _run_tf=DEFAULT,
+                _setup_plugin_cache=DEFAULT
+            ) as mocks:
+                cls._setup_tf()
+        assert mocks['_set_remote'].mock_calls == []
+        assert mocks['_setup_plugin_cache'].mock_calls == [call(cls)]
+        assert mocks['_run_tf'].mock_calls == [
+            call(cls, 'init', stream=False)
+        ]
+
+    def test_setup_tf_init_unchanged(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform')
+        cls.tf_version = (0, 9, 2)
+        with tmpdir.as_cwd():
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                with patch.multiple(
+                    pb,
+                    autospec=True,
+                    _run_tf=DEFAULT,
+                    _init_fingerprint=DEFAULT
+                ) as mocks:
+                    with patch('%s._binary_key' % pb) as mock_bk:
+                        mock_bk.return_value = 'tfbin'
+                        mocks['_init_fingerprint'].return_value = 'fp1'
+                        cls._setup_tf()
+                        # terraform would create this
+                        tmpdir.mkdir('.terraform')
+                        cls._setup_tf()
+                        mocks['_init_fingerprint'].return_value = 'fp2'
+                        cls._setup_tf()
+        assert mocks['_run_tf'].mock_calls == [
+            call(cls, 'init', stream=False),
+            call(cls, 'init', stream=False)
+        ]
+        assert mock_logger.mock_calls == [
+            call.info('Terraform initialized'),
+            call.debug('Using cached terraform %s', 'init'),
+            call.info('Terraform backend and providers unchanged; not '
+                      're-initializing'),
+            call.info('Terraform initialized')
+        ]
+
+    def test_setup_tf_init_no_dir(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform')
+        cls.tf_version = (0, 9, 2)
+        with tmpdir.as_cwd():
+            with patch.multiple(
+                pb,
+                autospec=True,
+                _run_tf=DEFAULT,
+                _init_fingerprint=DEFAULT
+            ) as mocks:
+                with patch('%s._binary_key' % pb) as mock_bk:
+                    mock_bk.return_value = 'tfbin'
+                    mocks['_init_fingerprint'].return_value = 'fp1'
+                    cls._setup_tf()
+                    cls._setup_tf()
+        assert mocks['_run_tf'].mock_calls == [
+            call(cls, 'init', stream=False),
+            call(cls, 'init', stream=False)
+        ]
+
+    def test_init_fingerprint(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform')
+        conf = {
+            'provider': {'aws': {}},
+            'terraform': {'backend': {'s3': {'bucket': 'foo'}}},
+            'resource': {
+                'aws_lambda_function': {'lf': {'handler': 'a'}}
+            }
+        }
+        with tmpdir.as_cwd():
+            assert cls._init_fingerprint() is None
+            tmpdir.join('webhook2lambda2sqs.tf.json').write(json.dumps(conf))
+            fp1 = cls._init_fingerprint()
+            # resource changes don't change the fingerprint
+            conf['resource']['aws_lambda_function']['lf']['handler'] = 'b'
+            conf['resource']['aws_sqs_queue'] = {'q': {}}
+            tmpdir.join('webhook2lambda2sqs.tf.json').write(json.dumps(conf))
+            assert cls._init_fingerprint() == fp1
+            # backend changes do
+            conf['terraform']['backend']['s3']['bucket'] = 'bar'
+            tmpdir.join('webhook2lambda2sqs.tf.json').write(json.dumps(conf))
+            fp2 = cls._init_fingerprint()
+            assert fp2 != fp1
+            # as do new providers
+            conf['resource']['null_resource'] = {'n': {}}
+            tmpdir.join('webhook2lambda2sqs.tf.json').write(json.dumps(conf))
+            fp3 = cls._init_fingerprint()
+            assert fp3 not in [fp1, fp2]
+            # and new modules, but not module arguments
+            conf['module'] = {'m': {'source': './mod', 'foo': {'a': 1}}}
+            tmpdir.join('webhook2lambda2sqs.tf.json').write(json.dumps(conf))
+            fp4 = cls._init_fingerprint()
+            assert fp4 not in [fp1, fp2, fp3]
+            conf['module']['m']['foo']['b'] = 2
+            tmpdir.join('webhook2lambda2sqs.tf.json').write(json.dumps(conf))
+            assert cls._init_fingerprint() == fp4
+
+    def test_setup_plugin_cache_default(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform')
+        with patch.dict('%s.os.environ' % pbm, {'HOME': str(tmpdir)}):
+            os.environ.pop('TF_PLUGIN_CACHE_DIR', None)
+            res = cls._setup_plugin_cache()
+            env = os.environ.get('TF_PLUGIN_CACHE_DIR')
+        expected = str(tmpdir.join('.terraform.d', 'plugin-cache'))
+        assert res == expected
+        assert env == expected
+        assert os.path.isdir(expected)
+
+    def test_setup_plugin_cache_env(self, tmpdir):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(self.mock_config(), 'terraform')
+        d = str(tmpdir.join('foo'))
+        with patch.dict('%s.os.environ' % pbm, {'TF_PLUGIN_CACHE_DIR': d}):
+            assert cls._setup_plugin_cache() == d
+        assert os.path.isdir(d)
+
+    def test_setup_plugin_cache_config(self, tmpdir):
+        d = str(tmpdir.join('bar'))
+        tmpdir.mkdir('bar')
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(
+                self.mock_config({'terraform_plugin_cache_dir': d}),
+                'terraform'
+            )
+        with patch.dict('%s.os.environ' % pbm, {'TF_PLUGIN_CACHE_DIR': 'x'}):
+            assert cls._setup_plugin_cache() == d
+            assert os.environ['TF_PLUGIN_CACHE_DIR'] == d
+
+    def test_setup_plugin_cache_disabled(self):
+        with patch('%s._validate' % pb):
+            cls = TerraformRunner(
+                self.mock_config({'terraform_plugin_cache_dir': False}),
+                'terraform'
+            )
+        with patch.dict('%s.os.environ' % pbm, {}, clear=True):
+            assert cls._setup_plugin_cache() is None
+            assert 'TF_PLUGIN_CACHE_DIR' not in os.environ
+
     def test_setup_tf_pre090(self):
         with patch('%s._validate' % pb):
             cls = TerraformRunner(self.mock_config(), 'terraform')
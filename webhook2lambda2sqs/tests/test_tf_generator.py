@@ -36,13 +36,24 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 import sys
 import json
+import hashlib
+import os
+import pytest
 from freezegun import freeze_time
-from zipfile import ZipInfo
+from zipfile import ZipFile
+from io import BytesIO
 from copy import deepcopy
 
+from webhook2lambda2sqs.json_templates import (
+    request_model_mapping, response_model_mapping,
+    async_response_model_mapping, direct_response_model_mapping
+)
+from webhook2lambda2sqs.utils import pretty_json
 from webhook2lambda2sqs.tf_generator import TerraformGenerator
+from webhook2lambda2sqs.tf_templates import endpoints_module
 from webhook2lambda2sqs.version import VERSION, PROJECT_URL
 from webhook2lambda2sqs.config import Config
+from webhook2lambda2sqs.tests.support import exc_msg
 
 # https://code.google.com/p/mock/issues/detail?id=249
 # py>=3.4 should use unittest.mock not the mock package on pypi
@@ -73,6 +84,11 @@ class TestTerraformGenerator(object):
         config.get.side_effect = se_get
         type(config).func_name = 'myFuncName'
         type(config).stage_name = 'mystagename'
+        type(config).lambda_runtime = 'python2.7'
+        type(config).api_layout = 'endpoints'
+        type(config).api_definition = 'resources'
+        type(config).api_type = PropertyMock(
+            side_effect=lambda: self.conf.get('api_type') or 'rest')
         with patch('%s._setup_tf_config' % pb):
             self.cls = TerraformGenerator(config)
         self.cls.aws_region = 'myregion'
@@ -116,6 +132,15 @@ class TestTerraformGenerator(object):
         assert cls.tf_conf == self.base_tf_conf
         assert cls._tf_ver == (0, 9, 0)
 
+    def test_init_region(self):
+        config = Mock()
+        config.get.return_value = None
+        type(config).func_name = 'foobar'
+        with patch('%s._setup_tf_config' % pb, autospec=True):
+            cls = TerraformGenerator(config, region='eu-west-1')
+        assert cls.region == 'eu-west-1'
+        assert cls.tf_conf['provider'] == {'aws': {'region': 'eu-west-1'}}
+
     def test_init_old_ver(self):
         conf = {}
 
@@ -160,6 +185,7 @@ class TestTerraformGenerator(object):
         config.get.side_effect = se_get
         type(config).func_name = 'myFuncName'
         type(config).stage_name = 'mystagename'
+        type(config).lambda_runtime = 'python2.7'
 
         self.cls._tf_ver = (0, 9, 4)
         assert self.cls.tf_conf == self.base_tf_conf
@@ -176,6 +202,46 @@ class TestTerraformGenerator(object):
         self.cls._setup_tf_config()
         assert self.cls.tf_conf == expected
 
+    def test_setup_tf_config_region_rmt(self):
+        self.conf['terraform_remote_state'] = {
+            'backend': 's3',
+            'config': {'key': 'foo.tfstate'}
+        }
+        self.cls.region = 'eu-west-1'
+        self.cls._tf_ver = (0, 9, 4)
+        self.cls.config.region_remote_state.return_value = {
+            'backend': 's3',
+            'config': {'key': 'eu-west-1/foo.tfstate'}
+        }
+        expected = deepcopy(self.base_tf_conf)
+        expected['terraform'] = {
+            'required_version': '>= 0.9.0',
+            'backend': {
+                's3': {'key': 'eu-west-1/foo.tfstate'}
+            }
+        }
+        self.cls._setup_tf_config()
+        assert self.cls.tf_conf == expected
+        assert self.cls.config.region_remote_state.mock_calls == [
+            call('eu-west-1')
+        ]
+
+    def test_setup_tf_config_module(self):
+        self.conf['terraform_module'] = True
+        self.cls._tf_ver = (0, 9, 0)
+        expected = deepcopy(self.base_tf_conf)
+        expected['terraform'] = {'required_version': '>= 0.13.0'}
+        self.cls._setup_tf_config()
+        assert self.cls.tf_conf == expected
+
+    def test_setup_tf_config_http(self):
+        self.conf['api_type'] = 'http'
+        self.cls._tf_ver = (0, 7, 4)
+        expected = deepcopy(self.base_tf_conf)
+        expected['terraform'] = {'required_version': '>= 0.12.0'}
+        self.cls._setup_tf_config()
+        assert self.cls.tf_conf == expected
+
     def test_description(self):
         assert self.cls.description == 'push webhook contents to SQS - ' \
                                        'generated and managed by %s ' \
@@ -231,6 +297,22 @@ class TestTerraformGenerator(object):
         }
         assert self.cls.tf_conf == expected_conf
 
+    def test_generate_iam_role_policy_sns_fanout(self):
+        self.conf['endpoints']['other_resource_path']['sns_fanout'] = True
+        self.cls._generate_iam_role_policy()
+        pol = json.loads(self.cls.tf_conf['resource']['aws_iam_role_policy'][
+            'role_policy']['policy'])
+        assert len(pol['Statement']) == 5
+        assert pol['Statement'][4] == {
+            "Effect": "Allow",
+            "Action": [
+                "sns:Publish"
+            ],
+            "Resource": [
+                "arn:aws:sns:myregion:1234:myFuncName-other_resource_path"
+            ]
+        }
+
     def test_generate_iam_invoke_role_policy(self):
         self.cls._generate_iam_invoke_role_policy()
         expected_pol = {
@@ -251,6 +333,36 @@ class TestTerraformGenerator(object):
         }
         assert self.cls.tf_conf == expected_conf
 
+    def test_generate_iam_invoke_role_policy_direct(self):
+        self.conf['endpoints']['other_resource_path'] = {
+            'method': 'GET',
+            'queues': ['queueName3'],
+            'integration': 'direct'
+        }
+        self.cls._generate_iam_invoke_role_policy()
+        expected_pol = {
+            "Version": "2012-10-17",
+            "Statement": [
+                {
+                    "Effect": "Allow",
+                    "Resource": ["*"],
+                    "Action": ["lambda:InvokeFunction"]
+                },
+                {
+                    "Effect": "Allow",
+                    "Resource": ["arn:aws:sqs:myregion:1234:queueName3"],
+                    "Action": ["sqs:SendMessage"]
+                }
+            ]
+        }
+        expected_conf = self.base_tf_conf
+        expected_conf['resource']['aws_iam_role_policy']['invoke_policy'] = {
+            'name': 'myFuncName-invoke',
+            'role': '${aws_iam_role.invoke_role.id}',
+            'policy': json.dumps(expected_pol)
+        }
+        assert self.cls.tf_conf == expected_conf
+
     def test_generate_iam_role(self):
         self.cls._generate_iam_role()
         expected_pol = {
@@ -279,6 +391,20 @@ class TestTerraformGenerator(object):
         }
         assert self.cls.tf_conf == expected_conf
 
+    def test_iam_name_region(self):
+        assert self.cls._iam_name == 'myFuncName'
+        self.cls.region = 'eu-west-1'
+        assert self.cls._iam_name == 'myFuncName-eu-west-1'
+
+    def test_queue_region(self):
+        assert self.cls._queue_region == 'myregion'
+        assert self.cls._queue_arn('q1') == 'arn:aws:sqs:myregion:1234:q1'
+        self.conf['queue_region'] = 'us-east-1'
+        assert self.cls._queue_region == 'us-east-1'
+        assert self.cls._queue_arn('q1') == 'arn:aws:sqs:us-east-1:1234:q1'
+        assert self.cls._queue_arn(
+            'q1', region='myregion') == 'arn:aws:sqs:myregion:1234:q1'
+
     def test_generate_iam_invoke_role(self):
         self.cls._generate_iam_invoke_role()
         expected_pol = {
@@ -328,85 +454,436 @@ class TestTerraformGenerator(object):
             self.cls._generate_lambda()
         assert self.cls.tf_conf == expected_conf
 
+    def test_generate_lambda_layer(self):
+        self.conf['lambda_layer'] = True
+        with patch('%s.description' % pb, new_callable=PropertyMock) as m_d:
+            m_d.return_value = 'mydesc'
+            self.cls._generate_lambda()
+        res = self.cls.tf_conf['resource']
+        assert res['aws_lambda_layer_version'] == {
+            'lambda_layer': {
+                'filename': 'webhook2lambda2sqs_layer.zip',
+                'layer_name': 'myFuncName',
+                'source_code_hash': '${base64sha256(file('
+                                    '"webhook2lambda2sqs_layer.zip"))}',
+                'description': 'mydesc',
+                'compatible_runtimes': ['python2.7']
+            }
+        }
+        assert res['aws_lambda_function']['lambda_func']['layers'] == [
+            '${aws_lambda_layer_version.lambda_layer.arn}'
+        ]
+
+    def test_generate_sns_fanout_none(self):
+        self.cls._generate_sns_fanout()
+        assert self.cls.tf_conf == self.base_tf_conf
+
+    def test_generate_sns_fanout(self):
+        self.conf['endpoints']['some_resource_path']['sns_fanout'] = True
+        self.conf['endpoints']['some_resource_path'][
+            'sns_filter_policies'] = {'queueName2': {'data': {'a': ['b']}}}
+        self.conf['endpoints']['other_resource_path']['sns_fanout'] = True
+        self.conf['sns_fanout_queue_policies'] = True
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            self.cls._generate_sns_fanout()
+        assert mock_logger.mock_calls == [
+            call.warning('sns_fanout_queue_policies is enabled; replacing '
+                         'the SQS queue policy of queues: %s',
+                         'queueName1, queueName2, queueName3')
+        ]
+        res = self.cls.tf_conf['resource']
+        assert res['aws_sns_topic'] == {
+            'other_resource_path': {
+                'name': 'myFuncName-other_resource_path'
+            },
+            'some_resource_path': {
+                'name': 'myFuncName-some_resource_path'
+            }
+        }
+        assert sorted(res['aws_sns_topic_subscription'].keys()) == [
+            'other_resource_path_queueName2',
+            'other_resource_path_queueName3',
+            'some_resource_path_queueName1',
+            'some_resource_path_queueName2'
+        ]
+        assert res['aws_sns_topic_subscription'][
+            'other_resource_path_queueName2'] == {
+            'topic_arn': '${aws_sns_topic.other_resource_path.arn}',
+            'protocol': 'sqs',
+            'endpoint': 'arn:aws:sqs:myregion:1234:queueName2',
+            'raw_message_delivery': True
+        }
+        assert res['aws_sns_topic_subscription'][
+            'some_resource_path_queueName2'] == {
+            'topic_arn': '${aws_sns_topic.some_resource_path.arn}',
+            'protocol': 'sqs',
+            'endpoint': 'arn:aws:sqs:myregion:1234:queueName2',
+            'raw_message_delivery': True,
+            'filter_policy': '{"data": {"a": ["b"]}}',
+            'filter_policy_scope': 'MessageBody'
+        }
+        assert sorted(res['aws_sqs_queue_policy'].keys()) == [
+            'queueName1', 'queueName2', 'queueName3'
+        ]
+        q2 = res['aws_sqs_queue_policy']['queueName2']
+        assert q2['queue_url'] == 'https://sqs.myregion.amazonaws.com/1234/' \
+                                  'queueName2'
+        assert json.loads(q2['policy']) == {
+            'Version': '2012-10-17',
+            'Statement': [
+                {
+                    'Effect': 'Allow',
+                    'Principal': {'Service': 'sns.amazonaws.com'},
+                    'Action': 'sqs:SendMessage',
+                    'Resource': 'arn:aws:sqs:myregion:1234:queueName2',
+                    'Condition': {
+                        'ArnEquals': {
+                            'aws:SourceArn': [
+                                '${aws_sns_topic.other_resource_path.arn}',
+                                '${aws_sns_topic.some_resource_path.arn}'
+                            ]
+                        }
+                    }
+                }
+            ]
+        }
+
+    def test_generate_sns_fanout_no_queue_policies(self):
+        self.conf['endpoints']['some_resource_path']['sns_fanout'] = True
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            self.cls._generate_sns_fanout()
+        assert mock_logger.mock_calls == []
+        res = self.cls.tf_conf['resource']
+        assert res['aws_sns_topic'] == {
+            'some_resource_path': {
+                'name': 'myFuncName-some_resource_path'
+            }
+        }
+        assert sorted(res['aws_sns_topic_subscription'].keys()) == [
+            'some_resource_path_queueName1',
+            'some_resource_path_queueName2'
+        ]
+        assert 'aws_sqs_queue_policy' not in res
+
+    def test_generate_async_destination_none(self):
+        self.cls._generate_async_destination()
+        assert self.cls.tf_conf == self.base_tf_conf
+
+    def test_generate_async_destination(self):
+        self.conf['endpoints']['some_resource_path']['async'] = True
+        self.cls._generate_async_destination()
+        res = self.cls.tf_conf['resource']
+        assert res['aws_sqs_queue'] == {
+            'async_failures': {'name': 'myFuncName-failures'}
+        }
+        assert res['aws_lambda_function_event_invoke_config'] == {
+            'lambda_func': {
+                'function_name':
+                    '${aws_lambda_function.lambda_func.function_name}',
+                'maximum_retry_attempts': 2,
+                'destination_config': {
+                    'on_failure': {
+                        'destination': '${aws_sqs_queue.async_failures.arn}'
+                    }
+                }
+            }
+        }
+        assert self.cls.tf_conf['output']['async_failure_queue_url'] == {
+            'value': '${aws_sqs_queue.async_failures.id}'
+        }
+
+    def test_generate_iam_role_policy_async(self):
+        self.conf['endpoints']['some_resource_path']['async'] = True
+        self.cls._generate_iam_role_policy()
+        pol = json.loads(self.cls.tf_conf['resource']['aws_iam_role_policy'][
+            'role_policy']['policy'])
+        assert pol['Statement'][3]['Resource'] == [
+            'arn:aws:sqs:myregion:1234:myFuncName-failures',
+            'arn:aws:sqs:myregion:1234:queueName1',
+            'arn:aws:sqs:myregion:1234:queueName2',
+            'arn:aws:sqs:myregion:1234:queueName3'
+        ]
+
     def test_set_account_info_env_default(self):
         self.cls.aws_account_id = None
         self.cls.aws_region = None
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-            with patch('%s.client' % pbm, autospec=True) as mock_client:
-                mock_client.return_value.get_user.return_value = {
-                    'User': {'Arn': 'arn:aws:iam::123456789:user/foo'}
-                }
-                type(mock_client.return_value)._client_config = Mock(
-                    region_name='myregion')
-                with patch.dict(
-                        '%s.os.environ' % pbm,
-                        {'AWS_DEFAULT_REGION': 'adr'},
-                        clear=True):
-                    self.cls._set_account_info()
+            with patch('%s.get_session' % pbm, autospec=True) as mock_session:
+                with patch('%s._caller_account_id' % pb,
+                           autospec=True) as mock_caller:
+                    mock_caller.return_value = '123456789'
+                    with patch.dict(
+                            '%s.os.environ' % pbm,
+                            {'AWS_DEFAULT_REGION': 'adr', 'AWS_REGION': 'ar'},
+                            clear=True):
+                        self.cls._set_account_info()
         assert self.cls.aws_account_id == '123456789'
-        assert self.cls.aws_region == 'myregion'
-        assert mock_client.mock_calls == [
-            call('iam', region_name='adr'),
-            call().get_user(),
-            call('lambda', region_name='adr')
-        ]
+        assert self.cls.aws_region == 'adr'
+        assert mock_caller.mock_calls == [call(self.cls)]
+        assert mock_session.mock_calls == []
         assert mock_logger.mock_calls == [
-            call.debug('Connecting to IAM with region_name=%s', 'adr'),
             call.info('Found AWS account ID as %s; region: %s',
-                      '123456789', 'myregion')
+                      '123456789', 'adr')
         ]
 
     def test_set_account_info_env(self):
         self.cls.aws_account_id = None
         self.cls.aws_region = None
-        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-            with patch('%s.client' % pbm, autospec=True) as mock_client:
-                mock_client.return_value.get_user.return_value = {
-                    'User': {'Arn': 'arn:aws:iam::123456789:user/foo'}
-                }
-                type(mock_client.return_value)._client_config = Mock(
-                    region_name='myregion')
-                with patch.dict(
-                        '%s.os.environ' % pbm,
-                        {'AWS_REGION': 'ar'},
-                        clear=True):
+        with patch('%s.get_session' % pbm, autospec=True) as mock_session:
+            with patch('%s._caller_account_id' % pb,
+                       autospec=True) as mock_caller:
+                mock_caller.return_value = '123456789'
+                with patch.dict('%s.os.environ' % pbm, {'AWS_REGION': 'ar'},
+                                clear=True):
                     self.cls._set_account_info()
         assert self.cls.aws_account_id == '123456789'
-        assert self.cls.aws_region == 'myregion'
-        assert mock_client.mock_calls == [
-            call('iam', region_name='ar'),
-            call().get_user(),
-            call('lambda', region_name='ar')
-        ]
-        assert mock_logger.mock_calls == [
-            call.debug('Connecting to IAM with region_name=%s', 'ar'),
-            call.info('Found AWS account ID as %s; region: %s',
-                      '123456789', 'myregion')
-        ]
+        assert self.cls.aws_region == 'ar'
+        assert mock_session.mock_calls == []
 
     def test_set_account_info_no_env(self):
         self.cls.aws_account_id = None
         self.cls.aws_region = None
-        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-            with patch('%s.client' % pbm, autospec=True) as mock_client:
-                mock_client.return_value.get_user.return_value = {
-                    'User': {'Arn': 'arn:aws:iam::123456789:user/foo'}
-                }
-                type(mock_client.return_value)._client_config = Mock(
-                    region_name='myregion')
+        with patch('%s.get_session' % pbm, autospec=True) as mock_session:
+            with patch('%s._caller_account_id' % pb,
+                       autospec=True) as mock_caller:
+                mock_caller.return_value = '123456789'
+                type(mock_session.return_value).region_name = 'cfgregion'
                 with patch.dict('%s.os.environ' % pbm, {}, clear=True):
                     self.cls._set_account_info()
         assert self.cls.aws_account_id == '123456789'
-        assert self.cls.aws_region == 'myregion'
-        assert mock_client.mock_calls == [
-            call('iam'),
-            call().get_user(),
-            call('lambda')
+        assert self.cls.aws_region == 'cfgregion'
+        assert mock_session.mock_calls == [call()]
+
+    def test_set_account_info_no_region(self):
+        self.cls.aws_account_id = None
+        self.cls.aws_region = None
+        with patch('%s.get_session' % pbm, autospec=True) as mock_session:
+            with patch('%s._caller_account_id' % pb,
+                       autospec=True) as mock_caller:
+                type(mock_session.return_value).region_name = None
+                with patch.dict('%s.os.environ' % pbm, {}, clear=True):
+                    with pytest.raises(Exception) as excinfo:
+                        self.cls._set_account_info()
+        assert exc_msg(excinfo.value) == 'ERROR: unable to determine the ' \
+                                         'AWS region; set the aws_region ' \
+                                         'configuration option or ' \
+                                         'AWS_DEFAULT_REGION environment ' \
+                                         'variable'
+        assert mock_caller.mock_calls == []
+
+    def test_set_account_info_offline(self):
+        self.conf['aws_account_id'] = '111111111111'
+        self.conf['aws_region'] = 'us-west-2'
+        with patch('%s._setup_tf_config' % pb):
+            cls = TerraformGenerator(self.cls.config)
+        assert cls.tf_conf['provider'] == {'aws': {'region': 'us-west-2'}}
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            get_session=DEFAULT,
+            get_client=DEFAULT,
+            cache_get=DEFAULT,
+            cache_set=DEFAULT
+        ) as mocks:
+            with patch.dict('%s.os.environ' % pbm,
+                            {'AWS_DEFAULT_REGION': 'adr'}, clear=True):
+                cls._set_account_info()
+        assert cls.aws_account_id == '111111111111'
+        assert cls.aws_region == 'us-west-2'
+        for m in mocks.values():
+            assert m.mock_calls == []
+
+    def test_set_account_info_no_lookup_region(self):
+        self.conf['aws_account_id'] = '111111111111'
+        with patch('%s._setup_tf_config' % pb):
+            cls = TerraformGenerator(self.cls.config, offline=True)
+        with patch('%s.get_session' % pbm, autospec=True) as mock_session:
+            with patch.dict('%s.os.environ' % pbm, {}, clear=True):
+                with pytest.raises(Exception) as excinfo:
+                    cls._set_account_info()
+        assert exc_msg(excinfo.value) == 'ERROR: unable to determine the ' \
+                                         'AWS region; set the aws_region ' \
+                                         'configuration option or ' \
+                                         'AWS_DEFAULT_REGION environment ' \
+                                         'variable'
+        assert mock_session.mock_calls == []
+
+    def test_set_account_info_no_lookup_account(self):
+        with patch('%s._setup_tf_config' % pb):
+            cls = TerraformGenerator(self.cls.config, aws_region='us-east-1',
+                                     offline=True)
+        with patch('%s._caller_account_id' % pb,
+                   autospec=True) as mock_caller:
+            with pytest.raises(Exception) as excinfo:
+                cls._set_account_info()
+        assert exc_msg(excinfo.value) == 'ERROR: unable to determine the ' \
+                                         'AWS account ID without AWS API ' \
+                                         'calls; set the aws_account_id ' \
+                                         'configuration option'
+        assert mock_caller.mock_calls == []
+
+    def test_set_account_info_args(self):
+        self.conf['aws_account_id'] = '111111111111'
+        self.conf['aws_region'] = 'us-west-2'
+        with patch('%s._setup_tf_config' % pb):
+            cls = TerraformGenerator(self.cls.config,
+                                     account_id='222222222222',
+                                     aws_region='eu-west-1')
+        assert cls.tf_conf['provider'] == {'aws': {'region': 'eu-west-1'}}
+        with patch('%s._caller_account_id' % pb,
+                   autospec=True) as mock_caller:
+            cls._set_account_info()
+        assert cls.aws_account_id == '222222222222'
+        assert cls.aws_region == 'eu-west-1'
+        assert mock_caller.mock_calls == []
+
+    def test_set_account_info_region(self):
+        self.conf['aws_region'] = 'us-west-2'
+        with patch('%s._setup_tf_config' % pb):
+            cls = TerraformGenerator(self.cls.config, region='eu-west-1',
+                                     aws_region='us-east-1')
+        assert cls.tf_conf['provider'] == {'aws': {'region': 'eu-west-1'}}
+        with patch('%s._caller_account_id' % pb,
+                   autospec=True) as mock_caller:
+            mock_caller.return_value = '123456789'
+            with patch.dict('%s.os.environ' % pbm,
+                            {'AWS_DEFAULT_REGION': 'adr'}, clear=True):
+                cls._set_account_info()
+        assert cls.aws_account_id == '123456789'
+        assert cls.aws_region == 'eu-west-1'
+
+    def test_caller_account_id(self):
+        key = hashlib.sha256(b'myprofile|AKIAFOO').hexdigest()
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            get_client=DEFAULT,
+            get_session=DEFAULT,
+            cache_get=DEFAULT,
+            cache_set=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            mocks['cache_get'].return_value = None
+            mocks['get_session'].return_value.get_credentials.return_value \
+                .access_key = 'AKIAFOO'
+            conn = mocks['get_client'].return_value
+            conn.get_caller_identity.return_value = {
+                'Account': '123456789012',
+                'Arn': 'arn:aws:sts::123456789012:assumed-role/foo/bar',
+                'UserId': 'AROAFOO:bar'
+            }
+            with patch.dict(
+                    '%s.os.environ' % pbm,
+                    {'AWS_PROFILE': 'myprofile'},
+                    clear=True):
+                res = self.cls._caller_account_id()
+        assert res == '123456789012'
+        assert mocks['get_session'].mock_calls == [
+            call(),
+            call().get_credentials()
         ]
-        assert mock_logger.mock_calls == [
-            call.debug('Connecting to IAM without specified region'),
-            call.info('Found AWS account ID as %s; region: %s',
-                      '123456789', 'myregion')
+        assert mocks['cache_get'].mock_calls == [
+            call('account_id', key, 86400)
+        ]
+        assert mocks['get_client'].mock_calls == [
+            call('sts', 'myregion'),
+            call().get_caller_identity()
+        ]
+        assert mocks['cache_set'].mock_calls == [
+            call('account_id', key, '123456789012')
+        ]
+        assert mocks['logger'].mock_calls == [
+            call.debug('Connecting to STS with region_name=%s', 'myregion')
+        ]
+
+    def test_caller_account_id_cached(self):
+        key = hashlib.sha256(b'default|ASIABAR').hexdigest()
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            get_client=DEFAULT,
+            get_session=DEFAULT,
+            cache_get=DEFAULT,
+            cache_set=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            mocks['cache_get'].return_value = '123456789012'
+            mocks['get_session'].return_value.get_credentials.return_value \
+                .access_key = 'ASIABAR'
+            with patch.dict('%s.os.environ' % pbm, {}, clear=True):
+                res = self.cls._caller_account_id()
+        assert res == '123456789012'
+        assert mocks['cache_get'].mock_calls == [
+            call('account_id', key, 86400)
+        ]
+        assert mocks['get_client'].mock_calls == []
+        assert mocks['cache_set'].mock_calls == []
+        assert mocks['logger'].mock_calls == [
+            call.debug('Using cached AWS account ID for profile %s',
+                       'default')
+        ]
+
+    def test_caller_account_id_credentials_change(self):
+        """
+        Credentials from a source other than the environment (e.g. SSO or
+        an instance role) for the same profile use separate cache entries.
+        """
+        keys = [
+            hashlib.sha256(b'default|ASIAONE').hexdigest(),
+            hashlib.sha256(b'default|ASIATWO').hexdigest()
+        ]
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            get_client=DEFAULT,
+            get_session=DEFAULT,
+            cache_get=DEFAULT,
+            cache_set=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            mocks['cache_get'].side_effect = ['111111111111', None]
+            creds = mocks['get_session'].return_value.get_credentials
+            conn = mocks['get_client'].return_value
+            conn.get_caller_identity.return_value = {
+                'Account': '222222222222'
+            }
+            with patch.dict('%s.os.environ' % pbm, {}, clear=True):
+                creds.return_value.access_key = 'ASIAONE'
+                res1 = self.cls._caller_account_id()
+                creds.return_value.access_key = 'ASIATWO'
+                res2 = self.cls._caller_account_id()
+        assert res1 == '111111111111'
+        assert res2 == '222222222222'
+        assert mocks['cache_get'].mock_calls == [
+            call('account_id', keys[0], 86400),
+            call('account_id', keys[1], 86400)
+        ]
+        assert mocks['cache_set'].mock_calls == [
+            call('account_id', keys[1], '222222222222')
+        ]
+
+    def test_caller_account_id_no_credentials(self):
+        with patch.multiple(
+            pbm,
+            autospec=True,
+            get_client=DEFAULT,
+            get_session=DEFAULT,
+            cache_get=DEFAULT,
+            cache_set=DEFAULT,
+            logger=DEFAULT
+        ) as mocks:
+            mocks['get_session'].return_value.get_credentials.return_value = \
+                None
+            conn = mocks['get_client'].return_value
+            conn.get_caller_identity.side_effect = RuntimeError('no creds')
+            with patch.dict('%s.os.environ' % pbm, {}, clear=True):
+                with pytest.raises(RuntimeError):
+                    self.cls._caller_account_id()
+        assert mocks['cache_get'].mock_calls == []
+        assert mocks['cache_set'].mock_calls == []
+        assert mocks['get_client'].mock_calls == [
+            call('sts', 'myregion'),
+            call().get_caller_identity()
         ]
 
     def test_generate_response_models(self):
@@ -477,6 +954,458 @@ class TestTerraformGenerator(object):
             call(self.cls, 'some_resource_path', 'POST')
         ]
 
+    def test_generate_api_gateway_proxy(self):
+        type(self.cls.config).api_layout = 'proxy'
+        with patch.multiple(
+            pb,
+            autospec=True,
+            _generate_endpoint=DEFAULT,
+            _generate_proxy_endpoint=DEFAULT
+        ) as mocks:
+            self.cls._generate_api_gateway()
+        assert mocks['_generate_endpoint'].mock_calls == []
+        assert mocks['_generate_proxy_endpoint'].mock_calls == [
+            call(self.cls)
+        ]
+        assert sorted(self.cls.tf_conf['output'].keys()) == [
+            'base_url', 'rest_api_id'
+        ]
+
+    def test_generate_api_gateway_openapi(self):
+        type(self.cls.config).api_definition = 'openapi'
+        with patch.multiple(
+            pb,
+            autospec=True,
+            _generate_endpoint=DEFAULT,
+            _openapi_document=DEFAULT
+        ) as mocks:
+            mocks['_openapi_document'].return_value = {'openapi': '3.0.1'}
+            with patch('%s.description' % pb, new_callable=PropertyMock) as m_d:
+                m_d.return_value = 'mydesc'
+                self.cls._generate_api_gateway()
+        assert mocks['_generate_endpoint'].mock_calls == []
+        assert mocks['_openapi_document'].mock_calls == [call(self.cls)]
+        assert self.cls.tf_conf['resource']['aws_api_gateway_rest_api'] == {
+            'rest_api': {
+                'name': 'myFuncName',
+                'description': 'mydesc',
+                'body': pretty_json({'openapi': '3.0.1'})
+            }
+        }
+        assert sorted(self.cls.tf_conf['output'].keys()) == [
+            'base_url', 'rest_api_id'
+        ]
+
+    def test_generate_api_gateway_module(self):
+        self.conf['terraform_module'] = True
+        with patch.multiple(
+            pb,
+            autospec=True,
+            _generate_endpoint=DEFAULT,
+            _generate_endpoints_module=DEFAULT
+        ) as mocks:
+            self.cls._generate_api_gateway()
+        assert mocks['_generate_endpoint'].mock_calls == []
+        assert mocks['_generate_endpoints_module'].mock_calls == [
+            call(self.cls)
+        ]
+
+    def test_generate_endpoints_module(self):
+        self.conf['endpoints']['other_resource_path']['integration'] = \
+            'direct'
+        self.conf['endpoints']['third'] = {
+            'method': 'post', 'queues': ['q3'], 'async': True
+        }
+        self.cls._generate_endpoints_module()
+        lint = self.cls._lambda_integration('some_resource_path', 'POST')
+        dint = self.cls._direct_integration('other_resource_path', 'GET')
+        assert self.cls.tf_conf['locals'] == {
+            'request_templates_lambda': request_model_mapping,
+            'request_templates_direct_GET': dint['request_templates'],
+            'response_templates_lambda': response_model_mapping,
+            'response_templates_async': async_response_model_mapping,
+            'response_templates_direct': direct_response_model_mapping
+        }
+        assert self.cls.tf_conf['module'] == {
+            'endpoints': {
+                'source': './webhook2lambda2sqs_endpoints',
+                'rest_api_id': '${aws_api_gateway_rest_api.rest_api.id}',
+                'parent_id':
+                    '${aws_api_gateway_rest_api.rest_api.root_resource_id}',
+                'success_model':
+                    '${aws_api_gateway_model.successmessage.name}',
+                'error_model': '${aws_api_gateway_model.errormessage.name}',
+                'endpoints': {
+                    'other_resource_path': {
+                        'method': 'GET',
+                        'type': 'AWS',
+                        'uri': dint['uri'],
+                        'credentials': '${aws_iam_role.invoke_role.arn}',
+                        'integration_http_method': 'POST',
+                        'passthrough_behavior': 'WHEN_NO_TEMPLATES',
+                        'request_parameters': dint['request_parameters'],
+                        'request_templates':
+                            '${local.request_templates_direct_GET}',
+                        'success_templates':
+                            '${local.response_templates_direct.success}',
+                        'error_templates':
+                            '${local.response_templates_direct.error}',
+                        'error_pattern': '[45]\\d{2}'
+                    },
+                    'some_resource_path': {
+                        'method': 'POST',
+                        'type': 'AWS',
+                        'uri': lint['uri'],
+                        'credentials': '${aws_iam_role.invoke_role.arn}',
+                        'integration_http_method': 'POST',
+                        'passthrough_behavior': 'WHEN_NO_MATCH',
+                        'request_parameters': {},
+                        'request_templates':
+                            '${local.request_templates_lambda}',
+                        'success_templates':
+                            '${local.response_templates_lambda.success}',
+                        'error_templates':
+                            '${local.response_templates_lambda.error}',
+                        'error_pattern':
+                            '(^Failed.*)|(.*([Ee]xception|[Ee]rror).*)'
+                    },
+                    'third': {
+                        'method': 'POST',
+                        'type': 'AWS',
+                        'uri': lint['uri'],
+                        'credentials': '${aws_iam_role.invoke_role.arn}',
+                        'integration_http_method': 'POST',
+                        'passthrough_behavior': 'WHEN_NO_MATCH',
+                        'request_parameters': {
+                            'integration.request.header.'
+                            'X-Amz-Invocation-Type': "'Event'"
+                        },
+                        'request_templates':
+                            '${local.request_templates_lambda}',
+                        'success_templates':
+                            '${local.response_templates_async.success}',
+                        'error_templates':
+                            '${local.response_templates_async.error}',
+                        'error_pattern':
+                            '(^Failed.*)|(.*([Ee]xception|[Ee]rror).*)'
+                    }
+                }
+            }
+        }
+        assert self.cls.tf_conf['output']['endpoint_paths'] == {
+            'value': '${module.endpoints.paths}'
+        }
+
+    def test_get_config_module(self):
+        def get_conf(num_endpoints):
+            self.conf['terraform_module'] = True
+            self.conf['endpoints'] = {}
+            for i in range(num_endpoints):
+                self.conf['endpoints']['ep%d' % i] = {
+                    'method': 'POST', 'queues': ['q%d' % i]
+                }
+            self.cls.config._config = self.conf
+            with patch('%s._setup_tf_config' % pb):
+                gen = TerraformGenerator(self.cls.config)
+            gen.aws_region = 'myregion'
+            gen.aws_account_id = '1234'
+            with patch('%s._set_account_info' % pb, autospec=True):
+                return json.loads(gen._get_config('funcsrc'))
+
+        conf = get_conf(2)
+        assert 'aws_api_gateway_method' not in conf['resource']
+        assert 'aws_api_gateway_model' in conf['resource']
+        assert sorted(conf['module']['endpoints']['endpoints'].keys()) == [
+            'ep0', 'ep1'
+        ]
+        depl = conf['resource']['aws_api_gateway_deployment']['depl']
+        assert 'module.endpoints' in depl['depends_on']
+        big = get_conf(500)
+        assert sum([len(x) for x in conf['resource'].values()]) == \
+            sum([len(x) for x in big['resource'].values()])
+        assert big['locals'] == conf['locals']
+        # adding an endpoint changes the deployment hash
+        assert big['resource']['aws_api_gateway_deployment']['depl'][
+            'stage_description'] != depl['stage_description']
+        assert 'variables' not in depl
+
+    def test_openapi_document(self):
+        self.conf['endpoints']['other_resource_path']['integration'] = \
+            'direct'
+        self.conf['endpoints']['some_resource_path']['async'] = True
+        with patch('%s.description' % pb, new_callable=PropertyMock) as m_d:
+            m_d.return_value = 'mydesc'
+            doc = self.cls._openapi_document()
+        assert doc['openapi'] == '3.0.1'
+        assert doc['info'] == {
+            'title': 'myFuncName',
+            'description': 'mydesc',
+            'version': VERSION
+        }
+        assert sorted(doc['components']['schemas'].keys()) == [
+            'errormessage', 'successmessage'
+        ]
+        assert doc['components']['schemas']['errormessage'] == {
+            'title': 'Error Schema',
+            'type': 'object',
+            'properties': {
+                'status': {'type': 'string'},
+                'message': {'type': 'string'},
+                'request_id': {'type': 'string'}
+            }
+        }
+        assert sorted(doc['paths'].keys()) == [
+            '/other_resource_path', '/some_resource_path'
+        ]
+        direct = doc['paths']['/other_resource_path']['get']
+        d_int = direct['x-amazon-apigateway-integration']
+        assert d_int['type'] == 'aws'
+        assert d_int['passthroughBehavior'] == 'when_no_templates'
+        assert d_int['uri'] == self.cls._direct_integration(
+            'other_resource_path', 'GET')['uri']
+        assert d_int['responses']['[45]\\d{2}']['statusCode'] == '500'
+        assert d_int['responses']['default']['responseTemplates'] == \
+            direct_response_model_mapping['success']
+        assert direct['responses']['500']['content'] == {
+            'application/json': {
+                'schema': {'$ref': '#/components/schemas/errormessage'}
+            }
+        }
+        op = doc['paths']['/some_resource_path']['post']
+        l_int = op['x-amazon-apigateway-integration']
+        lint = self.cls._lambda_integration('some_resource_path', 'POST')
+        assert l_int == {
+            'type': 'aws',
+            'httpMethod': 'POST',
+            'uri': lint['uri'],
+            'credentials': lint['credentials'],
+            'requestTemplates': lint['request_templates'],
+            'passthroughBehavior': 'when_no_match',
+            'requestParameters': {
+                'integration.request.header.X-Amz-Invocation-Type': "'Event'"
+            },
+            'responses': {
+                'default': {
+                    'statusCode': '202',
+                    'responseTemplates':
+                        async_response_model_mapping['success']
+                },
+                '(^Failed.*)|(.*([Ee]xception|[Ee]rror).*)': {
+                    'statusCode': '500',
+                    'responseTemplates': async_response_model_mapping['error']
+                }
+            }
+        }
+
+    def test_openapi_document_proxy(self):
+        type(self.cls.config).api_layout = 'proxy'
+        with patch('%s.description' % pb, new_callable=PropertyMock) as m_d:
+            m_d.return_value = 'mydesc'
+            doc = self.cls._openapi_document()
+        assert list(doc['paths'].keys()) == ['/{proxy+}']
+        op = doc['paths']['/{proxy+}']['x-amazon-apigateway-any-method']
+        assert op['parameters'] == [{
+            'name': 'proxy',
+            'in': 'path',
+            'required': True,
+            'schema': {'type': 'string'}
+        }]
+        api_int = op['x-amazon-apigateway-integration']
+        assert api_int['uri'] == self.cls._lambda_integration(
+            'proxy', 'ANY')['uri']
+        assert api_int['responses']['.+'] == {
+            'statusCode': '500',
+            'responseTemplates': response_model_mapping['error']
+        }
+
+    def test_get_config_openapi_resource_count(self):
+        def num_resources(num_endpoints):
+            self.conf['endpoints'] = {}
+            for i in range(num_endpoints):
+                self.conf['endpoints']['ep%d' % i] = {
+                    'method': 'POST', 'queues': ['q%d' % i]
+                }
+            self.cls.config._config = self.conf
+            with patch('%s._setup_tf_config' % pb):
+                gen = TerraformGenerator(self.cls.config)
+            gen.aws_region = 'myregion'
+            gen.aws_account_id = '1234'
+            with patch('%s._set_account_info' % pb, autospec=True):
+                conf = json.loads(gen._get_config('funcsrc'))
+            return conf
+
+        type(self.cls.config).api_definition = 'openapi'
+        conf = num_resources(2)
+        assert 'aws_api_gateway_method' not in conf['resource']
+        assert 'aws_api_gateway_model' not in conf['resource']
+        body = json.loads(
+            conf['resource']['aws_api_gateway_rest_api']['rest_api']['body'])
+        assert sorted(body['paths'].keys()) == ['/ep0', '/ep1']
+        big = num_resources(500)
+        assert sum([len(x) for x in conf['resource'].values()]) == \
+            sum([len(x) for x in big['resource'].values()])
+
+    def test_generate_proxy_endpoint(self):
+        self.cls._generate_proxy_endpoint()
+        res = self.cls.tf_conf['resource']
+        assert res['aws_api_gateway_resource'] == {
+            'proxy': {
+                'rest_api_id': '${aws_api_gateway_rest_api.rest_api.id}',
+                'parent_id':
+                    '${aws_api_gateway_rest_api.rest_api.root_resource_id}',
+                'path_part': '{proxy+}'
+            }
+        }
+        assert res['aws_api_gateway_method'] == {
+            'proxy_ANY': {
+                'rest_api_id': '${aws_api_gateway_rest_api.rest_api.id}',
+                'resource_id': '${aws_api_gateway_resource.proxy.id}',
+                'http_method': 'ANY',
+                'authorization': 'NONE',
+                'request_parameters': {'method.request.path.proxy': True}
+            }
+        }
+        assert sorted(res['aws_api_gateway_method_response'].keys()) == [
+            'proxy_ANY_202', 'proxy_ANY_500'
+        ]
+        assert res['aws_api_gateway_method_response']['proxy_ANY_500'][
+            'response_models'] == {
+            'application/json': '${aws_api_gateway_model.errormessage.name}'
+        }
+        assert res['aws_api_gateway_integration'] == {
+            'proxy_ANY_integration': self.cls._lambda_integration(
+                'proxy', 'ANY')
+        }
+        intresp = res['aws_api_gateway_integration_response']
+        assert sorted(intresp.keys()) == [
+            'proxy_ANY_errorResponse', 'proxy_ANY_successResponse'
+        ]
+        assert intresp['proxy_ANY_errorResponse']['selection_pattern'] == '.+'
+        assert intresp['proxy_ANY_errorResponse']['response_templates'] == \
+            response_model_mapping['error']
+        assert 'selection_pattern' not in intresp['proxy_ANY_successResponse']
+
+    def test_get_config_proxy_resource_count(self):
+        type(self.cls.config).api_layout = 'proxy'
+
+        def num_resources(num_endpoints):
+            self.conf['endpoints'] = {}
+            for i in range(num_endpoints):
+                self.conf['endpoints']['ep%d' % i] = {
+                    'method': 'POST', 'queues': ['q%d' % i]
+                }
+            self.cls.config._config = self.conf
+            with patch('%s._setup_tf_config' % pb):
+                gen = TerraformGenerator(self.cls.config)
+            gen.aws_region = 'myregion'
+            gen.aws_account_id = '1234'
+            with patch('%s._set_account_info' % pb, autospec=True):
+                conf = json.loads(gen._get_config('funcsrc'))
+            return sum([len(x) for x in conf['resource'].values()])
+
+        assert num_resources(2) == num_resources(500)
+
+    def test_generate_http_api_proxy(self):
+        type(self.cls.config).api_layout = 'proxy'
+        self.cls._generate_http_api()
+        assert self.cls.tf_conf['resource']['aws_apigatewayv2_route'] == {
+            'proxy_ANY': {
+                'api_id': '${aws_apigatewayv2_api.http_api.id}',
+                'route_key': 'ANY /{proxy+}',
+                'target': 'integrations/'
+                          '${aws_apigatewayv2_integration.lambda.id}'
+            }
+        }
+
+    def test_generate_http_api(self):
+        del self.conf['api_gateway_method_settings']
+        with patch('%s.description' % pb, new_callable=PropertyMock) as m_d:
+            m_d.return_value = 'mydesc'
+            self.cls._generate_http_api()
+        res = self.cls.tf_conf['resource']
+        assert res['aws_apigatewayv2_api'] == {
+            'http_api': {
+                'name': 'myFuncName',
+                'description': 'mydesc',
+                'protocol_type': 'HTTP'
+            }
+        }
+        assert res['aws_apigatewayv2_integration'] == {
+            'lambda': {
+                'api_id': '${aws_apigatewayv2_api.http_api.id}',
+                'integration_type': 'AWS_PROXY',
+                'integration_method': 'POST',
+                'integration_uri':
+                    '${aws_lambda_function.lambda_func.invoke_arn}',
+                'payload_format_version': '2.0'
+            }
+        }
+        assert res['aws_apigatewayv2_route'] == {
+            'other_resource_path_GET': {
+                'api_id': '${aws_apigatewayv2_api.http_api.id}',
+                'route_key': 'GET /other_resource_path',
+                'target': 'integrations/'
+                          '${aws_apigatewayv2_integration.lambda.id}'
+            },
+            'some_resource_path_POST': {
+                'api_id': '${aws_apigatewayv2_api.http_api.id}',
+                'route_key': 'POST /some_resource_path',
+                'target': 'integrations/'
+                          '${aws_apigatewayv2_integration.lambda.id}'
+            }
+        }
+        assert res['aws_apigatewayv2_stage'] == {
+            'stage': {
+                'api_id': '${aws_apigatewayv2_api.http_api.id}',
+                'name': 'mystagename',
+                'description': 'mydesc',
+                'auto_deploy': True
+            }
+        }
+        assert res['aws_lambda_permission']['http_api']['source_arn'] == \
+            '${aws_apigatewayv2_api.http_api.execution_arn}/*/*'
+        assert self.cls.tf_conf['output'] == {
+            'http_api_id': {'value': '${aws_apigatewayv2_api.http_api.id}'},
+            'base_url': {
+                'value': '${aws_apigatewayv2_stage.stage.invoke_url}/'
+            }
+        }
+
+    def test_generate_http_api_route_settings(self):
+        self.conf['api_gateway_method_settings'] = {
+            'metricsEnabled': False
+        }
+        self.conf['endpoints']['some_resource_path']['method_settings'] = {
+            'throttlingBurstLimit': 500,
+            'throttlingRateLimit': 250.0
+        }
+        self.cls._generate_http_api()
+        stage = self.cls.tf_conf['resource']['aws_apigatewayv2_stage']['stage']
+        assert stage['default_route_settings'] == {
+            'detailed_metrics_enabled': False
+        }
+        assert stage['route_settings'] == [
+            {
+                'route_key': 'POST /some_resource_path',
+                'throttling_burst_limit': 500,
+                'throttling_rate_limit': 250.0
+            }
+        ]
+
+    def test_http_api_route_settings(self):
+        assert self.cls._http_api_route_settings({
+            'metricsEnabled': True,
+            'loggingLevel': 'OFF',
+            'throttlingBurstLimit': 10,
+            'throttlingRateLimit': None
+        }) == {
+            'detailed_metrics_enabled': True,
+            'throttling_burst_limit': 10
+        }
+
+    def test_http_api_route_settings_none(self):
+        assert self.cls._http_api_route_settings(None) == {}
+
     def test_generate_api_gateway_deployment(self):
         self.cls.tf_conf['resource']['aws_api_gateway_integration'] = {
             'foo': 1,
@@ -507,18 +1436,52 @@ class TestTerraformGenerator(object):
                     'baz.blam',
                     'baz.blarg'
                 ],
-                'description': 'mydesc',
-                'stage_name': 'mystagename'
+                'description': 'mydesc (API config sha256 myhash)',
+                'stage_name': 'mystagename',
+                'stage_description': 'API config sha256 myhash',
+                'lifecycle': {'create_before_destroy': True}
             }
         }
         expected_conf['output'] = {
             'deployment_id': {'value': '${aws_api_gateway_deployment.depl.id}'}
         }
         with patch('%s.description' % pb, new_callable=PropertyMock) as m_d:
-            m_d.return_value = 'mydesc'
-            self.cls._generate_api_gateway_deployment()
+            with patch('%s._api_config_hash' % pb,
+                       new_callable=PropertyMock) as m_h:
+                m_d.return_value = 'mydesc'
+                m_h.return_value = 'myhash'
+                self.cls._generate_api_gateway_deployment()
         assert self.cls.tf_conf == expected_conf
 
+    def test_api_config_hash(self):
+        self.cls.tf_conf['resource']['aws_api_gateway_integration'] = {
+            'foo': {'a': 1}
+        }
+        self.cls.tf_conf['resource']['aws_api_gateway_deployment'] = {
+            'depl': {'description': 'foo'}
+        }
+        self.cls.tf_conf['resource']['aws_lambda_function'] = {
+            'lambda_func': {'description': 'foo'}
+        }
+        orig = self.cls._api_config_hash
+        assert orig == hashlib.sha256(json.dumps({
+            'aws_api_gateway_integration': {'foo': {'a': 1}},
+            'aws_api_gateway_integration_response': {},
+            'aws_api_gateway_method': {},
+            'aws_api_gateway_method_response': {},
+            'aws_api_gateway_resource': {},
+            'aws_api_gateway_rest_api': {}
+        }, sort_keys=True).encode('utf-8')).hexdigest()
+        # non-API resources and the deployment itself don't change the hash
+        self.cls.tf_conf['resource']['aws_lambda_function']['lambda_func'][
+            'description'] = 'bar'
+        self.cls.tf_conf['resource']['aws_api_gateway_deployment']['depl'][
+            'description'] = 'bar'
+        assert self.cls._api_config_hash == orig
+        self.cls.tf_conf['resource']['aws_api_gateway_integration']['foo'][
+            'a'] = 2
+        assert self.cls._api_config_hash != orig
+
     def test_generate_endpoint_post(self):
         expected_conf = self.base_tf_conf
         expected_conf['resource']['aws_api_gateway_resource']['rname'] = {
@@ -598,7 +1561,7 @@ class TestTerraformGenerator(object):
             'resource_id': '${aws_api_gateway_resource.rname.id}',
             'http_method': 'POST',
             'type': 'AWS',
-            'uri': 'arn:aws:apigateway:us-east-1:lambda:path/2015-03-31/'
+            'uri': 'arn:aws:apigateway:myregion:lambda:path/2015-03-31/'
                    'functions/${aws_lambda_function.lambda_func.arn}'
                    '/invocations',
             'credentials': '${aws_iam_role.invoke_role.arn}',
@@ -695,7 +1658,7 @@ class TestTerraformGenerator(object):
             'resource_id': '${aws_api_gateway_resource.myname.id}',
             'http_method': 'GET',
             'type': 'AWS',
-            'uri': 'arn:aws:apigateway:us-east-1:lambda:path/2015-03-31/'
+            'uri': 'arn:aws:apigateway:myregion:lambda:path/2015-03-31/'
                    'functions/${aws_lambda_function.lambda_func.arn}'
                    '/invocations',
             'credentials': '${aws_iam_role.invoke_role.arn}',
@@ -713,6 +1676,78 @@ class TestTerraformGenerator(object):
                 self.cls._generate_endpoint('myname', 'GET')
         assert self.cls.tf_conf == expected_conf
 
+    def test_generate_endpoint_direct(self):
+        self.conf['endpoints']['dname'] = {
+            'method': 'POST',
+            'queues': ['dqueue'],
+            'integration': 'direct'
+        }
+        with patch('%s.request_model_mapping' % pbm, {'foo': 'bar'}):
+            with patch('%s.direct_request_model_mapping' % pbm, {
+                'POST': {'dfoo': 'dbar'}
+            }):
+                with patch('%s.direct_response_model_mapping' % pbm, {
+                    'success': {'dsbaz': 'dsblam'},
+                    'error': {'debaz': 'deblam'}
+                }):
+                    self.cls._generate_endpoint('dname', 'POST')
+        res = self.cls.tf_conf['resource']
+        assert res['aws_api_gateway_integration'][
+            'dname_POST_integration'] == {
+            'rest_api_id': '${aws_api_gateway_rest_api.rest_api.id}',
+            'resource_id': '${aws_api_gateway_resource.dname.id}',
+            'http_method': 'POST',
+            'type': 'AWS',
+            'uri': 'arn:aws:apigateway:myregion:sqs:path/1234/dqueue',
+            'credentials': '${aws_iam_role.invoke_role.arn}',
+            'integration_http_method': 'POST',
+            'request_parameters': {
+                'integration.request.header.Content-Type':
+                    "'application/x-www-form-urlencoded'"
+            },
+            'passthrough_behavior': 'WHEN_NO_TEMPLATES',
+            'request_templates': {'dfoo': 'dbar'}
+        }
+        success = res['aws_api_gateway_integration_response'][
+            'dname_POST_successResponse']
+        assert success['status_code'] == 202
+        assert success['response_templates'] == {'dsbaz': 'dsblam'}
+        assert 'selection_pattern' not in success
+        error = res['aws_api_gateway_integration_response'][
+            'dname_POST_errorResponse']
+        assert error['status_code'] == 500
+        assert error['response_templates'] == {'debaz': 'deblam'}
+        assert error['selection_pattern'] == '[45]\\d{2}'
+        assert sorted(res['aws_api_gateway_method_response'].keys()) == [
+            'dname_POST_202', 'dname_POST_500'
+        ]
+
+    def test_generate_endpoint_async(self):
+        self.conf['endpoints']['aname'] = {
+            'method': 'POST',
+            'queues': ['q1'],
+            'async': True
+        }
+        with patch('%s.request_model_mapping' % pbm, {'foo': 'bar'}):
+            with patch('%s.async_response_model_mapping' % pbm, {
+                'success': {'asbaz': 'asblam'},
+                'error': {'aebaz': 'aeblam'}
+            }):
+                self.cls._generate_endpoint('aname', 'POST')
+        res = self.cls.tf_conf['resource']
+        integ = res['aws_api_gateway_integration']['aname_POST_integration']
+        assert integ['request_parameters'] == {
+            'integration.request.header.X-Amz-Invocation-Type': "'Event'"
+        }
+        assert integ['request_templates'] == {'foo': 'bar'}
+        success = res['aws_api_gateway_integration_response'][
+            'aname_POST_successResponse']
+        assert success['status_code'] == 202
+        assert success['response_templates'] == {'asbaz': 'asblam'}
+        error = res['aws_api_gateway_integration_response'][
+            'aname_POST_errorResponse']
+        assert error['response_templates'] == {'aebaz': 'aeblam'}
+
     def test_generate_saved_config(self):
         type(self.cls.config)._config = {'foo': 'bar', 'baz': 2}
         expected_conf = self.base_tf_conf
@@ -732,6 +1767,8 @@ class TestTerraformGenerator(object):
                 pb,
                 autospec=True,
                 _generate_lambda=DEFAULT,
+                _generate_async_destination=DEFAULT,
+                _generate_sns_fanout=DEFAULT,
                 _generate_iam_role=DEFAULT,
                 _generate_iam_invoke_role=DEFAULT,
                 _set_account_info=DEFAULT,
@@ -740,6 +1777,7 @@ class TestTerraformGenerator(object):
                 _generate_iam_role_policy=DEFAULT,
                 _generate_iam_invoke_role_policy=DEFAULT,
                 _generate_api_gateway_deployment=DEFAULT,
+                _generate_custom_domain=DEFAULT,
                 _generate_saved_config=DEFAULT,
             ) as mocks:
                 mock_json.return_value = 'my_json_str'
@@ -751,65 +1789,355 @@ class TestTerraformGenerator(object):
         assert mocks['_set_account_info'].mock_calls == [call(self.cls)]
         assert res == 'my_json_str'
 
-    @freeze_time("2016-07-01 02:03:04")
+    def test_generate_custom_domain_none(self):
+        self.cls._generate_custom_domain()
+        assert self.cls.tf_conf == self.base_tf_conf
+
+    def test_generate_custom_domain(self):
+        self.conf['custom_domain'] = {
+            'domain_name': 'hooks.example.com',
+            'route53_zone_id': 'Z123',
+            'certificate_arns': {'myregion': 'certarn', 'other': 'foo'}
+        }
+        self.cls._generate_custom_domain()
+        res = self.cls.tf_conf['resource']
+        assert res['aws_api_gateway_domain_name'] == {
+            'custom_domain': {
+                'domain_name': 'hooks.example.com',
+                'regional_certificate_arn': 'certarn',
+                'endpoint_configuration': {'types': ['REGIONAL']}
+            }
+        }
+        assert res['aws_api_gateway_base_path_mapping'] == {
+            'custom_domain': {
+                'api_id': '${aws_api_gateway_rest_api.rest_api.id}',
+                'stage_name': '${aws_api_gateway_deployment.depl.stage_name}',
+                'domain_name':
+                    '${aws_api_gateway_domain_name.custom_domain.domain_name}'
+            }
+        }
+        assert res['aws_route53_record'] == {
+            'custom_domain': {
+                'zone_id': 'Z123',
+                'name': 'hooks.example.com',
+                'type': 'A',
+                'set_identifier': 'myregion',
+                'latency_routing_policy': {'region': 'myregion'},
+                'alias': {
+                    'name': '${aws_api_gateway_domain_name.custom_domain.'
+                            'regional_domain_name}',
+                    'zone_id': '${aws_api_gateway_domain_name.custom_domain.'
+                               'regional_zone_id}',
+                    'evaluate_target_health': True
+                }
+            }
+        }
+        assert self.cls.tf_conf['output'] == {
+            'custom_domain_url': {'value': 'https://hooks.example.com/'}
+        }
+
+    def test_generate_custom_domain_no_cert(self):
+        self.conf['custom_domain'] = {
+            'domain_name': 'hooks.example.com',
+            'route53_zone_id': 'Z123',
+            'certificate_arns': {'other': 'foo'}
+        }
+        with pytest.raises(Exception) as excinfo:
+            self.cls._generate_custom_domain()
+        assert exc_msg(excinfo.value) == 'ERROR: custom_domain ' \
+                                         'certificate_arns has no ' \
+                                         'certificate for region myregion'
+        assert self.cls.tf_conf == self.base_tf_conf
+
+    def test_get_config_http(self):
+        self.conf['api_type'] = 'http'
+        with patch('%s.pretty_json' % pbm, autospec=True) as mock_json:
+            with patch.multiple(
+                pb,
+                autospec=True,
+                _generate_lambda=DEFAULT,
+                _generate_sns_fanout=DEFAULT,
+                _generate_iam_role=DEFAULT,
+                _generate_iam_invoke_role=DEFAULT,
+                _set_account_info=DEFAULT,
+                _generate_response_models=DEFAULT,
+                _generate_api_gateway=DEFAULT,
+                _generate_http_api=DEFAULT,
+                _generate_iam_role_policy=DEFAULT,
+                _generate_iam_invoke_role_policy=DEFAULT,
+                _generate_api_gateway_deployment=DEFAULT,
+                _generate_saved_config=DEFAULT,
+            ) as mocks:
+                mock_json.return_value = 'my_json_str'
+                res = self.cls._get_config('funcsrc')
+        assert res == 'my_json_str'
+        assert mock_json.mock_calls == [
+            call({'provider': {'aws': {}}, 'resource': {}, 'output': {}})
+        ]
+        for m in [
+            '_set_account_info', '_generate_iam_role',
+            '_generate_iam_role_policy', '_generate_lambda',
+            '_generate_sns_fanout', '_generate_http_api',
+            '_generate_saved_config'
+        ]:
+            assert mocks[m].mock_calls == [call(self.cls)]
+        for m in [
+            '_generate_iam_invoke_role', '_generate_iam_invoke_role_policy',
+            '_generate_response_models', '_generate_api_gateway',
+            '_generate_api_gateway_deployment'
+        ]:
+            assert mocks[m].mock_calls == []
+
     def test_write_zip(self):
-        with patch('%s.zipfile.ZipFile' % pbm, autospec=True) as mock_zf:
-            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-                self.cls._write_zip('myfsrc', 'mypath.zip')
-        # the only way I can find to capture attributes being set on the ZipInfo
-        # is to not mock it, but use a real ZipInfo object. Unfortunately, that
-        # makes assertin on calls a bit more difficult...
-        assert len(mock_zf.mock_calls) == 4
-        assert mock_zf.mock_calls[0] == call('mypath.zip', 'w')
-        assert mock_zf.mock_calls[1] == call().__enter__()
-        assert mock_zf.mock_calls[3] == call().__exit__(None, None, None)
-        # ok, now handle the second call, which should have the ZipInfo
-        # as its first argument...
-        # test that it's the right chained method call
-        assert mock_zf.mock_calls[2][0] == '().__enter__().writestr'
-        # test its arguments
-        arg_tup = mock_zf.mock_calls[2][1]
-        assert isinstance(arg_tup[0], ZipInfo)
-        assert arg_tup[0].filename == 'webhook2lambda2sqs_func.py'
-        assert arg_tup[0].date_time == (2016, 7, 1, 2, 3, 4)
-        assert arg_tup[0].external_attr == 0x0755 << 16
-        assert arg_tup[1] == 'myfsrc'
+        with patch('%s._zip_bytes' % pb, autospec=True) as mock_zb:
+            with patch('%s.write_if_changed' % pbm) as mock_wic:
+                with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                    mock_zb.return_value = b'zipbytes'
+                    mock_wic.return_value = True
+                    res = self.cls._write_zip('myfsrc', 'mypath.zip')
+        assert res is True
+        assert mock_zb.mock_calls == [call(self.cls, 'myfsrc')]
+        assert mock_wic.mock_calls == [call('mypath.zip', b'zipbytes')]
         assert mock_logger.mock_calls == [
-            call.debug('setting zipinfo date to: %s', (2016, 7, 1, 2, 3, 4)),
-            call.debug('setting zipinfo file mode to: %s', (0x0755 << 16)),
             call.debug('writing zip file at: %s', 'mypath.zip')
         ]
 
+    def test_zip_bytes(self):
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            res = self.cls._zip_bytes('myfsrc')
+        with ZipFile(BytesIO(res)) as z:
+            infos = z.infolist()
+        assert len(infos) == 1
+        assert infos[0].filename == 'webhook2lambda2sqs_func.py'
+        assert infos[0].date_time == (1980, 1, 1, 0, 0, 0)
+        assert infos[0].external_attr == 0x0755 << 16
+        assert infos[0].create_system == 3
+        assert mock_logger.mock_calls == [
+            call.debug('setting zipinfo date to: %s', (1980, 1, 1, 0, 0, 0))
+        ]
+
+    def test_zip_bytes_reproducible(self):
+        with freeze_time('2016-07-01 02:03:04'):
+            first = self.cls._zip_bytes('myfsrc')
+        with freeze_time('2017-08-02 03:04:05'):
+            second = self.cls._zip_bytes('myfsrc')
+        assert first == second
+        assert self.cls._zip_bytes('otherfsrc') != first
+
+    def test_zip_bytes_vendor_dir(self, tmpdir):
+        vdir = tmpdir.mkdir('vendor')
+        vdir.mkdir('pkg').join('__init__.py').write('x = 1')
+        vdir.join('pkg').join('__init__.pyc').write('junk')
+        vdir.join('mod.py').write('y = 2')
+        vdir.join('zz.py').write('z = 3')
+        self.conf['lambda_vendor_dir'] = str(vdir)
+        res = self.cls._zip_bytes('myfsrc')
+        with ZipFile(BytesIO(res)) as z:
+            assert z.namelist() == [
+                'mod.py',
+                'pkg/__init__.py',
+                'webhook2lambda2sqs_func.py',
+                'zz.py'
+            ]
+            assert z.read('webhook2lambda2sqs_func.py') == b'myfsrc'
+            assert z.read('pkg/__init__.py') == b'x = 1'
+            info = z.getinfo('mod.py')
+            assert info.date_time == (1980, 1, 1, 0, 0, 0)
+            assert info.external_attr == 0o100644 << 16
+        assert self.cls._zip_bytes('myfsrc') == res
+
+    def test_zip_bytes_vendor_dir_layer(self, tmpdir):
+        vdir = tmpdir.mkdir('vendor')
+        vdir.join('mod.py').write('y = 2')
+        self.conf['lambda_vendor_dir'] = str(vdir)
+        self.conf['lambda_layer'] = True
+        with ZipFile(BytesIO(self.cls._zip_bytes('myfsrc'))) as z:
+            assert z.namelist() == ['webhook2lambda2sqs_func.py']
+        with ZipFile(BytesIO(self.cls._layer_zip_bytes())) as z:
+            assert z.namelist() == ['python/mod.py']
+            assert z.read('python/mod.py') == b'y = 2'
+
+    def test_zip_bytes_vendor_dir_botocore_services(self, tmpdir):
+        vdir = tmpdir.mkdir('vendor')
+        data = vdir.mkdir('botocore').mkdir('data')
+        vdir.join('botocore').join('__init__.py').write('')
+        data.join('endpoints.json').write('{}')
+        data.mkdir('sqs').mkdir('2012-11-05').join('service-2.json').write('{}')
+        data.mkdir('ec2').mkdir('2016-11-15').join('service-2.json').write('{}')
+        b3data = vdir.mkdir('boto3').mkdir('data')
+        b3data.mkdir('sqs').mkdir('2012-11-05').join('resources-1.json').write(
+            '{}')
+        b3data.mkdir('s3').mkdir('2006-03-01').join('resources-1.json').write(
+            '{}')
+        self.conf['lambda_vendor_dir'] = str(vdir)
+        self.conf['lambda_botocore_services'] = ['sqs', 'sns']
+        with ZipFile(BytesIO(self.cls._zip_bytes('myfsrc'))) as z:
+            assert z.namelist() == [
+                'boto3/data/sqs/2012-11-05/resources-1.json',
+                'botocore/__init__.py',
+                'botocore/data/endpoints.json',
+                'botocore/data/sqs/2012-11-05/service-2.json',
+                'webhook2lambda2sqs_func.py'
+            ]
+
+    @pytest.mark.skipif(sys.version_info < (3, 7), reason='requires py3.7+')
+    def test_zip_bytes_precompile(self, tmpdir):
+        vdir = tmpdir.mkdir('vendor')
+        vdir.mkdir('pkg').join('__init__.py').write('x = 1')
+        vdir.join('bad.py').write('def (:')
+        self.conf['lambda_vendor_dir'] = str(vdir)
+        self.conf['lambda_precompile'] = True
+        type(self.cls.config).lambda_runtime = 'python%d.%d' % (
+            sys.version_info[:2])
+        tag = sys.implementation.cache_tag
+        res = self.cls._zip_bytes('def foo():\n    return 1\n')
+        with ZipFile(BytesIO(res)) as z:
+            assert z.namelist() == [
+                '__pycache__/webhook2lambda2sqs_func.%s.pyc' % tag,
+                'bad.py',
+                'pkg/__init__.py',
+                'pkg/__pycache__/__init__.%s.pyc' % tag,
+                'webhook2lambda2sqs_func.py'
+            ]
+            pyc = z.read('__pycache__/webhook2lambda2sqs_func.%s.pyc' % tag)
+        # PEP 552 flags: hash-based (0x01), unchecked (no 0x02)
+        assert pyc[4:8] == b'\x01\x00\x00\x00'
+        assert self.cls._zip_bytes('def foo():\n    return 1\n') == res
+
+    def test_compile_entries_wrong_version(self):
+        self.conf['lambda_precompile'] = True
+        type(self.cls.config).lambda_runtime = 'python1.5'
+        with pytest.raises(Exception) as excinfo:
+            self.cls._compile_entries({'foo.py': 'x = 1'})
+        assert exc_msg(excinfo.value) == 'ERROR: lambda_precompile requires ' \
+                                         'running under the same Python ' \
+                                         '(3.7+) version as lambda_runtime ' \
+                                         '(python1.5); running python%d.%d.' \
+                                         '' % sys.version_info[:2]
+
+    def test_package_report(self, tmpdir):
+        fpath = str(tmpdir.join('func.zip'))
+        with open(fpath, 'wb') as fh:
+            fh.write(self.cls._zip_bytes('x = 1\n'))
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            res = self.cls._package_report([fpath])
+        assert isinstance(res, float)
+        assert mock_logger.mock_calls == [
+            call.warning('Package %s size: %d bytes', fpath,
+                         os.path.getsize(fpath)),
+            call.warning('Function module import time (local %s): %.3f '
+                         'seconds', sys.executable, res)
+        ]
+
+    def test_package_report_layer_error(self, tmpdir):
+        fpath = str(tmpdir.join('func.zip'))
+        lpath = str(tmpdir.join('layer.zip'))
+        with open(fpath, 'wb') as fh:
+            fh.write(self.cls._zip_bytes('import mylayermod\n'))
+        self.conf['lambda_vendor_dir'] = str(tmpdir.mkdir('vendor'))
+        with open(lpath, 'wb') as fh:
+            fh.write(self.cls._layer_zip_bytes())
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            with patch('%s.subprocess.check_output' % pbm) as mock_co:
+                mock_co.side_effect = OSError('foo')
+                res = self.cls._package_report([fpath, lpath])
+        assert res is None
+        assert mock_co.call_count == 1
+        code = mock_co.mock_calls[0][1][0][2]
+        assert os.path.join('1', 'python') in code
+        assert mock_logger.mock_calls[2] == call.error(
+            'Unable to measure function import time', exc_info=1
+        )
+
+    def test_zip_bytes_vendor_dir_missing(self, tmpdir):
+        vdir = str(tmpdir.join('nonexistent'))
+        self.conf['lambda_vendor_dir'] = vdir
+        with pytest.raises(Exception) as excinfo:
+            self.cls._zip_bytes('myfsrc')
+        assert exc_msg(excinfo.value) == 'ERROR: lambda_vendor_dir %s does ' \
+                                         'not exist or is not a ' \
+                                         'directory.' % vdir
+
     def test_generate(self):
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
             with patch('%s._get_config' % pb, autospec=True) as mock_get:
-                with patch('%s.open' % pbm, mock_open(), create=True) as m_open:
+                with patch('%s.write_if_changed' % pbm) as mock_wic:
                     with patch('%s._write_zip' % pb, autospec=True) as mock_zip:
                         mock_get.return_value = 'myjson'
                         self.cls.generate('myfunc')
         assert mock_get.mock_calls == [call(self.cls, 'myfunc')]
-        assert m_open.mock_calls == [
-            call('./webhook2lambda2sqs_func.py', 'w'),
-            call().__enter__(),
-            call().write('myfunc'),
-            call().__exit__(None, None, None),
-            call('./webhook2lambda2sqs.tf.json', 'w'),
-            call().__enter__(),
-            call().write('myjson'),
-            call().__exit__(None, None, None)
+        assert mock_wic.mock_calls == [
+            call('./webhook2lambda2sqs_func.py', b'myfunc'),
+            call('./webhook2lambda2sqs.tf.json', b'myjson')
         ]
         assert mock_zip.mock_calls == [
             call(self.cls, 'myfunc', './webhook2lambda2sqs_func.zip')
         ]
         assert mock_logger.mock_calls == [
-            call.warning('Writing lambda function source to: '
+            call.warning('Writing lambda function source to: %s',
                          './webhook2lambda2sqs_func.py'),
             call.debug('lambda function written'),
-            call.warning('Writing lambda function source zip file to: '
+            call.warning('Writing lambda function source zip file to: %s',
                          './webhook2lambda2sqs_func.zip'),
             call.debug('lambda zip written'),
-            call.warning('Writing terraform configuration JSON to: '
+            call.warning('Writing terraform configuration JSON to: %s',
                          './webhook2lambda2sqs.tf.json'),
             call.debug('terraform configuration written'),
             call.warning('Completed writing lambda function and TF config.')
         ]
+
+    def test_generate_workdir(self, tmpdir):
+        wd = tmpdir.join('stacks', 'foo')
+        self.cls.workdir = str(wd)
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch('%s._get_config' % pb, autospec=True) as mock_get:
+                with patch('%s._zip_bytes' % pb, autospec=True) as mock_zip:
+                    mock_get.return_value = 'myjson'
+                    mock_zip.return_value = b'myzip'
+                    self.cls.generate('myfunc')
+        assert sorted(os.listdir(str(wd))) == [
+            'webhook2lambda2sqs.tf.json',
+            'webhook2lambda2sqs_func.py',
+            'webhook2lambda2sqs_func.zip'
+        ]
+        assert wd.join('webhook2lambda2sqs.tf.json').read() == 'myjson'
+        assert wd.join('webhook2lambda2sqs_func.zip').read_binary() == b'myzip'
+
+    def test_generate_module(self, tmpdir):
+        self.conf['terraform_module'] = True
+        self.cls.workdir = str(tmpdir)
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            with patch('%s._get_config' % pb, autospec=True) as mock_get:
+                with patch('%s._zip_bytes' % pb, autospec=True) as mock_zip:
+                    mock_get.return_value = 'myjson'
+                    mock_zip.return_value = b'myzip'
+                    self.cls.generate('myfunc')
+        mod_path = str(tmpdir.join('webhook2lambda2sqs_endpoints', 'main.tf'))
+        assert tmpdir.join('webhook2lambda2sqs_endpoints', 'main.tf').read() \
+            == endpoints_module
+        assert call.warning('Writing terraform endpoints module to: %s',
+                            mod_path) in mock_logger.mock_calls
+
+    def test_generate_layer_report(self):
+        self.conf['lambda_layer'] = True
+        with patch.multiple(
+            pb,
+            autospec=True,
+            _get_config=DEFAULT,
+            _write_zip=DEFAULT,
+            _layer_zip_bytes=DEFAULT,
+            _package_report=DEFAULT
+        ) as mocks:
+            with patch('%s.write_if_changed' % pbm) as mock_wic:
+                mocks['_get_config'].return_value = 'myjson'
+                mocks['_layer_zip_bytes'].return_value = b'layerzip'
+                self.cls.generate('myfunc', package_report=True)
+        assert mock_wic.mock_calls == [
+            call('./webhook2lambda2sqs_func.py', b'myfunc'),
+            call('./webhook2lambda2sqs_layer.zip', b'layerzip'),
+            call('./webhook2lambda2sqs.tf.json', b'myjson')
+        ]
+        assert mocks['_package_report'].mock_calls == [
+            call(self.cls, ['./webhook2lambda2sqs_func.zip',
+                            './webhook2lambda2sqs_layer.zip'])
+        ]
@@ -35,10 +35,16 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ################################################################################
 """
 import sys
+import os
 import pytest
 import json
+import threading
+import time
 
-from webhook2lambda2sqs.utils import pretty_json, run_cmd, read_json_file
+from webhook2lambda2sqs.utils import (
+    pretty_json, run_cmd, read_json_file, write_if_changed, _stop_process,
+    cache_get, cache_set
+)
 from webhook2lambda2sqs.tests.support import exc_msg
 
 # https://code.google.com/p/mock/issues/detail?id=249
@@ -67,48 +73,111 @@ class TestUtils(object):
         assert pretty_json(obj) == json.dumps(obj, sort_keys=True, indent=4)
 
     def test_run_cmd(self, capsys):
-        mock_stdout = Mock()
-        mock_stdout.read.side_effect = ['f', 'o', 'o', '']
+        cmd = [sys.executable, '-c', 'print("foo"); print("bar")']
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-            with patch('%s.subprocess.Popen' % pbm) as mock_popen:
-                mock_popen.return_value.stdout = mock_stdout
-                mock_popen.return_value.returncode = 0
-                mock_popen.return_value.pid = 1234
-                out, retcode = run_cmd(['foo', 'bar'])
-        assert out == 'foo'
+            out, retcode = run_cmd(cmd, shell=False)
+        assert out == 'foo\nbar\n'
         assert retcode == 0
         out, err = capsys.readouterr()
         assert out == ''
         assert err == ''
-        assert mock_logger.mock_calls == [
-            call.info('Running command%s: %s', '', ['foo', 'bar']),
-            call.debug('Started process; pid=%s', 1234),
+        assert mock_logger.mock_calls[0] == call.info(
+            'Running command%s: %s', '', cmd
+        )
+        assert mock_logger.mock_calls[1][0] == 'debug'
+        assert mock_logger.mock_calls[1][1][0] == 'Started process; pid=%s'
+        assert mock_logger.mock_calls[2:] == [
             call.info('Command exited with code %d', 0),
-            call.debug("Command output:\n%s", 'foo')
+            call.debug("Command output:\n%s", 'foo\nbar\n')
         ]
 
     def test_run_cmd_stream(self, capsys):
-        mock_stdout = Mock()
-        mock_stdout.read.side_effect = ['f', 'o', 'o', '']
+        cmd = [sys.executable, '-c',
+               'import sys; sys.stdout.write("foo"); sys.exit(5)']
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-            with patch('%s.subprocess.Popen' % pbm) as mock_popen:
-                mock_popen.return_value.stdout = mock_stdout
-                mock_popen.return_value.returncode = 5
-                mock_popen.return_value.pid = 1234
-                out, retcode = run_cmd(['foo', 'bar'], stream=True)
+            out, retcode = run_cmd(cmd, stream=True, shell=False)
         assert out == 'foo'
         assert retcode == 5
         out, err = capsys.readouterr()
         assert out == 'foo'
         assert err == ''
-        assert mock_logger.mock_calls == [
-            call.info('Running command%s: %s', ' and streaming output',
-                      ['foo', 'bar']),
-            call.debug('Started process; pid=%s', 1234),
+        assert mock_logger.mock_calls[0] == call.info(
+            'Running command%s: %s', ' and streaming output', cmd
+        )
+        assert mock_logger.mock_calls[2:] == [
             call.info('Command exited with code %d', 5),
             call.debug("Command output:\n%s", 'foo')
         ]
 
+    def test_run_cmd_shell_stderr(self):
+        out, retcode = run_cmd('echo foo; echo bar >&2')
+        assert out == 'foo\nbar\n'
+        assert retcode == 0
+
+    def test_run_cmd_max_output(self):
+        cmd = [sys.executable, '-c', 'for i in range(5): print("line%d" % i)']
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            out, retcode = run_cmd(cmd, shell=False, max_output=12)
+        assert out == '[... 18 characters of output discarded ...]\n' \
+                      'line3\nline4\n'
+        assert retcode == 0
+        assert call.warning(
+            'Discarded first %d characters of command output', 18
+        ) in mock_logger.mock_calls
+
+    def test_run_cmd_transcript(self, tmpdir):
+        fpath = tmpdir.join('transcript.log')
+        fpath.write_binary(b'previous\n')
+        cmd = [sys.executable, '-c', 'for i in range(3): print("line%d" % i)']
+        out, retcode = run_cmd(cmd, shell=False, max_output=6,
+                               transcript=str(fpath))
+        assert out.endswith('line2\n')
+        assert fpath.read_binary() == b'previous\nline0\nline1\nline2\n'
+
+    def test_run_cmd_cwd(self, tmpdir):
+        cmd = [sys.executable, '-c', 'import os; print(os.getcwd())']
+        out, retcode = run_cmd(cmd, shell=False, cwd=str(tmpdir))
+        assert retcode == 0
+        assert os.path.realpath(out.strip()) == os.path.realpath(str(tmpdir))
+
+    def test_run_cmd_timeout(self):
+        cmd = [sys.executable, '-c', 'import time; time.sleep(30)']
+        start = time.time()
+        with pytest.raises(Exception) as excinfo:
+            run_cmd(cmd, shell=False, timeout=0.5)
+        assert exc_msg(excinfo.value) == 'Command timed out after 0.5 ' \
+                                         'seconds: %s' % cmd
+        assert time.time() - start < 10
+
+    def test_run_cmd_cancel(self):
+        cmd = [sys.executable, '-c', 'import time; time.sleep(30)']
+        ev = threading.Event()
+        timer = threading.Timer(0.3, ev.set)
+        timer.start()
+        with pytest.raises(Exception) as excinfo:
+            run_cmd(cmd, shell=False, cancel=ev)
+        assert exc_msg(excinfo.value) == 'Command cancelled: %s' % cmd
+
+    def test_stop_process_kill(self):
+        p = Mock(pid=123)
+        p.poll.return_value = None
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            with patch('%s.time' % pbm) as mock_time:
+                mock_time.time.side_effect = [0, 1, 6]
+                _stop_process(p)
+        assert p.mock_calls == [
+            call.terminate(),
+            call.poll(),
+            call.poll(),
+            call.poll(),
+            call.kill(),
+            call.wait()
+        ]
+        assert mock_logger.mock_calls == [
+            call.warning('Terminating process %s', 123),
+            call.warning('Process %s did not exit; killing', 123)
+        ]
+
     def test_read_json_file(self):
         val = {'foo': 'bar', 'baz': 2}
         content = json.dumps(val)
@@ -126,6 +195,72 @@ class TestUtils(object):
             call().__exit__(None, None, None)
         ]
 
+    def test_cache_set_get(self, tmpdir):
+        cpath = str(tmpdir.join('sub', 'cache.json'))
+        with patch('%s.AWS_CACHE_PATH' % pbm, cpath):
+            with patch('%s.time.time' % pbm) as mock_time:
+                mock_time.return_value = 1000.0
+                assert cache_get('sect', 'k1', 60) is None
+                cache_set('sect', 'k1', 'v1')
+                cache_set('sect', 'k2', {'foo': 'bar'})
+                cache_set('other', 'k1', 'v3')
+                mock_time.return_value = 1060.0
+                assert cache_get('sect', 'k1', 60) == 'v1'
+                assert cache_get('sect', 'k2', 60) == {'foo': 'bar'}
+                assert cache_get('other', 'k1', 60) == 'v3'
+                assert cache_get('sect', 'k3', 60) is None
+                mock_time.return_value = 1061.0
+                assert cache_get('sect', 'k1', 60) is None
+        with open(cpath, 'r') as fh:
+            assert json.loads(fh.read()) == {
+                'sect': {
+                    'k1': {'value': 'v1', 'time': 1000.0},
+                    'k2': {'value': {'foo': 'bar'}, 'time': 1000.0}
+                },
+                'other': {'k1': {'value': 'v3', 'time': 1000.0}}
+            }
+
+    def test_cache_get_bad_file(self, tmpdir):
+        f = tmpdir.join('cache.json')
+        f.write('not json')
+        with patch('%s.AWS_CACHE_PATH' % pbm, str(f)):
+            assert cache_get('sect', 'k1', 60) is None
+
+    def test_cache_set_unwritable(self, tmpdir):
+        cpath = str(tmpdir.join('cache.json'))
+        with patch('%s.AWS_CACHE_PATH' % pbm, cpath):
+            with patch('%s.open' % pbm, create=True) as m_open:
+                with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                    m_open.side_effect = IOError('denied')
+                    cache_set('sect', 'k1', 'v1')
+        assert mock_logger.mock_calls == [
+            call.debug('Unable to write AWS cache %s', cpath, exc_info=1)
+        ]
+
+    def test_write_if_changed_new(self, tmpdir):
+        fpath = str(tmpdir.join('foo.txt'))
+        assert write_if_changed(fpath, b'foo') is True
+        assert tmpdir.join('foo.txt').read_binary() == b'foo'
+
+    def test_write_if_changed_changed(self, tmpdir):
+        f = tmpdir.join('foo.txt')
+        f.write_binary(b'bar')
+        assert write_if_changed(str(f), b'foo') is True
+        assert f.read_binary() == b'foo'
+
+    def test_write_if_changed_unchanged(self, tmpdir):
+        f = tmpdir.join('foo.txt')
+        f.write_binary(b'foo')
+        with patch('%s.open' % pbm, mock_open(read_data=b'foo'),
+                   create=True) as m_open:
+            assert write_if_changed(str(f), b'foo') is False
+        assert m_open.mock_calls == [
+            call(str(f), 'rb'),
+            call().__enter__(),
+            call().read(),
+            call().__exit__(None, None, None)
+        ]
+
     def test_read_json_file_no_exist(self):
         val = {'foo': 'bar', 'baz': 2}
         content = json.dumps(val)
@@ -37,19 +37,44 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import logging
 import json
+import hashlib
 import zipfile
-from boto3 import client
-from datetime import datetime
+from io import BytesIO
 import os
+import posixpath
+import marshal
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
 
 from webhook2lambda2sqs.version import VERSION, PROJECT_URL
-from webhook2lambda2sqs.utils import pretty_json
+from webhook2lambda2sqs.aws import get_client, get_session
+from webhook2lambda2sqs.utils import (
+    pretty_json, write_if_changed, cache_get, cache_set
+)
 from webhook2lambda2sqs.json_templates import (
-    request_model_mapping, response_model_mapping
+    request_model_mapping, response_model_mapping,
+    direct_request_model_mapping, direct_response_model_mapping,
+    async_response_model_mapping
 )
+from webhook2lambda2sqs.tf_templates import endpoints_module
 
 logger = logging.getLogger(__name__)
 
+#: Fixed timestamp for all entries in the Lambda function zip file, so that
+#: the zip is reproducible. This is the earliest date the zip format supports.
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+#: Directory (relative to the working directory) that the endpoints module is
+#: written to, when the ``terraform_module`` configuration option is true.
+ENDPOINTS_MODULE_DIR = 'webhook2lambda2sqs_endpoints'
+
+#: Seconds to cache the AWS account ID found for a set of credentials; see
+#: :py:meth:`~.TerraformGenerator._caller_account_id`
+ACCOUNT_ID_CACHE_TTL = 86400
+
 
 class TerraformGenerator(object):
     """
@@ -59,7 +84,8 @@ class TerraformGenerator(object):
     ``tf_config`` dict.
     """
 
-    def __init__(self, config, tf_ver=(0, 9, 0)):
+    def __init__(self, config, tf_ver=(0, 9, 0), workdir='.', region=None,
+                 account_id=None, aws_region=None, offline=False):
         """
         Initialize the Terraform config generator.
 
@@ -67,8 +93,35 @@ class TerraformGenerator(object):
         :type config: :py:class:`~.Config`
         :param tf_ver: target terraform version
         :type tf_ver: tuple
+        :param workdir: directory to write generated files to
+        :type workdir: str
+        :param region: AWS region to generate the stack for, when deploying
+          to multiple regions; None to use the default region.
+        :type region: str
+        :param account_id: AWS account ID to generate for (overriding the
+          ``aws_account_id`` configuration option), or None
+        :type account_id: str
+        :param aws_region: AWS region to generate for when not deploying to
+          multiple regions (overriding the ``aws_region`` configuration
+          option), or None
+        :type aws_region: str
+        :param offline: if True, never look up the account ID or region from
+          AWS configuration files or APIs; they must be given by the
+          arguments, configuration or environment instead.
+        :type offline: bool
         """
         self.config = config
+        self.workdir = workdir
+        self.region = region
+        self._offline = offline
+        if account_id is None:
+            account_id = config.get('aws_account_id')
+        self._account_id = account_id
+        if region is not None:
+            aws_region = region
+        elif aws_region is None:
+            aws_region = config.get('aws_region')
+        self._aws_region = aws_region
         self.tf_conf = {
             'provider': {
                 'aws': {}
@@ -93,15 +146,27 @@ class TerraformGenerator(object):
         self.resource_name = config.func_name
         self.aws_account_id = None
         self.aws_region = None
+        if aws_region is not None:
+            self.tf_conf['provider']['aws']['region'] = aws_region
         self._setup_tf_config()
 
     def _setup_tf_config(self):
-        if self._tf_ver < (0, 9, 0):
+        if self.config.get('terraform_module'):
+            # module for_each and depends_on were added in 0.13
+            self.tf_conf['terraform'] = {'required_version': '>= 0.13.0'}
+        elif self.config.api_type == 'http':
+            # the aws_apigatewayv2_* resources need an AWS provider that only
+            # supports 0.12 and later
+            self.tf_conf['terraform'] = {'required_version': '>= 0.12.0'}
+        elif self._tf_ver < (0, 9, 0):
             return
-        self.tf_conf['terraform'] = {'required_version': '>= 0.9.0'}
+        else:
+            self.tf_conf['terraform'] = {'required_version': '>= 0.9.0'}
         if self.config.get('terraform_remote_state') is None:
             return
         rmt = self.config.get('terraform_remote_state')
+        if self.region is not None:
+            rmt = self.config.region_remote_state(self.region)
         self.tf_conf['terraform']['backend'] = {
             rmt['backend']: rmt['config']
         }
@@ -111,6 +176,96 @@ class TerraformGenerator(object):
         return 'push webhook contents to SQS - generated and managed by ' \
                '%s v%s' % (PROJECT_URL, VERSION)
 
+    def _endpoint_option(self, ep_name, key, default=None):
+        """
+        Return the value of an optional per-endpoint configuration key.
+
+        :param ep_name: endpoint name
+        :type ep_name: str
+        :param key: endpoint configuration key
+        :type key: str
+        :param default: value to return if the key is not set
+        :return: configuration value, or ``default``
+        """
+        return self.config.get('endpoints').get(ep_name, {}).get(key, default)
+
+    @property
+    def _queue_region(self):
+        """
+        Return the region that the configured SQS queues are in.
+
+        :rtype: str
+        """
+        if self.config.get('queue_region') is not None:
+            return self.config.get('queue_region')
+        return self.aws_region
+
+    def _queue_arn(self, qname, region=None):
+        """
+        Return the ARN for the SQS queue with the given name.
+
+        :param qname: queue name
+        :type qname: str
+        :param region: region the queue is in; defaults to the configured
+          queue region
+        :type region: str
+        :return: queue ARN
+        :rtype: str
+        """
+        if region is None:
+            region = self._queue_region
+        return 'arn:aws:sqs:%s:%s:%s' % (region, self.aws_account_id, qname)
+
+    @property
+    def _iam_name(self):
+        """
+        Return the name of the function's IAM role. IAM is global, so when
+        deploying to multiple regions the region is appended to the name.
+
+        :rtype: str
+        """
+        if self.region is None:
+            return self.resource_name
+        return '%s-%s' % (self.resource_name, self.region)
+
+    def _sns_topic_name(self, ep_name):
+        """
+        Return the name of the SNS fan-out topic for an endpoint. This must
+        match the name computed by
+        :py:func:`webhook2lambda2sqs.lambda_func.sns_topic_for_endpoint`.
+
+        :param ep_name: endpoint name
+        :type ep_name: str
+        :return: SNS topic name
+        :rtype: str
+        """
+        return '%s-%s' % (self.resource_name, ep_name)
+
+    @property
+    def _fanout_endpoints(self):
+        """
+        Return a sorted list of the names of all endpoints using SNS fan-out.
+
+        :return: list of endpoint names (str)
+        :rtype: :std:term:`list`
+        """
+        return sorted([
+            ep for ep in self.config.get('endpoints')
+            if self._endpoint_option(ep, 'sns_fanout', False)
+        ])
+
+    @property
+    def _has_async_endpoints(self):
+        """
+        Return whether or not any endpoints use asynchronous invocation.
+
+        :rtype: bool
+        """
+        for ep in self.config.get('endpoints'):
+            if self._endpoint_option(ep, 'async', False):
+                return True
+        return False
+
     def _generate_iam_role_policy(self):
         """
         Generate the policy for the IAM Role.
@@ -121,10 +276,14 @@ class TerraformGenerator(object):
         queue_arns = []
         for ep in endpoints:
             for qname in endpoints[ep]['queues']:
-                qarn = 'arn:aws:sqs:%s:%s:%s' % (self.aws_region,
-                                                 self.aws_account_id, qname)
+                qarn = self._queue_arn(qname)
                 if qarn not in queue_arns:
                     queue_arns.append(qarn)
+        if self._has_async_endpoints:
+            # Lambda sends failed async events to the on-failure destination
+            # using the function's execution role
+            queue_arns.append(self._queue_arn(self._async_failure_queue_name,
+                                              region=self.aws_region))
         pol = {
             "Version": "2012-10-17",
             "Statement": [
@@ -165,6 +324,19 @@ class TerraformGenerator(object):
                 }
             ]
         }
+        topic_arns = [
+            'arn:aws:sns:%s:%s:%s' % (self.aws_region, self.aws_account_id,
+                                      self._sns_topic_name(ep))
+            for ep in self._fanout_endpoints
+        ]
+        if len(topic_arns) > 0:
+            pol['Statement'].append({
+                "Effect": "Allow",
+                "Action": [
+                    "sns:Publish"
+                ],
+                "Resource": topic_arns
+            })
         self.tf_conf['resource']['aws_iam_role_policy']['role_policy'] = {
             'name': self.resource_name,
             'role': '${aws_iam_role.lambda_role.id}',
@@ -174,10 +346,20 @@ class TerraformGenerator(object):
     def _generate_iam_invoke_role_policy(self):
         """
         Generate the policy for the IAM role used by API Gateway to invoke
-        the lambda function.
+        the lambda function, and to send messages to the queues of any
+        endpoints using the "direct" integration.
 
         Terraform name: aws_iam_role.invoke_role
         """
+        endpoints = self.config.get('endpoints')
+        direct_arns = []
+        for ep in endpoints:
+            if endpoints[ep].get('integration', 'lambda') != 'direct':
+                continue
+            for qname in endpoints[ep]['queues']:
+                qarn = self._queue_arn(qname)
+                if qarn not in direct_arns:
+                    direct_arns.append(qarn)
         invoke_pol = {
             "Version": "2012-10-17",
             "Statement": [
@@ -188,6 +370,12 @@ class TerraformGenerator(object):
                 }
             ]
         }
+        if len(direct_arns) > 0:
+            invoke_pol['Statement'].append({
+                "Effect": "Allow",
+                "Resource": sorted(direct_arns),
+                "Action": ["sqs:SendMessage"]
+            })
         self.tf_conf['resource']['aws_iam_role_policy']['invoke_policy'] = {
             'name': self.resource_name + '-invoke',
             'role': '${aws_iam_role.invoke_role.id}',
@@ -216,7 +404,7 @@ class TerraformGenerator(object):
 
         self.tf_conf['resource']['aws_iam_role'] = {}
         self.tf_conf['resource']['aws_iam_role']['lambda_role'] = {
-            'name': self.resource_name,
+            'name': self._iam_name,
             'assume_role_policy': json.dumps(pol),
         }
         self.tf_conf['output']['iam_role_arn'] = {
@@ -248,7 +436,7 @@ class TerraformGenerator(object):
             ]
         }
         self.tf_conf['resource']['aws_iam_role']['invoke_role'] = {
-            'name': self.resource_name + '-invoke',
+            'name': self._iam_name + '-invoke',
             'assume_role_policy': json.dumps(invoke_assume),
         }
         self.tf_conf['output']['iam_invoke_role_arn'] = {
@@ -270,43 +458,220 @@ class TerraformGenerator(object):
             'source_code_hash': '${base64sha256(file('
                                 '"webhook2lambda2sqs_func.zip"))}',
             'description': self.description,
-            'runtime': 'python2.7',
+            'runtime': self.config.lambda_runtime,
             'timeout': 120
         }
+        if self.config.get('lambda_layer'):
+            self.tf_conf['resource']['aws_lambda_layer_version'] = {
+                'lambda_layer': {
+                    'filename': 'webhook2lambda2sqs_layer.zip',
+                    'layer_name': self.resource_name,
+                    'source_code_hash': '${base64sha256(file('
+                                        '"webhook2lambda2sqs_layer.zip"))}',
+                    'description': self.description,
+                    'compatible_runtimes': [self.config.lambda_runtime]
+                }
+            }
+            self.tf_conf['resource']['aws_lambda_function']['lambda_func'][
+                'layers'] = ['${aws_lambda_layer_version.lambda_layer.arn}']
         self.tf_conf['output']['lambda_func_arn'] = {
             'value': '${aws_lambda_function.lambda_func.arn}'
         }
 
+    def _generate_sns_fanout(self):
+        """
+        Generate the SNS topic and queue subscriptions for each endpoint with
+        ``sns_fanout`` enabled, and add to self.tf_conf. Policies for the
+        subscribed queues are only generated if the
+        ``sns_fanout_queue_policies`` option is true, as they replace any
+        existing policy on those queues.
+
+        Terraform names:
+
+        - aws_sns_topic: {ep_name}
+        - aws_sns_topic_subscription: {ep_name}_{queue_name}
+        - aws_sqs_queue_policy: {queue_name}
+        """
+        fanout_eps = self._fanout_endpoints
+        if len(fanout_eps) == 0:
+            return
+        topics = {}
+        subs = {}
+        # queue name to list of topic ARNs allowed to send to it
+        queue_topics = {}
+        for ep in fanout_eps:
+            topics[ep] = {'name': self._sns_topic_name(ep)}
+            filter_pols = self._endpoint_option(ep, 'sns_filter_policies', {})
+            for qname in self.config.get('endpoints')[ep]['queues']:
+                sub = {
+                    'topic_arn': '${aws_sns_topic.%s.arn}' % ep,
+                    'protocol': 'sqs',
+                    'endpoint': self._queue_arn(qname),
+                    'raw_message_delivery': True
+                }
+                if qname in filter_pols:
+                    sub['filter_policy'] = json.dumps(filter_pols[qname],
+                                                      sort_keys=True)
+                    sub['filter_policy_scope'] = 'MessageBody'
+                subs['%s_%s' % (ep, qname)] = sub
+                queue_topics.setdefault(qname, []).append(
+                    '${aws_sns_topic.%s.arn}' % ep
+                )
+        self.tf_conf['resource']['aws_sns_topic'] = topics
+        self.tf_conf['resource']['aws_sns_topic_subscription'] = subs
+        if not self.config.get('sns_fanout_queue_policies'):
+            return
+        logger.warning('sns_fanout_queue_policies is enabled; replacing the '
+                       'SQS queue policy of queues: %s',
+                       ', '.join(sorted(queue_topics.keys())))
+        pols = {}
+        for qname in sorted(queue_topics.keys()):
+            pol = {
+                'Version': '2012-10-17',
+                'Statement': [
+                    {
+                        'Effect': 'Allow',
+                        'Principal': {'Service': 'sns.amazonaws.com'},
+                        'Action': 'sqs:SendMessage',
+                        'Resource': self._queue_arn(qname),
+                        'Condition': {
+                            'ArnEquals': {'aws:SourceArn': queue_topics[qname]}
+                        }
+                    }
+                ]
+            }
+            pols[qname] = {
+                'queue_url': 'https://sqs.%s.amazonaws.com/%s/%s' % (
+                    self._queue_region, self.aws_account_id, qname),
+                'policy': json.dumps(pol)
+            }
+        self.tf_conf['resource']['aws_sqs_queue_policy'] = pols
+
+    @property
+    def _async_failure_queue_name(self):
+        """
+        Return the name of the SQS queue used as the on-failure destination
+        for asynchronous invocations.
+
+        :rtype: str
+        """
+        return '%s-failures' % self.resource_name
+
+    def _generate_async_destination(self):
+        """
+        If any endpoints use asynchronous invocation, generate the SQS queue
+        and Lambda event invoke config that sends events which fail all
+        retries to that queue, and add to self.tf_conf
+
+        Terraform names:
+
+        - aws_sqs_queue: async_failures
+        - aws_lambda_function_event_invoke_config: lambda_func
+        """
+        if not self._has_async_endpoints:
+            return
+        self.tf_conf['resource']['aws_sqs_queue'] = {
+            'async_failures': {
+                'name': self._async_failure_queue_name
+            }
+        }
+        self.tf_conf['resource']['aws_lambda_function_event_invoke_config'] = {
+            'lambda_func': {
+                'function_name':
+                    '${aws_lambda_function.lambda_func.function_name}',
+                'maximum_retry_attempts': 2,
+                'destination_config': {
+                    'on_failure': {
+                        'destination': '${aws_sqs_queue.async_failures.arn}'
+                    }
+                }
+            }
+        }
+        self.tf_conf['output']['async_failure_queue_url'] = {
+            'value': '${aws_sqs_queue.async_failures.id}'
+        }
+
     def _set_account_info(self):
         """
-        Connect to the AWS IAM API via boto3 and run the GetUser operation
-        on the current user. Use this to set ``self.aws_account_id`` and
-        ``self.aws_region``.
-        """
-        if 'AWS_DEFAULT_REGION' in os.environ:
-            logger.debug('Connecting to IAM with region_name=%s',
-                         os.environ['AWS_DEFAULT_REGION'])
-            kwargs = {'region_name': os.environ['AWS_DEFAULT_REGION']}
-        elif 'AWS_REGION' in os.environ:
-            logger.debug('Connecting to IAM with region_name=%s',
-                         os.environ['AWS_REGION'])
-            kwargs = {'region_name': os.environ['AWS_REGION']}
+        Set ``self.aws_account_id`` and ``self.aws_region``. Each of them is
+        taken from the constructor arguments or configuration if set, in
+        which case no AWS API calls are made. Otherwise, the region comes
+        from the environment or AWS configuration files, and the account ID
+        from :py:meth:`~._caller_account_id`; unless ``offline`` was set, in
+        which case an exception is raised if either is unknown.
+        """
+        region = self._aws_region
+        if region is None and 'AWS_DEFAULT_REGION' in os.environ:
+            region = os.environ['AWS_DEFAULT_REGION']
+        elif region is None and 'AWS_REGION' in os.environ:
+            region = os.environ['AWS_REGION']
+        elif region is None and not self._offline:
+            # from the AWS config file; this doesn't connect to anything
+            region = get_session().region_name
+        if region is None:
+            raise Exception('ERROR: unable to determine the AWS region; set '
+                            'the aws_region configuration option or '
+                            'AWS_DEFAULT_REGION environment variable')
+        self.aws_region = region
+        if self._account_id is not None:
+            self.aws_account_id = self._account_id
+        elif self._offline:
+            raise Exception('ERROR: unable to determine the AWS account ID '
+                            'without AWS API calls; set the aws_account_id '
+                            'configuration option')
         else:
-            logger.debug('Connecting to IAM without specified region')
-            kwargs = {}
-        conn = client('iam', **kwargs)
-        self.aws_account_id = conn.get_user()['User']['Arn'].split(':')[4]
-        # region
-        conn = client('lambda', **kwargs)
-        self.aws_region = conn._client_config.region_name
+            self.aws_account_id = self._caller_account_id()
         logger.info('Found AWS account ID as %s; region: %s',
                     self.aws_account_id, self.aws_region)
 
+    def _caller_account_id(self):
+        """
+        Return the AWS account ID of the current credentials, from the STS
+        GetCallerIdentity operation (which works for users and assumed roles
+        alike, and requires no IAM permissions). The result is cached on disk
+        per AWS profile and resolved access key (from whatever source boto3
+        finds the credentials in, such as the environment, shared credentials
+        file, SSO or instance role) for :py:const:`~.ACCOUNT_ID_CACHE_TTL`
+        seconds; see :py:func:`~.cache_get`.
+
+        :return: AWS account ID
+        :rtype: str
+        """
+        profile = os.environ.get(
+            'AWS_PROFILE', os.environ.get('AWS_DEFAULT_PROFILE', 'default'))
+        creds = get_session().get_credentials()
+        key = None
+        if creds is not None:
+            key = hashlib.sha256(('%s|%s' % (
+                profile, creds.access_key
+            )).encode('utf-8')).hexdigest()
+            account_id = cache_get('account_id', key, ACCOUNT_ID_CACHE_TTL)
+            if account_id is not None:
+                logger.debug('Using cached AWS account ID for profile %s',
+                             profile)
+                return account_id
+        logger.debug('Connecting to STS with region_name=%s', self.aws_region)
+        conn = get_client('sts', self.aws_region)
+        account_id = conn.get_caller_identity()['Account']
+        if key is not None:
+            cache_set('account_id', key, account_id)
+        return account_id
+
     def _generate_response_models(self):
         """
         Generate API Gateway response models and add to self.tf_conf
         """
-        self.tf_conf['resource']['aws_api_gateway_model'] = {
+        self.tf_conf['resource']['aws_api_gateway_model'] = \
+            self._response_models()
+
+    def _response_models(self):
+        """
+        Return the API Gateway response model resources.
+
+        :return: aws_api_gateway_model resources, by name
+        :rtype: dict
+        """
+        return {
             'errormessage': {
                 'rest_api_id': '${aws_api_gateway_rest_api.rest_api.id}',
                 'name': 'errormessage',
@@ -372,14 +737,171 @@ class TerraformGenerator(object):
                      'execute-api.%s.amazonaws.com/%s/' % (
                          self.aws_region, self.config.stage_name)
         }
+        if self.config.api_definition == 'openapi':
+            self.tf_conf['resource']['aws_api_gateway_rest_api']['rest_api'][
+                'body'] = pretty_json(self._openapi_document())
+            return
         # generate the endpoint configs
+        if self.config.api_layout == 'proxy':
+            self._generate_proxy_endpoint()
+            return
+        if self.config.get('terraform_module'):
+            self._generate_endpoints_module()
+            return
         endpoints = self.config.get('endpoints')
         for ep in sorted(endpoints.keys()):
             self._generate_endpoint(ep, endpoints[ep]['method'])
 
+    def _generate_http_api(self):
+        """
+        Generate the full configuration for an API Gateway HTTP API (v2)
+        with a Lambda proxy integration using payload format version 2.0,
+        and add to self.tf_conf. This is used instead of the ReST API
+        resources when the ``api_type`` configuration key is "http".
+
+        Terraform names:
+
+        - aws_apigatewayv2_api: http_api
+        - aws_apigatewayv2_integration: lambda
+        - aws_apigatewayv2_route: {ep_name}_{ep_method}, or proxy_ANY for the
+          "proxy" api_layout
+        - aws_apigatewayv2_stage: stage
+        - aws_lambda_permission: http_api
+        """
+        self.tf_conf['resource']['aws_apigatewayv2_api'] = {
+            'http_api': {
+                'name': self.resource_name,
+                'description': self.description,
+                'protocol_type': 'HTTP'
+            }
+        }
+        self.tf_conf['resource']['aws_apigatewayv2_integration'] = {
+            'lambda': {
+                'api_id': '${aws_apigatewayv2_api.http_api.id}',
+                'integration_type': 'AWS_PROXY',
+                'integration_method': 'POST',
+                'integration_uri':
+                    '${aws_lambda_function.lambda_func.invoke_arn}',
+                'payload_format_version': '2.0'
+            }
+        }
+        route_keys = {}
+        if self.config.api_layout == 'proxy':
+            # one route; the function routes on the proxy path parameter
+            route_keys['proxy_ANY'] = 'ANY /{proxy+}'
+        else:
+            endpoints = self.config.get('endpoints')
+            for ep in sorted(endpoints.keys()):
+                ep_method = endpoints[ep]['method'].upper()
+                route_keys['%s_%s' % (ep, ep_method)] = '%s /%s' % (
+                    ep_method, ep)
+        routes = {}
+        for rname, route_key in route_keys.items():
+            routes[rname] = {
+                'api_id': '${aws_apigatewayv2_api.http_api.id}',
+                'route_key': route_key,
+                'target': 'integrations/'
+                          '${aws_apigatewayv2_integration.lambda.id}'
+            }
+        self.tf_conf['resource']['aws_apigatewayv2_route'] = routes
+        stage = {
+            'api_id': '${aws_apigatewayv2_api.http_api.id}',
+            'name': self.config.stage_name,
+            'description': self.description,
+            'auto_deploy': True
+        }
+        route_settings = self._http_api_route_settings(
+            self.config.get('api_gateway_method_settings'))
+        if len(route_settings) > 0:
+            stage['default_route_settings'] = route_settings
+        if self.config.api_layout != 'proxy':
+            ep_settings = []
+            endpoints = self.config.get('endpoints')
+            for ep in sorted(endpoints.keys()):
+                rs = self._http_api_route_settings(
+                    endpoints[ep].get('method_settings'))
+                if len(rs) == 0:
+                    continue
+                rs['route_key'] = route_keys[
+                    '%s_%s' % (ep, endpoints[ep]['method'].upper())]
+                ep_settings.append(rs)
+            if len(ep_settings) > 0:
+                stage['route_settings'] = ep_settings
+        self.tf_conf['resource']['aws_apigatewayv2_stage'] = {'stage': stage}
+        self.tf_conf['resource']['aws_lambda_permission'] = {
+            'http_api': {
+                'statement_id': 'AllowHttpApiInvoke',
+                'action': 'lambda:InvokeFunction',
+                'function_name': '${aws_lambda_function.lambda_func.'
+                                 'function_name}',
+                'principal': 'apigateway.amazonaws.com',
+                'source_arn': '${aws_apigatewayv2_api.http_api.'
+                              'execution_arn}/*/*'
+            }
+        }
+        self.tf_conf['output']['http_api_id'] = {
+            'value': '${aws_apigatewayv2_api.http_api.id}'
+        }
+        self.tf_conf['output']['base_url'] = {
+            'value': '${aws_apigatewayv2_stage.stage.invoke_url}/'
+        }
+
+    def _http_api_route_settings(self, settings):
+        """
+        Translate the API Gateway method settings that HTTP APIs support
+        (from ``api_gateway_method_settings`` or an endpoint's
+        ``method_settings``) into ``aws_apigatewayv2_stage`` route settings.
+
+        :param settings: method settings, or None
+        :type settings: dict
+        :return: route settings for the stage
+        :rtype: dict
+        """
+        if settings is None:
+            return {}
+        res = {}
+        if settings.get('metricsEnabled') is not None:
+            res['detailed_metrics_enabled'] = settings['metricsEnabled']
+        if settings.get('throttlingBurstLimit') is not None:
+            res['throttling_burst_limit'] = settings['throttlingBurstLimit']
+        if settings.get('throttlingRateLimit') is not None:
+            res['throttling_rate_limit'] = settings['throttlingRateLimit']
+        return res
+
+    @property
+    def _api_config_hash(self):
+        """
+        Return a SHA256 hex digest of the generated API Gateway resources
+        (all ``aws_api_gateway_*`` resources other than the deployment), used
+        to redeploy the API only when its definition changes.
+
+        :rtype: str
+        """
+        api_res = {}
+        for rtype, resources in self.tf_conf['resource'].items():
+            if (rtype.startswith('aws_api_gateway_') and
+                    rtype != 'aws_api_gateway_deployment'):
+                api_res[rtype] = resources
+        for k in ['module', 'locals']:
+            if k in self.tf_conf:
+                api_res[k] = self.tf_conf[k]
+        return hashlib.sha256(
+            json.dumps(api_res, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+
     def _generate_api_gateway_deployment(self):
         """
         Generate the API Gateway Deployment/Stage, and add to self.tf_conf
+
+        API Gateway only serves changes to the API once they're deployed, but
+        Terraform won't create a new deployment unless the deployment resource
+        itself changes (https://github.com/hashicorp/terraform/issues/6613).
+        The deployment's ``description`` and ``stage_description`` (which
+        forces a new resource) include a hash of the API configuration, so a
+        new deployment is created exactly when the API changes. This must not
+        use stage ``variables``, as those are passed to the function and end
+        up in every message. ``create_before_destroy`` keeps the stage
+        serving the old deployment until the new one is in place.
         """
         # finally, the deployment
         # this resource MUST come last
@@ -387,10 +909,17 @@ class TerraformGenerator(object):
         for rtype in sorted(self.tf_conf['resource'].keys()):
             for rname in sorted(self.tf_conf['resource'][rtype].keys()):
                 dep_on.append('%s.%s' % (rtype, rname))
+        for mname in sorted(self.tf_conf.get('module', {}).keys()):
+            dep_on.append('module.%s' % mname)
+        api_hash = self._api_config_hash
         self.tf_conf['resource']['aws_api_gateway_deployment']['depl'] = {
             'rest_api_id': '${aws_api_gateway_rest_api.rest_api.id}',
-            'description': self.description,
+            'description': '%s (API config sha256 %s)' % (
+                self.description, api_hash
+            ),
             'stage_name': self.config.stage_name,
+            'stage_description': 'API config sha256 %s' % api_hash,
+            'lifecycle': {'create_before_destroy': True},
             'depends_on': dep_on
         }
         self.tf_conf['output']['deployment_id'] = {
@@ -459,22 +988,10 @@ class TerraformGenerator(object):
             ]
         }
 
+        integration, resp_mapping, error_pattern = self._endpoint_integration(
+            ep_name, ep_method)
         self.tf_conf['resource']['aws_api_gateway_integration'][
-            '%s_%s_integration' % (ep_name, ep_method)] = {
-            'rest_api_id': '${aws_api_gateway_rest_api.rest_api.id}',
-            'resource_id': '${aws_api_gateway_resource.%s.id}' % ep_name,
-            'http_method': ep_method,
-            'type': 'AWS',
-            'uri': 'arn:aws:apigateway:us-east-1:lambda:path/2015-03-31/'
-                   'functions/${aws_lambda_function.lambda_func.arn}'
-                   '/invocations',
-            'credentials': '${aws_iam_role.invoke_role.arn}',
-            'integration_http_method': 'POST',
-            'request_templates': request_model_mapping
-            # @TODO:
-            # request_parameters_in_json
-            # integrationResponses
-        }
+            '%s_%s_integration' % (ep_name, ep_method)] = integration
 
         self.tf_conf['resource']['aws_api_gateway_integration_response'][
             '%s_%s_successResponse' % (ep_name, ep_method)] = {
@@ -482,7 +999,7 @@ class TerraformGenerator(object):
             'resource_id': '${aws_api_gateway_resource.%s.id}' % ep_name,
             'http_method': ep_method,
             'status_code': 202,
-            'response_templates': response_model_mapping['success'],
+            'response_templates': resp_mapping['success'],
             'depends_on': [
                 'aws_api_gateway_method_response.%s_%s_202' % (
                     ep_name, ep_method),
@@ -496,8 +1013,8 @@ class TerraformGenerator(object):
             'resource_id': '${aws_api_gateway_resource.%s.id}' % ep_name,
             'http_method': ep_method,
             'status_code': 500,
-            'selection_pattern': '(^Failed.*)|(.*([Ee]xception|[Ee]rror).*)',
-            'response_templates': response_model_mapping['error'],
+            'selection_pattern': error_pattern,
+            'response_templates': resp_mapping['error'],
             'depends_on': [
                 'aws_api_gateway_method_response.%s_%s_500' % (
                     ep_name, ep_method),
@@ -506,6 +1023,389 @@ class TerraformGenerator(object):
             ]
         }
 
+    def _generate_endpoints_module(self):
+        """
+        Generate a call to the endpoints module (see
+        :py:data:`~webhook2lambda2sqs.tf_templates.endpoints_module`), which
+        creates the resources for every endpoint using ``for_each`` over a
+        map with one (small) entry per endpoint. The mapping templates shared
+        by many endpoints are added once, as locals.
+
+        Terraform Name: module.endpoints
+        """
+        endpoints = self.config.get('endpoints')
+        tf_locals = self.tf_conf.setdefault('locals', {})
+        ep_map = {}
+        for ep in sorted(endpoints.keys()):
+            ep_method = endpoints[ep]['method'].upper()
+            integration, resp_mapping, error_pattern = \
+                self._endpoint_integration(ep, ep_method)
+            kind = self._endpoint_option(ep, 'integration', 'lambda')
+            if kind == 'direct':
+                req_name = 'request_templates_direct_%s' % ep_method
+            else:
+                req_name = 'request_templates_lambda'
+                if self._endpoint_option(ep, 'async', False):
+                    kind = 'async'
+            tf_locals[req_name] = integration['request_templates']
+            tf_locals['response_templates_%s' % kind] = resp_mapping
+            ep_map[ep] = {
+                'method': ep_method,
+                'type': integration['type'],
+                'uri': integration['uri'],
+                'credentials': integration['credentials'],
+                'integration_http_method':
+                    integration['integration_http_method'],
+                'passthrough_behavior': integration.get(
+                    'passthrough_behavior', 'WHEN_NO_MATCH'),
+                'request_parameters': integration.get(
+                    'request_parameters', {}),
+                'request_templates': '${local.%s}' % req_name,
+                'success_templates':
+                    '${local.response_templates_%s.success}' % kind,
+                'error_templates':
+                    '${local.response_templates_%s.error}' % kind,
+                'error_pattern': error_pattern
+            }
+        self.tf_conf['module'] = {
+            'endpoints': {
+                'source': './%s' % ENDPOINTS_MODULE_DIR,
+                'rest_api_id': '${aws_api_gateway_rest_api.rest_api.id}',
+                'parent_id':
+                    '${aws_api_gateway_rest_api.rest_api.root_resource_id}',
+                'success_model':
+                    '${aws_api_gateway_model.successmessage.name}',
+                'error_model': '${aws_api_gateway_model.errormessage.name}',
+                'endpoints': ep_map
+            }
+        }
+        self.tf_conf['output']['endpoint_paths'] = {
+            'value': '${module.endpoints.paths}'
+        }
+
+    def _endpoint_integration(self, ep_name, ep_method):
+        """
+        Return the integration for an endpoint, along with the response
+        mapping templates and error selection pattern for its integration
+        responses.
+
+        :param ep_name: endpoint name (path component)
+        :type ep_name: str
+        :param ep_method: HTTP method for the endpoint
+        :type ep_method: str
+        :return: 3-tuple of (aws_api_gateway_integration resource
+          configuration (dict), response mapping templates (dict), error
+          response selection pattern (str))
+        :rtype: tuple
+        """
+        if self._endpoint_option(ep_name, 'integration') == 'direct':
+            integration = self._direct_integration(ep_name, ep_method)
+            # for AWS service integrations, selection_pattern matches the
+            # HTTP status code returned by the service
+            return integration, direct_response_model_mapping, '[45]\\d{2}'
+        integration = self._lambda_integration(ep_name, ep_method)
+        resp_mapping = response_model_mapping
+        if self._endpoint_option(ep_name, 'async', False):
+            # Lambda accepts the event and returns an empty body; API
+            # Gateway responds 202 without waiting for the function
+            integration['request_parameters'] = {
+                'integration.request.header.X-Amz-Invocation-Type':
+                    "'Event'"
+            }
+            resp_mapping = async_response_model_mapping
+        return (
+            integration, resp_mapping,
+            '(^Failed.*)|(.*([Ee]xception|[Ee]rror).*)'
+        )
+
+    def _openapi_document(self):
+        """
+        Return an OpenAPI 3.0 document describing the whole ReST API (paths,
+        methods, integrations with their mapping templates, and response
+        models), using the API Gateway OpenAPI extensions. This is used as the
+        ``body`` of the ``aws_api_gateway_rest_api`` when the
+        ``api_definition`` configuration key is "openapi", instead of
+        generating Terraform resources for each endpoint.
+
+        :return: OpenAPI document
+        :rtype: dict
+        """
+        schemas = {}
+        for name, model in self._response_models().items():
+            schema = json.loads(model['schema'])
+            del schema['$schema']
+            schemas[name] = schema
+        paths = {}
+        if self.config.api_layout == 'proxy':
+            op = self._openapi_operation(
+                self._lambda_integration('proxy', 'ANY'),
+                response_model_mapping, '.+'
+            )
+            op['parameters'] = [{
+                'name': 'proxy',
+                'in': 'path',
+                'required': True,
+                'schema': {'type': 'string'}
+            }]
+            paths['/{proxy+}'] = {'x-amazon-apigateway-any-method': op}
+        else:
+            endpoints = self.config.get('endpoints')
+            for ep in sorted(endpoints.keys()):
+                ep_method = endpoints[ep]['method'].upper()
+                paths['/%s' % ep] = {
+                    ep_method.lower(): self._openapi_operation(
+                        *self._endpoint_integration(ep, ep_method)
+                    )
+                }
+        return {
+            'openapi': '3.0.1',
+            'info': {
+                'title': self.resource_name,
+                'description': self.description,
+                'version': VERSION
+            },
+            'paths': paths,
+            'components': {'schemas': schemas}
+        }
+
+    def _openapi_operation(self, integration, resp_mapping, error_pattern):
+        """
+        Return an OpenAPI operation with an
+        ``x-amazon-apigateway-integration`` equivalent to the given
+        aws_api_gateway_integration resource and integration responses.
+
+        :param integration: aws_api_gateway_integration resource configuration
+        :type integration: dict
+        :param resp_mapping: response mapping templates
+        :type resp_mapping: dict
+        :param error_pattern: error response selection pattern
+        :type error_pattern: str
+        :return: OpenAPI operation
+        :rtype: dict
+        """
+        api_int = {
+            'type': integration['type'].lower(),
+            'httpMethod': integration['integration_http_method'],
+            'uri': integration['uri'],
+            'credentials': integration['credentials'],
+            'requestTemplates': integration['request_templates'],
+            'passthroughBehavior': integration.get(
+                'passthrough_behavior', 'WHEN_NO_MATCH').lower(),
+            'responses': {
+                'default': {
+                    'statusCode': '202',
+                    'responseTemplates': resp_mapping['success']
+                },
+                error_pattern: {
+                    'statusCode': '500',
+                    'responseTemplates': resp_mapping['error']
+                }
+            }
+        }
+        if 'request_parameters' in integration:
+            api_int['requestParameters'] = integration['request_parameters']
+        responses = {}
+        for status, model in [('202', 'successmessage'),
+                              ('500', 'errormessage')]:
+            responses[status] = {
+                'description': '%s response' % status,
+                'content': {
+                    'application/json': {
+                        'schema': {'$ref': '#/components/schemas/%s' % model}
+                    }
+                }
+            }
+        return {
+            'responses': responses,
+            'x-amazon-apigateway-integration': api_int
+        }
+
+    def _generate_proxy_endpoint(self):
+        """
+        Generate configuration for the "proxy" api_layout: a single greedy
+        ``{proxy+}`` resource and ``ANY`` method, integrated with the Lambda
+        function, which looks up the endpoint (and checks the method) from
+        the ``proxy`` path parameter. The number of resources is the same
+        regardless of the number of endpoints.
+
+        Terraform Names:
+
+        - aws_api_gateway_resource: proxy
+        - aws_api_gateway_method: proxy_ANY
+        """
+        self.tf_conf['resource']['aws_api_gateway_resource']['proxy'] = {
+            'rest_api_id': '${aws_api_gateway_rest_api.rest_api.id}',
+            'parent_id':
+                '${aws_api_gateway_rest_api.rest_api.root_resource_id}',
+            'path_part': '{proxy+}'
+        }
+        self.tf_conf['resource']['aws_api_gateway_method']['proxy_ANY'] = {
+            'rest_api_id': '${aws_api_gateway_rest_api.rest_api.id}',
+            'resource_id': '${aws_api_gateway_resource.proxy.id}',
+            'http_method': 'ANY',
+            'authorization': 'NONE',
+            'request_parameters': {'method.request.path.proxy': True}
+        }
+        for status, model in [(202, 'successmessage'), (500, 'errormessage')]:
+            self.tf_conf['resource']['aws_api_gateway_method_response'][
+                'proxy_ANY_%d' % status] = {
+                'rest_api_id': '${aws_api_gateway_rest_api.rest_api.id}',
+                'resource_id': '${aws_api_gateway_resource.proxy.id}',
+                'http_method': 'ANY',
+                'status_code': status,
+                'response_models': {
+                    'application/json':
+                        '${aws_api_gateway_model.%s.name}' % model,
+                },
+                'depends_on': ['aws_api_gateway_method.proxy_ANY']
+            }
+        self.tf_conf['resource']['aws_api_gateway_integration'][
+            'proxy_ANY_integration'] = self._lambda_integration('proxy', 'ANY')
+        self.tf_conf['resource']['aws_api_gateway_integration_response'][
+            'proxy_ANY_successResponse'] = {
+            'rest_api_id': '${aws_api_gateway_rest_api.rest_api.id}',
+            'resource_id': '${aws_api_gateway_resource.proxy.id}',
+            'http_method': 'ANY',
+            'status_code': 202,
+            'response_templates': response_model_mapping['success'],
+            'depends_on': [
+                'aws_api_gateway_method_response.proxy_ANY_202',
+                'aws_api_gateway_integration.proxy_ANY_integration'
+            ]
+        }
+        # any function error (including unknown endpoints and wrong methods)
+        # is an error response
+        self.tf_conf['resource']['aws_api_gateway_integration_response'][
+            'proxy_ANY_errorResponse'] = {
+            'rest_api_id': '${aws_api_gateway_rest_api.rest_api.id}',
+            'resource_id': '${aws_api_gateway_resource.proxy.id}',
+            'http_method': 'ANY',
+            'status_code': 500,
+            'selection_pattern': '.+',
+            'response_templates': response_model_mapping['error'],
+            'depends_on': [
+                'aws_api_gateway_method_response.proxy_ANY_500',
+                'aws_api_gateway_integration.proxy_ANY_integration'
+            ]
+        }
+
+    def _lambda_integration(self, ep_name, ep_method):
+        """
+        Return the aws_api_gateway_integration resource for an endpoint that
+        invokes the Lambda function.
+
+        :param ep_name: endpoint name (path component)
+        :type ep_name: str
+        :param ep_method: HTTP method for the endpoint
+        :type ep_method: str
+        :return: aws_api_gateway_integration resource configuration
+        :rtype: dict
+        """
+        return {
+            'rest_api_id': '${aws_api_gateway_rest_api.rest_api.id}',
+            'resource_id': '${aws_api_gateway_resource.%s.id}' % ep_name,
+            'http_method': ep_method,
+            'type': 'AWS',
+            'uri': 'arn:aws:apigateway:%s:lambda:path/2015-03-31/'
+                   'functions/${aws_lambda_function.lambda_func.arn}'
+                   '/invocations' % self.aws_region,
+            'credentials': '${aws_iam_role.invoke_role.arn}',
+            'integration_http_method': 'POST',
+            'request_templates': request_model_mapping
+            # @TODO:
+            # request_parameters_in_json
+            # integrationResponses
+        }
+
+    def _direct_integration(self, ep_name, ep_method):
+        """
+        Return the aws_api_gateway_integration resource for an endpoint using
+        the "direct" integration, which calls SQS SendMessage from API Gateway
+        without invoking the Lambda function.
+
+        :param ep_name: endpoint name (path component)
+        :type ep_name: str
+        :param ep_method: HTTP method for the endpoint
+        :type ep_method: str
+        :return: aws_api_gateway_integration resource configuration
+        :rtype: dict
+        """
+        qname = self.config.get('endpoints')[ep_name]['queues'][0]
+        return {
+            'rest_api_id': '${aws_api_gateway_rest_api.rest_api.id}',
+            'resource_id': '${aws_api_gateway_resource.%s.id}' % ep_name,
+            'http_method': ep_method,
+            'type': 'AWS',
+            'uri': 'arn:aws:apigateway:%s:sqs:path/%s/%s' % (
+                self._queue_region, self.aws_account_id, qname),
+            'credentials': '${aws_iam_role.invoke_role.arn}',
+            'integration_http_method': 'POST',
+            'request_parameters': {
+                'integration.request.header.Content-Type':
+                    "'application/x-www-form-urlencoded'"
+            },
+            # never pass an untransformed body through to SendMessage
+            'passthrough_behavior': 'WHEN_NO_TEMPLATES',
+            'request_templates': direct_request_model_mapping[ep_method]
+        }
+
+    def _generate_custom_domain(self):
+        """
+        If the ``custom_domain`` configuration option is set, generate a
+        regional API Gateway custom domain name mapped to the stage, and a
+        Route 53 latency-based alias record for this region pointing to it,
+        and add to self.tf_conf. Each region's stack manages its own record
+        (identified by the region) in the shared record set.
+
+        Terraform names:
+
+        - aws_api_gateway_domain_name: custom_domain
+        - aws_api_gateway_base_path_mapping: custom_domain
+        - aws_route53_record: custom_domain
+        """
+        cd = self.config.get('custom_domain')
+        if cd is None:
+            return
+        if self.aws_region not in cd['certificate_arns']:
+            raise Exception('ERROR: custom_domain certificate_arns has no '
+                            'certificate for region %s' % self.aws_region)
+        res = self.tf_conf['resource']
+        res['aws_api_gateway_domain_name'] = {
+            'custom_domain': {
+                'domain_name': cd['domain_name'],
+                'regional_certificate_arn':
+                    cd['certificate_arns'][self.aws_region],
+                'endpoint_configuration': {'types': ['REGIONAL']}
+            }
+        }
+        res['aws_api_gateway_base_path_mapping'] = {
+            'custom_domain': {
+                'api_id': '${aws_api_gateway_rest_api.rest_api.id}',
+                'stage_name': '${aws_api_gateway_deployment.depl.stage_name}',
+                'domain_name':
+                    '${aws_api_gateway_domain_name.custom_domain.domain_name}'
+            }
+        }
+        res['aws_route53_record'] = {
+            'custom_domain': {
+                'zone_id': cd['route53_zone_id'],
+                'name': cd['domain_name'],
+                'type': 'A',
+                'set_identifier': self.aws_region,
+                'latency_routing_policy': {'region': self.aws_region},
+                'alias': {
+                    'name': '${aws_api_gateway_domain_name.custom_domain.'
+                            'regional_domain_name}',
+                    'zone_id': '${aws_api_gateway_domain_name.custom_domain.'
+                               'regional_zone_id}',
+                    'evaluate_target_health': True
+                }
+            }
+        }
+        self.tf_conf['output']['custom_domain_url'] = {
+            'value': 'https://%s/' % cd['domain_name']
+        }
+
     def _generate_saved_config(self):
         """
         In order to ease saving webhook2lambda2sqs's JSON configuration,
@@ -532,19 +1432,61 @@ class TerraformGenerator(object):
         self._set_account_info()
         self._generate_iam_role()
         self._generate_iam_role_policy()
+        if self.config.api_type == 'http':
+            self._generate_lambda()
+            self._generate_sns_fanout()
+            self._generate_http_api()
+            self._generate_saved_config()
+            # drop the unused (empty) ReST API resource types
+            for rtype in list(self.tf_conf['resource'].keys()):
+                if len(self.tf_conf['resource'][rtype]) == 0:
+                    del self.tf_conf['resource'][rtype]
+            return pretty_json(self.tf_conf)
         self._generate_iam_invoke_role()
         self._generate_iam_invoke_role_policy()
         self._generate_lambda()
-        self._generate_response_models()
+        self._generate_async_destination()
+        self._generate_sns_fanout()
+        if self.config.api_definition != 'openapi':
+            # with "openapi", models are part of the rest_api body
+            self._generate_response_models()
         self._generate_api_gateway()
         self._generate_api_gateway_deployment()
+        self._generate_custom_domain()
         self._generate_saved_config()
+        if (self.config.api_definition == 'openapi' or
+                self.config.get('terraform_module')):
+            # the per-endpoint resource types are unused
+            for rtype in list(self.tf_conf['resource'].keys()):
+                if len(self.tf_conf['resource'][rtype]) == 0:
+                    del self.tf_conf['resource'][rtype]
         return pretty_json(self.tf_conf)
 
     def _write_zip(self, func_src, fpath):
         """
-        Write the function source to a zip file, suitable for upload to
-        Lambda.
+        Write the function source (and any vendored packages) to a zip file,
+        suitable for upload to Lambda. The file is only rewritten if its
+        content changed; see :py:meth:`~._zip_bytes`.
+
+        :param func_src: lambda function source
+        :type func_src: str
+        :param fpath: path to write the zip file at
+        :type fpath: str
+        :return: whether or not the file was written
+        :rtype: bool
+        """
+        logger.debug('writing zip file at: %s', fpath)
+        return write_if_changed(fpath, self._zip_bytes(func_src))
+
+    def _zip_bytes(self, func_src):
+        """
+        Return the bytes of a zip file containing the function source, and
+        the contents of ``lambda_vendor_dir`` if configured.
+
+        The zip is byte-for-byte reproducible for the same input: entries are
+        sorted by name and all have a fixed timestamp (:py:const:`ZIP_DATE`)
+        and normalized mode. This keeps the Lambda ``source_code_hash`` stable
+        so that Terraform only updates the function when its code changes.
 
         Note there's a bit of undocumented magic going on here; Lambda needs
         the execute bit set on the module with the handler in it (i.e. 0755
@@ -558,46 +1500,270 @@ class TerraformGenerator(object):
 
         :param func_src: lambda function source
         :type func_src: str
-        :param fpath: path to write the zip file at
-        :type fpath: str
+        :return: zip file content
+        :rtype: bytes
         """
-        # get timestamp for file
-        now = datetime.now()
-        zi_tup = (now.year, now.month, now.day, now.hour, now.minute,
-                  now.second)
-        logger.debug('setting zipinfo date to: %s', zi_tup)
-        # create a ZipInfo so we can set file attributes/mode
-        zinfo = zipfile.ZipInfo('webhook2lambda2sqs_func.py', zi_tup)
-        # set file mode
-        zinfo.external_attr = 0x0755 << 16
-        logger.debug('setting zipinfo file mode to: %s', zinfo.external_attr)
-        logger.debug('writing zip file at: %s', fpath)
-        with zipfile.ZipFile(fpath, 'w') as z:
-            z.writestr(zinfo, func_src)
+        # mapping of archive name to (content, file mode, compress type)
+        entries = {
+            'webhook2lambda2sqs_func.py': (
+                func_src, 0x0755 << 16, zipfile.ZIP_STORED
+            )
+        }
+        if self.config.get('lambda_precompile'):
+            entries.update(self._compile_entries(
+                {'webhook2lambda2sqs_func.py': func_src}
+            ))
+        vendor_dir = self.config.get('lambda_vendor_dir')
+        if vendor_dir is not None and not self.config.get('lambda_layer'):
+            entries.update(self._vendor_entries(vendor_dir))
+        return self._build_zip(entries)
+
+    def _layer_zip_bytes(self):
+        """
+        Return the bytes of a Lambda layer zip file containing the contents
+        of ``lambda_vendor_dir`` under ``python/``, for use when the
+        ``lambda_layer`` option is set.
+
+        :return: zip file content
+        :rtype: bytes
+        """
+        entries = {}
+        vendor = self._vendor_entries(self.config.get('lambda_vendor_dir'))
+        for arcname, entry in vendor.items():
+            entries['python/' + arcname] = entry
+        return self._build_zip(entries)
+
+    def _build_zip(self, entries):
+        """
+        Build a reproducible zip file from a dict of entries.
+
+        :param entries: dict of archive name to 3-tuple of (content, file
+          mode, compress type)
+        :type entries: dict
+        :return: zip file content
+        :rtype: bytes
+        """
+        logger.debug('setting zipinfo date to: %s', ZIP_DATE)
+        buf = BytesIO()
+        with zipfile.ZipFile(buf, 'w') as z:
+            for arcname in sorted(entries.keys()):
+                content, mode, compress_type = entries[arcname]
+                zinfo = zipfile.ZipInfo(arcname, ZIP_DATE)
+                zinfo.create_system = 3  # unix, regardless of where we run
+                zinfo.external_attr = mode
+                zinfo.compress_type = compress_type
+                z.writestr(zinfo, content)
+        return buf.getvalue()
+
+    def _compile_entries(self, sources, ignore_errors=False):
+        """
+        Compile Python sources to bytecode for the ``lambda_precompile``
+        option, so that Lambda doesn't have to compile them on every cold
+        start (the deployment package is read-only, so it can't cache them).
+
+        Bytecode is only valid for the interpreter version that wrote it, so
+        this must run under the same Python version as ``lambda_runtime``.
+        The files are built in memory as unchecked hash-based pycs (PEP 552),
+        which don't depend on source mtimes and are reproducible; they're the
+        same as what :py:func:`py_compile.compile` writes with
+        ``invalidation_mode=UNCHECKED_HASH``.
+
+        :param sources: dict of archive name of the source file to source
+        :type sources: dict
+        :param ignore_errors: if True, skip sources that fail to compile
+          instead of raising an exception
+        :type ignore_errors: bool
+        :return: dict of archive name to 3-tuple of (content, file mode,
+          compress type) for the ``__pycache__`` entries
+        :rtype: dict
+        """
+        runtime = self.config.lambda_runtime
+        running = 'python%d.%d' % sys.version_info[:2]
+        if runtime != running or sys.version_info < (3, 7):
+            raise Exception('ERROR: lambda_precompile requires running under '
+                            'the same Python (3.7+) version as lambda_runtime '
+                            '(%s); running %s.' % (runtime, running))
+        # importlib.util.source_hash() was added in 3.7
+        import importlib.util
+        tag = sys.implementation.cache_tag
+        # PEP 552 flags: hash-based (0x01), unchecked (no 0x02)
+        header = importlib.util.MAGIC_NUMBER + struct.pack('<I', 1)
+        entries = {}
+        for arcname in sorted(sources.keys()):
+            src = sources[arcname]
+            if not isinstance(src, bytes):
+                src = src.encode('utf-8')
+            try:
+                code = compile(src, arcname, 'exec', dont_inherit=True)
+            except (SyntaxError, ValueError):
+                if not ignore_errors:
+                    raise
+                logger.debug('unable to compile %s; skipping', arcname)
+                continue
+            dirname, fname = posixpath.split(arcname)
+            pyc_name = posixpath.join(
+                dirname, '__pycache__', '%s.%s.pyc' % (fname[:-3], tag)
+            )
+            entries[pyc_name] = (
+                header + importlib.util.source_hash(src) + marshal.dumps(code),
+                0o100644 << 16, zipfile.ZIP_DEFLATED
+            )
+        logger.debug('compiled %d of %d sources', len(entries), len(sources))
+        return entries
+
+    def _vendor_entries(self, vendor_dir):
+        """
+        Return zip entries for the contents of ``vendor_dir``, to be added to
+        the top level of the function zip file so that vendored packages
+        (i.e. orjson) are importable by the function.
+
+        :param vendor_dir: path to the directory to add
+        :type vendor_dir: str
+        :return: dict of archive name to 3-tuple of (content, file mode,
+          compress type)
+        :rtype: dict
+        """
+        vendor_dir = os.path.abspath(os.path.expanduser(vendor_dir))
+        if not os.path.isdir(vendor_dir):
+            raise Exception('ERROR: lambda_vendor_dir %s does not exist or is '
+                            'not a directory.' % vendor_dir)
+        logger.debug('adding vendored packages from: %s', vendor_dir)
+        entries = {}
+        for root, dirs, files in os.walk(vendor_dir):
+            for fname in files:
+                if fname.endswith('.pyc'):
+                    continue
+                path = os.path.join(root, fname)
+                arcname = os.path.relpath(path, vendor_dir).replace(
+                    os.sep, '/')
+                if self._is_excluded_service_model(arcname):
+                    continue
+                mode = 0o100644
+                if os.stat(path).st_mode & 0o111:
+                    mode = 0o100755
+                with open(path, 'rb') as fh:
+                    entries[arcname] = (
+                        fh.read(), mode << 16, zipfile.ZIP_DEFLATED
+                    )
+        if self.config.get('lambda_precompile'):
+            entries.update(self._compile_entries(
+                dict([
+                    (k, entries[k][0]) for k in entries if k.endswith('.py')
+                ]),
+                ignore_errors=True
+            ))
+        return entries
+
+    def _is_excluded_service_model(self, arcname):
+        """
+        Return whether or not a vendored file is a boto3 or botocore data
+        file for an AWS service not listed in ``lambda_botocore_services``.
+        If that option isn't set, nothing is excluded.
+
+        :param arcname: archive name of the vendored file
+        :type arcname: str
+        :rtype: bool
+        """
+        services = self.config.get('lambda_botocore_services')
+        if services is None:
+            return False
+        parts = arcname.split('/')
+        if len(parts) < 4 or parts[0] not in ['boto3', 'botocore']:
+            return False
+        # only service directories, i.e. botocore/data/sqs/2012-11-05/...
+        return parts[1] == 'data' and parts[2] not in services
+
+    def _package_report(self, zip_paths):
+        """
+        Log the size of each deployment package, and the time it takes to
+        import the function module from the extracted packages in a new
+        Python process (using the local interpreter and its boto3, so it's
+        only an approximation of a Lambda cold start).
+
+        :param zip_paths: paths to the function zip file, and the layer zip
+          file if there is one
+        :type zip_paths: list
+        :return: measured import time in seconds, or None on failure
+        :rtype: float
+        """
+        for fpath in zip_paths:
+            logger.warning('Package %s size: %d bytes', fpath,
+                           os.path.getsize(fpath))
+        tmpdir = tempfile.mkdtemp()
+        try:
+            # mimic the Lambda layout: function in /var/task, layers in /opt
+            paths = []
+            for idx, fpath in enumerate(zip_paths):
+                dest = os.path.join(tmpdir, str(idx))
+                with zipfile.ZipFile(fpath) as z:
+                    z.extractall(dest)
+                paths.append(dest if idx == 0 else os.path.join(dest, 'python'))
+            code = 'import sys, time; sys.path[0:0] = %r; s = time.time(); ' \
+                   'import webhook2lambda2sqs_func; ' \
+                   'sys.stdout.write(repr(time.time() - s))' % paths
+            try:
+                out = subprocess.check_output([sys.executable, '-c', code])
+            except (subprocess.CalledProcessError, OSError):
+                logger.error('Unable to measure function import time',
+                             exc_info=1)
+                return None
+        finally:
+            shutil.rmtree(tmpdir)
+        secs = float(out.decode('utf-8').strip())
+        logger.warning('Function module import time (local %s): %.3f '
+                       'seconds', sys.executable, secs)
+        return secs
 
-    def generate(self, func_src):
+    def generate(self, func_src, package_report=False):
         """
-        Generate TF config and write to ./webhook2lambda2sqs.tf.json;
-        write the lambda function to ./webhook2lambda2sqs_func.py
+        Generate TF config and write to webhook2lambda2sqs.tf.json (and,
+        if the ``terraform_module`` configuration option is true, the
+        endpoints module to webhook2lambda2sqs_endpoints/main.tf);
+        write the lambda function to webhook2lambda2sqs_func.py and
+        webhook2lambda2sqs_func.zip, and the Lambda layer (if configured)
+        to webhook2lambda2sqs_layer.zip, all in the working directory (which
+        is created if it doesn't exist). Files whose content is unchanged
+        are not rewritten.
 
         :param func_src: lambda function source
         :type func_src: str
+        :param package_report: whether or not to report deployment package
+          size and import time; see :py:meth:`~._package_report`
+        :type package_report: bool
         """
+        if not os.path.isdir(self.workdir):
+            logger.debug('Creating working directory: %s', self.workdir)
+            os.makedirs(self.workdir)
+        func_path = os.path.join(self.workdir, 'webhook2lambda2sqs_func.py')
+        zip_path = os.path.join(self.workdir, 'webhook2lambda2sqs_func.zip')
+        layer_path = os.path.join(self.workdir, 'webhook2lambda2sqs_layer.zip')
+        tf_path = os.path.join(self.workdir, 'webhook2lambda2sqs.tf.json')
+        mod_dir = os.path.join(self.workdir, ENDPOINTS_MODULE_DIR)
         # write function source for reference
-        logger.warning('Writing lambda function source to: '
-                       './webhook2lambda2sqs_func.py')
-        with open('./webhook2lambda2sqs_func.py', 'w') as fh:
-            fh.write(func_src)
+        logger.warning('Writing lambda function source to: %s', func_path)
+        write_if_changed(func_path, func_src.encode('utf-8'))
         logger.debug('lambda function written')
         # write upload zip
-        logger.warning('Writing lambda function source zip file to: '
-                       './webhook2lambda2sqs_func.zip')
-        self._write_zip(func_src, './webhook2lambda2sqs_func.zip')
+        logger.warning('Writing lambda function source zip file to: %s',
+                       zip_path)
+        self._write_zip(func_src, zip_path)
         logger.debug('lambda zip written')
+        zip_paths = [zip_path]
+        if self.config.get('lambda_layer'):
+            logger.warning('Writing lambda layer zip file to: %s', layer_path)
+            write_if_changed(layer_path, self._layer_zip_bytes())
+            zip_paths.append(layer_path)
+        if package_report:
+            self._package_report(zip_paths)
         # write terraform
-        logger.warning('Writing terraform configuration JSON to: '
-                       './webhook2lambda2sqs.tf.json')
-        with open('./webhook2lambda2sqs.tf.json', 'w') as fh:
-            fh.write(self._get_config(func_src))
+        logger.warning('Writing terraform configuration JSON to: %s', tf_path)
+        write_if_changed(tf_path, self._get_config(func_src).encode('utf-8'))
         logger.debug('terraform configuration written')
+        if self.config.get('terraform_module'):
+            if not os.path.isdir(mod_dir):
+                os.makedirs(mod_dir)
+            mod_path = os.path.join(mod_dir, 'main.tf')
+            logger.warning('Writing terraform endpoints module to: %s',
+                           mod_path)
+            write_if_changed(mod_path, endpoints_module.encode('utf-8'))
         logger.warning('Completed writing lambda function and TF config.')
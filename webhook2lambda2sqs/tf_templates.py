@@ -0,0 +1,162 @@
+"""
+Terraform (HCL) templates
+
+The latest version of this package is available at:
+<http://github.com/jantman/webhook2lambda2sqs>
+
+################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of webhook2lambda2sqs, also known as webhook2lambda2sqs.
+
+    webhook2lambda2sqs is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    webhook2lambda2sqs is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with webhook2lambda2sqs.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/webhook2lambda2sqs> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+#: Terraform (>= 0.13) module creating the API Gateway Resource, Method,
+#: Method Responses, Integration and Integration Responses for each entry of
+#: the ``endpoints`` map variable. Used when the ``terraform_module``
+#: configuration option is true.
+endpoints_module = """# API Gateway resources for webhook2lambda2sqs endpoints.
+# Generated and managed by webhook2lambda2sqs; do not edit.
+
+variable "rest_api_id" {
+  type = string
+}
+
+variable "parent_id" {
+  type = string
+}
+
+variable "success_model" {
+  type = string
+}
+
+variable "error_model" {
+  type = string
+}
+
+variable "endpoints" {
+  description = "map of endpoint name (path part) to endpoint settings"
+  type = map(object({
+    method                  = string
+    type                    = string
+    uri                     = string
+    credentials             = string
+    integration_http_method = string
+    passthrough_behavior    = string
+    request_parameters      = map(string)
+    request_templates       = map(string)
+    success_templates       = map(string)
+    error_templates         = map(string)
+    error_pattern           = string
+  }))
+}
+
+resource "aws_api_gateway_resource" "endpoint" {
+  for_each    = var.endpoints
+  rest_api_id = var.rest_api_id
+  parent_id   = var.parent_id
+  path_part   = each.key
+}
+
+resource "aws_api_gateway_method" "endpoint" {
+  for_each      = var.endpoints
+  rest_api_id   = var.rest_api_id
+  resource_id   = aws_api_gateway_resource.endpoint[each.key].id
+  http_method   = each.value.method
+  authorization = "NONE"
+}
+
+resource "aws_api_gateway_method_response" "success" {
+  for_each    = var.endpoints
+  rest_api_id = var.rest_api_id
+  resource_id = aws_api_gateway_resource.endpoint[each.key].id
+  http_method = aws_api_gateway_method.endpoint[each.key].http_method
+  status_code = "202"
+  response_models = {
+    "application/json" = var.success_model
+  }
+}
+
+resource "aws_api_gateway_method_response" "error" {
+  for_each    = var.endpoints
+  rest_api_id = var.rest_api_id
+  resource_id = aws_api_gateway_resource.endpoint[each.key].id
+  http_method = aws_api_gateway_method.endpoint[each.key].http_method
+  status_code = "500"
+  response_models = {
+    "application/json" = var.error_model
+  }
+}
+
+resource "aws_api_gateway_integration" "endpoint" {
+  for_each                = var.endpoints
+  rest_api_id             = var.rest_api_id
+  resource_id             = aws_api_gateway_resource.endpoint[each.key].id
+  http_method             = each.value.method
+  type                    = each.value.type
+  uri                     = each.value.uri
+  credentials             = each.value.credentials
+  integration_http_method = each.value.integration_http_method
+  passthrough_behavior    = each.value.passthrough_behavior
+  request_parameters      = each.value.request_parameters
+  request_templates       = each.value.request_templates
+  depends_on              = [aws_api_gateway_method.endpoint]
+}
+
+resource "aws_api_gateway_integration_response" "success" {
+  for_each           = var.endpoints
+  rest_api_id        = var.rest_api_id
+  resource_id        = aws_api_gateway_resource.endpoint[each.key].id
+  http_method        = aws_api_gateway_method.endpoint[each.key].http_method
+  status_code        = "202"
+  response_templates = each.value.success_templates
+  depends_on = [
+    aws_api_gateway_method_response.success,
+    aws_api_gateway_integration.endpoint
+  ]
+}
+
+resource "aws_api_gateway_integration_response" "error" {
+  for_each           = var.endpoints
+  rest_api_id        = var.rest_api_id
+  resource_id        = aws_api_gateway_resource.endpoint[each.key].id
+  http_method        = aws_api_gateway_method.endpoint[each.key].http_method
+  status_code        = "500"
+  selection_pattern  = each.value.error_pattern
+  response_templates = each.value.error_templates
+  depends_on = [
+    aws_api_gateway_method_response.error,
+    aws_api_gateway_integration.endpoint
+  ]
+}
+
+output "paths" {
+  value = { for k, r in aws_api_gateway_resource.endpoint : k => r.path }
+}
+"""
@@ -37,12 +37,33 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import json
 import logging
+import hashlib
 import subprocess
 import sys
 import os
+import threading
+import time
+from collections import deque
+
+try:
+    from queue import Queue, Empty
+except ImportError:  # python 2
+    from Queue import Queue, Empty
 
 logger = logging.getLogger(__name__)
 
+#: Default maximum number of characters of command output that
+#: :py:func:`~.run_cmd` keeps in memory.
+RUN_CMD_MAX_OUTPUT = 16 * 1024 * 1024
+
+#: Per-user on-disk cache of values looked up from AWS (i.e. the account ID
+#: for a set of credentials); see :py:func:`~.cache_get`.
+AWS_CACHE_PATH = os.path.join('~', '.webhook2lambda2sqs', 'aws_cache.json')
+
+#: serializes read-modify-write of :py:const:`~.AWS_CACHE_PATH` between
+#: threads (i.e. the ``multi`` action, or multiple regions)
+_aws_cache_lock = threading.Lock()
+
 
 def read_json_file(fpath):
     """
@@ -73,17 +94,159 @@ def pretty_json(obj):
     return json.dumps(obj, sort_keys=True, indent=4)
 
 
-def run_cmd(args, stream=False, shell=True):
+def write_if_changed(fpath, content):
+    """
+    Write ``content`` to ``fpath``, unless the file already exists and its
+    content has the same SHA256 hash. Leaving unchanged files alone keeps
+    their mtimes stable and avoids needless work downstream.
+
+    :param fpath: path to the file to write
+    :type fpath: str
+    :param content: content to write
+    :type content: bytes
+    :return: whether or not the file was written
+    :rtype: bool
+    """
+    new_hash = hashlib.sha256(content).hexdigest()
+    if os.path.exists(fpath):
+        with open(fpath, 'rb') as fh:
+            old_hash = hashlib.sha256(fh.read()).hexdigest()
+        if old_hash == new_hash:
+            logger.info('%s is unchanged (sha256 %s); not rewriting',
+                        fpath, new_hash)
+            return False
+    with open(fpath, 'wb') as fh:
+        fh.write(content)
+    logger.debug('wrote %s (sha256 %s)', fpath, new_hash)
+    return True
+
+
+def _read_aws_cache():
+    """
+    Return the contents of the :py:const:`~.AWS_CACHE_PATH` cache file, or an
+    empty dict if it doesn't exist or can't be read.
+
+    :rtype: dict
+    """
+    try:
+        with open(os.path.expanduser(AWS_CACHE_PATH), 'r') as fh:
+            return json.loads(fh.read())
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def cache_get(name, key, max_age):
+    """
+    Return the value cached by :py:func:`~.cache_set` for ``key`` in the
+    ``name`` section of the per-user :py:const:`~.AWS_CACHE_PATH` cache, if
+    it was stored less than ``max_age`` seconds ago; otherwise None.
+
+    :param name: name of the cache section, i.e. "account_id"
+    :type name: str
+    :param key: cache key within the section
+    :type key: str
+    :param max_age: maximum age of the cached value, in seconds
+    :type max_age: int
+    :return: cached value, or None
+    """
+    with _aws_cache_lock:
+        entry = _read_aws_cache().get(name, {}).get(key)
+    if entry is None or time.time() - entry['time'] > max_age:
+        return None
+    return entry['value']
+
+
+def cache_set(name, key, value):
+    """
+    Store ``value`` for ``key`` in the ``name`` section of the per-user
+    :py:const:`~.AWS_CACHE_PATH` cache; see :py:func:`~.cache_get`. Failure
+    to write the cache is logged and otherwise ignored.
+
+    :param name: name of the cache section
+    :type name: str
+    :param key: cache key within the section
+    :type key: str
+    :param value: JSON-serializable value to cache
+    """
+    path = os.path.expanduser(AWS_CACHE_PATH)
+    with _aws_cache_lock:
+        cache = _read_aws_cache()
+        cache.setdefault(name, {})[key] = {'value': value, 'time': time.time()}
+        try:
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as fh:
+                fh.write(json.dumps(cache, sort_keys=True, indent=4))
+        except (IOError, OSError):
+            logger.debug('Unable to write AWS cache %s', path, exc_info=1)
+
+
+def _read_lines(fh, q):
+    """
+    Read lines from binary file handle ``fh`` until EOF, putting each one on
+    Queue ``q`` followed by None. Target for the :py:func:`~.run_cmd` reader
+    thread.
+
+    :param fh: file handle to read from
+    :param q: queue to put lines on
+    :type q: Queue
+    """
+    for line in iter(fh.readline, b''):
+        q.put(line)
+    q.put(None)
+
+
+def _stop_process(p, grace=5):
+    """
+    Terminate a :py:class:`subprocess.Popen` process; kill it if it hasn't
+    exited within ``grace`` seconds.
+
+    :param p: process to stop
+    :type p: :py:class:`subprocess.Popen`
+    :param grace: seconds to wait for the process to exit after terminating it
+    :type grace: int
+    """
+    logger.warning('Terminating process %s', p.pid)
+    p.terminate()
+    deadline = time.time() + grace
+    while p.poll() is None and time.time() < deadline:
+        time.sleep(0.1)
+    if p.poll() is None:
+        logger.warning('Process %s did not exit; killing', p.pid)
+        p.kill()
+    p.wait()
+
+
+def run_cmd(args, stream=False, shell=True, timeout=None, transcript=None,
+            max_output=RUN_CMD_MAX_OUTPUT, cancel=None, cwd=None):
     """
     Execute a command via :py:class:`subprocess.Popen`; return its output
     (string, combined STDOUT and STDERR) and exit code (int). If stream is True,
     also stream the output to STDOUT in realtime.
 
+    Output is read a line at a time (through a buffered pipe, in a separate
+    thread) and only the last ``max_output`` characters are kept in memory;
+    the full output can be written to a ``transcript`` file.
+
     :param args: the command to run and arguments, as a list or string
     :param stream: whether or not to stream combined OUT and ERR in realtime
     :type stream: bool
     :param shell: whether or not to execute the command through the shell
     :type shell: bool
+    :param timeout: if not None, terminate the command and raise an
+      exception if it runs for longer than this many seconds
+    :type timeout: float
+    :param transcript: if not None, path to a file to append the complete
+      command output to
+    :type transcript: str
+    :param max_output: maximum number of characters of output to keep in
+      memory and return; earlier output is discarded
+    :type max_output: int
+    :param cancel: if not None, terminate the command and raise an exception
+      when this event is set
+    :type cancel: :py:class:`threading.Event`
+    :param cwd: if not None, directory to run the command in
+    :type cwd: str
     :return: 2-tuple of (combined output (str), return code (int))
     :rtype: tuple
     """
@@ -91,15 +254,63 @@ def run_cmd(args, stream=False, shell=True):
     if stream:
         s = ' and streaming output'
     logger.info('Running command%s: %s', s, args)
-    outbuf = ''
     p = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                         shell=shell)
+                         shell=shell, cwd=cwd)
     logger.debug('Started process; pid=%s', p.pid)
-    for c in iter(lambda: p.stdout.read(1), ''):
-        outbuf += c
-        if stream:
-            sys.stdout.write(c)
-    p.poll()  # set returncode
+    q = Queue()
+    reader = threading.Thread(target=_read_lines, args=(p.stdout, q))
+    reader.daemon = True
+    reader.start()
+    deadline = None
+    if timeout is not None:
+        deadline = time.time() + timeout
+    poll_interval = None
+    if deadline is not None or cancel is not None:
+        poll_interval = 0.1
+    # bounded buffer of the most recent output lines
+    lines = deque()
+    buf_len = 0
+    dropped = 0
+    tfh = None
+    if transcript is not None:
+        tfh = open(transcript, 'ab')
+    try:
+        while True:
+            if cancel is not None and cancel.is_set():
+                _stop_process(p)
+                raise Exception('Command cancelled: %s' % args)
+            if deadline is not None and time.time() > deadline:
+                _stop_process(p)
+                raise Exception('Command timed out after %s seconds: %s' % (
+                    timeout, args))
+            try:
+                line = q.get(timeout=poll_interval)
+            except Empty:
+                continue
+            if line is None:
+                break
+            if tfh is not None:
+                tfh.write(line)
+            line = line.decode('utf-8', 'replace')
+            if stream:
+                sys.stdout.write(line)
+                sys.stdout.flush()
+            lines.append(line)
+            buf_len += len(line)
+            while buf_len > max_output and len(lines) > 1:
+                old = lines.popleft()
+                buf_len -= len(old)
+                dropped += len(old)
+    finally:
+        if tfh is not None:
+            tfh.close()
+    p.wait()  # set returncode
+    outbuf = ''.join(lines)
+    if dropped > 0:
+        logger.warning('Discarded first %d characters of command output',
+                       dropped)
+        outbuf = '[... %d characters of output discarded ...]\n%s' % (
+            dropped, outbuf)
     logger.info('Command exited with code %d', p.returncode)
     logger.debug("Command output:\n%s", outbuf)
     return outbuf, p.returncode